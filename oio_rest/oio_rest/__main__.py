@@ -60,18 +60,17 @@ def initdb(wait):
                 sys.exit(1)
             time.sleep(SLEEPING_TIME)
 
-    cursor = conn.cursor()
-    cursor.execute(INIT_CHECK_SQL)
-    initialised = bool(cursor.fetchone())
-
-    if initialised:
-        click.echo("Database already initialised; nothing happens.")
-        return
-
-    click.echo("Initializing database.")
-    cursor.execute("\n".join(db_templating.get_sql()))
-    conn.commit()
-    conn.close()
+    with conn, conn.cursor() as cursor:
+        cursor.execute(INIT_CHECK_SQL)
+        initialised = bool(cursor.fetchone())
+
+        if initialised:
+            click.echo("Database already initialised; nothing happens.")
+            return
+
+        click.echo("Initializing database.")
+        cursor.execute("\n".join(db_templating.get_sql()))
+
     click.echo("Database initialised.")
 
 
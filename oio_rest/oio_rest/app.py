@@ -16,13 +16,15 @@ from jinja2 import Environment, FileSystemLoader
 from psycopg2 import DataError
 
 from . import sag, indsats, dokument, tilstand, aktivitet, organisation
-from . import log, klassifikation
-from .authentication import get_authenticated_user
+from . import authentication, changes, current_cache, db, history_cache
+from . import klassifikation, log, log_client
+from . import validate
+from .authentication import get_authenticated_user, requires_auth
 from .log_client import log_service_call
 
 from .custom_exceptions import OIOFlaskException, AuthorizationFailedException
 from .custom_exceptions import BadRequestException
-from .auth import tokens
+from .auth import restrictions, tokens
 
 import flask_saml_sso
 
@@ -50,17 +52,26 @@ class RegexConverter(BaseConverter):
 app.url_map.converters['regex'] = RegexConverter
 app.url_map.strict_slashes = False
 
-klassifikation.KlassifikationsHierarki.setup_api(
-    base_url=settings.BASE_URL, flask=app,
+HIERARCHIES = (
+    klassifikation.KlassifikationsHierarki,
+    log.LogHierarki,
+    sag.SagsHierarki,
+    organisation.OrganisationsHierarki,
+    dokument.DokumentHierarki,
+    aktivitet.AktivitetsHierarki,
+    indsats.IndsatsHierarki,
+    tilstand.TilstandsHierarki,
 )
-log.LogHierarki.setup_api(base_url=settings.BASE_URL, flask=app)
-sag.SagsHierarki.setup_api(base_url=settings.BASE_URL, flask=app)
-organisation.OrganisationsHierarki.setup_api(base_url=settings.BASE_URL,
-                                             flask=app)
-dokument.DokumentHierarki.setup_api(base_url=settings.BASE_URL, flask=app)
-aktivitet.AktivitetsHierarki.setup_api(base_url=settings.BASE_URL, flask=app)
-indsats.IndsatsHierarki.setup_api(base_url=settings.BASE_URL, flask=app)
-tilstand.TilstandsHierarki.setup_api(base_url=settings.BASE_URL, flask=app)
+
+for hierarchy in HIERARCHIES:
+    hierarchy.setup_api(base_url=settings.BASE_URL, flask=app)
+
+# compile the database structure and the JSON schema validators up
+# front rather than on the first request
+db.db_helpers.get_registry()
+
+for obj_type in settings.REAL_DB_STRUCTURE:
+    validate.get_validator(obj_type)
 
 app.config.from_object(settings)
 flask_saml_sso.init_app(app)
@@ -109,6 +120,63 @@ def sitemap():
     return jsonify({"site-map": sorted(links)})
 
 
+@app.route('/stats')
+def stats():
+    """Returns runtime statistics for this process.
+
+    .. :quickref: :http:get:`/stats`
+
+    """
+    return jsonify({
+        "db_pool": db.get_pool_stats(),
+        "coalesced_reads": db.get_coalescing_stats(),
+        "log_publisher": log_client.get_publisher_stats(),
+        "saml_assertion_cache": authentication.assertion_cache.stats(),
+        "restriction_cache": restrictions.restriction_cache.stats(),
+        "current_cache": current_cache.cache.stats(),
+        "history_cache": history_cache.cache.stats(),
+    })
+
+
+@app.route('/changes')
+@requires_auth
+def get_changes():
+    """Streams changes to objects as Server-Sent Events.
+
+    .. :quickref: :http:get:`/changes`
+
+    """
+    objekttyper, uuids, livscykluskoder = changes.parse_filters(
+        request.args, HIERARCHIES,
+    )
+    # resolved once, while the request still has its user
+    objekttyper, restrictions = changes.get_read_restrictions(
+        objekttyper, HIERARCHIES,
+    )
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    if last_event_id:
+        position = changes.parse_event_id(last_event_id)
+    else:
+        position = db.get_change_position()
+
+    return Response(
+        changes.generate_events(position, objekttyper, uuids,
+                                livscykluskoder, restrictions),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # don't let nginx buffer the events
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    db.release_connection(exc)
+
+
 @app.errorhandler(OIOFlaskException)
 def handle_not_allowed(error):
     dct = error.to_dict()
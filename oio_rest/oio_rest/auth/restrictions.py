@@ -5,11 +5,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import collections
+import threading
+import time
 from enum import Enum
 from importlib import import_module
 
 from ..settings import AUTH_RESTRICTION_MODULE, AUTH_RESTRICTION_FUNCTION
 from ..settings import DO_ENABLE_RESTRICTIONS
+from ..settings import RESTRICTION_CACHE_SIZE, RESTRICTION_CACHE_TTL
 
 
 class Operation(Enum):
@@ -20,6 +24,105 @@ class Operation(Enum):
     PASSIVATE = "Passiver"
 
 
+class RestrictionCache(object):
+    """Remember the restrictions of users for ``ttl`` seconds.
+
+    Restrictions are keyed by user, object type and operation. At most
+    ``maxsize`` of them are kept, discarding the least recently used ones
+    first. The cache keeps counters of its usage, available through
+    :meth:`stats`.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key):
+        """Return whether restrictions are stored for the key, and the
+        restrictions."""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self._misses += 1
+                return False, None
+
+            restrictions, expires = entry
+
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self._expired += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+            return True, restrictions
+
+    def put(self, key, restrictions):
+        """Store the restrictions for the key."""
+        if not self.maxsize or self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = restrictions, time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, user=None, object_type=None):
+        """Forget the restrictions of the user for the object type, or
+        for any of them if ``None``."""
+        with self._lock:
+            for key in list(self._entries):
+                key_user, key_object_type, _ = key
+
+                if (
+                    (user is None or key_user == user) and
+                    (object_type is None or key_object_type == object_type)
+                ):
+                    del self._entries[key]
+                    self._invalidations += 1
+
+    def stats(self):
+        """Return a dictionary of counters describing cache usage."""
+        with self._lock:
+            return {
+                'max': self.maxsize,
+                'ttl': self.ttl,
+                'size': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'expired': self._expired,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
+
+
+restriction_cache = RestrictionCache(RESTRICTION_CACHE_SIZE,
+                                     RESTRICTION_CACHE_TTL)
+
+
+def invalidate_restrictions(user=None, object_type=None):
+    """Forget the cached restrictions of the user for the object type,
+    or for any of them if ``None``.
+
+    For the restriction module to call when restrictions change.
+    """
+    restriction_cache.invalidate(user, object_type)
+
+
 def get_restrictions(user, object_type, operation):
     """Return restriction scope for this type of object.
 
@@ -93,14 +196,24 @@ def get_restrictions(user, object_type, operation):
     if not DO_ENABLE_RESTRICTIONS:
         return None
 
+    key = user, object_type, operation
+    found, restrictions = restriction_cache.get(key)
+
+    if found:
+        return restrictions
+
     try:
         auth_module = import_module(AUTH_RESTRICTION_MODULE)
         auth_function = getattr(auth_module, AUTH_RESTRICTION_FUNCTION)
-        return auth_function(user, object_type, operation)
+        restrictions = auth_function(user, object_type, operation)
     except (AttributeError, ImportError):
         print("Config error: Unable to load authorization module!")
         raise
 
+    restriction_cache.put(key, restrictions)
+
+    return restrictions
+
 
 def get_auth_restrictions(user, object_type, operation):
     """Sample or dummy implementation - implement and specify in settings."""
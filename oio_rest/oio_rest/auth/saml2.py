@@ -86,6 +86,30 @@ class Saml2_Assertion(OneLogin_Saml2_Response):
         """Call the private __query_assertion method on the base class."""
         return self._OneLogin_Saml2_Response__query_assertion(xpath_expr)
 
+    def get_validity_period(self):
+        """Return the NotBefore and NotOnOrAfter timestamps of the
+        assertion.
+
+        :returns: A pair of POSIX timestamps, bounding the Condition
+                  elements of the assertion. Either may be ``None``.
+        """
+        not_before = None
+        not_on_or_after = None
+
+        for node in self.__query_assertion('/saml:Conditions'):
+            if node.get('NotBefore'):
+                t = OneLogin_Saml2_Utils.parse_SAML_to_time(
+                    node.get('NotBefore'))
+                not_before = t if not_before is None else max(not_before, t)
+
+            if node.get('NotOnOrAfter'):
+                t = OneLogin_Saml2_Utils.parse_SAML_to_time(
+                    node.get('NotOnOrAfter'))
+                not_on_or_after = (t if not_on_or_after is None
+                                   else min(not_on_or_after, t))
+
+        return not_before, not_on_or_after
+
     def check_validity(self):
         """Check if the assertion is valid. If not, raises Exception
 
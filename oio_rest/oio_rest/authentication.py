@@ -6,7 +6,10 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+import collections
+import hashlib
 import os
+import threading
 import zlib
 import uuid
 from base64 import b64decode
@@ -14,6 +17,8 @@ from functools import wraps
 
 from flask import request
 import flask_saml_sso
+from onelogin.saml2.constants import OneLogin_Saml2_Constants
+from onelogin.saml2.utils import OneLogin_Saml2_Utils
 
 from .custom_exceptions import UnauthorizedException
 from .custom_exceptions import AuthorizationFailedException
@@ -33,6 +38,95 @@ def get_idp_cert():
     return __IDP_CERT
 
 
+class AssertionCache(object):
+    """Remember the user and attributes of validated SAML assertions.
+
+    At most ``maxsize`` assertions are kept, discarding the least
+    recently used ones first. Entries are only returned while the
+    assertion is within its validity period, and removed once it has
+    expired. The cache keeps counters of its usage, available through
+    :meth:`stats`.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """Return the user ID and attributes stored for the key, or
+        ``None`` if there are none or the assertion is no longer valid."""
+        now = OneLogin_Saml2_Utils.now()
+        drift = OneLogin_Saml2_Constants.ALLOWED_CLOCK_DRIFT
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            user_id, attributes, not_before, not_on_or_after = entry
+
+            # same checks as OneLogin_Saml2_Response.validate_timestamps()
+            if (
+                not_before is not None and not_before > now + drift or
+                not_on_or_after + drift <= now
+            ):
+                del self._entries[key]
+                self._expired += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+            return user_id, attributes
+
+    def put(self, key, user_id, attributes, not_before, not_on_or_after):
+        """Store the user ID and attributes of a validated assertion.
+
+        Assertions without an expiry time aren't stored.
+        """
+        if not self.maxsize or not_on_or_after is None:
+            return
+
+        with self._lock:
+            self._entries[key] = (
+                user_id, attributes, not_before, not_on_or_after,
+            )
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """Forget all assertions."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return a dictionary of counters describing cache usage."""
+        with self._lock:
+            return {
+                'max': self.maxsize,
+                'size': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'expired': self._expired,
+                'evictions': self._evictions,
+            }
+
+
+assertion_cache = AssertionCache(settings.SAML_ASSERTION_CACHE_SIZE)
+
+
 def check_saml_authentication():
     """Checks the Authorization header for a SAML token and validates it.
 
@@ -55,6 +149,21 @@ def check_saml_authentication():
             "Unknown authorization type %s." % auth_type
         )
 
+    # The outcome of validating a token also depends on our settings
+    cache_key = (
+        hashlib.sha256(encoded_token.encode()).digest(),
+        settings.SAML_MOX_ENTITY_ID,
+        settings.SAML_IDP_ENTITY_ID,
+        settings.SAML_IDP_URL,
+        settings.SAML_USER_ID_ATTIBUTE,
+        get_idp_cert(),
+    )
+
+    cached = assertion_cache.get(cache_key)
+    if cached is not None:
+        request.saml_user_id, request.saml_attributes = cached
+        return
+
     binary_token = b64decode(encoded_token)
 
     # There are subtle differences between zlib and gzip, which is why we
@@ -101,6 +210,10 @@ def check_saml_authentication():
         )
         raise AuthorizationFailedException(errmsg)
 
+    assertion_cache.put(cache_key, request.saml_user_id,
+                        request.saml_attributes,
+                        *assertion.get_validity_period())
+
 
 def requires_auth(f):
     @wraps(f)
@@ -0,0 +1,316 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+"""Feed of changes to objects, as Server-Sent Events."""
+
+import json
+import logging
+import os
+import re
+import select
+import threading
+import time
+
+import psycopg2
+
+from . import db
+from . import settings
+from .auth.restrictions import Operation
+from .authentication import get_authenticated_user
+from .custom_exceptions import BadRequestException, NotAllowedException
+from .utils.build_registration import is_uuid
+
+logger = logging.getLogger(__name__)
+
+# The listener of this process, created on first use.
+listener = None
+
+EVENT_ID_RE = re.compile(r'^(\d+)-(\d+)$')
+
+
+class ChangeListener(object):
+    """Wake up waiting threads whenever a change notification arrives.
+
+    A single background thread per process listens on the
+    ``mox_notifications`` channel, on a connection of its own, so that
+    waiting for changes doesn't hold a connection from the pool. Callers
+    keep track of the last generation they have seen, and
+    :meth:`wait` returns once a notification has arrived since then.
+    """
+
+    def __init__(self, poll_interval=5.0):
+        self.poll_interval = poll_interval
+
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._thread = None
+        self._pid = None
+
+    @property
+    def generation(self):
+        with self._cond:
+            self._start()
+
+            return self._generation
+
+    def wait(self, generation, timeout):
+        """Wait at most ``timeout`` seconds for a notification after the
+        given generation, and return the current generation."""
+        with self._cond:
+            self._start()
+
+            self._cond.wait_for(lambda: self._generation != generation,
+                                timeout)
+
+            return self._generation
+
+    def _start(self):
+        # the thread doesn't survive a fork, so each process gets its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._thread = threading.Thread(
+            target=self._run, name='change-listener', daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception('change listener failed')
+                time.sleep(self.poll_interval)
+
+    def _listen(self):
+        conn = psycopg2.connect(
+            dbname=settings.DATABASE,
+            user=settings.DB_USER,
+            password=settings.DB_PASSWORD,
+            host=settings.DB_HOST,
+            port=settings.DB_PORT,
+        )
+
+        try:
+            conn.autocommit = True
+
+            with conn.cursor() as cursor:
+                cursor.execute('LISTEN mox_notifications')
+
+            while True:
+                select.select([conn], [], [], self.poll_interval)
+                conn.poll()
+
+                if conn.notifies:
+                    del conn.notifies[:]
+
+                    with self._cond:
+                        self._generation += 1
+                        self._cond.notify_all()
+        finally:
+            conn.close()
+
+
+def get_listener():
+    """Return the change listener, creating it on first use."""
+    global listener
+
+    if listener is None:
+        listener = ChangeListener()
+
+    return listener
+
+
+def format_event_id(position):
+    return '{}-{}'.format(*position)
+
+
+def parse_event_id(event_id):
+    """Return the outbox position of an event ID as given in the
+    ``Last-Event-ID`` header."""
+    m = EVENT_ID_RE.match(event_id)
+
+    if not m:
+        raise BadRequestException(
+            "Invalid Last-Event-ID {!r}".format(event_id),
+        )
+
+    return int(m.group(1)), int(m.group(2))
+
+
+def format_event(change):
+    """Return a change from the outbox as an event."""
+    txid, id, objekttype, objekt_id, livscykluskode, tidspunkt = change
+
+    data = {
+        'objektID': objekt_id,
+        'objekttype': objekttype,
+        'livscykluskode': livscykluskode,
+        'tidspunkt': tidspunkt.isoformat(),
+    }
+
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        format_event_id((txid, id)),
+        livscykluskode,
+        json.dumps(data, sort_keys=True),
+    )
+
+
+def generate_events(position, objekttyper=None, uuids=None,
+                    livscykluskoder=None, restrictions=None):
+    """Yield the changes after ``position`` as they are committed.
+
+    ``restrictions`` are the READ restrictions of the user, as returned
+    by :func:`get_read_restrictions`.
+
+    The outbox is read whenever a notification arrives, and at least
+    every ``settings.CHANGES_HEARTBEAT_INTERVAL`` seconds, in which case
+    a comment is sent to keep the connection alive if there were no
+    changes. The stream ends after ``settings.CHANGES_STREAM_DURATION``
+    seconds, leaving the client to reconnect from the last event.
+    """
+    deadline = time.monotonic() + settings.CHANGES_STREAM_DURATION
+    generation = get_listener().generation
+
+    # Have clients reconnect right away once we end the stream, from
+    # where we started should there be no events -- an event without
+    # data isn't dispatched, but still sets the ID to resume from.
+    yield 'retry: 0\nid: {}\n\n'.format(format_event_id(position))
+
+    while True:
+        changes = db.get_changes(position, objekttyper, uuids,
+                                 livscykluskoder, settings.LIST_BATCH_SIZE,
+                                 restrictions)
+
+        for change in changes:
+            yield format_event(change)
+
+        if changes:
+            position = change[:2]
+
+        remaining = deadline - time.monotonic()
+
+        if remaining <= 0:
+            return
+
+        if len(changes) == settings.LIST_BATCH_SIZE:
+            continue
+
+        previous, generation = generation, get_listener().wait(
+            generation,
+            min(remaining, settings.CHANGES_HEARTBEAT_INTERVAL),
+        )
+
+        if generation == previous:
+            yield ': keep-alive\n\n'
+
+
+def parse_filters(args, hierarchies):
+    """Return the object types, UUIDs and life cycle codes to filter
+    changes by, as given in the query parameters.
+
+    A filter which isn't given is ``None``. The ``service`` and
+    ``objekttype`` parameters both limit the object types.
+    """
+    services = {
+        h._name.lower(): {c.__name__.lower() for c in h._classes}
+        for h in hierarchies
+    }
+    all_types = set.union(*services.values())
+
+    objekttyper = None
+
+    if 'service' in args:
+        objekttyper = set()
+
+        for name in args.getlist('service'):
+            if name.lower() not in services:
+                raise BadRequestException(
+                    "Unknown service {!r}".format(name),
+                )
+
+            objekttyper |= services[name.lower()]
+
+    if 'objekttype' in args:
+        types = {name.lower() for name in args.getlist('objekttype')}
+
+        unknown = types - all_types
+
+        if unknown:
+            raise BadRequestException(
+                "Unknown objekttype {!r}".format(min(unknown)),
+            )
+
+        objekttyper = types if objekttyper is None else objekttyper & types
+
+    uuids = args.getlist('uuid') or None
+
+    for uuid in uuids or ():
+        if not is_uuid(uuid):
+            raise BadRequestException("Invalid UUID {!r}".format(uuid))
+
+    livscykluskoder = args.getlist('livscykluskode') or None
+    valid_codes = {code.value for code in db.Livscyklus}
+
+    for code in livscykluskoder or ():
+        if code not in valid_codes:
+            raise BadRequestException(
+                "Invalid livscykluskode {!r}".format(code),
+            )
+
+    return (
+        sorted(objekttyper) if objekttyper is not None else None,
+        uuids,
+        livscykluskoder,
+    )
+
+
+def get_read_restrictions(objekttyper, hierarchies):
+    """Return the object types the authenticated user may read, among
+    ``objekttyper``, and their READ restrictions.
+
+    The restrictions are a dictionary of the restrictions of each object
+    type, as SQL, leaving out the types the user may read without
+    restrictions. Types the user may never read are left out of the
+    object types instead; should there be none of those, and no filter,
+    the object types remain ``None``. Without restrictions enabled, the
+    object types are returned as given along with ``None``.
+    """
+    if not settings.DO_ENABLE_RESTRICTIONS:
+        return objekttyper, None
+
+    class_names = {
+        c.__name__.lower(): c.__name__
+        for h in hierarchies
+        for c in h._classes
+    }
+
+    user = get_authenticated_user()
+    allowed = []
+    restrictions = {}
+
+    for objekttype in (
+        objekttyper if objekttyper is not None else sorted(class_names)
+    ):
+        try:
+            sql_restrictions = db.get_restrictions_as_sql(
+                user, class_names[objekttype], Operation.READ,
+            )
+        except NotAllowedException:
+            continue
+
+        allowed.append(objekttype)
+
+        if sql_restrictions is not None:
+            restrictions[objekttype] = sql_restrictions
+
+    if objekttyper is None and len(allowed) == len(class_names):
+        allowed = None
+
+    return allowed, restrictions
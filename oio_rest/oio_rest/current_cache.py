@@ -0,0 +1,289 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Cache of the current state of objects.
+
+Objects are taken from the snapshot of their current registration kept
+by the database, and kept until they change or their next virkning
+period starts. Changes are read from the outbox by a background thread
+of each process, whenever a change notification arrives.
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from . import changes
+from . import db
+from .auth.restrictions import Operation
+from .authentication import get_authenticated_user
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CurrentCache(object):
+    """Remember the encoded current state of objects by object type and
+    UUID.
+
+    At most ``maxsize`` bytes of objects are kept, discarding the least
+    recently used ones first. Entries are only returned until they
+    expire, and while the changes to objects are being followed; they
+    are removed as soon as a change to their object is read from the
+    outbox. The cache keeps counters of its usage, available through
+    :meth:`stats`.
+
+    An entry read from the database is only stored if no changes were
+    read since the :attr:`epoch` taken before reading it, as it might
+    predate them.
+    """
+
+    def __init__(self, maxsize, poll_interval=10.0):
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._epoch = 0
+        self._following = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def epoch(self):
+        with self._lock:
+            return self._epoch
+
+    def get(self, key):
+        """Return the object stored for the key, or ``None`` if there is
+        none or it has expired."""
+        with self._lock:
+            entry = self._entries.get(key) if self._following else None
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            value, expires = entry
+
+            if expires is not None and expires <= time.time():
+                self._remove(key)
+                self._expired += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+            return value
+
+    def put(self, key, value, expires, epoch):
+        """Store an object read from the database after ``epoch``, until
+        ``expires`` seconds since the epoch, or for good if ``None``."""
+        if not self.maxsize or len(value) > self.maxsize:
+            return
+
+        with self._lock:
+            if not self._following or epoch != self._epoch:
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = value, expires
+            self._size += len(value)
+
+            while self._size > self.maxsize:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._evictions += 1
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._size -= len(value)
+
+    def invalidate(self, keys):
+        """Forget the objects with the given keys."""
+        with self._lock:
+            self._epoch += 1
+
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self._invalidations += 1
+
+    def clear(self, following=False):
+        """Forget all objects, and whether changes are being followed."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._epoch += 1
+            self._following = following
+
+    def start(self):
+        """Start following changes, unless already doing so."""
+        with self._lock:
+            # the thread doesn't survive a fork, so each process gets its own
+            if self._thread is not None and self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='current-cache', daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._follow()
+            except Exception:
+                logger.exception('current cache failed to follow changes')
+                self.clear()
+                time.sleep(self.poll_interval)
+
+    def _follow(self):
+        listener = changes.get_listener()
+        generation = listener.generation
+
+        # changes after this position may have been missed while not
+        # following them, so start afresh
+        position = db.get_change_position()
+        pending = frozenset()
+
+        self.clear(following=True)
+
+        while True:
+            generation = listener.wait(generation, self.poll_interval)
+            position, pending = self.sync(position, pending)
+
+    def sync(self, position, pending):
+        """Forget the objects changed after ``position``, other than by
+        the ``pending`` changes already seen, and return the position and
+        the pending changes to continue from."""
+        rows = db.get_changed_objects(position)
+
+        keys = {
+            (objekttype, objekt_id)
+            for txid, id, objekttype, objekt_id, settled in rows
+            if (txid, id) not in pending
+        }
+
+        if keys:
+            self.invalidate(keys)
+
+        # changes of transactions that might be followed by older ones
+        # are read again until they no longer might
+        for txid, id, _, _, settled in rows:
+            if not settled:
+                break
+
+            position = txid, id
+
+        pending = frozenset(
+            (txid, id)
+            for txid, id, _, _, settled in rows
+            if not settled
+        )
+
+        return position, pending
+
+    def stats(self):
+        """Return a dictionary of counters describing cache usage."""
+        with self._lock:
+            return {
+                'max': self.maxsize,
+                'size': self._size,
+                'entries': len(self._entries),
+                'following': self._following,
+                'hits': self._hits,
+                'misses': self._misses,
+                'expired': self._expired,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
+
+
+cache = CurrentCache(settings.CURRENT_CACHE_SIZE,
+                     settings.CHANGES_HEARTBEAT_INTERVAL)
+
+
+def _get_cached(class_name, uuid):
+    """Return the current state of the objects, ordered by UUID, or
+    ``None`` if any of them may not be taken from the cache."""
+    if not cache.maxsize:
+        return None
+
+    if db.get_restrictions_as_sql(get_authenticated_user(), class_name,
+                                  Operation.READ) is not None:
+        return None
+
+    cache.start()
+
+    objekttype = class_name.lower()
+    uuids = sorted({u.lower() for u in uuid})
+
+    epoch = cache.epoch
+    objects = {}
+
+    for u in uuids:
+        value = cache.get((objekttype, u))
+
+        if value is not None:
+            objects[u] = json.loads(value.decode())
+
+    missing = [u for u in uuids if u not in objects]
+
+    if missing:
+        rows = db.get_current_objects(class_name, missing)
+
+        if len(rows) != len(missing):
+            return None
+
+        for objekt_id, objekt, expires in rows:
+            objects[objekt_id] = objekt
+
+            value = json.dumps(objekt, separators=(',', ':')).encode()
+            cache.put((objekttype, objekt_id), value, expires, epoch)
+
+    return [objects[u] for u in uuids]
+
+
+def list_objects(class_name, uuid, virkning_fra, virkning_til,
+                 registreret_fra, registreret_til):
+    """Like :func:`oio_rest.db.list_objects`, but reading the objects from
+    the cache where possible."""
+    objects = _get_cached(class_name, uuid)
+
+    if objects is None:
+        return db.list_objects(class_name, uuid, virkning_fra, virkning_til,
+                               registreret_fra, registreret_til)
+
+    return [objects]
+
+
+def iter_objects(class_name, uuid, virkning_fra, virkning_til,
+                 registreret_fra, registreret_til):
+    """Like :func:`oio_rest.db.iter_objects`, but reading the objects from
+    the cache where possible."""
+    objects = _get_cached(class_name, uuid)
+
+    if objects is None:
+        return db.iter_objects(class_name, uuid, virkning_fra, virkning_til,
+                               registreret_fra, registreret_til)
+
+    return iter(objects)
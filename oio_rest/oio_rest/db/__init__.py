@@ -6,25 +6,32 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+import contextlib
 import datetime
 import enum
+import functools
+import inspect
+import itertools
+import json
 import pathlib
+import threading
+import time
 
+import flask
 import psycopg2
 
 from psycopg2.extras import DateTimeTZRange
-from psycopg2.extensions import (
-    AsIs, QuotedString, Boolean, adapt as psyco_adapt,
-)
-from psycopg2.pool import PersistentConnectionPool
+from psycopg2.extensions import AsIs, QuotedString, Boolean
 from jinja2 import Environment, FileSystemLoader
 from dateutil import parser as date_parser
 
+from .db_pool import ConnectionPool
+from .single_flight import SingleFlight
 from .db_helpers import (
-    get_attribute_fields, get_attribute_names, get_field_type,
+    get_attribute_fields, get_attribute_names, get_field_type, get_registry,
     get_state_names, get_relation_field_type, Soegeord, OffentlighedUndtaget,
     JournalNotat, JournalDokument, DokumentVariantType, AktoerAttr,
-    VaerdiRelationAttr, to_bool,
+    VaerdiRelationAttr, to_bool, Array, Cast, Row,
 )
 
 from ..authentication import get_authenticated_user
@@ -33,6 +40,7 @@ from ..auth.restrictions import Operation, get_restrictions
 from ..utils import build_registration
 from ..custom_exceptions import NotFoundException, NotAllowedException
 from ..custom_exceptions import DBException, BadRequestException
+from ..custom_exceptions import OIOFlaskException
 
 from .. import settings
 
@@ -42,51 +50,175 @@ from .. import settings
 
 pool = None
 
+# Leases held outside of a Flask application context, e.g. by agents
+# calling into this module directly.
+_thread_lease = threading.local()
+
+# Names for server-side cursors, which must be unique per connection.
+_cursor_ids = itertools.count()
+
+# Identical reads running concurrently in this process.
+_reads = SingleFlight()
+
+# Arguments of a request giving the virkning period it reads, which
+# otherwise defaults to the time of the request.
+_VIRKNING_ARGS = {'virkningfra', 'virkningtil', 'virkningstid'}
+
 jinja_env = Environment(loader=FileSystemLoader(
     str(pathlib.Path(__file__).parent / 'sql' / 'invocations' / 'templates'),
 ))
+jinja_env.globals['get_registry'] = get_registry
 
 
-def adapt(value):
-    connection = get_connection()
+@functools.lru_cache()
+def get_statement(template_name, **context):
+    """Render the SQL statement in the given template.
 
-    adapter = psyco_adapt(value)
-    if hasattr(adapter, 'prepare'):
-        adapter.prepare(connection)
-    return str(adapter.getquoted(), connection.encoding)
+    The statements only depend on the class and the shape of its
+    registrations; all values are passed as parameters. This keeps the
+    text of each statement constant, so we render it only once.
+    """
+    return jinja_env.get_template(template_name).render(**context)
 
 
-jinja_env.filters['adapt'] = adapt
+def get_pool():
+    """Return the connection pool, creating it on first use."""
+    global pool
+
+    if pool is None:
+        pool = ConnectionPool(
+            settings.DB_MIN_CONNECTIONS,
+            settings.DB_MAX_CONNECTIONS,
+            settings.DB_POOL_TIMEOUT,
+            dbname=settings.DATABASE,
+            user=settings.DB_USER,
+            password=settings.DB_PASSWORD,
+            host=settings.DB_HOST,
+            port=settings.DB_PORT,
+        )
+
+    return pool
 
 
 def get_connection():
     """Handle all intricacies of connecting to Postgres.
 
     We stash the current connection using Flask's `application
-    globals`_, ``g``, to avoid continually re-establishing the
-    connection.
+    globals`_, ``g``, so that each request (or CLI command) leases
+    exactly one connection from the pool. The lease is given back by
+    :func:`release_connection` once the application context is torn
+    down.
 
-    This is a common pattern, and when combined with a pool, we even
-    avoid re-connecting every request.
+    Outside an application context, the connection is leased to the
+    current thread until :func:`release_connection` is called from it.
 
     .. _application globals: http://flask.pocoo.org/docs/api/#flask.g
 
     """
 
-    global pool
+    holder = flask.g if flask.has_app_context() else _thread_lease
 
-    if pool is None:
-        pool = PersistentConnectionPool(
-            settings.DB_MIN_CONNECTIONS,
-            settings.DB_MAX_CONNECTIONS,
-            dbname=settings.DATABASE,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
+    conn = getattr(holder, 'db_connection', None)
+
+    if conn is None:
+        conn = holder.db_connection = get_pool().getconn()
+
+    return conn
+
+
+def release_connection(exc=None):
+    """Give the connection leased by :func:`get_connection` back."""
+    holder = flask.g if flask.has_app_context() else _thread_lease
+
+    conn = getattr(holder, 'db_connection', None)
+
+    if conn is not None:
+        holder.db_connection = None
+        get_pool().putconn(conn)
+
+
+def get_pool_stats():
+    """Return usage counters for the connection pool."""
+    return pool.stats() if pool is not None else None
+
+
+def get_coalescing_stats():
+    """Return usage counters for the coalescing of identical reads."""
+    return _reads.stats()
+
+
+def _reads_now():
+    """Tell whether the current request reads objects as they take effect
+    at the time of the request, rather than for a given virkning period."""
+    if not flask.has_request_context():
+        return False
+
+    args = {k.lower() for k in flask.request.args}
+
+    body = flask.request.get_json(silent=True)
+    if isinstance(body, dict):
+        args.update(k.lower() for k in body)
+
+    return not args & _VIRKNING_ARGS
+
+
+def coalesced(func):
+    """Decorate a function reading objects of a class, so that identical
+    concurrent calls by users with the same restrictions are coalesced,
+    if enabled by ``settings.COALESCE_READS``.
+
+    The virkning period defaulting to the time of each request is left
+    out of the comparison; a call only shares a run it precedes, so the
+    objects read still take effect when the request was made.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(class_name, *args, **kwargs):
+        if not settings.COALESCE_READS:
+            return func(class_name, *args, **kwargs)
+
+        user = get_authenticated_user()
+
+        if settings.DO_ENABLE_RESTRICTIONS:
+            restrictions = get_restrictions(user, class_name, Operation.READ)
+        else:
+            restrictions = None
+
+        arguments = dict(
+            signature.bind(class_name, *args, **kwargs).arguments,
         )
 
-    return pool.getconn()
+        if _reads_now():
+            arguments.pop('virkning_fra', None)
+            arguments.pop('virkning_til', None)
+
+        key = json.dumps(
+            [func.__name__, arguments, user, restrictions],
+            sort_keys=True, default=str,
+        )
+
+        return _reads.call(
+            key, functools.partial(func, class_name, *args, **kwargs),
+        )
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def _leased_cursor():
+    """Lease a connection for the duration of the block only.
+
+    For streaming responses, which would otherwise hold the lease of
+    :func:`get_connection` for as long as the client stays connected.
+    """
+    conn = get_pool().getconn()
+
+    try:
+        with conn, conn.cursor() as cursor:
+            yield cursor
+    finally:
+        get_pool().putconn(conn)
 
 
 #
@@ -216,31 +348,75 @@ class Livscyklus(enum.Enum):
 """
     GENERAL SQL GENERATION.
 
-    All of these functions generate bits of SQL to use in complete statements.
-    At some point, we might want to factor them to an "sql_helpers.py" module.
+    All of these functions generate values which psycopg2 adapts to SQL
+    when passed as statement parameters. At some point, we might want to
+    factor them to an "sql_helpers.py" module.
 """
 
+# Relation types with additional fields, and the names of these fields.
+RELATION_EXTRA_FIELDS = {
+    "Sag": ("indeks", "journalpostkode", "journalnotat", "journaldokument"),
+    "Aktivitet": ("indeks", "aktoerattr"),
+    "Indsats": ("indeks",),
+    "Tilstand": ("indeks", "tilstandsvaerdiattr"),
+}
+
+
+def sql_virkning(virkning, include_note=True):
+    """Return a Virkning composite for the given input dict."""
+    if not virkning:
+        return None
+
+    return Row('Virkning', (
+        DateTimeTZRange(virkning.get('from'), virkning.get('to')),
+        virkning.get('aktoerref') or None,
+        virkning.get('aktoertypekode') or None,
+        (virkning.get('notetekst') or '') if include_note else '',
+    ))
+
 
 def sql_state_array(state, periods, class_name):
-    """Return an SQL array of type <state>TilsType."""
-    t = jinja_env.get_template('state_array.sql')
-    sql = t.render(class_name=class_name, state_name=state,
-                   state_periods=periods)
-    return sql
+    """Return an array of type <state>TilsType."""
+    if periods is None:
+        return None
+
+    return Array('{}{}TilsType'.format(class_name, state), [
+        Row(None, (sql_virkning(period.get('virkning')), period.get(state)))
+        for period in periods
+    ])
 
 
 def sql_attribute_array(attribute, periods):
-    """Return an SQL array of type <attribute>AttrType[]."""
-    t = jinja_env.get_template('attribute_array.sql')
-    sql = t.render(attribute_name=attribute, attribute_periods=periods)
-    return sql
+    """Return an array of type <attribute>AttrType[]."""
+    if periods is None:
+        return None
+
+    # Note that the note text of attribute virkninger has never been
+    # stored.
+    return Array('{}AttrType'.format(attribute), [
+        Row(None, values[:-1] + [sql_virkning(values[-1], False)])
+        for values in periods
+    ])
 
 
 def sql_relations_array(class_name, relations):
-    """Return an SQL array of type <class_name>RelationType[]."""
-    t = jinja_env.get_template('relations_array.sql')
-    sql = t.render(class_name=class_name, relations=relations)
-    return sql
+    """Return an array of type <class_name>RelationType[]."""
+    if not relations:
+        return None
+
+    extra_fields = RELATION_EXTRA_FIELDS.get(class_name, ())
+
+    return Array('{}RelationType'.format(class_name), [
+        Row(None, (
+            Cast(rel_name, '{}RelationKode'.format(class_name)),
+            sql_virkning(rel.get('virkning')),
+            rel.get('uuid') or None,
+            rel.get('urn') or None,
+            rel.get('objekttype'),
+        ) + tuple(rel.get(field) for field in extra_fields))
+        for rel_name, periods in relations.items()
+        for rel in periods
+    ])
 
 
 def sql_convert_registration(registration, class_name):
@@ -249,9 +425,7 @@ def sql_convert_registration(registration, class_name):
     registration["relations"] = convert_relations(registration["relations"],
                                                   class_name)
     if "variants" in registration:
-        registration["variants"] = adapt(
-            convert_variants(registration["variants"])
-        )
+        registration["variants"] = convert_variants(registration["variants"])
     states = registration["states"]
     sql_states = []
     for sn in get_state_names(class_name):
@@ -279,7 +453,6 @@ def sql_convert_registration(registration, class_name):
 
     relations = registration["relations"]
     sql_relations = sql_relations_array(class_name, relations)
-    # print "CLASS", class_name
 
     registration["relations"] = sql_relations
 
@@ -289,26 +462,29 @@ def sql_convert_registration(registration, class_name):
 def sql_get_registration(class_name, time_period, life_cycle_code,
                          user_ref, note, registration):
     """
-    Return a an SQL registrering object of type
-    <class_name>RegistreringType[].
+    Return a registrering object of type <class_name>RegistreringType.
     Expects a Registration object returned from sql_convert_registration.
     """
-    sql_template = jinja_env.get_template('registration.sql')
-    sql = sql_template.render(
-        class_name=class_name,
-        time_period=time_period,
-        life_cycle_code=life_cycle_code,
-        user_ref=user_ref,
-        note=note,
-        states=registration["states"],
-        attributes=registration["attributes"],
-        relations=registration["relations"],
-        variants=registration.get("variants", None))
-    return sql
+    values = [
+        Row('RegistreringBase', (
+            time_period,
+            Cast(life_cycle_code, 'Livscykluskode'),
+            user_ref,
+            note,
+        )),
+    ]
+    values += registration["states"]
+    values += registration["attributes"]
+    values.append(registration["relations"])
+
+    if "variants" in registration:
+        values.append(registration["variants"])
+
+    return Row('{}RegistreringType'.format(class_name), values)
 
 
 def sql_convert_restrictions(class_name, restrictions):
-    """Convert a list of restrictions to SQL."""
+    """Convert a list of restrictions to registrering objects."""
     registrations = [
         build_registration.restriction_to_registration(class_name, r)
         for r in restrictions
@@ -320,8 +496,22 @@ def sql_convert_restrictions(class_name, restrictions):
     return sql_restrictions
 
 
+@functools.lru_cache(maxsize=settings.RESTRICTION_CACHE_SIZE)
+def _get_restrictions_array(class_name, restrictions):
+    """Return the restrictions, given as JSON, as an array of registrering
+    objects.
+
+    Converting the restrictions is costly, and users tend to share them,
+    so we convert each set of restrictions only once.
+    """
+    sql_restrictions = sql_convert_restrictions(class_name,
+                                                json.loads(restrictions))
+    return Array('{}RegistreringType'.format(class_name), sql_restrictions)
+
+
 def get_restrictions_as_sql(user, class_name, operation):
-    """Get restrictions for user and operation, return as array of SQL."""
+    """Get restrictions for user and operation, return as array of
+    registrering objects."""
     if not settings.DO_ENABLE_RESTRICTIONS:
         return None
     restrictions = get_restrictions(user, class_name, operation)
@@ -330,10 +520,43 @@ def get_restrictions_as_sql(user, class_name, operation):
     elif restrictions is None:
         return None
 
-    sql_restrictions = sql_convert_restrictions(class_name, restrictions)
-    sql_template = jinja_env.get_template('restrictions.sql')
-    sql = sql_template.render(restrictions=sql_restrictions)
-    return sql
+    return _get_restrictions_array(
+        class_name, json.dumps(restrictions, sort_keys=True, default=str),
+    )
+
+
+def get_update_statement(class_name, uuid, life_cycle_code, user_ref, note,
+                         registration, restrictions):
+    """Return the statement and parameters for updating an object.
+
+    Expects a Registration object returned from sql_convert_registration.
+    """
+    sql = get_statement(
+        'update_object.sql',
+        class_name=class_name,
+        attribute_count=len(registration["attributes"]),
+        state_count=len(registration["states"]),
+        variants="variants" in registration,
+        restrictions=restrictions is not None,
+    )
+
+    params = {
+        'uuid': uuid,
+        'user_ref': user_ref,
+        'note': note,
+        'life_cycle_code': life_cycle_code,
+        'relations': registration["relations"],
+        'variants': registration.get("variants"),
+        'restrictions': restrictions,
+    }
+
+    for i, attribute_array in enumerate(registration["attributes"]):
+        params['attribute_{}'.format(i)] = attribute_array
+
+    for i, state_array in enumerate(registration["states"]):
+        params['state_{}'.format(i)] = state_array
+
+    return sql, params
 
 
 """
@@ -343,22 +566,46 @@ def get_restrictions_as_sql(user, class_name, operation):
 
 def object_exists(class_name, uuid):
     """Check if an object with this class name and UUID exists already."""
-    sql = ("select (%s IN (SELECT DISTINCT " + class_name +  # noqa
-           "_id from " + class_name + "_registrering))")
-
     with get_connection() as conn, conn.cursor() as cursor:
-        try:
-            cursor.execute(sql, (uuid,))
-        except psycopg2.Error as e:
-            if e.pgcode[:2] == 'MO':
-                status_code = int(e.pgcode[2:])
-                raise DBException(status_code, e.pgerror)
-            else:
-                raise
+        return _object_exists(cursor, class_name, uuid)
 
-        result = cursor.fetchone()[0]
 
-    return result
+def _object_exists(cursor, class_name, uuid):
+    sql = ("SELECT EXISTS (SELECT 1 FROM " + class_name +  # noqa
+           "_registrering WHERE " + class_name + "_id = %s)")
+
+    try:
+        cursor.execute(sql, (uuid,))
+    except psycopg2.Error as e:
+        if e.pgcode[:2] == 'MO':
+            status_code = int(e.pgcode[2:])
+            raise DBException(status_code, e.pgerror)
+        else:
+            raise
+
+    return cursor.fetchone()[0]
+
+
+def _get_life_cycle_code(cursor, class_name, uuid):
+    """Return the life cycle code of the current registration of an
+    object, or ``None`` if it doesn't exist.
+
+    This only reads the registration table rather than the whole object.
+    """
+    sql = get_statement('get_life_cycle_code.sql', class_name=class_name)
+
+    try:
+        cursor.execute(sql, {'uuid': uuid})
+    except psycopg2.Error as e:
+        if e.pgcode[:2] == 'MO':
+            status_code = int(e.pgcode[2:])
+            raise DBException(status_code, e.pgerror)
+        else:
+            raise
+
+    output = cursor.fetchone()
+
+    return output[0] if output else None
 
 
 def get_document_from_content_url(content_url):
@@ -397,93 +644,233 @@ def create_or_import_object(class_name, note, registration,
     It is necessary to map the parameters to our custom PostgreSQL data types.
     """
 
-    if uuid is None:
-        life_cycle_code = Livscyklus.OPSTAAET.value
-    elif object_exists(class_name, uuid):
-        life_cycle_code = Livscyklus.RETTET.value
-    else:
-        life_cycle_code = Livscyklus.IMPORTERET.value
-
     user_ref = get_authenticated_user()
 
-    registration = sql_convert_registration(registration, class_name)
-    sql_registration = sql_get_registration(class_name, None, life_cycle_code,
-                                            user_ref, note, registration)
-
     sql_restrictions = get_restrictions_as_sql(
-        get_authenticated_user(),
+        user_ref,
         class_name,
         Operation.CREATE
     )
 
-    sql_template = jinja_env.get_template('create_object.sql')
-    sql = sql_template.render(
+    sql = get_statement(
+        'create_object.sql',
         class_name=class_name,
-        uuid=uuid,
-        life_cycle_code=life_cycle_code,
-        user_ref=user_ref,
-        note=note,
-        registration=sql_registration,
-        restrictions=sql_restrictions)
+        restrictions=sql_restrictions is not None,
+    )
 
     # Call Postgres! Return OK or not accordingly
     with get_connection() as conn, conn.cursor() as cursor:
-        try:
-            cursor.execute(sql)
-        except psycopg2.Error as e:
-            if e.pgcode[:2] == 'MO':
-                status_code = int(e.pgcode[2:])
-                raise DBException(status_code, e.pgerror)
-            else:
-                raise
+        return _create_or_import_object(cursor, sql, class_name, note,
+                                        registration, uuid, user_ref,
+                                        sql_restrictions)
 
-        output = cursor.fetchone()
+
+def create_or_import_objects(class_name, objects, atomic=True,
+                             batch_size=None):
+    """Create or import many objects using a single connection.
+
+    ``objects`` is an iterable of ``(note, registration, uuid)`` triples,
+    where ``uuid`` may be ``None``. Objects with a UUID are imported as
+    with :func:`import_object`. They are written in batches of
+    ``batch_size`` objects, or all at once if it is ``None``.
+
+    In atomic mode, everything is written in one transaction, and the
+    first failing object stops and rolls back the lot. Otherwise, each
+    batch is committed separately and a failing object is skipped,
+    leaving the rest of its batch intact.
+
+    Return a list with the UUID of each object written or the
+    exception it failed with, the size of each batch along with the
+    seconds spent writing it, and whether the objects were committed.
+    """
+
+    user_ref = get_authenticated_user()
+
+    sql_restrictions = get_restrictions_as_sql(
+        user_ref,
+        class_name,
+        Operation.CREATE
+    )
+
+    sql = get_statement(
+        'create_object.sql',
+        class_name=class_name,
+        restrictions=sql_restrictions is not None,
+    )
+
+    results = []
+    batches = []
+
+    objects = iter(objects)
+    conn = get_connection()
+
+    try:
+        with conn.cursor() as cursor:
+            while True:
+                batch = list(itertools.islice(objects, batch_size))
+                if not batch:
+                    break
+
+                start = time.monotonic()
+
+                for note, registration, uuid in batch:
+                    if not atomic:
+                        cursor.execute('SAVEPOINT bulk_object')
+
+                    try:
+                        if uuid is None:
+                            results.append(_create_or_import_object(
+                                cursor, sql, class_name, note, registration,
+                                uuid, user_ref, sql_restrictions,
+                            ))
+                        else:
+                            _import_object(cursor, class_name, note,
+                                           registration, uuid, user_ref)
+                            results.append(uuid)
+                    except (OIOFlaskException, psycopg2.DataError,
+                            psycopg2.IntegrityError) as e:
+                        results.append(e)
+
+                        if atomic:
+                            conn.rollback()
+                            return results, batches, False
+
+                        cursor.execute('ROLLBACK TO SAVEPOINT bulk_object')
+
+                if not atomic:
+                    conn.commit()
+
+                batches.append((len(batch), time.monotonic() - start))
+
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return results, batches, True
+
+
+def _create_or_import_object(cursor, sql, class_name, note, registration,
+                             uuid, user_ref, sql_restrictions,
+                             life_cycle_code=None):
+    if life_cycle_code is not None:
+        # The caller already looked it up
+        pass
+    elif uuid is None:
+        life_cycle_code = Livscyklus.OPSTAAET.value
+    elif _object_exists(cursor, class_name, uuid):
+        life_cycle_code = Livscyklus.RETTET.value
+    else:
+        life_cycle_code = Livscyklus.IMPORTERET.value
+
+    registration = sql_convert_registration(registration, class_name)
+    sql_registration = sql_get_registration(class_name, None, life_cycle_code,
+                                            user_ref, note, registration)
+
+    try:
+        cursor.execute(sql, {
+            'registration': sql_registration,
+            'uuid': uuid,
+            'restrictions': sql_restrictions,
+        })
+    except psycopg2.Error as e:
+        if e.pgcode[:2] == 'MO':
+            status_code = int(e.pgcode[2:])
+            raise DBException(status_code, e.pgerror)
+        else:
+            raise
+
+    output = cursor.fetchone()
 
     return output[0]
 
 
+def import_object(class_name, note, registration, uuid):
+    """Import an object at the given UUID, as done by a PUT.
+
+    A new object is created, and a deleted or passive one is revived
+    with the life cycle code "Importeret". Any other object is
+    overwritten with the life cycle code "Rettet". Looking up the
+    current life cycle code and writing happen in one transaction.
+
+    Return the life cycle code the object was written with.
+    """
+
+    user_ref = get_authenticated_user()
+
+    with get_connection() as conn, conn.cursor() as cursor:
+        return _import_object(cursor, class_name, note, registration, uuid,
+                              user_ref)
+
+
+def _import_object(cursor, class_name, note, registration, uuid, user_ref):
+    current_life_cycle_code = _get_life_cycle_code(cursor, class_name, uuid)
+
+    if current_life_cycle_code in (Livscyklus.PASSIVERET.value,
+                                   Livscyklus.SLETTET.value):
+        life_cycle_code = Livscyklus.IMPORTERET.value
+
+        _update_object(cursor, class_name, note, registration, uuid,
+                       life_cycle_code, user_ref)
+    else:
+        if current_life_cycle_code is None:
+            life_cycle_code = Livscyklus.IMPORTERET.value
+        else:
+            life_cycle_code = Livscyklus.RETTET.value
+
+        sql_restrictions = get_restrictions_as_sql(
+            user_ref,
+            class_name,
+            Operation.CREATE
+        )
+        sql = get_statement(
+            'create_object.sql',
+            class_name=class_name,
+            restrictions=sql_restrictions is not None,
+        )
+
+        _create_or_import_object(cursor, sql, class_name, note,
+                                 registration, uuid, user_ref,
+                                 sql_restrictions, life_cycle_code)
+
+    return life_cycle_code
+
+
 def delete_object(class_name, registration, note, uuid):
     """Delete object by using the stored procedure.
 
     Deleting is the same as updating with the life cycle code "Slettet".
     """
 
-    if not object_exists(class_name, uuid):
-        raise NotFoundException(
-            "No {} with ID {} found.".format(class_name, uuid)
-        )
-
     life_cycle_code = Livscyklus.SLETTET.value
 
-    if get_life_cycle_code(class_name, uuid) == life_cycle_code:
-        # Already deleted, no problem as DELETE is idempotent.
-        return
-
     user_ref = get_authenticated_user()
-    sql_template = jinja_env.get_template('update_object.sql')
     registration = sql_convert_registration(registration, class_name)
     sql_restrictions = get_restrictions_as_sql(
         get_authenticated_user(),
         class_name,
         Operation.DELETE
     )
-    sql = sql_template.render(
-        class_name=class_name,
-        uuid=uuid,
-        life_cycle_code=life_cycle_code,
-        user_ref=user_ref,
-        note=note,
-        states=registration["states"],
-        attributes=registration["attributes"],
-        relations=registration["relations"],
-        variants=registration.get("variants", None),
-        restrictions=sql_restrictions
+    sql, params = get_update_statement(
+        class_name, uuid, life_cycle_code, user_ref, note, registration,
+        sql_restrictions,
     )
 
     # Call Postgres! Return OK or not accordingly
     with get_connection() as conn, conn.cursor() as cursor:
+        current_life_cycle_code = _get_life_cycle_code(cursor, class_name,
+                                                       uuid)
+
+        if current_life_cycle_code is None:
+            raise NotFoundException(
+                "No {} with ID {} found.".format(class_name, uuid)
+            )
+        elif current_life_cycle_code == life_cycle_code:
+            # Already deleted, no problem as DELETE is idempotent.
+            return
+
         try:
-            cursor.execute(sql)
+            cursor.execute(sql, params)
         except psycopg2.Error as e:
             if e.pgcode[:2] == 'MO':
                 status_code = int(e.pgcode[2:])
@@ -501,30 +888,21 @@ def passivate_object(class_name, note, registration, uuid):
 
     user_ref = get_authenticated_user()
     life_cycle_code = Livscyklus.PASSIVERET.value
-    sql_template = jinja_env.get_template('update_object.sql')
     registration = sql_convert_registration(registration, class_name)
     sql_restrictions = get_restrictions_as_sql(
         get_authenticated_user(),
         class_name,
         Operation.PASSIVATE
     )
-    sql = sql_template.render(
-        class_name=class_name,
-        uuid=uuid,
-        life_cycle_code=life_cycle_code,
-        user_ref=user_ref,
-        note=note,
-        states=registration["states"],
-        attributes=registration["attributes"],
-        relations=registration["relations"],
-        variants=registration.get("variants", None),
-        restrictions=sql_restrictions
+    sql, params = get_update_statement(
+        class_name, uuid, life_cycle_code, user_ref, note, registration,
+        sql_restrictions,
     )
 
     # Call PostgreSQL
     with get_connection() as conn, conn.cursor() as cursor:
         try:
-            cursor.execute(sql)
+            cursor.execute(sql, params)
         except psycopg2.Error as e:
             if e.pgcode[:2] == 'MO':
                 status_code = int(e.pgcode[2:])
@@ -542,57 +920,59 @@ def update_object(class_name, note, registration, uuid=None,
     """Update object with the partial data supplied."""
     user_ref = get_authenticated_user()
 
+    # Call PostgreSQL
+    with get_connection() as conn, conn.cursor() as cursor:
+        return _update_object(cursor, class_name, note, registration, uuid,
+                              life_cycle_code, user_ref)
+
+
+def _update_object(cursor, class_name, note, registration, uuid,
+                   life_cycle_code, user_ref):
     registration = sql_convert_registration(registration, class_name)
 
     sql_restrictions = get_restrictions_as_sql(
-        get_authenticated_user(),
+        user_ref,
         class_name,
         Operation.UPDATE
     )
 
-    sql_template = jinja_env.get_template('update_object.sql')
-    sql = sql_template.render(
-        class_name=class_name,
-        uuid=uuid,
-        life_cycle_code=life_cycle_code,
-        user_ref=user_ref,
-        note=note,
-        states=registration["states"],
-        attributes=registration["attributes"],
-        relations=registration["relations"],
-        variants=registration.get("variants", None),
-        restrictions=sql_restrictions)
+    sql, params = get_update_statement(
+        class_name, uuid, life_cycle_code, user_ref, note, registration,
+        sql_restrictions,
+    )
 
-    # Call PostgreSQL
-    with get_connection() as conn, conn.cursor() as cursor:
-        try:
-            cursor.execute(sql)
-            cursor.fetchone()
-        except psycopg2.Error as e:
-            noop_msg = ('Aborted updating {} with id [{}] as the given data, '
-                        'does not give raise to a new registration.'.format(
-                            class_name.lower(), uuid
-                        ))
-
-            if e.pgerror.startswith(noop_msg):
-                return uuid
-            elif e.pgcode[:2] == 'MO':
-                status_code = int(e.pgcode[2:])
-                raise DBException(status_code, e.pgerror)
-            else:
-                raise
+    try:
+        cursor.execute(sql, params)
+        cursor.fetchone()
+    except psycopg2.Error as e:
+        noop_msg = ('Aborted updating {} with id [{}] as the given data, '
+                    'does not give raise to a new registration.'.format(
+                        class_name.lower(), uuid
+                    ))
+
+        if e.pgerror.startswith(noop_msg):
+            return uuid
+        elif e.pgcode[:2] == 'MO':
+            status_code = int(e.pgcode[2:])
+            raise DBException(status_code, e.pgerror)
+        else:
+            raise
 
     return uuid
 
 
+@coalesced
 def list_objects(class_name, uuid, virkning_fra, virkning_til,
                  registreret_fra, registreret_til):
     """List objects with the given uuids, optionally filtering by the given
-    virkning and registering periods."""
+    virkning and registering periods.
 
-    assert isinstance(uuid, list) or not uuid
+    Current registrations are taken from the snapshot maintained by the
+    database when it holds for the virkning period, unless restrictions
+    apply to the user.
+    """
 
-    sql_template = jinja_env.get_template('list_objects.sql')
+    assert isinstance(uuid, list) or not uuid
 
     sql_restrictions = get_restrictions_as_sql(
         get_authenticated_user(),
@@ -600,15 +980,17 @@ def list_objects(class_name, uuid, virkning_fra, virkning_til,
         Operation.READ
     )
 
-    sql = sql_template.render(
-        class_name=class_name,
-        restrictions=sql_restrictions
-    )
-
     registration_period = None
     if registreret_fra is not None or registreret_til is not None:
         registration_period = DateTimeTZRange(registreret_fra, registreret_til)
 
+    sql = get_statement(
+        'list_objects.sql',
+        class_name=class_name,
+        restrictions=sql_restrictions is not None,
+        current=registration_period is None and sql_restrictions is None,
+    )
+
     with get_connection() as conn, conn.cursor() as cursor:
         try:
             cursor.execute(sql, {
@@ -616,7 +998,8 @@ def list_objects(class_name, uuid, virkning_fra, virkning_til,
                 'registrering_tstzrange': registration_period,
                 'virkning_tstzrange': DateTimeTZRange(
                     virkning_fra, virkning_til
-                )
+                ),
+                'restrictions': sql_restrictions,
             })
         except psycopg2.Error as e:
             if e.pgcode[:2] == 'MO':
@@ -636,10 +1019,228 @@ def list_objects(class_name, uuid, virkning_fra, virkning_til,
     return filter_json_output(output)
 
 
+def iter_objects(class_name, uuid, virkning_fra, virkning_til,
+                 registreret_fra, registreret_til):
+    """Like :func:`list_objects`, but return an iterator over the objects.
+
+    The objects are fetched through a server-side cursor, at most
+    ``settings.LIST_BATCH_SIZE`` at a time. The first batch is fetched
+    right away, so errors are raised here rather than while iterating.
+    The cursor runs on a connection leased for the iterator alone, as
+    the response may be streamed long after the request is served; it
+    is given back once the iterator is exhausted or closed.
+
+    If ``settings.COALESCE_READS`` is enabled, the objects are read all
+    at once by :func:`list_objects` instead, so that identical listings
+    may share them.
+    """
+
+    assert isinstance(uuid, list) or not uuid
+
+    if settings.COALESCE_READS:
+        objects = list_objects(class_name, uuid, virkning_fra, virkning_til,
+                               registreret_fra, registreret_til)
+
+        return iter((objects[0] or []) if objects else [])
+
+    sql_restrictions = get_restrictions_as_sql(
+        get_authenticated_user(),
+        class_name,
+        Operation.READ
+    )
+
+    registration_period = None
+    if registreret_fra is not None or registreret_til is not None:
+        registration_period = DateTimeTZRange(registreret_fra, registreret_til)
+
+    sql = get_statement(
+        'iter_objects.sql',
+        class_name=class_name,
+        restrictions=sql_restrictions is not None,
+        current=registration_period is None and sql_restrictions is None,
+    )
+
+    conn = get_pool().getconn()
+    cursor = conn.cursor(
+        'iter_objects_{}'.format(next(_cursor_ids)),
+    )
+
+    try:
+        cursor.execute(sql, {
+            'uuid': uuid,
+            'registrering_tstzrange': registration_period,
+            'virkning_tstzrange': DateTimeTZRange(
+                virkning_fra, virkning_til
+            ),
+            'restrictions': sql_restrictions,
+        })
+
+        # a named cursor only runs the statement on the first fetch
+        rows = cursor.fetchmany(settings.LIST_BATCH_SIZE)
+    except BaseException as e:
+        cursor.close()
+        conn.rollback()
+        get_pool().putconn(conn)
+
+        if isinstance(e, psycopg2.Error) and (e.pgcode or '')[:2] == 'MO':
+            status_code = int(e.pgcode[2:])
+            raise DBException(status_code, e.pgerror)
+        else:
+            raise
+
+    def generate(rows):
+        try:
+            # started below, so that closing the iterator before it is
+            # read still gives the connection back
+            yield
+
+            while rows:
+                for (obj,) in rows:
+                    yield filter_json_output(obj)
+
+                rows = cursor.fetchmany(settings.LIST_BATCH_SIZE)
+        finally:
+            try:
+                cursor.close()
+                conn.commit()
+            finally:
+                get_pool().putconn(conn)
+
+    objects = generate(rows)
+    next(objects)
+
+    return objects
+
+
+def get_past_registrations(class_name, uuid, registreret_fra,
+                           registreret_til):
+    """Return the registrations of the objects with the given UUIDs
+    overlapping the given registration period, if the period has passed.
+
+    The period has passed for an object once its current registration
+    started after the period, and no registration overlapping the
+    period can change after that. If so for all of the objects, return a
+    list of strings identifying the time zone of the connection and the
+    overlapping registrations, otherwise ``None``. Like
+    :func:`iter_objects`, this leases a connection of its own, as it may
+    serve a streaming response.
+    """
+
+    assert isinstance(uuid, list)
+
+    sql = get_statement('get_past_registrations.sql', class_name=class_name)
+
+    with _leased_cursor() as cursor:
+        cursor.execute(sql, {
+            'uuid': uuid,
+            'registrering_tstzrange': DateTimeTZRange(
+                registreret_fra, registreret_til,
+            ),
+        })
+
+        past, time_zone, registrations = cursor.fetchone()
+
+    if not past:
+        return None
+
+    return [time_zone] + registrations
+
+
+def get_current_objects(class_name, uuid):
+    """Return the current state of the objects with the given UUIDs, as
+    stored in their snapshot when it is valid now.
+
+    Each object is a tuple of ``(uuid, object, expires)``, where
+    ``expires`` is the time, in seconds since the epoch, at which the
+    next virkning period of the object starts, or ``None``. Objects
+    without a valid snapshot are left out. Like :func:`iter_objects`,
+    this leases a connection of its own, as it may serve a streaming
+    response.
+    """
+
+    assert isinstance(uuid, list)
+
+    sql = get_statement('get_current_objects.sql', class_name=class_name)
+
+    with _leased_cursor() as cursor:
+        cursor.execute(sql, {
+            'uuid': uuid,
+        })
+
+        return [
+            (objekt_id, filter_json_output(objekt), expires)
+            for objekt_id, objekt, expires in cursor.fetchall()
+        ]
+
+
 def filter_json_output(output):
-    """Filter the JSON output returned from the DB-layer."""
-    return transform_relations(transform_virkning(filter_empty(
-        simplify_cleared_wrappers(output))))
+    """Filter the JSON output returned from the DB-layer.
+
+    For the output of the database, the result is the same as applying
+    :func:`simplify_cleared_wrappers`, :func:`filter_empty`,
+    :func:`transform_virkning` and :func:`transform_relations` in turn,
+    but computed in a single pass over the output.
+    """
+    return _shape_json_output(output)
+
+
+def _shape_json_output(o, relations=True):
+    if isinstance(o, dict):
+        if "cleared" in o:
+            # Handle clearable wrapper db-types. The wrapped value isn't
+            # simplified any further.
+            value = transform_virkning(filter_empty(o.get("value", None)))
+            return transform_relations(value) if relations else value
+
+        # Relation lists are grouped by type, but transform_relations()
+        # doesn't recurse any further into such an object
+        grouped = relations and isinstance(o.get("relationer"),
+                                           (list, tuple))
+
+        shaped = {}
+        for k, v in o.items():
+            v = _shape_json_output(v, relations and not grouped)
+            if v:
+                shaped[k] = v
+
+        if "timeperiod" in shaped:
+            # Handle clearable wrapper db-types.
+            timeperiod = shaped.pop("timeperiod")
+            f, t = timeperiod[1:-1].split(',')
+
+            # Get rid of quotes
+            if f[0] == '"':
+                f = f[1:-1]
+            if t[0] == '"':
+                t = t[1:-1]
+
+            shaped.update([
+                ('from', f), ('to', t),
+                ("from_included", timeperiod[0] == '['),
+                ("to_included", timeperiod[-1] == ']'),
+            ])
+
+        if grouped:
+            if "relationer" not in shaped:
+                # All relations were empty; nothing stopped the recursion
+                return transform_relations(shaped)
+
+            rel_dict = {}
+            for rel in shaped["relationer"]:
+                # Remove the reltype from the dict and add to the output dict
+                rel_type = rel.pop("reltype")
+                rel_dict.setdefault(rel_type, []).append(rel)
+            shaped["relationer"] = rel_dict
+
+        return shaped
+    elif isinstance(o, list):
+        shaped = (_shape_json_output(v, relations) for v in o)
+        return [v for v in shaped if v]
+    elif isinstance(o, tuple):
+        shaped = (_shape_json_output(v, relations) for v in o)
+        return tuple(v for v in shaped if v)
+    else:
+        return o
 
 
 def simplify_cleared_wrappers(o):
@@ -738,12 +1339,21 @@ def transform_relations(o):
         return o
 
 
+@coalesced
 def search_objects(class_name, uuid, registration,
                    virkning_fra=None, virkning_til=None,
                    registreret_fra=None, registreret_til=None,
                    life_cycle_code=None, user_ref=None, note=None,
                    any_attr_value_arr=None, any_rel_uuid_arr=None,
-                   first_result=0, max_results=2147483647):
+                   first_result=0, max_results=2147483647, after=None):
+    """Search for objects, returning their UUIDs.
+
+    Paged searches are sorted by ``brugervendtnoegle`` and UUID. Besides
+    the UUIDs, return the sort key of the last object found, which may be
+    passed back as ``after`` -- a ``(sort_key, uuid)`` pair -- to resume
+    the search from there rather than skipping past ``first_result``
+    objects. Unpaged searches return ``None`` as the sort key.
+    """
     if not any_attr_value_arr:
         any_attr_value_arr = []
     if not any_rel_uuid_arr:
@@ -760,8 +1370,6 @@ def search_objects(class_name, uuid, registration,
                                             life_cycle_code, user_ref, note,
                                             registration)
 
-    sql_template = jinja_env.get_template('search_objects.sql')
-
     virkning_soeg = None
     if virkning_fra is not None or virkning_til is not None:
         virkning_soeg = DateTimeTZRange(virkning_fra, virkning_til)
@@ -772,21 +1380,42 @@ def search_objects(class_name, uuid, registration,
         Operation.READ
     )
 
-    sql = sql_template.render(
-        first_result=first_result,
-        uuid=uuid,
-        class_name=class_name,
-        registration=sql_registration,
-        any_attr_value_arr=any_attr_value_arr,
-        any_rel_uuid_arr=any_rel_uuid_arr,
-        max_results=max_results,
-        virkning_soeg=virkning_soeg,
-        # TODO: Get this into the SQL function signature!
-        restrictions=sql_restrictions
-    )
+    if settings.SEARCH_ENGINE == 'query' and class_name != 'Dokument':
+        sql = get_statement(
+            'search_objects_query.sql',
+            class_name=class_name,
+            uuid=uuid is not None,
+            restrictions=sql_restrictions is not None,
+            paged=max_results is not None,
+            after=after is not None,
+            **_get_search_criteria(class_name, registration,
+                                   any_attr_value_arr, any_rel_uuid_arr)
+        )
+    else:
+        sql = get_statement(
+            'search_objects.sql',
+            class_name=class_name,
+            restrictions=sql_restrictions is not None,
+            paged=max_results is not None,
+            after=after is not None,
+        )
+    after_sort_key, after_uuid = after or (None, None)
+    params = {
+        'first_result': first_result,
+        'uuid': uuid,
+        'registration': sql_registration,
+        'virkning_soeg': virkning_soeg,
+        'max_results': max_results,
+        'any_attr_value_arr': any_attr_value_arr,
+        'any_rel_uuid_arr': any_rel_uuid_arr,
+        'restrictions': sql_restrictions,
+        'after_sort_key': after_sort_key,
+        'after_uuid': after_uuid,
+    }
+
     with get_connection() as conn, conn.cursor() as cursor:
         try:
-            cursor.execute(sql)
+            cursor.execute(sql, params)
         except psycopg2.Error as e:
             if e.pgcode[:2] == 'MO':
                 status_code = int(e.pgcode[2:])
@@ -796,14 +1425,173 @@ def search_objects(class_name, uuid, registration,
 
         output = cursor.fetchone()
 
-    return output
+    if max_results is None:
+        return output, None
+
+    return output[:1], output[1]
+
+
+def _get_search_criteria(class_name, registration, any_attr_value_arr,
+                         any_rel_uuid_arr):
+    """Return the number of search criteria of each kind, for rendering
+    ``search_objects_query.sql``.
+
+    Expects a registration returned from sql_convert_registration. The
+    criteria of each attribute are given as the number of search words of
+    each, as a class searched by several search words must match each of
+    them.
+    """
+    class_name = class_name.lower()
+
+    attributes = []
 
+    for attr_name, periods in zip(get_attribute_names(class_name),
+                                  registration["attributes"]):
+        if periods is None or not periods.items:
+            continue
 
-def get_life_cycle_code(class_name, uuid):
-    n = datetime.datetime.now()
-    n1 = n + datetime.timedelta(seconds=1)
-    regs = list_objects(class_name, [uuid], n, n1, None, None)
-    reg = regs[0][0]
-    livscykluskode = reg['registreringer'][0]['livscykluskode']
+        fields = get_attribute_fields(attr_name)
+        soegeord = []
 
-    return livscykluskode
+        for period in periods.items:
+            if 'soegeord' in fields:
+                soegeord.append(
+                    len(period.values[fields.index('soegeord')] or ()),
+                )
+            else:
+                soegeord.append(0)
+
+        attributes.append((attr_name[len(class_name):], tuple(soegeord)))
+
+    states = tuple(
+        (state_name, len(periods.items))
+        for state_name, periods in zip(get_state_names(class_name),
+                                       registration["states"])
+        if periods is not None and periods.items
+    )
+
+    relations = registration["relations"]
+
+    return {
+        'attributes': tuple(attributes),
+        'states': states,
+        'relations': len(relations.items) if relations is not None else 0,
+        'any_attr': len(any_attr_value_arr),
+        'any_uuid': len(any_rel_uuid_arr),
+    }
+
+
+def get_change_position():
+    """Return the position in the outbox of changes from which to read
+    changes made from now on."""
+    with _leased_cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        (txid,) = cursor.fetchone()
+
+    return txid, 0
+
+
+def get_changes(position, objekttyper=None, uuids=None, livscykluskoder=None,
+                limit=None, restrictions=None):
+    """Return the changes recorded in the outbox after ``position``.
+
+    Each change is a tuple of ``(txid, id, objekttype, objekt_id,
+    livscykluskode, tidspunkt)``, in the order they were committed; the
+    position of a change is its ``(txid, id)`` pair. Each of the filters
+    is either ``None`` or a list of the values to match. Changes of
+    transactions that might still be followed by older ones are left out
+    until that is no longer the case. ``restrictions`` maps object types
+    to the restrictions, as SQL, that their objects must meet.
+    """
+    restricted = tuple(sorted(restrictions or ()))
+
+    sql = get_statement(
+        'get_changes.sql',
+        objekttyper=objekttyper is not None,
+        uuids=uuids is not None,
+        livscykluskoder=livscykluskoder is not None,
+        restricted=restricted,
+    )
+
+    txid, id = position
+
+    params = {
+        'txid': txid,
+        'id': id,
+        'objekttyper': objekttyper,
+        'uuids': uuids,
+        'livscykluskoder': livscykluskoder,
+        'limit': limit,
+    }
+
+    for objekttype in restricted:
+        params['restrictions_' + objekttype] = restrictions[objekttype]
+
+    with _leased_cursor() as cursor:
+        cursor.execute(sql, params)
+
+        return cursor.fetchall()
+
+
+def get_changed_objects(position):
+    """Return the objects changed in the outbox after ``position``,
+    including changes of transactions that might still be followed by
+    older ones.
+
+    Each change is a tuple of ``(txid, id, objekttype, objekt_id,
+    settled)``, in the order of their position, where ``settled`` tells
+    whether :func:`get_changes` would return the change yet. Unlike
+    :func:`get_changes`, this leases a connection of its own.
+    """
+    sql = get_statement('get_changed_objects.sql')
+
+    txid, id = position
+
+    with _leased_cursor() as cursor:
+        cursor.execute(sql, {
+            'txid': txid,
+            'id': id,
+        })
+
+        return cursor.fetchall()
+
+
+def get_registrations_since(class_name, since, after_id, limit):
+    """Return the registrations of objects of a class started after the
+    given position, ordered by their start and ID.
+
+    The position is the start of a registration and its ID; pass an ID
+    of ``0`` to include all registrations started at ``since``. Each
+    registration is a tuple of ``(id, uuid, livscykluskode,
+    registreringstid, allowed)``, where ``allowed`` tells whether the
+    user may read the object. Registrations started after the oldest
+    transaction still running that has written to the database are left
+    out, as others may yet appear before them.
+    """
+    sql_restrictions = get_restrictions_as_sql(
+        get_authenticated_user(),
+        class_name,
+        Operation.READ
+    )
+
+    sql = get_statement(
+        'get_registrations_since.sql',
+        class_name=class_name,
+        restrictions=sql_restrictions is not None,
+    )
+
+    with get_connection() as conn, conn.cursor() as cursor:
+        # read before the registrations, so that any registration started
+        # before the horizon has been committed by the time they are read
+        cursor.execute(get_statement('get_registration_horizon.sql'))
+        (horizon,) = cursor.fetchone()
+
+        cursor.execute(sql, {
+            'since': since,
+            'after_id': after_id,
+            'horizon': horizon,
+            'limit': limit,
+            'restrictions': sql_restrictions,
+        })
+
+        return cursor.fetchall()
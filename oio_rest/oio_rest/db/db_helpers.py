@@ -20,83 +20,161 @@ from .. import settings
 from ..contentstore import content_store
 from ..custom_exceptions import BadRequestException
 
-_attribute_fields = {}
 
+class CompiledClass(object):
+    """Lookup tables for a single class of the database structure.
 
-def get_attribute_fields(attribute_name):
-    """Return the field names from the PostgreSQL type in question.
+    Attributes are keyed on their full name, e.g. ``klasseegenskaber``.
+    """
+
+    def __init__(self, class_name, class_info):
+        self.name = class_name
+
+        self.attributes = dict(class_info.get('attributter', {}))
+        self.attribute_metadata = class_info.get('attributter_metadata', {})
+
+        # unfortunately, the ordering of attribute names is of
+        # semantic importance to the database code, and the
+        # ordering isn't consistent in Python 3.5
+        #
+        # specifically, the two state types of 'aktivitet' can
+        # trigger occasional errors
+        self.attribute_names = sorted(class_name + a for a in self.attributes)
+
+        self.attribute_fields = {
+            class_name + a: fields + ['virkning']
+            for a, fields in self.attributes.items()
+        }
+
+        self.field_types = {
+            class_name + a: {
+                field_name: field_info['type']
+                for field_name, field_info in metadata.items()
+                if 'type' in field_info
+            }
+            for a, metadata in self.attribute_metadata.items()
+        }
+
+        # map each field to the attributes containing it, so that
+        # query parameters can be routed without scanning them all
+        self.attribute_routes = {}
+
+        for attr_name in self.attribute_names:
+            for field_name in self.attribute_fields[attr_name]:
+                self.attribute_routes.setdefault(field_name, []).append(
+                    attr_name,
+                )
+
+        states = class_info.get('tilstande', {})
+
+        self.states = dict(states)
+
+        if isinstance(states, list):
+            self.state_names = [state[0] for state in states]
+        else:
+            self.state_names = list(states)
+
+        self.relations_to_one = class_info.get('relationer_nul_til_en', [])
+        self.relations_to_many = class_info.get(
+            'relationer_nul_til_mange', [],
+        )
+        self.relation_names = self.relations_to_one + self.relations_to_many
+        self.relation_metadata = class_info.get('relationer_metadata', {})
+
+        self.relation_field_types = {}
+
+        for metadata in self.relation_metadata.values():
+            for field_name, field_info in metadata.items():
+                if 'type' in field_info:
+                    self.relation_field_types.setdefault(
+                        field_name, field_info['type'],
+                    )
+
+        self.attribute_field_set = frozenset(self.attribute_routes)
+        self.state_name_set = frozenset(self.state_names)
+        self.relation_name_set = frozenset(self.relation_names)
+
+
+class StructureRegistry(object):
+    """Lookup tables compiled once from a database structure.
 
+    Index it with a class name, in any case, to get its
+    :class:`CompiledClass`.
     """
 
-    if not _attribute_fields:
-        # Initialize attr fields for ease of use.
-        for c, fs in settings.REAL_DB_STRUCTURE.items():
-            for a, v in fs["attributter"].items():
-                _attribute_fields[c + a] = v + ['virkning']
+    def __init__(self, structure):
+        self.structure = structure
+        self.classes = {
+            c: CompiledClass(c, fs) for c, fs in structure.items()
+        }
 
-    return _attribute_fields[attribute_name.lower()]
+        self.attribute_fields = {}
+        self.field_types = {}
 
+        for compiled in self.classes.values():
+            for attr_name, fields in compiled.attribute_fields.items():
+                self.attribute_fields.setdefault(attr_name, fields)
 
-def get_field_type(attribute_name, field_name):
-    for c, fs in settings.REAL_DB_STRUCTURE.items():
-        if "attributter_metadata" in fs:
-            for a, fs in fs["attributter_metadata"].items():
-                if attribute_name == c + a:
-                    if field_name in fs and 'type' in fs[field_name]:
-                        return fs[field_name]['type']
-    return "text"
+            for attr_name, types in compiled.field_types.items():
+                self.field_types.setdefault(attr_name, types)
+
+    def __getitem__(self, class_name):
+        return self.classes[class_name.lower()]
+
+
+_registry = None
+
+
+def get_registry():
+    """Return the registry compiled from the current database structure.
+
+    The registry is rebuilt whenever ``settings.REAL_DB_STRUCTURE`` is
+    replaced, e.g. by :func:`oio_rest.settings.load_db_extensions`.
+    """
+    global _registry
 
+    registry = _registry
 
-_attribute_names = {}
+    if (registry is None or
+            registry.structure is not settings.REAL_DB_STRUCTURE):
+        registry = _registry = StructureRegistry(settings.REAL_DB_STRUCTURE)
+
+    return registry
+
+
+def get_attribute_fields(attribute_name):
+    """Return the field names from the PostgreSQL type in question.
+
+    """
+    return get_registry().attribute_fields[attribute_name.lower()]
+
+
+def get_field_type(attribute_name, field_name):
+    types = get_registry().field_types.get(attribute_name, {})
+    return types.get(field_name, "text")
 
 
 def get_relation_field_type(class_name, field_name):
-    class_info = settings.REAL_DB_STRUCTURE[class_name.lower()]
-    if 'relationer_metadata' in class_info:
-        metadata = class_info['relationer_metadata']
-        for relation in metadata:
-            for key in metadata[relation]:
-                if field_name == key and 'type' in metadata[relation][key]:
-                    return metadata[relation][key]['type']
-    return "text"
+    try:
+        types = get_registry()[class_name].relation_field_types
+    except KeyError:
+        return "text"
+    return types.get(field_name, "text")
 
 
 def get_attribute_names(class_name):
     "Return the list of all recognized attributes for this class."
-    if not _attribute_names:
-        for c, fs in settings.REAL_DB_STRUCTURE.items():
-            # unfortunately, the ordering of attribute names is of
-            # semantic importance to the database code, and the
-            # ordering isn't consistent in Python 3.5
-            #
-            # specifically, the two state types of 'aktivitet' can
-            # trigger occasional errors
-            _attribute_names[c] = sorted(c + a for a in fs['attributter'])
-    return _attribute_names[class_name.lower()]
+    return get_registry()[class_name].attribute_names
 
 
 def get_state_names(class_name):
     "Return the list of all recognized states for this class."
-    states = settings.REAL_DB_STRUCTURE[class_name.lower()]['tilstande']
-
-    if isinstance(states, list):
-        return [state[0] for state in states]
-    else:
-        return list(states)
-
-
-_relation_names = {}
+    return get_registry()[class_name].state_names
 
 
 def get_relation_names(class_name):
     "Return the list of all recognized relations for this class."
-    if len(_relation_names) == 0:
-        for c, fs in settings.REAL_DB_STRUCTURE.items():
-            _relation_names[c] = (
-                fs['relationer_nul_til_en'] +
-                fs['relationer_nul_til_mange']
-            )
-    return _relation_names[class_name.lower()]
+    return get_registry()[class_name].relation_names
 
 
 def get_document_part_relation_names():
@@ -362,6 +440,56 @@ class AktoerAttrAdapter(NamedTupleAdapter):
         return sql
 
 
+class Row(namedtuple('Row', 'type_name values')):
+    """A composite value, cast to the PostgreSQL type ``type_name``.
+
+    The cast is omitted if ``type_name`` is ``None``.
+    """
+
+
+class RowAdapter(NamedTupleAdapter):
+
+    def getquoted(self):
+        values = list(map(self.prepare_and_adapt, self._tuple_obj.values))
+        values = [v.getquoted() for v in values]
+        sql = b'ROW(' + b','.join(values) + b')'
+        if self._tuple_obj.type_name:
+            sql += b' :: ' + self._tuple_obj.type_name.encode('ascii')
+        return sql
+
+
+class Array(namedtuple('Array', 'type_name items')):
+    """An array of values, cast to the PostgreSQL type ``type_name[]``.
+
+    Unlike plain lists, the cast lets PostgreSQL know the type of an
+    empty array.
+    """
+
+
+class ArrayAdapter(NamedTupleAdapter):
+
+    def getquoted(self):
+        values = list(map(self.prepare_and_adapt, self._tuple_obj.items))
+        values = [v.getquoted() for v in values]
+        return (b'ARRAY[' + b','.join(values) + b'] :: ' +
+                self._tuple_obj.type_name.encode('ascii') + b'[]')
+
+
+class Cast(namedtuple('Cast', 'value type_name')):
+    """A value, cast to the PostgreSQL type ``type_name``."""
+
+
+class CastAdapter(NamedTupleAdapter):
+
+    def getquoted(self):
+        value = self.prepare_and_adapt(self._tuple_obj.value)
+        return (value.getquoted() + b' :: ' +
+                self._tuple_obj.type_name.encode('ascii'))
+
+
+psyco_register_adapter(Cast, CastAdapter)
+psyco_register_adapter(Row, RowAdapter)
+psyco_register_adapter(Array, ArrayAdapter)
 psyco_register_adapter(Virkning, NamedTupleAdapter)
 psyco_register_adapter(Soegeord, NamedTupleAdapter)
 psyco_register_adapter(OffentlighedUndtaget, NamedTupleAdapter)
@@ -0,0 +1,135 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+"""Bounded pool of database connections with lease accounting."""
+
+import threading
+import time
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from ..custom_exceptions import DBException
+
+
+class ConnectionPool(object):
+    """Hand out connections from a bounded pool, waiting when exhausted.
+
+    Unlike :class:`psycopg2.pool.PersistentConnectionPool`, connections
+    aren't tied to threads: each lease is explicitly given back with
+    :meth:`putconn`. When all ``maxconn`` connections are leased, callers
+    wait up to ``timeout`` seconds for one to be returned rather than
+    failing immediately.
+
+    As with the underlying pool, at most ``minconn`` connections are
+    kept open while idle; others are closed when given back.
+
+    The pool keeps counters of its usage, available through
+    :meth:`stats`.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=None, **kwargs):
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+
+        # the underlying pool opens minconn connections up front
+        self._idle = minconn
+        self._active = 0
+        self._waiting = 0
+        self._leases = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def getconn(self):
+        """Lease a connection, waiting at most ``timeout`` seconds."""
+        with self._lock:
+            self._waiting += 1
+
+        start = time.monotonic()
+        acquired = False
+
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            waited = time.monotonic() - start
+
+            with self._lock:
+                self._waiting -= 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+        if not acquired:
+            with self._lock:
+                self._timeouts += 1
+
+            raise DBException(
+                503,
+                "Timed out after {}s waiting for a database connection "
+                "({} of {} in use)".format(
+                    self.timeout, self._active, self.maxconn,
+                ),
+            )
+
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            # an idle connection is reused if there is one; otherwise a
+            # new one was opened
+            self._idle = max(self._idle - 1, 0)
+            self._active += 1
+            self._leases += 1
+
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Give a leased connection back to the pool.
+
+        Any open transaction is rolled back by the underlying pool.
+        """
+        try:
+            self._pool.putconn(conn, close=close or conn.closed)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+                # kept only if still open and fewer than minconn are idle
+                if (not close and not conn.closed and
+                        self._idle < self.minconn):
+                    self._idle += 1
+
+            self._slots.release()
+
+    def closeall(self):
+        """Close all connections, leased or idle."""
+        self._pool.closeall()
+
+        with self._lock:
+            self._idle = 0
+
+    def stats(self):
+        """Return a dictionary of counters describing pool usage."""
+        with self._lock:
+            return {
+                'max': self.maxconn,
+                'active': self._active,
+                'idle': self._idle,
+                'waiting': self._waiting,
+                'leases': self._leases,
+                'timeouts': self._timeouts,
+                'wait_seconds_total': self._wait_total,
+                'wait_seconds_max': self._wait_max,
+            }
@@ -38,6 +38,7 @@ TEMPLATES = (
     "json-cast-functions",
     "_as_sorted",
     "_as_filter_unauth",
+    "_as_refresh_aktuel",
 )
 
 
@@ -0,0 +1,102 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+"""Coalescing of identical concurrent calls."""
+
+import threading
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Run identical concurrent calls only once, sharing the result.
+
+    A call waits for an identical one to run for it, but only if that
+    one hasn't started yet: a call started earlier might not see changes
+    the caller made right before. Calls made while an identical one is
+    running wait for it to finish, and then run once for all of them.
+    The result or exception is shared by all of them, so the result must
+    not be modified.
+
+    The coalescing keeps counters of its usage, available through
+    :meth:`stats`.
+    """
+
+    def __init__(self):
+        self._running = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        self._calls = 0
+        self._runs = 0
+        self._coalesced = 0
+
+    def call(self, key, func):
+        """Return the result of ``func()``, or that of an identical call
+        with the same key."""
+        with self._lock:
+            self._calls += 1
+
+            previous = None
+            leader = True
+
+            if key in self._pending:
+                flight = self._pending[key]
+                leader = False
+                self._coalesced += 1
+            elif key in self._running:
+                flight = self._pending[key] = _Flight()
+                previous = self._running[key]
+            else:
+                flight = self._running[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+        else:
+            if previous is not None:
+                previous.done.wait()
+
+                with self._lock:
+                    del self._pending[key]
+                    self._running[key] = flight
+
+            self._run(key, flight, func)
+
+        if flight.error is not None:
+            raise flight.error
+
+        return flight.result
+
+    def _run(self, key, flight, func):
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                self._runs += 1
+
+                if self._running.get(key) is flight:
+                    del self._running[key]
+
+            flight.done.set()
+
+    def stats(self):
+        """Return a dictionary of counters describing the coalescing."""
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'runs': self._runs,
+                'coalesced': self._coalesced,
+                'running': len(self._running),
+            }
@@ -0,0 +1,69 @@
+-- Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+-- Every change to a registration is recorded here by notify_event(), in
+-- the same transaction as the change itself. Relays read the outbox in
+-- (txid, id) order -- which, unlike the id alone, is the order in which
+-- the changes become visible -- and only rows of transactions older
+-- than the oldest one still running.
+CREATE TABLE mox_outbox (
+    id bigserial PRIMARY KEY,
+    txid bigint NOT NULL DEFAULT txid_current(),
+    objekttype text NOT NULL,
+    objekt_id uuid NOT NULL,
+    registrering_id bigint NOT NULL,
+    livscykluskode LivscyklusKode,
+    handling text NOT NULL,
+    tidspunkt timestamptz NOT NULL DEFAULT now()
+);
+
+
+CREATE INDEX mox_outbox_idx_position
+    ON mox_outbox
+    USING btree
+    (txid, id);
+
+
+-- The position of the last row published by each relay.
+CREATE TABLE mox_outbox_checkpoint (
+    relay text PRIMARY KEY,
+    txid bigint NOT NULL DEFAULT 0,
+    id bigint NOT NULL DEFAULT 0,
+    opdateret timestamptz NOT NULL DEFAULT now()
+);
+
+
+CREATE INDEX mox_outbox_idx_tidspunkt
+    ON mox_outbox
+    USING btree
+    (tidspunkt);
+
+
+-- Delete the rows of the outbox older than the given interval which
+-- every relay has published. Clients of the change feed may resume from
+-- any row kept, so the interval should cover how long they may stay
+-- away. Returns the number of rows deleted.
+CREATE OR REPLACE FUNCTION prune_mox_outbox(keep interval)
+RETURNS bigint AS $$
+    WITH oldest AS (
+        SELECT txid, id
+          FROM mox_outbox_checkpoint
+         ORDER BY txid, id
+         LIMIT 1
+    ), pruned AS (
+        DELETE FROM mox_outbox o
+         WHERE o.tidspunkt < now() - keep
+           AND NOT EXISTS (
+               SELECT 1
+                 FROM oldest c
+                WHERE (o.txid, o.id) > (c.txid, c.id)
+           )
+        RETURNING 1
+    )
+    SELECT count(*) FROM pruned;
+$$ LANGUAGE sql;
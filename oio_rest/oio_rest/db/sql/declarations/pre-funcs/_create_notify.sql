@@ -10,7 +10,7 @@ CREATE OR REPLACE FUNCTION notify_event ()
     RETURNS TRIGGER AS $$
 DECLARE
     data json;
-    notification json;
+    objekttype text;
 BEGIN
     -- Convert the old or new row to JSON, based on the kind of action.
     -- Action = DELETE?             -> OLD row
@@ -20,13 +20,23 @@ BEGIN
     ELSE
         data = row_to_json(NEW);
     END IF;
-    -- Contruct the notification
-    notification = json_build_object('table', TG_TABLE_NAME, 'action', TG_OP, 'data', data);
-    -- Execute pg_notify(channel, notification)
+    -- Strip '_registrering' from the table name
+    objekttype = left(TG_TABLE_NAME, -13);
+    -- Record the change in the outbox
+    INSERT INTO mox_outbox (
+        objekttype, objekt_id, registrering_id, livscykluskode, handling
+    ) VALUES (
+        objekttype,
+        (data ->> (objekttype || '_id')) :: uuid,
+        (data ->> 'id') :: bigint,
+        (data -> 'registrering' ->> 'livscykluskode') :: LivscyklusKode,
+        TG_OP
+    );
+    -- Wake up any relays; identical notifications are sent only once per
+    -- transaction
     PERFORM
-        pg_notify('mox_notifications', notification::text);
+        pg_notify('mox_notifications', '');
     -- Result is ignored since this is an AFTER trigger
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
-
@@ -17,12 +17,17 @@ CREATE OR REPLACE FUNCTION _as_create_{{oio_type}}_registrering(
     note text DEFAULT ''::text
 ) RETURNS {{oio_type}}_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     {{oio_type}}_registrering_id bigint;
     {{oio_type}}_registrering    {{oio_type}}_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE {{oio_type}}_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -0,0 +1,114 @@
+{% extends "basis.jinja.sql" %}
+
+-- Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+{% block body %}
+
+-- Store the current registration of the given object, as listed at the
+-- current time, in {{oio_type}}_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_{{oio_type}}(
+    {{oio_type}}_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM {{oio_type}}_registrering b
+     WHERE b.{{oio_type}}_id = {{oio_type}}_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        {%- for attribut, attribut_fields in attributter.items() %}
+        SELECT (a.virkning).TimePeriod periode
+          FROM {{oio_type}}_attr_{{attribut}} a
+         WHERE a.{{oio_type}}_registrering_id = registrering_id
+         UNION ALL
+        {%- endfor %}
+        {%- for tilstand, tilstand_values in tilstande.items() %}
+        SELECT (a.virkning).TimePeriod
+          FROM {{oio_type}}_tils_{{tilstand}} a
+         WHERE a.{{oio_type}}_registrering_id = registrering_id
+         UNION ALL
+        {%- endfor %}
+        {%- if oio_type == "dokument" %}
+        SELECT (a.virkning).TimePeriod
+          FROM dokument_variant_egenskaber a
+          JOIN dokument_variant b ON b.id = a.variant_id
+         WHERE b.dokument_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM dokument_del_egenskaber a
+          JOIN dokument_del c ON c.id = a.del_id
+          JOIN dokument_variant b ON b.id = c.variant_id
+         WHERE b.dokument_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM dokument_del_relation a
+          JOIN dokument_del c ON c.id = a.del_id
+          JOIN dokument_variant b ON b.id = c.variant_id
+         WHERE b.dokument_registrering_id = registrering_id
+         UNION ALL
+        {%- endif %}
+        SELECT (a.virkning).TimePeriod
+          FROM {{oio_type}}_relation a
+         WHERE a.{{oio_type}}_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_{{oio_type}}(
+        ARRAY[{{oio_type}}_uuid], null, aktuel_virkning
+    ))[1] :: json;
+{% if 'brugervendtnoegle' in attributter.egenskaber %}
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM {{oio_type}}_attr_egenskaber a
+         WHERE a.{{oio_type}}_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
+{% endif %}
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM {{oio_type}}_aktuel
+         WHERE {{oio_type}}_id = {{oio_type}}_uuid;
+    ELSE
+        INSERT INTO {{oio_type}}_aktuel (
+            {{oio_type}}_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            {{oio_type}}_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT ({{oio_type}}_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+
+{% endblock %}
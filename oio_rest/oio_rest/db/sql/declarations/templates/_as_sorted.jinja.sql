@@ -15,7 +15,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_{{oio_type}}(
     virkningSoeg TSTZRANGE,
     registreringObj    {{oio_type|title}}RegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     {{oio_type}}_sorted_uuid uuid[];
@@ -26,7 +28,42 @@ BEGIN
     ELSE
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
+{% if 'brugervendtnoegle' in attributter.egenskaber %}
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in {{oio_type}}_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest({{oio_type}}_uuids) u(id)
+       LEFT JOIN {{oio_type}}_aktuel c ON c.{{oio_type}}_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.{{oio_type}}_id
+                    FROM {{oio_type}}_aktuel c
+                   WHERE c.{{oio_type}}_id = ANY ({{oio_type}}_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.{{oio_type}}_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
 
+        RETURN array(
+              SELECT c.{{oio_type}}_id
+                FROM {{oio_type}}_aktuel c
+               WHERE c.{{oio_type}}_id = ANY ({{oio_type}}_uuids)
+                 AND (c.sorteringsnoegle, c.{{oio_type}}_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.{{oio_type}}_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+{% endif %}
     {{oio_type}}_sorted_uuid:=array(
           SELECT b.{{oio_type}}_id
             FROM {{oio_type}}_registrering b
@@ -35,6 +72,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.{{oio_type}}_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.{{oio_type}}_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.{{oio_type}}_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -43,4 +86,32 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql STABLE;
 
+
+-- Return the key _as_sorted_{{oio_type}} sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_{{oio_type}}(
+    {{oio_type}}_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    {{oio_type|title}}RegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM {{oio_type}}_registrering b
+            JOIN {{oio_type}}_attr_egenskaber a ON a.{{oio_type}}_registrering_id=b.id
+           WHERE b.{{oio_type}}_id = {{oio_type}}_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
 {% endblock %}
@@ -38,34 +38,17 @@ $$ DECLARE {{oio_type}}_registrering_id bigint;
     klasse_attr_egenskaber_id bigint;
     klasse_attr_egenskaber_soegeord_obj KlasseSoegeordType;
     {% elif oio_type == "sag" %}
-    sag_relation_kode SagRelationKode;
-    sag_uuid_underscores text;
-    sag_rel_seq_name text;
     sag_rel_type_cardinality_unlimited SagRelationKode[]:=ARRAY['andetarkiv'::SagRelationKode,'andrebehandlere'::SagRelationKode,'sekundaerpart'::SagRelationKode,'andresager'::SagRelationKode,'byggeri'::SagRelationKode,'fredning'::SagRelationKode,'journalpost'::SagRelationKode]::SagRelationKode[];
     {% endif %}
 
     auth_filtered_uuids uuid[];
 
     {% if oio_type == "aktivitet" %}
-    aktivitet_relation_kode aktivitetRelationKode;
-    aktivitet_uuid_underscores text;
-    aktivitet_rel_seq_name text;
     aktivitet_rel_type_cardinality_unlimited aktivitetRelationKode[]:=ARRAY['udfoererklasse'::AktivitetRelationKode,'deltagerklasse'::AktivitetRelationKode,'objektklasse'::AktivitetRelationKode,'resultatklasse'::AktivitetRelationKode,'grundlagklasse'::AktivitetRelationKode,'facilitetklasse'::AktivitetRelationKode,'adresse'::AktivitetRelationKode,'geoobjekt'::AktivitetRelationKode,'position'::AktivitetRelationKode,'facilitet'::AktivitetRelationKode,'lokale'::AktivitetRelationKode,'aktivitetdokument'::AktivitetRelationKode,'aktivitetgrundlag'::AktivitetRelationKode,'aktivitetresultat'::AktivitetRelationKode,'udfoerer'::AktivitetRelationKode,'deltager'::AktivitetRelationKode]::aktivitetRelationKode[];
-    aktivitet_rel_type_cardinality_unlimited_present_in_argument aktivitetRelationKode[];
     {% elif oio_type == "indsats" %}
-    indsats_relation_kode indsatsRelationKode;
-    indsats_uuid_underscores text;
-    indsats_rel_seq_name text;
     indsats_rel_type_cardinality_unlimited indsatsRelationKode[]:=ARRAY['indsatskvalitet'::IndsatsRelationKode,'indsatsaktoer'::IndsatsRelationKode,'samtykke'::IndsatsRelationKode,'indsatssag'::IndsatsRelationKode,'indsatsdokument'::IndsatsRelationKode]::indsatsRelationKode[];
-    indsats_rel_type_cardinality_unlimited_present_in_argument indsatsRelationKode[];
-    {% elif oio_type == "sag" %}
-    sag_rel_type_cardinality_unlimited_present_in_argument sagRelationKode[];
     {% elif oio_type == "tilstand" %}
-    tilstand_relation_kode tilstandRelationKode;
-    tilstand_uuid_underscores text;
-    tilstand_rel_seq_name text;
     tilstand_rel_type_cardinality_unlimited tilstandRelationKode[]:=ARRAY['tilstandsvaerdi'::TilstandRelationKode,'begrundelse'::TilstandRelationKode,'tilstandskvalitet'::TilstandRelationKode,'tilstandsvurdering'::TilstandRelationKode,'tilstandsaktoer'::TilstandRelationKode,'tilstandsudstyr'::TilstandRelationKode,'samtykke'::TilstandRelationKode,'tilstandsdokument'::TilstandRelationKode]::TilstandRelationKode[];
-    tilstand_rel_type_cardinality_unlimited_present_in_argument tilstandRelationKode[];
     {% endif %}
 
     does_exist boolean;
@@ -217,25 +200,6 @@ END IF;
 {% if oio_type in ("aktivitet", "indsats", "sag", "tilstand") %}
 IF coalesce(array_length({{oio_type}}_registrering.relationer,1),0)>0 THEN
 
---Create temporary sequences
-{{oio_type}}_uuid_underscores:=replace({{oio_type}}_uuid::text, '-', '_');
-
-SELECT array_agg(DISTINCT a.RelType) into {{oio_type}}_rel_type_cardinality_unlimited_present_in_argument FROM unnest({{oio_type}}_registrering.relationer) a WHERE a.RelType = any ({{oio_type}}_rel_type_cardinality_unlimited) ;
-IF coalesce(array_length({{oio_type}}_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-
-FOREACH {{oio_type}}_relation_kode IN ARRAY ({{oio_type}}_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  {{oio_type}}_rel_seq_name := '{{oio_type}}_' || {{oio_type}}_relation_kode::text || {{oio_type}}_uuid_underscores;
-
-  EXECUTE 'CREATE TEMPORARY SEQUENCE ' || {{oio_type}}_rel_seq_name || '
-  INCREMENT 1
-  MINVALUE 1
-  MAXVALUE 9223372036854775807
-  START 1
-  CACHE 1;';
-
-END LOOP;
-END IF;
 {% endif %}
 
     INSERT INTO {{oio_type}}_relation (
@@ -263,7 +227,7 @@ END IF;
       a.relType,
       a.objektType{% if oio_type in ("aktivitet", "indsats", "tilstand") %},
       CASE WHEN a.relType = any ({{oio_type}}_rel_type_cardinality_unlimited) THEN --rel_index
-      nextval('{{oio_type}}_' || a.relType::text || {{oio_type}}_uuid_underscores)
+      row_number() OVER (PARTITION BY a.relType ORDER BY a.ordinality)
       ELSE 
       NULL
       END{% endif %}{% if oio_type == "aktivitet" %},
@@ -287,7 +251,7 @@ END IF;
       END
       {% elif oio_type == "sag" %},
       CASE WHEN a.relType = any (sag_rel_type_cardinality_unlimited) THEN --rel_index
-      nextval('sag_' || a.relType::text || sag_uuid_underscores)
+      row_number() OVER (PARTITION BY a.relType ORDER BY a.ordinality)
       ELSE 
       NULL
       END,
@@ -346,21 +310,11 @@ END IF;
         NULL
       END
     {% endif %}
-    FROM unnest({{oio_type}}_registrering.relationer) a
+    FROM unnest({{oio_type}}_registrering.relationer) WITH ORDINALITY a
   ;
 
 
 {% if oio_type in ("aktivitet", "indsats", "sag", "tilstand") %}
---Drop temporary sequences
-IF coalesce(array_length({{oio_type}}_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-FOREACH {{oio_type}}_relation_kode IN ARRAY ({{oio_type}}_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  {{oio_type}}_rel_seq_name := '{{oio_type}}_' || {{oio_type}}_relation_kode::text || {{oio_type}}_uuid_underscores;
-  EXECUTE 'DROP SEQUENCE ' || {{oio_type}}_rel_seq_name || ';';
-END LOOP;
-END IF;
-
-
 END IF;
 {% elif oio_type == "dokument" %}
 --/*********************************/
@@ -507,7 +461,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_{{oio_type}}({{oio_type}}_uuid);
 
 
 RETURN {{oio_type}}_uuid;
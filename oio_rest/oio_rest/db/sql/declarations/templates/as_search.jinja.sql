@@ -24,7 +24,9 @@ CREATE OR REPLACE FUNCTION as_search_{{oio_type}}(
     {% if oio_type in ("aktivitet", "indsats") %},
     search_operator_greater_than_or_equal_attr_egenskaber {{oio_type|title}}EgenskaberAttrType[]=null,
     search_operator_less_than_or_equal_attr_egenskaber    {{oio_type|title}}EgenskaberAttrType[]=null
-    {% endif %}
+    {% endif %},
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -278,27 +280,58 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.{{oio_type}}_id
+            FROM  {{oio_type}}_attr_{{attribut}} a
+            JOIN {{oio_type}}_registrering b on a.{{oio_type}}_registrering_id=b.id
+            WHERE
+            (
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_{{oio_type}}_attr_{{attribut}}(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        {%- for attribut_field in attribut_fields %}
+                            {%- set type = attributter_metadata[attribut][attribut_field]['type'] %}
+                            {%- if not type %}
+                        OR a.{{attribut_field}} ILIKE anyAttrValue
+                            {%- elif type == "text[]" %}
+                        OR _as_search_ilike_array(anyAttrValue,a.{{attribut_field}})
+                            {%- elif type == "offentlighedundtagettype" %}
+                        OR (a.{{attribut_field}}).Hjemmel ilike anyAttrValue OR (a.{{attribut_field}}).AlternativTitel ilike anyAttrValue
+                            {%- elif type not in ("boolean", "timestamptz") %}
+                        OR a.{{attribut_field}}::text ilike anyAttrValue
+                            {%- endif %}
+                        {%- endfor %}
+                    )
+                )
+                {%- for attribut_field in attribut_fields %}
+                    {%- set type = attributter_metadata[attribut][attribut_field]['type'] %}
+                    {%- if type == "timestamptz" %}
+                OR
+                a.{{attribut_field}}::text ilike anyAttrValue
+                    {%- endif %}
+                {%- endfor %}
+            )
+            AND
+            (
+                virkningSoeg IS NULL
+                OR
+                virkningSoeg && (a.virkning).TimePeriod
+            )
+            AND
+            {% include 'as_search_mixin_filter_reg.jinja.sql' %}
             {% if oio_type == "dokument" %}
-            FROM dokument_registrering b 
-            LEFT JOIN dokument_attr_egenskaber a on a.dokument_registrering_id=b.id and (virkningSoeg IS NULL or virkningSoeg && (a.virkning).TimePeriod )
-            LEFT JOIN dokument_variant c on c.dokument_registrering_id=b.id 
+            UNION
+            SELECT DISTINCT
+            b.dokument_id
+            FROM dokument_registrering b
+            JOIN dokument_variant c on c.dokument_registrering_id=b.id
             LEFT JOIN dokument_del f on f.variant_id=c.id
             LEFT JOIN dokument_del_egenskaber d on d.del_id = f.id and (virkningSoeg IS NULL or virkningSoeg && (d.virkning).TimePeriod )
             LEFT JOIN dokument_variant_egenskaber e on e.variant_id = c.id and (virkningSoeg IS NULL or virkningSoeg && (e.virkning).TimePeriod )
             WHERE
             (
-                (
-                    a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.beskrivelse ILIKE anyAttrValue OR
-                                    a.brevdato::text ilike anyAttrValue OR
-                        a.kassationskode ILIKE anyAttrValue OR
-                                    a.major::text ilike anyAttrValue OR
-                                    a.minor::text ilike anyAttrValue OR
-                                    (a.offentlighedundtaget).Hjemmel ilike anyAttrValue OR (a.offentlighedundtaget).AlternativTitel ilike anyAttrValue OR
-                        a.titel ILIKE anyAttrValue OR
-                        a.dokumenttype ILIKE anyAttrValue
-                )
-                OR
                 (
                     (c.varianttekst ilike anyAttrValue and e.id is not null) --varianttekst handled like it is logically part of variant egenskaber
                 )
@@ -316,42 +349,21 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 )
             )
             AND
-            {% else %}
-            FROM  {{oio_type}}_attr_{{attribut}} a
-            JOIN {{oio_type}}_registrering b on a.{{oio_type}}_registrering_id=b.id
-            {% if oio_type == "klasse" %}
-            LEFT JOIN klasse_attr_egenskaber_soegeord c on a.id=c.klasse_attr_egenskaber_id
-            {% endif %}
+            {% include 'as_search_mixin_filter_reg.jinja.sql' %}
+            {% elif oio_type == "klasse" %}
+            UNION
+            SELECT DISTINCT
+            b.klasse_id
+            FROM klasse_attr_egenskaber a
+            JOIN klasse_registrering b on a.klasse_registrering_id=b.id
+            JOIN klasse_attr_egenskaber_soegeord c on a.id=c.klasse_attr_egenskaber_id
             WHERE
             (
-                {%- for attribut_field in attribut_fields %}
-                    {%- if attributter_metadata[attribut][attribut_field]['type'] %}
-                        {%-if attributter_metadata[attribut][attribut_field]['type'] == "text[]" %}
-                              _as_search_ilike_array(anyAttrValue,a.{{attribut_field}})  {%- if (not loop.last)%} OR {%- endif %}
-                        {%-else %}
-                            {%-if attributter_metadata[attribut][attribut_field]['type'] == "boolean" %}
-                                -- boolean is skipped intentionally
-                                {% if (loop.last and loop.first)-%} FALSE {%- endif -%}
-                            {%-else %}
-                                {%-if attributter_metadata[attribut][attribut_field]['type'] == "offentlighedundtagettype" %}
-                                    (a.{{attribut_field}}).Hjemmel ilike anyAttrValue OR (a.{{attribut_field}}).AlternativTitel ilike anyAttrValue {%- if (not loop.last)%} OR {%- endif %}
-                                {%-else %}
-                                    a.{{attribut_field}}::text ilike anyAttrValue  {%- if (not loop.last)%} OR {%- endif %}
-                                {%- endif -%}
-                            {%- endif -%}
-                        {%- endif -%}
-                    {%-else %}
-                        a.{{attribut_field}} ILIKE anyAttrValue {%- if (not loop.last)%} OR {%- endif %}
-                    {%- endif -%}
-                {%- endfor %}
-                {% if oio_type == "klasse" %}
-                OR
                 c.soegeordidentifikator ILIKE anyAttrValue
                 OR
                 c.beskrivelse ILIKE anyAttrValue
                 OR
                 c.soegeordskategori ILIKE anyAttrValue
-                {% endif %}
             )
             AND
             (
@@ -360,8 +372,8 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            {% endif %}
             {% include 'as_search_mixin_filter_reg.jinja.sql' %}
+            {% endif %}
 
             {%- if (not loop.last)%}
             UNION
@@ -1175,8 +1187,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_{{oio_type}}({{oio_type}}_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_{{oio_type}}(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_{{oio_type}}(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -58,12 +58,8 @@ DECLARE
     auth_filtered_uuids uuid[];
 
     {% if oio_type == "aktivitet" %}
-    rel_type_max_index_prev_rev int;
     rel_type_max_index_arr _aktivitetRelationMaxIndex[];
     aktivitet_rel_type_cardinality_unlimited aktivitetRelationKode[]:=ARRAY['udfoererklasse'::AktivitetRelationKode,'deltagerklasse'::AktivitetRelationKode,'objektklasse'::AktivitetRelationKode,'resultatklasse'::AktivitetRelationKode,'grundlagklasse'::AktivitetRelationKode,'facilitetklasse'::AktivitetRelationKode,'adresse'::AktivitetRelationKode,'geoobjekt'::AktivitetRelationKode,'position'::AktivitetRelationKode,'facilitet'::AktivitetRelationKode,'lokale'::AktivitetRelationKode,'aktivitetdokument'::AktivitetRelationKode,'aktivitetgrundlag'::AktivitetRelationKode,'aktivitetresultat'::AktivitetRelationKode,'udfoerer'::AktivitetRelationKode,'deltager'::AktivitetRelationKode]::aktivitetRelationKode[];
-    aktivitet_uuid_underscores text;
-    aktivitet_rel_seq_name text;
-    aktivitet_rel_type_cardinality_unlimited_present_in_argument aktivitetRelationKode[];
     {% elif oio_type == "dokument" %}
     dokument_variant_obj DokumentVariantType;
     dokument_variant_egenskab_obj DokumentVariantEgenskaberType;
@@ -84,26 +80,14 @@ DECLARE
     dokument_del_id bigint;
     dokument_variant_del_prev_reg_rel_transfer _DokumentVariantDelKey[];
     {% elif oio_type == "indsats" %}
-    rel_type_max_index_prev_rev int;
     rel_type_max_index_arr _indsatsRelationMaxIndex[];
     indsats_rel_type_cardinality_unlimited indsatsRelationKode[]:=ARRAY['indsatskvalitet'::IndsatsRelationKode,'indsatsaktoer'::IndsatsRelationKode,'samtykke'::IndsatsRelationKode,'indsatssag'::IndsatsRelationKode,'indsatsdokument'::IndsatsRelationKode];
-    indsats_uuid_underscores text;
-    indsats_rel_seq_name text;
-    indsats_rel_type_cardinality_unlimited_present_in_argument IndsatsRelationKode[];
     {% elif oio_type == "sag" %}
-    rel_type_max_index_prev_rev int;
     rel_type_max_index_arr _SagRelationMaxIndex[];
     sag_rel_type_cardinality_unlimited SagRelationKode[]:=ARRAY['andetarkiv'::SagRelationKode,'andrebehandlere'::SagRelationKode,'sekundaerpart'::SagRelationKode,'andresager'::SagRelationKode,'byggeri'::SagRelationKode,'fredning'::SagRelationKode,'journalpost'::SagRelationKode]::SagRelationKode[];
-    sag_uuid_underscores text;
-    sag_rel_seq_name text;
-    sag_rel_type_cardinality_unlimited_present_in_argument sagRelationKode[];
     {% elif oio_type == "tilstand" %}
-    rel_type_max_index_prev_rev int;
     rel_type_max_index_arr _tilstandRelationMaxIndex[];
     tilstand_rel_type_cardinality_unlimited tilstandRelationKode[]:=ARRAY['tilstandsvaerdi'::TilstandRelationKode,'begrundelse'::TilstandRelationKode,'tilstandskvalitet'::TilstandRelationKode,'tilstandsvurdering'::TilstandRelationKode,'tilstandsaktoer'::TilstandRelationKode,'tilstandsudstyr'::TilstandRelationKode,'samtykke'::TilstandRelationKode,'tilstandsdokument'::TilstandRelationKode]::TilstandRelationKode[];
-    tilstand_uuid_underscores text;
-    tilstand_rel_seq_name text;
-    tilstand_rel_type_cardinality_unlimited_present_in_argument tilstandRelationKode[];
     {% endif %}
 BEGIN
     -- Create a new registrering
@@ -139,8 +123,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -168,41 +152,6 @@ BEGIN
              AND a.rel_type = ANY ({{oio_type}}_rel_type_cardinality_unlimited)
         GROUP BY rel_type
     ) AS a;
-
- 
-    ---Create temporary sequences
-    {% if oio_type != "tilstand" %}
-    {{oio_type}}_uuid_underscores:=replace({{oio_type}}_uuid::text, '-', '_');
-    {% endif %}
-
-    SELECT array_agg(DISTINCT a.RelType) INTO {{oio_type}}_rel_type_cardinality_unlimited_present_in_argument FROM unnest(relationer) a WHERE a.RelType = ANY ({{oio_type}}_rel_type_cardinality_unlimited);
-    {% if oio_type == "tilstand" %}
-    {{oio_type}}_uuid_underscores := replace({{oio_type}}_uuid::text, '-', '_');
-    {% endif %}
-
-    IF coalesce(array_length({{oio_type}}_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        FOREACH {{oio_type}}_relation_navn IN ARRAY ({{oio_type}}_rel_type_cardinality_unlimited_present_in_argument) LOOP
-            {{oio_type}}_rel_seq_name := '{{oio_type}}_' || {{oio_type}}_relation_navn::text || {{oio_type}}_uuid_underscores;
-
-            rel_type_max_index_prev_rev := null;
-
-            SELECT a.indeks into rel_type_max_index_prev_rev
-              FROM unnest(rel_type_max_index_arr) a(relType,indeks)
-             WHERE a.relType={{oio_type}}_relation_navn;
-
-            IF rel_type_max_index_prev_rev IS NULL THEN
-              rel_type_max_index_prev_rev := 0;
-            END IF;
-
-            EXECUTE 'CREATE TEMPORARY SEQUENCE ' || {{oio_type}}_rel_seq_name || '
-            INCREMENT 1
-            MINVALUE 1
-            MAXVALUE 9223372036854775807
-            START ' ||  (rel_type_max_index_prev_rev+1)::text ||'
-            CACHE 1;';
-
-        END LOOP;
-    END IF;
     {% endif %}
 
     INSERT INTO {{oio_type}}_relation ({{oio_type}}_registrering_id, virkning, rel_maal_uuid, rel_maal_urn, rel_type, objekt_type {% if oio_type == "aktivitet" %}, rel_index, aktoer_attr {% elif oio_type == "indsats" %}, rel_index {% elif oio_type == "sag" %}, rel_index, rel_type_spec, journal_notat, journal_dokument_attr {% elif oio_type == "tilstand" %}, rel_index, tilstand_vaerdi_attr {% endif %})
@@ -218,8 +167,9 @@ BEGIN
                     OR b.id IS NULL THEN
                     -- For new relations and relations with index given that
                     -- is not found in prev registrering, we'll assign new
-                    -- index values.
-                    nextval('aktivitet_' || a.relType::text || aktivitet_uuid_underscores)
+                    -- index values, numbered in the order given.
+                    coalesce(m.indeks, 0) + count(*) FILTER (WHERE a.indeks IS NULL
+                        OR b.id IS NULL) OVER (PARTITION BY a.relType ORDER BY a.ordinality ROWS UNBOUNDED PRECEDING)
                 ELSE
                     a.indeks
                 END
@@ -244,8 +194,9 @@ BEGIN
                     OR b.id IS NULL THEN
                     -- For new relations and relations with index given that
                     -- is not found in prev registrering, we'll assign new
-                    -- index values.
-                    nextval('indsats_' || a.relType::text || indsats_uuid_underscores)
+                    -- index values, numbered in the order given.
+                    coalesce(m.indeks, 0) + count(*) FILTER (WHERE a.indeks IS NULL
+                        OR b.id IS NULL) OVER (PARTITION BY a.relType ORDER BY a.ordinality ROWS UNBOUNDED PRECEDING)
                 ELSE
                     a.indeks
                 END
@@ -257,8 +208,9 @@ BEGIN
                     OR b.id IS NULL THEN
                     -- For new relations and relations with index given that
                     -- is not found in prev registrering, we'll assign new
-                    -- index values.
-                    nextval('sag_' || a.relType::text || sag_uuid_underscores)
+                    -- index values, numbered in the order given.
+                    coalesce(m.indeks, 0) + count(*) FILTER (WHERE a.indeks IS NULL
+                        OR b.id IS NULL) OVER (PARTITION BY a.relType ORDER BY a.ordinality ROWS UNBOUNDED PRECEDING)
                 ELSE
                     a.indeks
                 END
@@ -292,8 +244,9 @@ BEGIN
                     OR b.id IS NULL THEN
                     -- For new relations and relations with index given that
                     -- is not found in prev registrering, we'll assign new
-                    -- index values.
-                    nextval('tilstand_' || a.relType::text || tilstand_uuid_underscores)
+                    -- index values, numbered in the order given.
+                    coalesce(m.indeks, 0) + count(*) FILTER (WHERE a.indeks IS NULL
+                        OR b.id IS NULL) OVER (PARTITION BY a.relType ORDER BY a.ordinality ROWS UNBOUNDED PRECEDING)
                 ELSE
                     a.indeks
                 END
@@ -310,24 +263,9 @@ BEGIN
                 NULL
             END {% endif %}
         FROM
-            unnest(relationer) AS a {% if oio_type in ("aktivitet", "indsats", "sag", "tilstand") %}
-        LEFT JOIN {{oio_type}}_relation b ON a.relType = ANY ({{oio_type}}_rel_type_cardinality_unlimited) AND b.{{oio_type}}_registrering_id = prev_{{oio_type}}_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index {% endif %};
-
-    {% if oio_type in ("aktivitet", "indsats", "sag", "tilstand") %}
-    -- Drop temporary sequences
-    IF coalesce(array_length({{oio_type}}_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        {% if oio_type == "tilstand" %}
-        FOREACH tilstand_relation_navn IN ARRAY (SELECT array_agg(DISTINCT a.RelType) FROM unnest(relationer) a WHERE a.RelType = ANY (tilstand_rel_type_cardinality_unlimited))
-        {% else %}
-        FOREACH {{oio_type}}_relation_navn IN ARRAY ({{oio_type}}_rel_type_cardinality_unlimited_present_in_argument)
-        {% endif %}
-        LOOP
-          {{oio_type}}_rel_seq_name := '{{oio_type}}_' || {{oio_type}}_relation_navn::text || {{oio_type}}_uuid_underscores;
-          EXECUTE 'DROP SEQUENCE ' || {{oio_type}}_rel_seq_name || ';';
-        END LOOP;
-    END IF;
-    {% endif %}
-
+            unnest(relationer) {% if oio_type in ("aktivitet", "indsats", "sag", "tilstand") %}WITH ORDINALITY {% endif %}AS a {% if oio_type in ("aktivitet", "indsats", "sag", "tilstand") %}
+        LEFT JOIN {{oio_type}}_relation b ON a.relType = ANY ({{oio_type}}_rel_type_cardinality_unlimited) AND b.{{oio_type}}_registrering_id = prev_{{oio_type}}_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index
+        LEFT JOIN unnest(rel_type_max_index_arr) m (relType, indeks) ON m.relType = a.relType {% endif %};
 
     -- Ad 2)
     -- 0..1 relations
@@ -1257,6 +1195,7 @@ END IF; --else block for skip on empty array for variants.
       RAISE EXCEPTION 'Aborted updating {{oio_type}} with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', {{oio_type}}_uuid, to_json(read_new_{{oio_type}}_reg), to_json(read_prev_{{oio_type}}_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_{{oio_type}}({{oio_type}}_uuid);
 
     return new_{{oio_type}}_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
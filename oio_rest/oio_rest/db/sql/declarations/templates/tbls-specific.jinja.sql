@@ -92,11 +92,62 @@ CREATE INDEX {{oio_type}}_id_idx
     ON {{oio_type}}_registrering ({{oio_type}}_id);
 
 
+CREATE INDEX {{oio_type}}_registrering_idx_timeperiod_lower
+    ON {{oio_type}}_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX {{oio_type}}_registrering_idx_timeperiod
+    ON {{oio_type}}_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX {{oio_type}}_registrering_idx_current
+    ON {{oio_type}}_registrering
+    USING btree
+    ({{oio_type}}_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_{{oio_type}}
     AFTER INSERT OR UPDATE OR DELETE ON {{oio_type}}_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
 
 
+/****************************************************************************/
+
+-- The current registration of each object as listed by as_list_{{oio_type}}
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_{{oio_type}}. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_{{oio_type}} sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE {{oio_type}}_aktuel (
+    {{oio_type}}_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT {{oio_type}}_aktuel_pkey PRIMARY KEY ({{oio_type}}_id),
+    CONSTRAINT {{oio_type}}_aktuel_{{oio_type}}_fkey FOREIGN KEY ({{oio_type}}_id)
+        REFERENCES {{oio_type}} (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE {{oio_type}}_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX {{oio_type}}_aktuel_idx_sorteringsnoegle
+    ON {{oio_type}}_aktuel
+    USING btree
+    (sorteringsnoegle, {{oio_type}}_id);
+
+
 /****************************************************************************/
 
 {% for attribut, attribut_fields in attributter.items() %}
@@ -187,6 +238,11 @@ ALTER TABLE {{oio_type}}_attr_{{attribut}}
 {% endfor %}
 
 
+CREATE INDEX {{oio_type}}_attr_{{attribut}}_idx_virkning_timeperiod
+    ON {{oio_type}}_attr_{{attribut}}
+    USING gist
+    ({{oio_type}}_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX {{oio_type}}_attr_{{attribut}}_idx_virkning_aktoerref
     ON {{oio_type}}_attr_{{attribut}}
     USING btree
@@ -207,6 +263,43 @@ CREATE INDEX {{oio_type}}_attr_{{attribut}}_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+{%- set searched %}
+    {%- for field in attribut_fields %}
+        {%- set type = attributter_metadata[attribut][field]['type'] %}
+        {%- if not type %},
+        ($1).{{field}}
+        {%- elif type == "text[]" %},
+        array_to_string(($1).{{field}}, E'\n')
+        {%- elif type == "offentlighedundtagettype" %},
+        (($1).{{field}}).AlternativTitel,
+        (($1).{{field}}).Hjemmel
+        {%- elif type not in ("boolean", "timestamptz") %},
+        ($1).{{field}}::text
+        {%- endif %}
+    {%- endfor %}
+{%- endset %}
+CREATE OR REPLACE FUNCTION _as_search_text_{{oio_type}}_attr_{{attribut}}(
+    {{oio_type}}_attr_{{attribut}}
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    {%- if searched %}
+    SELECT concat_ws(E'\n'{{ searched }}
+    );
+    {%- else %}
+    SELECT NULL::text;
+    {%- endif %}
+$$;
+
+CREATE INDEX {{oio_type}}_attr_{{attribut}}_pat_search_text
+    ON {{oio_type}}_attr_{{attribut}}
+    USING gin
+    (_as_search_text_{{oio_type}}_attr_{{attribut}}({{oio_type}}_attr_{{attribut}}) gin_trgm_ops);
+
 {% endfor %}
 
 
@@ -306,6 +399,11 @@ CREATE INDEX {{oio_type}}_tils_{{tilstand}}_idx_{{tilstand}}
     USING btree
     ({{tilstand}});
   
+CREATE INDEX {{oio_type}}_tils_{{tilstand}}_idx_virkning_timeperiod
+    ON {{oio_type}}_tils_{{tilstand}}
+    USING gist
+    ({{oio_type}}_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX {{oio_type}}_tils_{{tilstand}}_idx_virkning_aktoerref
     ON {{oio_type}}_tils_{{tilstand}}
     USING btree
@@ -445,6 +543,11 @@ CREATE INDEX {{oio_type}}_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX {{oio_type}}_relation_idx_virkning_timeperiod
+    ON {{oio_type}}_relation
+    USING gist
+    ({{oio_type}}_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX {{oio_type}}_relation_idx_virkning_aktoerref
     ON {{oio_type}}_relation
     USING btree
@@ -546,6 +649,11 @@ CREATE INDEX dokument_variant_egenskaber_idx_produktion
     USING btree
     (produktion); 
 
+CREATE INDEX dokument_variant_egenskaber_idx_virkning_timeperiod
+    ON dokument_variant_egenskaber
+    USING gist
+    (variant_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_variant_egenskaber_idx_virkning_aktoerref
     ON dokument_variant_egenskaber
     USING btree
@@ -661,6 +769,11 @@ CREATE INDEX dokument_del_egenskaber_idx_mimetype
     USING btree
     (mimetype); 
 
+CREATE INDEX dokument_del_egenskaber_idx_virkning_timeperiod
+    ON dokument_del_egenskaber
+    USING gist
+    (del_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_del_egenskaber_idx_virkning_aktoerref
     ON dokument_del_egenskaber
     USING btree
@@ -739,6 +852,11 @@ CREATE INDEX dokument_del_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX dokument_del_relation_idx_virkning_timeperiod
+    ON dokument_del_relation
+    USING gist
+    (del_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_del_relation_idx_virkning_aktoerref
     ON dokument_del_relation
     USING btree
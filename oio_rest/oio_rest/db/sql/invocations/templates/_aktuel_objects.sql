@@ -0,0 +1,24 @@
+{#
+  The current registrations of the objects, taken from their snapshot in
+  {{ class_name|lower }}_aktuel when it is valid for the whole virkning
+  period asked for, and listed by as_list_{{ class_name|lower }} otherwise.
+-#}
+{% set table = class_name|lower -%}
+WITH aktuel AS (
+    SELECT a.{{ table }}_id AS id, a.objekt
+      FROM {{ table }}_aktuel a
+     WHERE a.{{ table }}_id = ANY (%(uuid)s :: uuid[])
+       AND a.virkning @> %(virkning_tstzrange)s :: tstzrange
+       AND NOT isempty(%(virkning_tstzrange)s :: tstzrange)
+       AND a.tidszone = current_setting('TimeZone')
+), objects AS (
+    SELECT id, objekt
+      FROM aktuel
+     UNION ALL
+    SELECT (o ->> 'id') :: uuid, o
+      FROM unnest(as_list_{{ table }}(
+        array(SELECT unnest(%(uuid)s :: uuid[]) EXCEPT SELECT id FROM aktuel),
+        null,
+        %(virkning_tstzrange)s
+      ) :: json[]) o
+)
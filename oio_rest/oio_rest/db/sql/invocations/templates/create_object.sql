@@ -1,7 +1,7 @@
 
 SELECT * from as_create_or_import_{{ class_name|lower }}(
-    {{registration}},
-    {% if uuid != None %} '{{uuid}}' :: uuid {% else %}null{% endif %}{% if restrictions %},
-        {{restrictions}}
-            {% endif %}
+    %(registration)s,
+    %(uuid)s :: uuid{% if restrictions %},
+    auth_criteria_arr => %(restrictions)s
+    {% endif %}
 );
@@ -0,0 +1,5 @@
+SELECT txid, id, objekttype, objekt_id,
+       txid < txid_snapshot_xmin(txid_current_snapshot()) AS settled
+  FROM mox_outbox
+ WHERE (txid, id) > (%(txid)s, %(id)s)
+ ORDER BY txid, id;
@@ -0,0 +1,14 @@
+
+SELECT txid, id, objekttype, objekt_id, livscykluskode, tidspunkt
+  FROM mox_outbox
+ WHERE (txid, id) > (%(txid)s, %(id)s)
+   AND txid < txid_snapshot_xmin(txid_current_snapshot()){% if objekttyper %}
+   AND objekttype = ANY (%(objekttyper)s :: text[]){% endif %}{% if uuids %}
+   AND objekt_id = ANY (%(uuids)s :: uuid[]){% endif %}{% if livscykluskoder %}
+   AND livscykluskode = ANY (%(livscykluskoder)s :: livscykluskode[]){% endif %}{% for objekttype in restricted %}
+   AND (objekttype <> '{{ objekttype }}' OR _as_is_authorized_{{ objekttype }}(
+           objekt_id,
+           %(restrictions_{{ objekttype }})s
+       )){% endfor %}
+ ORDER BY txid, id
+ LIMIT %(limit)s;
@@ -0,0 +1,10 @@
+{% set table = class_name|lower -%}
+SELECT a.{{ table }}_id,
+       a.objekt,
+       CASE WHEN isfinite(upper(a.virkning))
+            THEN extract(epoch FROM upper(a.virkning))
+       END
+  FROM {{ table }}_aktuel a
+ WHERE a.{{ table }}_id = ANY (%(uuid)s :: uuid[])
+   AND a.virkning @> now()
+   AND a.tidszone = current_setting('TimeZone');
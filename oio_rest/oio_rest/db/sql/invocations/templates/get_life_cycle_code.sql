@@ -0,0 +1,6 @@
+
+SELECT (b.registrering).livscykluskode
+  FROM {{ class_name|lower }}_registrering b
+ WHERE b.{{ class_name|lower }}_id = %(uuid)s :: uuid
+ ORDER BY lower((b.registrering).timeperiod) DESC
+ LIMIT 1;
@@ -0,0 +1,16 @@
+SELECT coalesce(bool_and(
+           c.id IS NOT NULL
+           AND (c.registrering).timeperiod >> %(registrering_tstzrange)s
+       ), FALSE),
+       current_setting('TimeZone'),
+       array(
+           SELECT b.id || ' ' || (b.registrering).timeperiod :: text
+             FROM {{ class_name|lower }}_registrering b
+            WHERE b.{{ class_name|lower }}_id = ANY (%(uuid)s::uuid[])
+              AND (b.registrering).timeperiod && %(registrering_tstzrange)s
+            ORDER BY b.id
+       )
+  FROM unnest(%(uuid)s::uuid[]) u(id)
+  LEFT JOIN {{ class_name|lower }}_registrering c
+    ON c.{{ class_name|lower }}_id = u.id
+   AND upper((c.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
@@ -0,0 +1,6 @@
+-- Registrations are timed after their transaction has written, so none
+-- may yet appear before the start of the oldest transaction that has.
+SELECT coalesce(min(xact_start), clock_timestamp())
+  FROM pg_stat_activity
+ WHERE datname = current_database()
+   AND backend_xid IS NOT NULL;
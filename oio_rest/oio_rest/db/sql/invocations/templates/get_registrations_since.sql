@@ -0,0 +1,23 @@
+
+WITH page AS (
+    SELECT b.id,
+           b.{{ class_name|lower }}_id AS uuid,
+           (b.registrering).livscykluskode,
+           lower((b.registrering).timeperiod) AS registreringstid
+      FROM {{ class_name|lower }}_registrering b
+     WHERE (lower((b.registrering).timeperiod), b.id)
+           > (%(since)s :: timestamptz, %(after_id)s)
+       -- registrations of transactions still running may yet appear
+       -- before the others; leave them for the next page
+       AND lower((b.registrering).timeperiod) < %(horizon)s :: timestamptz
+     ORDER BY lower((b.registrering).timeperiod), b.id
+     LIMIT %(limit)s
+)
+SELECT id, uuid, livscykluskode, registreringstid, {% if restrictions %}
+       _as_is_authorized_{{ class_name|lower }}(
+           uuid,
+           %(restrictions)s
+       ){% else %}
+       true{% endif %} AS allowed
+  FROM page
+ ORDER BY registreringstid, id;
@@ -0,0 +1,14 @@
+{% if current %}
+{% include '_aktuel_objects.sql' %}
+SELECT a.objekt
+  FROM objects a
+ ORDER BY a.id;
+{% else %}
+SELECT  unnest(as_list_{{ class_name | lower }}(
+    %(uuid)s::uuid[],
+    %(registrering_tstzrange)s,
+    %(virkning_tstzrange)s{% if restrictions %},
+    auth_criteria_arr => %(restrictions)s
+    {% endif %}
+    ) :: json[]);
+{% endif %}
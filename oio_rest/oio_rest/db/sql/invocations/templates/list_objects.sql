@@ -1,7 +1,13 @@
+{% if current %}
+{% include '_aktuel_objects.sql' %}
+SELECT array_agg(a.objekt ORDER BY a.id)
+  FROM objects a;
+{% else %}
 SELECT  as_list_{{ class_name | lower }}(
     %(uuid)s::uuid[],
     %(registrering_tstzrange)s,
     %(virkning_tstzrange)s{% if restrictions %},
-        {{restrictions}}
-            {% endif %}
+    auth_criteria_arr => %(restrictions)s
+    {% endif %}
     ) :: json[];
+{% endif %}
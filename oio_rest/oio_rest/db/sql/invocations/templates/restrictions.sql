@@ -1,6 +0,0 @@
-    -- restrictions
-    ARRAY[
-    {% for r in restrictions %}
-    {{ r }}{% if not loop.last %},{% endif %}
-    {% endfor %}
-    ]
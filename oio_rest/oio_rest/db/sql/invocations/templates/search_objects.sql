@@ -1,13 +1,25 @@
-
-SELECT to_json(a.*) from as_search_{{ class_name|lower }}(
-    {{first_result|adapt}},
-    {{uuid|adapt}}::uuid,
-    {{registration}},
-    {{virkning_soeg|adapt}},
-    {{max_results|adapt}},
-    {{any_attr_value_arr|adapt}} :: text[],
-    {{any_rel_uuid_arr|adapt}} :: uuid[]{% if restrictions %},
-    {{restrictions}}
+WITH params AS (
+    SELECT %(registration)s :: {{ class_name|lower }}registreringtype AS registration,
+           %(virkning_soeg)s :: tstzrange AS virkning_soeg
+)
+SELECT to_json(a.*){% if paged %},
+    _as_sort_key_{{ class_name|lower }}(
+        (a)[array_upper(a, 1)],
+        p.virkning_soeg,
+        p.registration
+    ){% endif %}
+FROM params p, as_search_{{ class_name|lower }}(
+    %(first_result)s,
+    %(uuid)s::uuid,
+    p.registration,
+    p.virkning_soeg,
+    %(max_results)s,
+    %(any_attr_value_arr)s :: text[],
+    %(any_rel_uuid_arr)s :: uuid[]{% if restrictions %},
+    auth_criteria_arr => %(restrictions)s
+    {% endif %}{% if after %},
+    afterSortKey => %(after_sort_key)s :: text[],
+    afterUuid => %(after_uuid)s :: uuid
     {% endif %}
 
 ) a;
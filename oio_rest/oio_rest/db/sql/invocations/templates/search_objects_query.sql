@@ -0,0 +1,466 @@
+{#-
+  The search of as_search_<class>, as a single query: each criterion is
+  a subquery of the objects meeting it, and the result is their
+  intersection. The criteria are read from the registration by their
+  position in its arrays. The registration and virkning period are
+  bound once, as the row of params, rather than for each use.
+-#}
+{%- set class = class_name|lower %}
+{%- set compiled = get_registry()[class_name] %}
+{%- set reg = '(p.registration)' %}
+{%- set virkning_soeg = 'p.virkning_soeg' %}
+
+{%- macro filter_reg() %}
+    (
+        ({{ reg }}.registrering) IS NULL
+        OR
+        (
+            (
+                ({{ reg }}.registrering).timeperiod IS NULL
+                OR
+                ({{ reg }}.registrering).timeperiod && (b.registrering).timeperiod
+            )
+            AND
+            (
+                ({{ reg }}.registrering).livscykluskode IS NULL
+                OR
+                ({{ reg }}.registrering).livscykluskode = (b.registrering).livscykluskode
+            )
+            AND
+            (
+                ({{ reg }}.registrering).brugerref IS NULL
+                OR
+                ({{ reg }}.registrering).brugerref = (b.registrering).brugerref
+            )
+            AND
+            (
+                ({{ reg }}.registrering).note IS NULL
+                OR
+                (b.registrering).note ILIKE ({{ reg }}.registrering).note
+            )
+        )
+    )
+    AND
+    (
+        (
+            (b.registrering).livscykluskode <> 'Slettet'::Livscykluskode
+            AND
+            (
+                ({{ reg }}.registrering) IS NULL
+                OR
+                ({{ reg }}.registrering).livscykluskode IS NULL
+            )
+        )
+        OR
+        (
+            NOT (({{ reg }}.registrering) IS NULL)
+            AND
+            ({{ reg }}.registrering).livscykluskode IS NOT NULL
+        )
+    )
+    AND
+    (
+        (
+            (
+                ({{ reg }}.registrering) IS NULL
+                OR
+                ({{ reg }}.registrering).timeperiod IS NULL
+            )
+            AND
+            upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ
+        )
+        OR
+        (
+            NOT (({{ reg }}.registrering) IS NULL)
+            AND
+            ({{ reg }}.registrering).timeperiod IS NOT NULL
+        )
+    )
+{%- endmacro %}
+
+{%- macro filter_virkning(obj) %}
+    (
+        ({{ obj }}).virkning IS NULL
+        OR
+        (
+            (
+                (({{ obj }}).virkning).TimePeriod IS NULL
+                OR
+                (({{ obj }}).virkning).TimePeriod && (a.virkning).TimePeriod
+            )
+            AND
+            (
+                (({{ obj }}).virkning).AktoerRef IS NULL
+                OR
+                (({{ obj }}).virkning).AktoerRef = (a.virkning).AktoerRef
+            )
+            AND
+            (
+                (({{ obj }}).virkning).AktoerTypeKode IS NULL
+                OR
+                (({{ obj }}).virkning).AktoerTypeKode = (a.virkning).AktoerTypeKode
+            )
+            AND
+            (
+                (({{ obj }}).virkning).NoteTekst IS NULL
+                OR
+                (a.virkning).NoteTekst ILIKE (({{ obj }}).virkning).NoteTekst
+            )
+        )
+    )
+    AND
+    (
+        NOT (({{ obj }}).virkning IS NULL OR (({{ obj }}).virkning).TimePeriod IS NULL)
+        OR
+        {{ virkning_soeg }} IS NULL
+        OR
+        {{ virkning_soeg }} && (a.virkning).TimePeriod
+    )
+{%- endmacro %}
+
+{%- macro match_optional(value, column, op='=') %}
+    (
+        {{ value }} IS NULL
+        OR
+        {{ column }} {{ op }} {{ value }}
+    )
+{%- endmacro %}
+
+{%- macro search_attribute(attribut, i, soegeord) %}
+    {%- set obj = '((' ~ reg ~ '.attr' ~ attribut ~ ')[' ~ i ~ '])' %}
+    SELECT b.{{ class }}_id
+      FROM {{ class }}_attr_{{ attribut }} a
+      JOIN {{ class }}_registrering b ON a.{{ class }}_registrering_id = b.id
+     CROSS JOIN params p
+     WHERE
+    {{- filter_virkning(obj) }}
+    {%- for field in compiled.attributes[attribut] %}
+        {%- set type = compiled.attribute_metadata.get(attribut, {}).get(field, {}).get('type') %}
+        {%- if type == "soegeord" %}
+        {%- elif type == "text[]" %}
+    AND
+    (
+        {{ obj }}.{{ field }} IS NULL
+        OR
+        _as_search_match_array({{ obj }}.{{ field }}, a.{{ field }})
+    )
+        {%- elif type == "offentlighedundtagettype" %}
+    AND
+    (
+        {{ obj }}.{{ field }} IS NULL
+        OR
+        (
+            {{- match_optional('(' ~ obj ~ '.' ~ field ~ ').AlternativTitel', '(a.' ~ field ~ ').AlternativTitel', 'ILIKE') }}
+            AND
+            {{- match_optional('(' ~ obj ~ '.' ~ field ~ ').Hjemmel', '(a.' ~ field ~ ').Hjemmel', 'ILIKE') }}
+        )
+    )
+        {%- elif type %}
+    AND
+    {{- match_optional(obj ~ '.' ~ field, 'a.' ~ field) }}
+        {%- else %}
+    AND
+    {{- match_optional(obj ~ '.' ~ field, 'a.' ~ field, 'ILIKE') }}
+        {%- endif %}
+    {%- endfor %}
+    {%- if soegeord %}
+    AND
+    (
+        {{ soegeord }} IS NULL
+        OR
+        EXISTS (
+        SELECT 1
+          FROM klasse_attr_egenskaber_soegeord c
+         WHERE c.klasse_attr_egenskaber_id = a.id
+           AND
+           {{- match_optional(soegeord ~ '.soegeordidentifikator', 'c.soegeordidentifikator', 'ILIKE') }}
+           AND
+           {{- match_optional(soegeord ~ '.beskrivelse', 'c.beskrivelse', 'ILIKE') }}
+           AND
+           {{- match_optional(soegeord ~ '.soegeordskategori', 'c.soegeordskategori', 'ILIKE') }}
+        )
+    )
+    {%- endif %}
+    AND
+    {{- filter_reg() }}
+{%- endmacro %}
+
+{%- macro search_state(tilstand, i) %}
+    {%- set obj = '((' ~ reg ~ '.tils' ~ tilstand ~ ')[' ~ i ~ '])' %}
+    SELECT b.{{ class }}_id
+      FROM {{ class }}_tils_{{ tilstand }} a
+      JOIN {{ class }}_registrering b ON a.{{ class }}_registrering_id = b.id
+     CROSS JOIN params p
+     WHERE
+    {{- filter_virkning(obj) }}
+    AND
+    {{- match_optional(obj ~ '.' ~ tilstand, 'a.' ~ tilstand) }}
+    AND
+    {{- filter_reg() }}
+{%- endmacro %}
+
+{%- macro search_relation(i) %}
+    {%- set obj = '((' ~ reg ~ '.relationer)[' ~ i ~ '])' %}
+    SELECT b.{{ class }}_id
+      FROM {{ class }}_relation a
+      JOIN {{ class }}_registrering b ON a.{{ class }}_registrering_id = b.id
+     CROSS JOIN params p
+     WHERE
+    {{- filter_virkning(obj) }}
+    AND
+    {{- match_optional(obj ~ '.relType', 'a.rel_type') }}
+    AND
+    {{- match_optional(obj ~ '.uuid', 'a.rel_maal_uuid') }}
+    AND
+    {{- match_optional(obj ~ '.objektType', 'a.objekt_type') }}
+    AND
+    {{- match_optional(obj ~ '.urn', 'a.rel_maal_urn') }}
+    {%- if class in ("aktivitet", "indsats", "sag", "tilstand") %}
+    AND
+    {{- match_optional(obj ~ '.indeks', 'a.rel_index') }}
+    {%- endif %}
+    {%- if class == "sag" %}
+    AND
+    {{- match_optional(obj ~ '.relTypeSpec', 'a.rel_type_spec') }}
+    AND
+    (
+        {{ obj }}.journalNotat IS NULL
+        OR
+        (
+            {{- match_optional('(' ~ obj ~ '.journalNotat).titel', '(a.journal_notat).titel', 'ILIKE') }}
+            AND
+            {{- match_optional('(' ~ obj ~ '.journalNotat).notat', '(a.journal_notat).notat', 'ILIKE') }}
+            AND
+            {{- match_optional('(' ~ obj ~ '.journalNotat).format', '(a.journal_notat).format', 'ILIKE') }}
+        )
+    )
+    AND
+    (
+        {{ obj }}.journalDokumentAttr IS NULL
+        OR
+        (
+            {{- match_optional('(' ~ obj ~ '.journalDokumentAttr).dokumenttitel', '(a.journal_dokument_attr).dokumenttitel', 'ILIKE') }}
+            AND
+            (
+                ({{ obj }}.journalDokumentAttr).offentlighedundtaget IS NULL
+                OR
+                (
+                    {{- match_optional('((' ~ obj ~ '.journalDokumentAttr).offentlighedundtaget).AlternativTitel', '((a.journal_dokument_attr).offentlighedundtaget).AlternativTitel', 'ILIKE') }}
+                    AND
+                    {{- match_optional('((' ~ obj ~ '.journalDokumentAttr).offentlighedundtaget).Hjemmel', '((a.journal_dokument_attr).offentlighedundtaget).Hjemmel', 'ILIKE') }}
+                )
+            )
+        )
+    )
+    {%- elif class == "aktivitet" %}
+    AND
+    (
+        {{ obj }}.aktoerAttr IS NULL
+        OR
+        (
+            {{- match_optional('(' ~ obj ~ '.aktoerAttr).obligatorisk', '(a.aktoer_attr).obligatorisk') }}
+            AND
+            {{- match_optional('(' ~ obj ~ '.aktoerAttr).accepteret', '(a.aktoer_attr).accepteret') }}
+            AND
+            {{- match_optional('(' ~ obj ~ '.aktoerAttr).repraesentation_uuid', '(a.aktoer_attr).repraesentation_uuid') }}
+            AND
+            {{- match_optional('(' ~ obj ~ '.aktoerAttr).repraesentation_urn', '(a.aktoer_attr).repraesentation_urn') }}
+        )
+    )
+    {%- elif class == "tilstand" %}
+    AND
+    (
+        {{ obj }}.tilstandsVaerdiAttr IS NULL
+        OR
+        (
+            {{- match_optional('(' ~ obj ~ '.tilstandsVaerdiAttr).nominelVaerdi', '(a.tilstand_vaerdi_attr).nominelVaerdi', 'ILIKE') }}
+            AND
+            {{- match_optional('(' ~ obj ~ '.tilstandsVaerdiAttr).forventet', '(a.tilstand_vaerdi_attr).forventet') }}
+        )
+    )
+    {%- endif %}
+    AND
+    {{- filter_reg() }}
+{%- endmacro %}
+
+{%- macro search_any_attr(i) %}
+    {%- set value = '(%(any_attr_value_arr)s :: text[])[' ~ i ~ ']' %}
+    {%- for attribut, fields in compiled.attributes.items() %}
+    {%- if not loop.first %}
+    UNION
+    {%- endif %}
+    SELECT b.{{ class }}_id
+      FROM {{ class }}_attr_{{ attribut }} a
+      JOIN {{ class }}_registrering b ON a.{{ class }}_registrering_id = b.id
+     CROSS JOIN params p
+     WHERE
+    (
+        (
+            _as_search_text_{{ class }}_attr_{{ attribut }}(a) ILIKE '%%' || {{ value }} || '%%'
+            AND
+            (
+                FALSE
+            {%- for field in fields %}
+                {%- set type = compiled.attribute_metadata.get(attribut, {}).get(field, {}).get('type') %}
+                {%- if not type %}
+                OR a.{{ field }} ILIKE {{ value }}
+                {%- elif type == "text[]" %}
+                OR _as_search_ilike_array({{ value }}, a.{{ field }})
+                {%- elif type == "offentlighedundtagettype" %}
+                OR (a.{{ field }}).Hjemmel ILIKE {{ value }}
+                OR (a.{{ field }}).AlternativTitel ILIKE {{ value }}
+                {%- elif type not in ("boolean", "soegeord", "timestamptz") %}
+                OR a.{{ field }}::text ILIKE {{ value }}
+                {%- endif %}
+            {%- endfor %}
+            )
+        )
+        {%- for field in fields %}
+        {%- if compiled.attribute_metadata.get(attribut, {}).get(field, {}).get('type') == "timestamptz" %}
+        OR
+        a.{{ field }}::text ILIKE {{ value }}
+        {%- endif %}
+        {%- endfor %}
+    )
+    AND
+    (
+        {{ virkning_soeg }} IS NULL
+        OR
+        {{ virkning_soeg }} && (a.virkning).TimePeriod
+    )
+    AND
+    {{- filter_reg() }}
+    {%- if class == "klasse" %}
+    UNION
+    SELECT b.klasse_id
+      FROM klasse_attr_egenskaber a
+      JOIN klasse_registrering b ON a.klasse_registrering_id = b.id
+      JOIN klasse_attr_egenskaber_soegeord c ON a.id = c.klasse_attr_egenskaber_id
+     CROSS JOIN params p
+     WHERE
+    (
+        c.soegeordidentifikator ILIKE {{ value }}
+        OR
+        c.beskrivelse ILIKE {{ value }}
+        OR
+        c.soegeordskategori ILIKE {{ value }}
+    )
+    AND
+    (
+        {{ virkning_soeg }} IS NULL
+        OR
+        {{ virkning_soeg }} && (a.virkning).TimePeriod
+    )
+    AND
+    {{- filter_reg() }}
+    {%- endif %}
+    {%- endfor %}
+{%- endmacro %}
+
+{%- macro search_any_uuid(i) %}
+    {%- set value = '(%(any_rel_uuid_arr)s :: uuid[])[' ~ i ~ ']' %}
+    SELECT b.{{ class }}_id
+      FROM {{ class }}_relation a
+      JOIN {{ class }}_registrering b ON a.{{ class }}_registrering_id = b.id
+     CROSS JOIN params p
+     WHERE
+    {%- if class == "aktivitet" %}
+    (
+        a.rel_maal_uuid = {{ value }}
+        OR
+        (a.aktoer_attr).repraesentation_uuid = {{ value }}
+    )
+    {%- else %}
+    a.rel_maal_uuid = {{ value }}
+    {%- endif %}
+    AND
+    (
+        {{ virkning_soeg }} IS NULL
+        OR
+        {{ virkning_soeg }} && (a.virkning).TimePeriod
+    )
+    AND
+    {{- filter_reg() }}
+{%- endmacro %}
+
+WITH params AS (
+    SELECT %(registration)s :: {{ class_name }}RegistreringType AS registration,
+           %(virkning_soeg)s :: tstzrange AS virkning_soeg
+), candidates AS (
+    SELECT b.{{ class }}_id
+      FROM {{ class }}_registrering b
+     CROSS JOIN params p
+     WHERE
+    {%- if uuid %}
+    b.{{ class }}_id = %(uuid)s :: uuid
+    AND
+    {%- endif %}
+    {{- filter_reg() }}
+{%- for attribut, soegeord in attributes %}
+{%- for count in soegeord %}
+{%- set i = loop.index %}
+{%- if count > 1 %}
+{%- for j in range(1, count + 1) %}
+    INTERSECT
+    {{- search_attribute(attribut, i, '(((' ~ reg ~ '.attr' ~ attribut ~ ')[' ~ i ~ ']).soegeord[' ~ j ~ '])') }}
+{%- endfor %}
+{%- else %}
+    INTERSECT
+    {{- search_attribute(attribut, i, '(((' ~ reg ~ '.attr' ~ attribut ~ ')[' ~ i ~ ']).soegeord[1])' if count else None) }}
+{%- endif %}
+{%- endfor %}
+{%- endfor %}
+{%- for tilstand, count in states %}
+{%- for i in range(1, count + 1) %}
+    INTERSECT
+    {{- search_state(tilstand, i) }}
+{%- endfor %}
+{%- endfor %}
+{%- for i in range(1, relations + 1) %}
+    INTERSECT
+    {{- search_relation(i) }}
+{%- endfor %}
+{%- for i in range(1, any_attr + 1) %}
+    INTERSECT
+    (
+    {{- search_any_attr(i) }}
+    )
+{%- endfor %}
+{%- for i in range(1, any_uuid + 1) %}
+    INTERSECT
+    {{- search_any_uuid(i) }}
+{%- endfor %}
+), found AS (
+    SELECT array(
+        SELECT {{ class }}_id
+          FROM candidates{% if restrictions %}
+         WHERE _as_is_authorized_{{ class }}(
+             {{ class }}_id,
+             %(restrictions)s
+         ){% endif %}
+    ) AS uuids
+)
+SELECT to_json(s.uuids){% if paged %},
+    _as_sort_key_{{ class }}(
+        s.uuids[array_upper(s.uuids, 1)],
+        {{ virkning_soeg }},
+        {{ reg }}
+    ){% endif %}
+FROM (
+    SELECT CASE
+           WHEN %(first_result)s > 0
+             OR %(max_results)s < 2147483647{% if after %}
+             OR TRUE{% endif %}
+           THEN _as_sorted_{{ class }}(
+               uuids,
+               {{ virkning_soeg }},
+               {{ reg }},
+               %(first_result)s,
+               %(max_results)s{% if after %},
+               %(after_sort_key)s :: text[],
+               %(after_uuid)s :: uuid{% endif %}
+           )
+           ELSE uuids
+           END AS uuids
+      FROM found, params p
+) s, params p;
@@ -1,24 +1,24 @@
 
 SELECT * from as_update_{{ class_name|lower }}(
-    {{ uuid|adapt }} :: uuid,
-    {{ user_ref|adapt }} :: uuid,
-    {{ note|adapt }},
-    {{ life_cycle_code|adapt }} ::livscykluskode,
+    %(uuid)s :: uuid,
+    %(user_ref)s :: uuid,
+    %(note)s,
+    %(life_cycle_code)s ::livscykluskode,
     -- attributes
-    {% for attribute_array in attributes -%}
-    {{ attribute_array }},
+    {% for i in range(attribute_count) -%}
+    %(attribute_{{ i }})s,
     {% endfor %}
     -- states
-    {% for state_array in states -%}
-    {{ state_array }},
+    {% for i in range(state_count) -%}
+    %(state_{{ i }})s,
     {% endfor -%}
     -- relations
-    {{ relations }}
+    %(relations)s
     {% if variants -%},
     -- variants
-    {{ variants }}
+    %(variants)s
     {% endif -%}
     {% if restrictions -%},
-        {{restrictions}}
-            {% endif %}
+    auth_criteria_arr => %(restrictions)s
+    {% endif %}
 );
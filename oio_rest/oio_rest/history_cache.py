@@ -0,0 +1,364 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Cache of objects listed as they were registered in the past.
+
+Registrations are never changed once a newer one has replaced them, so
+listing objects for a registration period that has passed always gives
+the same result. Such listings are kept here, keyed by the request, the
+restrictions of the user and the registrations it covers.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from . import db
+from .auth.restrictions import Operation, get_restrictions
+from .authentication import get_authenticated_user
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryCache(object):
+    """Remember encoded responses by key.
+
+    At most ``maxsize`` bytes of responses are kept in memory, discarding
+    the least recently used ones first. Given a ``directory``, responses
+    are also written there, so that they survive restarts and may be
+    shared by the processes of a server. Responses missing from memory
+    are looked up in the directory, and reading one marks it as recently
+    used by touching the file.
+
+    The directory holds about ``directory_size`` bytes of responses at
+    most, counting those written by every process. Each process adds the
+    files it writes to the size of the directory as of its last scan.
+    Once that exceeds the limit, it scans the directory again and
+    discards the least recently used files, until they take up no more
+    than ``1 - EVICTION_SLACK`` of the limit, so that scans are rare.
+    Files are read and written without holding the lock of the cache,
+    and failing to write one is only logged. The cache keeps counters of
+    its usage, available through :meth:`stats`.
+    """
+
+    # the fraction of the directory freed by evicting files
+    EVICTION_SLACK = 0.1
+
+    def __init__(self, maxsize, directory=None, directory_size=0):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.directory_size = directory_size
+
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._files = {}
+        self._files_size = 0
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._evict_files()
+
+    def get(self, key):
+        """Return the response stored for the key, or ``None``."""
+        with self._lock:
+            value = self._entries.get(key)
+
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return value
+
+            if not self.directory:
+                self._misses += 1
+                return None
+
+        path = os.path.join(self.directory, key)
+
+        try:
+            with open(path, 'rb') as fp:
+                value = fp.read()
+        except OSError as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning('failed to read history cache file: %s', e)
+
+            # never written, or evicted by another process
+            with self._lock:
+                if key in self._files:
+                    self._files_size -= self._files.pop(key)
+
+                self._misses += 1
+
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            if key not in self._files:
+                # written by another process
+                self._files[key] = len(value)
+                self._files_size += len(value)
+
+            self._disk_hits += 1
+
+            self._store(key, value)
+
+        return value
+
+    def put(self, key, value):
+        """Store the response for the key."""
+        if not self.maxsize:
+            return
+
+        with self._lock:
+            self._store(key, value)
+
+            if (
+                not self.directory or
+                key in self._files or
+                len(value) > self.directory_size
+            ):
+                return
+
+        self._write_file(key, value)
+
+    def _store(self, key, value):
+        if len(value) > self.maxsize:
+            return
+
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+
+        self._entries[key] = value
+        self._size += len(value)
+
+        while self._size > self.maxsize:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self._evictions += 1
+
+    def _write_file(self, key, value):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.')
+
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    fp.write(value)
+
+                os.replace(tmp_path, os.path.join(self.directory, key))
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            logger.exception('failed to write history cache file')
+            return
+
+        with self._lock:
+            if key not in self._files:
+                self._files[key] = len(value)
+                self._files_size += len(value)
+
+            full = self._files_size > self.directory_size
+
+        if full:
+            self._evict_files()
+
+    def _evict_files(self):
+        """Count the files of the directory anew, discarding the least
+        recently used ones should they exceed the limit."""
+        # one scan at a time is enough
+        if not self._evict_lock.acquire(blocking=False):
+            return
+
+        try:
+            files = []
+
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith('.'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    files.append((stat.st_mtime, entry.name, stat.st_size))
+
+            files.sort()
+            size = sum(file_size for _, _, file_size in files)
+            evicted = 0
+
+            if size > self.directory_size:
+                target = self.directory_size * (1 - self.EVICTION_SLACK)
+
+                while evicted < len(files) and size > target:
+                    _, name, file_size = files[evicted]
+                    evicted += 1
+                    size -= file_size
+
+                    try:
+                        os.unlink(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        pass
+
+            with self._lock:
+                self._files = {
+                    name: file_size
+                    for _, name, file_size in files[evicted:]
+                }
+                self._files_size = size
+        except OSError:
+            logger.exception('failed to evict history cache files')
+        finally:
+            self._evict_lock.release()
+
+    def clear(self):
+        """Forget all responses kept in memory."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Return a dictionary of counters describing cache usage."""
+        with self._lock:
+            return {
+                'max': self.maxsize,
+                'size': self._size,
+                'entries': len(self._entries),
+                'directory_max': self.directory_size if self.directory else 0,
+                'directory_size': self._files_size,
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
+
+
+cache = HistoryCache(settings.HISTORY_CACHE_SIZE,
+                     settings.HISTORY_CACHE_DIRECTORY,
+                     settings.HISTORY_CACHE_DIRECTORY_SIZE)
+
+
+def is_historical(args):
+    """Tell whether the arguments of a request read a registration period
+    that may have passed, for an explicitly given virkning period.
+
+    Without a virkning period, objects are read as they take effect now,
+    which changes over time.
+    """
+    return (
+        bool(args.keys() & {'registrerettil', 'registreringstid'}) and
+        bool(args.keys() & {'virkningfra', 'virkningtil', 'virkningstid'})
+    )
+
+
+def get_key(class_name, uuid, virkning_fra, virkning_til, registreret_fra,
+            registreret_til, registrations):
+    """Return the key of a listing of the given registrations."""
+    if settings.DO_ENABLE_RESTRICTIONS:
+        restrictions = get_restrictions(get_authenticated_user(), class_name,
+                                        Operation.READ)
+    else:
+        restrictions = None
+
+    # serialised like the restrictions of oio_rest.db, so that equal
+    # restrictions give equal keys
+    restrictions = json.dumps(restrictions, sort_keys=True, default=str)
+
+    key = json.dumps([
+        class_name,
+        list(uuid),
+        [str(virkning_fra), str(virkning_til)],
+        [str(registreret_fra), str(registreret_til)],
+        restrictions,
+        registrations,
+    ], sort_keys=True, default=str)
+
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _get_cached(read, class_name, uuid, virkning_fra, virkning_til,
+                registreret_fra, registreret_til):
+    """Return the listing from the cache, or ``None`` if it may not be
+    cached, reading it with ``read`` and storing it on a miss."""
+    if not cache.maxsize:
+        return None
+
+    registrations = db.get_past_registrations(class_name, uuid,
+                                              registreret_fra,
+                                              registreret_til)
+
+    if registrations is None:
+        return None
+
+    key = get_key(class_name, uuid, virkning_fra, virkning_til,
+                  registreret_fra, registreret_til, registrations)
+
+    value = cache.get(key)
+
+    if value is not None:
+        return json.loads(value.decode())
+
+    objects = read(class_name, uuid, virkning_fra, virkning_til,
+                   registreret_fra, registreret_til)
+
+    cache.put(key, json.dumps(objects, separators=(',', ':')).encode())
+
+    return objects
+
+
+def _read_streamed(class_name, uuid, virkning_fra, virkning_til,
+                   registreret_fra, registreret_til):
+    """Read a listing like :func:`oio_rest.db.list_objects`, but through
+    :func:`oio_rest.db.iter_objects`, so as not to use the connection
+    leased for a streaming response."""
+    objects = list(db.iter_objects(class_name, uuid, virkning_fra,
+                                   virkning_til, registreret_fra,
+                                   registreret_til))
+
+    return [objects or None]
+
+
+def list_objects(class_name, uuid, virkning_fra, virkning_til,
+                 registreret_fra, registreret_til):
+    """Like :func:`oio_rest.db.list_objects`, but reading the objects from
+    the cache if the registration period has passed."""
+    objects = _get_cached(db.list_objects, class_name, uuid, virkning_fra,
+                          virkning_til, registreret_fra, registreret_til)
+
+    if objects is None:
+        return db.list_objects(class_name, uuid, virkning_fra, virkning_til,
+                               registreret_fra, registreret_til)
+
+    return objects
+
+
+def iter_objects(class_name, uuid, virkning_fra, virkning_til,
+                 registreret_fra, registreret_til):
+    """Like :func:`oio_rest.db.iter_objects`, but reading the objects from
+    the cache if the registration period has passed."""
+    objects = _get_cached(_read_streamed, class_name, uuid, virkning_fra,
+                          virkning_til, registreret_fra, registreret_til)
+
+    if objects is None:
+        return db.iter_objects(class_name, uuid, virkning_fra, virkning_til,
+                               registreret_fra, registreret_til)
+
+    return iter((objects[0] or []) if objects else [])
@@ -6,11 +6,354 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
-import pika
+import atexit
+import collections
+import glob
 import json
+import logging
+import os
+import threading
+import time
+
+import pika
 
 from . import settings
 
+logger = logging.getLogger(__name__)
+
+# The publisher of this process, created on first use.
+publisher = None
+
+
+class LogPublisher(object):
+    """Publish audit log events to AMQP from a background thread.
+
+    Events are put on a bounded in-memory queue by :meth:`publish`, which
+    returns without waiting for the AMQP server. A single worker thread
+    keeps one connection and channel open, and publishes the queued events
+    in batches of at most ``batch_size``. Each batch is sent in an AMQP
+    transaction, so the worker waits for the server once per batch rather
+    than once per event, and the events only count as published once the
+    server has committed them. Should the connection fail, the batch is
+    put back on the queue and the worker reconnects after ``retry_delay``
+    seconds.
+
+    When the queue holds ``maxsize`` events, ``overflow`` decides what
+    happens to new ones:
+
+    ``block``
+        wait at most ``block_timeout`` seconds for the worker to make
+        room, then discard the oldest queued event;
+    ``drop-oldest``
+        discard the oldest queued event;
+    ``spill``
+        append the event to a file in ``spill_dir``, to be published once
+        the queue has drained.
+
+    The publisher keeps counters of its usage, available through
+    :meth:`stats`.
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop-oldest', 'spill')
+
+    def __init__(self, host, exchange, queue, maxsize=10000, batch_size=100,
+                 overflow='block', spill_dir=None, retry_delay=1.0,
+                 block_timeout=1.0):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(
+                "Invalid overflow policy {!r}, must be one of {}".format(
+                    overflow, ', '.join(self.OVERFLOW_POLICIES),
+                ),
+            )
+
+        if overflow == 'spill' and not spill_dir:
+            raise ValueError("Spilling to disk requires a spill directory")
+
+        self.host = host
+        self.exchange = exchange
+        self.queue = queue
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.spill_dir = spill_dir
+        self.retry_delay = retry_delay
+        self.block_timeout = block_timeout
+
+        self._events = collections.deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._closing = False
+
+        self._connection = None
+        self._channel = None
+
+        self._queued = 0
+        self._published = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._failures = 0
+        self._connects = 0
+
+    def publish(self, body, headers):
+        """Queue an event for publishing.
+
+        ``body`` is the JSON encoded message, and ``headers`` the AMQP
+        headers to send along with it.
+        """
+        event = (body, headers)
+
+        with self._cond:
+            self._start()
+
+            if len(self._events) >= self.maxsize:
+                if self.overflow == 'spill':
+                    self._spill([event])
+                    self._spilled += 1
+                    return
+
+                if self.overflow == 'block':
+                    self._cond.wait_for(
+                        lambda: len(self._events) < self.maxsize,
+                        self.block_timeout,
+                    )
+
+                if len(self._events) >= self.maxsize:
+                    self._events.popleft()
+                    self._dropped += 1
+
+            self._events.append(event)
+            self._queued += 1
+            self._cond.notify_all()
+
+    def close(self, timeout=None):
+        """Stop the worker, waiting at most ``timeout`` seconds for the
+        queue to drain.
+
+        With the ``spill`` policy, events left on the queue are written to
+        disk so another process may publish them.
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+        with self._cond:
+            if self.overflow == 'spill' and self._events:
+                self._spill(self._events)
+                self._spilled += len(self._events)
+                self._events.clear()
+
+        self._disconnect()
+
+    def stats(self):
+        """Return a dictionary of counters describing publisher usage."""
+        with self._cond:
+            return {
+                'max': self.maxsize,
+                'size': len(self._events),
+                'queued': self._queued,
+                'published': self._published,
+                'dropped': self._dropped,
+                'spilled': self._spilled,
+                'failures': self._failures,
+                'connects': self._connects,
+            }
+
+    def _start(self):
+        # the worker doesn't survive a fork, so each process gets its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._connection = self._channel = None
+        self._thread = threading.Thread(
+            target=self._run, name='log-publisher', daemon=True,
+        )
+        self._thread.start()
+
+        atexit.register(self.close, self.retry_delay)
+
+    def _run(self):
+        while True:
+            try:
+                if not self._step():
+                    return
+            except Exception:
+                logger.exception('audit log publisher failed')
+                time.sleep(self.retry_delay)
+
+    def _step(self):
+        """Publish one batch of events, waiting for one if necessary.
+
+        Returns ``False`` when the publisher is closing and all events
+        have been published.
+        """
+        with self._cond:
+            while not self._events:
+                if self.overflow == 'spill' and self._unspill():
+                    break
+
+                if self._closing:
+                    return False
+
+                self._cond.wait(self.retry_delay)
+
+            batch = [
+                self._events.popleft()
+                for _ in range(min(self.batch_size, len(self._events)))
+            ]
+
+            # make room for any blocked callers
+            self._cond.notify_all()
+
+        try:
+            channel = self._get_channel()
+
+            for body, headers in batch:
+                channel.basic_publish(
+                    exchange=self.exchange,
+                    routing_key='',
+                    body=body,
+                    properties=pika.BasicProperties(
+                        content_type='application/json',
+                        delivery_mode=2,
+                        headers=headers,
+                    ),
+                )
+
+            channel.tx_commit()
+
+        except Exception:
+            logger.exception('failed to publish audit log events')
+
+            # nothing was committed, so the whole batch goes back
+            self._disconnect()
+
+            with self._cond:
+                self._failures += 1
+                self._events.extendleft(reversed(batch))
+
+                if self._closing:
+                    return False
+
+            time.sleep(self.retry_delay)
+
+        else:
+            with self._cond:
+                self._published += len(batch)
+
+        return True
+
+    def _get_channel(self):
+        if self._channel is None or self._channel.is_closed:
+            self._disconnect()
+
+            self._connection = pika.BlockingConnection(
+                pika.ConnectionParameters(host=self.host),
+            )
+            self._connects += 1
+
+            channel = self._connection.channel()
+            channel.queue_declare(queue=self.queue)
+            channel.exchange_declare(exchange=self.exchange,
+                                     exchange_type='fanout')
+            channel.queue_bind(self.queue, exchange=self.exchange)
+            channel.tx_select()
+
+            self._channel = channel
+
+        return self._channel
+
+    def _disconnect(self):
+        connection = self._connection
+        self._connection = self._channel = None
+
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _spill(self, events):
+        path = os.path.join(
+            self.spill_dir, 'log-spill-{}.jsonl'.format(os.getpid()),
+        )
+
+        with open(path, 'a') as fp:
+            for body, headers in events:
+                fp.write(json.dumps({'body': body, 'headers': headers}))
+                fp.write('\n')
+
+    def _unspill(self):
+        """Move events spilled by any process back onto the queue.
+
+        A file is claimed by renaming it, so that only one process reads
+        it; anything beyond the size of the queue is spilled again.
+        Returns whether any events were found.
+        """
+        pattern = os.path.join(self.spill_dir, 'log-spill-*.jsonl')
+
+        for path in glob.glob(pattern):
+            claimed = '{}.{}'.format(path, os.getpid())
+
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+
+            events = []
+
+            with open(claimed) as fp:
+                for line in fp:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        logger.warning('skipping malformed spilled event')
+                        continue
+
+                    events.append((event['body'], event['headers']))
+
+            room = max(self.maxsize - len(self._events), 0)
+
+            self._events.extend(events[:room])
+
+            if events[room:]:
+                self._spill(events[room:])
+
+            os.unlink(claimed)
+
+            if events:
+                return True
+
+        return False
+
+
+def get_publisher():
+    """Return the audit log publisher, creating it on first use."""
+    global publisher
+
+    if publisher is None:
+        publisher = LogPublisher(
+            settings.LOG_AMQP_SERVER,
+            settings.MOX_LOG_EXCHANGE,
+            settings.MOX_LOG_QUEUE,
+            maxsize=settings.LOG_QUEUE_SIZE,
+            batch_size=settings.LOG_BATCH_SIZE,
+            overflow=settings.LOG_OVERFLOW,
+            spill_dir=settings.LOG_SPILL_DIR,
+            block_timeout=settings.LOG_BLOCK_TIMEOUT,
+        )
+
+    return publisher
+
+
+def get_publisher_stats():
+    """Return usage counters for the audit log publisher."""
+    return publisher.stats() if publisher is not None else None
+
 
 def log_service_call(service_name, class_name, time,
                      operation, return_code, msg, note, user_uuid, role,
@@ -80,33 +423,12 @@ def log_service_call(service_name, class_name, time,
 
     # TODO: Get auth token if auth enabled
 
-    # Send AMQP message to LOG_SERVICE_URL
-
-    if settings.LOG_AMQP_SERVER:
-        connection = pika.BlockingConnection(pika.ConnectionParameters(
-            host=settings.LOG_AMQP_SERVER
-        ))
-        channel = connection.channel()
-        channel.queue_declare(queue=settings.MOX_LOG_QUEUE)
-        channel.exchange_declare(exchange=settings.MOX_LOG_EXCHANGE,
-                                 exchange_type='fanout')
-        channel.queue_bind(settings.MOX_LOG_QUEUE,
-                           exchange=settings.MOX_LOG_EXCHANGE)
-
-        message = json.dumps(logevent_dict)
-        # print "Log exchange", LOG_EXCHANGE
-
-        channel.basic_publish(
-            exchange=settings.MOX_LOG_EXCHANGE,
-            routing_key='',
-            body=message,
-            properties=pika.BasicProperties(
-                content_type='application/json',
-                delivery_mode=2,
-                headers={
-                    'beskedversion': "1",
-                    'beskedID': object_uuid,
-                    'objekttype': 'LogHaendelse',
-                    'operation': 'create',
-                }
-            ))
+    get_publisher().publish(
+        json.dumps(logevent_dict),
+        {
+            'beskedversion': "1",
+            'beskedID': object_uuid,
+            'objekttype': 'LogHaendelse',
+            'operation': 'create',
+        },
+    )
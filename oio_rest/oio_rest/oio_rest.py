@@ -7,22 +7,27 @@
 
 """Superclasses for OIO objects and object hierarchies."""
 
+import base64
+import binascii
 import json
 import datetime
 
 import dateutil
 import jsonschema
-from flask import jsonify, request
+from flask import current_app, jsonify, request, stream_with_context
+from flask.json import dumps as json_dumps
 
 from werkzeug.datastructures import ImmutableOrderedMultiDict
 
 from . import db
 from .db import db_helpers
+from . import current_cache
+from . import history_cache
 from . import validate
 from .utils.build_registration import build_registration, to_lower_param
-from .utils.build_registration import split_param
+from .utils.build_registration import is_uuid, split_param
 from .custom_exceptions import BadRequestException, NotFoundException
-from .custom_exceptions import GoneException
+from .custom_exceptions import GoneException, OIOFlaskException
 
 # Just a helper during debug
 from .authentication import requires_auth
@@ -34,6 +39,7 @@ from . import settings
 GENERAL_SEARCH_PARAMS = frozenset({
     'brugerref',
     'foersteresultat',
+    'fortsaettelse',
     'livscykluskode',
     'maximalantalresultater',
     'notetekst',
@@ -55,6 +61,18 @@ TEMPORALITY_PARAMS = frozenset({
     'virkningstid',
 })
 
+'''List of parameters allowed for listing changes.'''
+CHANGES_PARAMS = frozenset({
+    'maximalantalresultater',
+    'since',
+})
+
+'''List of parameters allowed for bulk operations.'''
+BULK_PARAMS = frozenset({
+    'atomic',
+    'batchsize',
+})
+
 '''Some operations take no arguments; this makes it explicit.
 
 '''
@@ -85,6 +103,22 @@ def typed_get(d, field, default):
     return v
 
 
+def error_to_dict(error):
+    """Describe why a single object of a bulk operation failed."""
+    if isinstance(error, jsonschema.exceptions.ValidationError):
+        return {'status': 400, 'message': error.message}
+    elif isinstance(error, OIOFlaskException):
+        return dict(error.to_dict(), status=error.status_code)
+    else:
+        # a database error, reported as by app.handle_db_error()
+        return {
+            'status': 400,
+            'message': error.diag.message_primary,
+            'context': (error.diag.context or
+                        error.pgerror.split('\n', 1)[-1]),
+        }
+
+
 def get_virkning_dates(args):
     virkning_fra = args.get('virkningfra')
     virkning_til = args.get('virkningtil')
@@ -127,6 +161,122 @@ def get_registreret_dates(args):
     return registreret_fra, registreret_til
 
 
+def close_iterator(iterator):
+    """Close the iterator, if it holds anything to give back."""
+    close = getattr(iterator, 'close', None)
+
+    if close is not None:
+        close()
+
+
+def stream_results(objects):
+    """Return a response with the objects as ``{"results": [objects]}``.
+
+    The body is the same as :func:`flask.jsonify` gives, but each object
+    is encoded and sent as it is consumed from the iterator rather than
+    all at once. The iterator is closed once the response is, whether or
+    not it was read, so that any connection it holds is given back.
+    """
+    if current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug:
+        try:
+            objects = list(objects)
+        finally:
+            close_iterator(objects)
+
+        return jsonify({'results': [objects] if objects else []})
+
+    def generate():
+        try:
+            obj = next(objects, None)
+
+            if obj is None:
+                yield '{"results":[]}\n'
+                return
+
+            yield '{"results":[[' + json_dumps(obj, separators=(',', ':'))
+
+            for obj in objects:
+                yield ',' + json_dumps(obj, separators=(',', ':'))
+
+            yield ']]}\n'
+        finally:
+            close_iterator(objects)
+
+    response = current_app.response_class(
+        stream_with_context(generate()),
+        mimetype=current_app.config['JSONIFY_MIMETYPE'],
+    )
+
+    # closing the generator above does nothing unless it has started
+    response.call_on_close(lambda: close_iterator(objects))
+
+    return response
+
+
+def _encode_token(value):
+    token = json.dumps(value, separators=(',', ':'))
+
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip('=')
+
+
+def _decode_token(token):
+    padding = '=' * (-len(token) % 4)
+
+    return json.loads(base64.urlsafe_b64decode(token + padding).decode())
+
+
+def encode_continuation(sort_key, uuid):
+    """Return an opaque token for resuming a paged search after the object
+    with the given sort key and UUID."""
+    return _encode_token([sort_key, uuid])
+
+
+def decode_continuation(token):
+    """Return the ``(sort_key, uuid)`` pair encoded in a token from
+    :func:`encode_continuation`."""
+    try:
+        sort_key, uuid = _decode_token(token)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise BadRequestException("Invalid 'fortsaettelse' token")
+
+    valid_key = sort_key is None or (
+        isinstance(sort_key, list) and
+        all(k is None or isinstance(k, str) for k in sort_key)
+    )
+
+    if not valid_key or not isinstance(uuid, str) or not is_uuid(uuid):
+        raise BadRequestException("Invalid 'fortsaettelse' token")
+
+    return sort_key, uuid
+
+
+def encode_change_position(registration_time, registration_id):
+    """Return an opaque token for listing the registrations started after
+    the one with the given start and ID."""
+    return _encode_token([registration_time, registration_id])
+
+
+def decode_change_position(since):
+    """Return the ``(registration_time, registration_id)`` position given
+    by the ``since`` parameter of a change listing.
+
+    The parameter is either a token from :func:`encode_change_position`
+    or a timestamp, which includes all registrations started at that time.
+    """
+    try:
+        registration_time, registration_id = _decode_token(since)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return since, 0
+
+    if (
+        not isinstance(registration_time, str) or
+        not isinstance(registration_id, int)
+    ):
+        raise BadRequestException("Invalid 'since' token")
+
+    return registration_time, registration_id
+
+
 class ArgumentDict(ImmutableOrderedMultiDict):
     '''
     A Werkzeug multi dict that maintains the order, and maps alias
@@ -260,6 +410,127 @@ class OIORestObject(object):
         request.uuid = uuid
         return jsonify({'uuid': uuid}), 201
 
+    @classmethod
+    @requires_auth
+    def create_objects(cls):
+        """A bulk :ref:`CreateOperation` that creates or imports each
+        object in the payload, which is either a JSON array or
+        newline-delimited JSON (``application/x-ndjson``). Objects with a
+        ``uuid`` are imported at that UUID, as with :ref:`ImportOperation`,
+        so existing objects are overwritten and deleted or passive ones
+        revived.
+
+        By default, the request is all or nothing. With ``atomic=false``,
+        invalid or failing objects are skipped and the rest are written.
+        Objects are written in batches of ``batchsize`` objects, each
+        committed on its own unless the request is atomic.
+
+        Returns the UUID, error or ``null`` of each object in order,
+        along with the size and duration of each batch.
+
+        .. :quickref: Bulk :ref:`CreateOperation`
+
+        """
+
+        cls.verify_args(bulk=True)
+
+        args = cls._get_args()
+
+        try:
+            atomic = db_helpers.to_bool(args.get('atomic', 'true'))
+            batch_size = int(args.get('batchsize', settings.BULK_BATCH_SIZE))
+        except ValueError as e:
+            raise BadRequestException(str(e))
+
+        if batch_size < 1:
+            raise BadRequestException('batchsize must be positive')
+
+        results = []
+        objects = []
+        positions = []
+
+        for i, input in enumerate(cls._get_bulk_json()):
+            try:
+                if not isinstance(input, dict):
+                    raise BadRequestException('expected an object')
+
+                input = dict(input)
+                uuid = typed_get(input, 'uuid', '')
+                input.pop('uuid', None)
+
+                if uuid and not is_uuid(uuid):
+                    raise BadRequestException('invalid uuid: {}'.format(uuid))
+
+                validate.validate(input, cls.__name__.lower())
+
+                note = typed_get(input, "note", "")
+                registration = cls.gather_registration(input)
+            except (OIOFlaskException,
+                    jsonschema.exceptions.ValidationError) as e:
+                results.append({'error': error_to_dict(e)})
+            else:
+                results.append(None)
+                objects.append((note, registration, uuid or None))
+                positions.append(i)
+
+        errors = [r['error'] for r in results if r]
+
+        if atomic and errors:
+            return jsonify({
+                'results': results,
+                'batches': [],
+                'committed': False,
+            }), errors[0]['status']
+
+        request.api_operation = "Opret"
+
+        written, batches, committed = db.create_or_import_objects(
+            cls.__name__, objects, atomic, batch_size,
+        )
+
+        for i, result in zip(positions, written):
+            if isinstance(result, Exception):
+                results[i] = {'error': error_to_dict(result)}
+                errors.append(results[i]['error'])
+            elif committed:
+                results[i] = {'uuid': result}
+
+        return jsonify({
+            'results': results,
+            'batches': [
+                {'size': size, 'seconds': seconds}
+                for size, seconds in batches
+            ],
+            'committed': committed,
+        }), 200 if committed else errors[0]['status']
+
+    @classmethod
+    def _get_bulk_json(cls):
+        """Return the objects of a bulk request, either from a JSON
+        array or from newline-delimited JSON.
+        """
+        if request.mimetype == 'application/x-ndjson':
+            lines = request.get_data(as_text=True).splitlines()
+
+            for lineno, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise BadRequestException(
+                        'invalid JSON on line {}: {}'.format(lineno, e),
+                    )
+
+        else:
+            input = request.get_json()
+
+            if not isinstance(input, list):
+                raise BadRequestException('expected a list of objects')
+
+            yield from input
+
     @classmethod
     def _get_args(cls, as_lists=False):
         """
@@ -312,6 +583,12 @@ class OIORestObject(object):
             max_results = args.get('maximalantalresultater', None)
             if max_results is not None:
                 max_results = int(max_results)
+            continuation = args.get('fortsaettelse', None)
+            if continuation is not None:
+                if first_result:
+                    raise BadRequestException("'foersteresultat' conflicts "
+                                              "with 'fortsaettelse'")
+                continuation = decode_continuation(continuation)
 
             any_attr_value_arr = list_args.get('vilkaarligattr', None)
             any_rel_uuid_arr = list_args.get('vilkaarligrel', None)
@@ -322,31 +599,181 @@ class OIORestObject(object):
             # Fill out a registration object based on the query arguments
             registration = build_registration(cls.__name__, list_args)
             request.api_operation = "Søg"
-            results = db.search_objects(cls.__name__,
-                                        uuid_param,
-                                        registration,
-                                        virkning_fra, virkning_til,
-                                        registreret_fra, registreret_til,
-                                        life_cycle_code,
-                                        user_ref, note,
-                                        any_attr_value_arr,
-                                        any_rel_uuid_arr, first_result,
-                                        max_results)
+            results, last_sort_key = db.search_objects(
+                cls.__name__,
+                uuid_param,
+                registration,
+                virkning_fra, virkning_til,
+                registreret_fra, registreret_til,
+                life_cycle_code,
+                user_ref, note,
+                any_attr_value_arr,
+                any_rel_uuid_arr, first_result,
+                max_results,
+                after=continuation,
+            )
+
+            # A full page may be followed by another; hand out a token
+            # for fetching it
+            uuids = results[0] if results else None
+            if max_results and uuids and len(uuids) >= max_results:
+                next_page = encode_continuation(last_sort_key, uuids[-1])
+            else:
+                next_page = None
 
         else:
             uuid_param = list_args.get('uuid', None)
             request.api_operation = "List"
-            results = db.list_objects(cls.__name__, uuid_param, virkning_fra,
-                                      virkning_til, registreret_fra,
-                                      registreret_til)
+            request.uuid = uuid_param or ''
+            if uuid_param and history_cache.is_historical(args):
+                iter_objects = history_cache.iter_objects
+            elif uuid_param and not TEMPORALITY_PARAMS & args.keys():
+                iter_objects = current_cache.iter_objects
+            else:
+                iter_objects = db.iter_objects
+            objects = iter_objects(cls.__name__, uuid_param, virkning_fra,
+                                   virkning_til, registreret_fra,
+                                   registreret_til)
+            return stream_results(objects)
+
         if results is None:
             results = []
         if uuid_param:
             request.uuid = uuid_param
         else:
             request.uuid = ''
+        if next_page is not None:
+            return jsonify({'results': results, 'fortsaettelse': next_page})
         return jsonify({'results': results})
 
+    @classmethod
+    @requires_auth
+    def list_objects(cls):
+        """A :ref:`ListOperation` taking its parameters from the JSON payload
+        rather than the query string, so that any number of UUIDs may be
+        given.
+
+        The objects are read in batches of :py:data:`LIST_BATCH_SIZE` UUIDs
+        and streamed back as they are read.
+
+        .. :quickref: :ref:`ListOperation`
+
+        """
+        cls.verify_args()
+
+        input = cls.get_json()
+        if not isinstance(input, dict):
+            raise BadRequestException('expected an object')
+
+        args = {k.lower(): v for k, v in input.items()}
+
+        invalid_args = set(args) - TEMPORALITY_PARAMS - {'uuid'}
+        if invalid_args:
+            raise BadRequestException('Unsupported argument(s): {}'.format(
+                ', '.join(sorted(invalid_args)),
+            ))
+
+        uuids = args.get('uuid')
+        if not isinstance(uuids, list) or not all(
+            isinstance(uuid, str) and is_uuid(uuid) for uuid in uuids
+        ):
+            raise BadRequestException("'uuid' must be a list of UUIDs")
+
+        registreret_fra, registreret_til = get_registreret_dates(args)
+        virkning_fra, virkning_til = get_virkning_dates(args)
+
+        request.api_operation = "List"
+        request.uuid = uuids
+
+        batches = [
+            uuids[i:i + settings.LIST_BATCH_SIZE]
+            for i in range(0, len(uuids), settings.LIST_BATCH_SIZE)
+        ]
+
+        def list_batch(batch):
+            return db.iter_objects(cls.__name__, batch, virkning_fra,
+                                   virkning_til, registreret_fra,
+                                   registreret_til)
+
+        if not batches:
+            return stream_results(iter(()))
+
+        # read the first batch right away to report errors properly
+        first = list_batch(batches[0])
+
+        def generate():
+            try:
+                # started below, so that closing it before it is read
+                # still closes the first batch
+                yield
+
+                yield from first
+
+                for batch in batches[1:]:
+                    yield from list_batch(batch)
+            finally:
+                close_iterator(first)
+
+        objects = generate()
+        next(objects)
+
+        return stream_results(objects)
+
+    @classmethod
+    @requires_auth
+    def get_changes(cls):
+        """Return the UUIDs and life cycle codes of the objects with
+        registrations started after ``since``, in the order they started.
+
+        The response holds a ``fortsaettelse`` token, which is passed as
+        ``since`` to get the registrations started after these.
+
+        .. :quickref: :http:get:`/(service)/(object)/changes`
+
+        """
+        cls.verify_args(changes=True)
+
+        args = cls._get_args()
+
+        if 'since' not in args:
+            raise BadRequestException("Missing 'since' parameter")
+
+        registration_time, registration_id = decode_change_position(
+            args['since'],
+        )
+
+        try:
+            max_results = int(args.get('maximalantalresultater',
+                                       settings.LIST_BATCH_SIZE))
+        except ValueError:
+            raise BadRequestException("Invalid 'maximalantalresultater'")
+
+        request.api_operation = "Søg"
+
+        registrations = db.get_registrations_since(
+            cls.__name__, registration_time, registration_id, max_results,
+        )
+
+        results = [
+            {
+                'uuid': uuid,
+                'livscykluskode': life_cycle_code,
+                'registreringstid': started.isoformat(),
+            }
+            for _, uuid, life_cycle_code, started, allowed in registrations
+            if allowed
+        ]
+
+        if registrations:
+            registration_id, _, _, started, _ = registrations[-1]
+            registration_time = started.isoformat()
+
+        return jsonify({
+            'results': results,
+            'fortsaettelse': encode_change_position(registration_time,
+                                                    registration_id),
+        })
+
     @classmethod
     @requires_auth
     def get_object(cls, uuid):
@@ -364,9 +791,15 @@ class OIORestObject(object):
 
         request.api_operation = 'Læs'
         request.uuid = uuid
-        object_list = db.list_objects(cls.__name__, [uuid], virkning_fra,
-                                      virkning_til, registreret_fra,
-                                      registreret_til)
+        if history_cache.is_historical(args):
+            list_objects = history_cache.list_objects
+        elif not TEMPORALITY_PARAMS & args.keys():
+            list_objects = current_cache.list_objects
+        else:
+            list_objects = db.list_objects
+        object_list = list_objects(cls.__name__, [uuid], virkning_fra,
+                                   virkning_til, registreret_fra,
+                                   registreret_til)
         try:
             object = object_list[0]
         except IndexError:
@@ -431,36 +864,20 @@ class OIORestObject(object):
         # Get most common parameters if available.
         note = typed_get(input, "note", "")
         registration = cls.gather_registration(input)
-        exists = db.object_exists(cls.__name__, uuid)
-        deleted_or_passive = False
-        if exists:
-            livscyklus = db.get_life_cycle_code(cls.__name__, uuid)
-            if (
-                livscyklus == db.Livscyklus.PASSIVERET.value or
-                livscyklus == db.Livscyklus.SLETTET.value
-            ):
-                deleted_or_passive = True
 
         request.uuid = uuid
 
-        if not exists:
-            # Do import.
-            request.api_operation = "Import"
-            db.create_or_import_object(cls.__name__, note, registration, uuid)
-            return jsonify({'uuid': uuid}), 200
-        elif deleted_or_passive:
-            # Import.
-            request.api_operation = "Import"
-            db.update_object(cls.__name__, note, registration,
-                             uuid=uuid,
-                             life_cycle_code=db.Livscyklus.IMPORTERET.value)
-            return jsonify({'uuid': uuid}), 200
-        else:
+        life_cycle_code = db.import_object(cls.__name__, note, registration,
+                                           uuid)
+
+        if life_cycle_code == db.Livscyklus.RETTET.value:
             # Edit.
             request.api_operation = "Ret"
-            db.create_or_import_object(cls.__name__, note, registration, uuid)
+        else:
+            # Import.
+            request.api_operation = "Import"
 
-            return jsonify({'uuid': uuid}), 200
+        return jsonify({'uuid': uuid}), 200
 
     @classmethod
     @requires_auth
@@ -607,6 +1024,27 @@ class OIORestObject(object):
             methods=['POST'],
         )
 
+        flask.add_url_rule(
+            '{}/{}'.format(class_url, 'bulk'),
+            '_'.join([cls.__name__, 'create_objects']),
+            cls.create_objects,
+            methods=['POST'],
+        )
+
+        flask.add_url_rule(
+            '{}/{}'.format(class_url, 'list'),
+            '_'.join([cls.__name__, 'list_objects']),
+            cls.list_objects,
+            methods=['POST'],
+        )
+
+        flask.add_url_rule(
+            '{}/{}'.format(class_url, 'changes'),
+            '_'.join([cls.__name__, 'get_changes']),
+            cls.get_changes,
+            methods=['GET'],
+        )
+
         flask.add_url_rule(
             object_url,
             '_'.join([cls.__name__, 'delete_object']),
@@ -630,31 +1068,29 @@ class OIORestObject(object):
             methods=['GET'],
         )
 
-    # Templates which may be overridden on subclass.
-    # Templates may only be overridden on subclass if they are explicitly
-    # listed here.
-    RELATIONS_TEMPLATE = 'relations_array.sql'
-
     @classmethod
     def attribute_names(cls):
-        return {
-            a
-            for attr in db_helpers.get_attribute_names(cls.__name__)
-            for a in db_helpers.get_attribute_fields(attr)
-        }
+        return db_helpers.get_registry()[cls.__name__].attribute_field_set
 
     @classmethod
     def relation_names(cls):
-        return set(db_helpers.get_relation_names(cls.__name__))
+        return db_helpers.get_registry()[cls.__name__].relation_name_set
 
     @classmethod
     def state_names(cls):
-        return set(db_helpers.get_state_names(cls.__name__))
+        return db_helpers.get_registry()[cls.__name__].state_name_set
 
     @classmethod
-    def verify_args(cls, temporality=False, search=False):
+    def verify_args(cls, temporality=False, search=False, bulk=False,
+                    changes=False):
         req_args = set(cls._get_args())
 
+        if bulk:
+            req_args -= BULK_PARAMS
+
+        if changes:
+            req_args -= CHANGES_PARAMS
+
         if temporality:
             req_args -= TEMPORALITY_PARAMS
 
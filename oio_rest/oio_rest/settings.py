@@ -43,8 +43,48 @@ DATABASE = os.getenv('DB_NAME' ,"mox")
 # failing if the database isn't available.
 DB_MIN_CONNECTIONS = int(os.getenv('DB_MIN_CONNECTIONS', '0'))
 DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', '10'))
+# Seconds to wait for a connection when all of them are in use, before
+# failing the request.
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
 DB_STRUCTURE = os.getenv('DB_STRUCTURE', 'oio_rest.db.db_structure')
 
+# Default number of objects written per batch by the bulk endpoints.
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '1000'))
+
+# Number of objects fetched from the database at a time when listing.
+LIST_BATCH_SIZE = int(os.getenv('LIST_BATCH_SIZE', '100'))
+
+# Whether identical searches and listings running concurrently in a process,
+# for users with the same restrictions, are run only once.
+COALESCE_READS = os.getenv('COALESCE_READS', False)
+
+# How searches are run: 'function' narrows down the candidates one
+# criterion at a time in the as_search_<class> function of the database,
+# whereas 'query' compiles the search into a single query. Documents are
+# always searched by the function.
+SEARCH_ENGINE = os.getenv('SEARCH_ENGINE', 'function')
+
+# Seconds between reads of the outbox by the change feed in the absence of
+# notifications, and the number of seconds after which it ends the stream.
+CHANGES_HEARTBEAT_INTERVAL = float(
+    os.getenv('CHANGES_HEARTBEAT_INTERVAL', '10'),
+)
+CHANGES_STREAM_DURATION = float(os.getenv('CHANGES_STREAM_DURATION', '25'))
+
+# Bytes of the current state of objects to keep in memory per process, for
+# reads without a registration or virkning period -- 0 disables the cache.
+CURRENT_CACHE_SIZE = int(os.getenv('CURRENT_CACHE_SIZE', '0'))
+
+# Bytes of listings of past registrations to keep in memory per process, for
+# reads with both a registration and a virkning period -- 0 disables the
+# cache. Given a directory, the listings are also kept there, up to the
+# given number of bytes.
+HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', str(64 * 2 ** 20)))
+HISTORY_CACHE_DIRECTORY = os.getenv('HISTORY_CACHE_DIRECTORY')
+HISTORY_CACHE_DIRECTORY_SIZE = int(
+    os.getenv('HISTORY_CACHE_DIRECTORY_SIZE', str(2 ** 30)),
+)
+
 # This is where file uploads are stored. It must be readable and writable by
 # the mox user, running the REST API server. This is used in the Dokument
 # hierarchy.
@@ -87,6 +127,11 @@ SAML_USER_ID_ATTIBUTE = os.getenv(
     'http://wso2.org/claims/url'
 )
 
+# Number of validated SAML assertions to remember, so that a token
+# reused by a client is only validated once -- 0 disables the cache
+SAML_ASSERTION_CACHE_SIZE = int(os.getenv('SAML_ASSERTION_CACHE_SIZE',
+                                          '1000'))
+
 # Whether authorization is enabled.
 # If not, the restrictions module is not called.
 DO_ENABLE_RESTRICTIONS = os.getenv('DO_ENABLE_RESTRICTIONS', False)
@@ -105,11 +150,33 @@ AUTH_RESTRICTION_FUNCTION = os.getenv(
     'get_auth_restrictions',
 )
 
+# Seconds to remember the restrictions of a user for an object class and
+# operation -- 0 disables the cache -- and the number of them to remember.
+# The restriction module may forget them sooner through
+# oio_rest.auth.restrictions.invalidate_restrictions().
+RESTRICTION_CACHE_TTL = float(os.getenv('RESTRICTION_CACHE_TTL', '0'))
+RESTRICTION_CACHE_SIZE = int(os.getenv('RESTRICTION_CACHE_SIZE', '1000'))
+
 # Log AMQP settings
 LOG_AMQP_SERVER = os.getenv('LOG_AMQP_SERVER', '')
 MOX_LOG_EXCHANGE = os.getenv('MOX_LOG_EXCHANGE', 'mox.log')
 MOX_LOG_QUEUE = os.getenv('MOX_LOG_QUEUE', 'mox.log_queue')
 
+# Maximum number of audit log events waiting to be published.
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+# Maximum number of audit log events published at a time.
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 100))
+
+# What to do with new audit log events when the queue is full: 'block',
+# 'drop-oldest' or 'spill' to LOG_SPILL_DIR.
+LOG_OVERFLOW = os.getenv('LOG_OVERFLOW', 'block')
+LOG_SPILL_DIR = os.getenv('LOG_SPILL_DIR', FILE_UPLOAD_FOLDER)
+
+# Seconds to wait for room in the queue with 'block' before dropping the
+# oldest audit log event.
+LOG_BLOCK_TIMEOUT = float(os.getenv('LOG_BLOCK_TIMEOUT', '1'))
+
 LOG_IGNORED_SERVICES = ['Log', ]
 
 SAML_IDP_METADATA_URL = os.getenv(
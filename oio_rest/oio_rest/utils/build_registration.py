@@ -10,8 +10,7 @@ import itertools
 import uuid
 from werkzeug.datastructures import MultiDict
 
-from oio_rest.db.db_helpers import get_attribute_names, get_attribute_fields
-from oio_rest.db.db_helpers import get_state_names, get_relation_names
+from oio_rest.db.db_helpers import get_registry
 from oio_rest.db.db_helpers import get_document_part_relation_names
 from oio_rest.db.db_helpers import DokumentVariantEgenskaberType
 from oio_rest.db.db_helpers import DokumentDelEgenskaberType
@@ -119,31 +118,32 @@ def add_journal_post_relation_fields(param, values, relation):
 
 
 def build_registration(class_name, list_args):
+    compiled = get_registry()[class_name]
+
     registration = {}
     for f in list_args:
         attr = registration.setdefault('attributes', {})
-        for attr_name in get_attribute_names(class_name):
-            if f in get_attribute_fields(attr_name):
-                for attr_value in list_args[f]:
-                    attr_period = {
-                        f: escape_underscores(attr_value),
-                        'virkning': None
-                    }
-                    attr.setdefault(attr_name, []).append(attr_period)
+        for attr_name in compiled.attribute_routes.get(f, []):
+            for attr_value in list_args[f]:
+                attr_period = {
+                    f: escape_underscores(attr_value),
+                    'virkning': None
+                }
+                attr.setdefault(attr_name, []).append(attr_period)
 
         state = registration.setdefault('states', {})
-        for state_name in get_state_names(class_name):
-            state_periods = state.setdefault(state_name, [])
-            if f == state_name:
-                for state_value in list_args[f]:
-                    state_periods.append({
-                        state_name: state_value,
-                        'virkning': None
-                    })
+        for state_name in compiled.state_names:
+            state.setdefault(state_name, [])
+        if f in compiled.state_name_set:
+            for state_value in list_args[f]:
+                state[f].append({
+                    f: state_value,
+                    'virkning': None
+                })
 
         relation = registration.setdefault('relations', {})
         rel_name, objekttype = split_param(f)
-        if rel_name in get_relation_names(class_name):
+        if rel_name in compiled.relation_name_set:
             relation.setdefault(rel_name, [])
 
             # Support multiple relation references at a time
@@ -19,11 +19,11 @@ import typing
 import click
 import mock
 import testing.postgresql
-import psycopg2.pool
+import psycopg2
 
 from .. import app
 from .. import db
-from ..db import db_templating
+from ..db import db_pool, db_templating
 
 from .. import settings
 
@@ -37,9 +37,7 @@ def patch_db_struct(new: typing.Union[types.ModuleType, dict]):
     '''Context manager for overriding db_structures'''
 
     patches = [
-        mock.patch('oio_rest.db.db_helpers._attribute_fields', {}),
-        mock.patch('oio_rest.db.db_helpers._attribute_names', {}),
-        mock.patch('oio_rest.db.db_helpers._relation_names', {}),
+        mock.patch('oio_rest.db.db_helpers._registry', None),
         mock.patch('oio_rest.validate.SCHEMAS', {}),
         mock.patch('oio_rest.settings.REAL_DB_STRUCTURE', new=new),
     ]
@@ -67,9 +65,7 @@ def extend_db_struct(new: dict):
     real_dbs = copy.deepcopy(settings.REAL_DB_STRUCTURE)
 
     patches = [
-        mock.patch('oio_rest.db.db_helpers._attribute_fields', {}),
-        mock.patch('oio_rest.db.db_helpers._attribute_names', {}),
-        mock.patch('oio_rest.db.db_helpers._relation_names', {}),
+        mock.patch('oio_rest.db.db_helpers._registry', None),
         mock.patch('oio_rest.validate.SCHEMAS', {}),
         mock.patch('oio_rest.settings.DB_STRUCTURE.DATABASE_STRUCTURE',
                    new=dbs),
@@ -343,8 +339,8 @@ def run_with_db(**kwargs):
         settings.DB_HOST = dsn['host']
         settings.DB_PORT = dsn['port']
 
-        db.pool = psycopg2.pool.PersistentConnectionPool(
-            1, 100,
+        db.pool = db_pool.ConnectionPool(
+            1, 100, settings.DB_POOL_TIMEOUT,
             database=dsn['database'],
             user=dsn['user'],
             password=dsn.get('password'),
@@ -9,7 +9,7 @@
 import copy
 import jsonschema
 
-from . import settings
+from .db import db_helpers
 
 # A very nice reference explaining the JSON schema syntax can be found
 # here: https://spacetelescope.github.io/understanding-json-schema/
@@ -101,8 +101,13 @@ def _get_metadata(obj, metadata_type, key):
     :param key: The attribute to get the metadata from, e.g. 'egenskaber'
     :return: Dictionary containing the metadata for the attribute fields
     """
-    metadata = settings.REAL_DB_STRUCTURE[obj].get(
-        '{}_metadata'.format(metadata_type), [])
+    compiled = db_helpers.get_registry()[obj]
+
+    if metadata_type == 'attributter':
+        metadata = compiled.attribute_metadata
+    else:
+        metadata = compiled.relation_metadata
+
     if not metadata or key not in metadata:
         return metadata
     return metadata[key]
@@ -152,7 +157,7 @@ def _generate_attributter(obj):
     :return: Dictionary representing the 'attributter' part of the JSON schema.
     """
 
-    db_attributter = settings.REAL_DB_STRUCTURE[obj]['attributter']
+    db_attributter = db_helpers.get_registry()[obj].attributes
 
     attrs = {}
     required = []
@@ -189,7 +194,7 @@ def _generate_tilstande(obj):
     :return: Dictionary representing the 'tilstande' part of the JSON schema.
     """
 
-    tilstande = dict(settings.REAL_DB_STRUCTURE[obj]['tilstande'])
+    tilstande = db_helpers.get_registry()[obj].states
 
     properties = {}
     required = []
@@ -243,9 +248,7 @@ def _handle_relation_metadata_specific(obj, relation_schema):
     :return: Dictionary representing the updated 'relationer' part of
     the JSON schema.
     """
-    metadata_specific = (
-        settings.REAL_DB_STRUCTURE[obj].get('relationer_metadata', [])
-    )
+    metadata_specific = db_helpers.get_registry()[obj].relation_metadata
 
     for relation in [key for key in metadata_specific if not key == '*']:
         for i in range(2):
@@ -282,10 +285,9 @@ def _generate_relationer(obj):
     :param obj: The type of LoRa object, i.e. 'bruger', 'organisation' etc.
     :return: Dictionary representing the 'relationer' part of the JSON schema.
     """
-    relationer_nul_til_en = \
-        settings.REAL_DB_STRUCTURE[obj]['relationer_nul_til_en']
-    relationer_nul_til_mange = settings.REAL_DB_STRUCTURE[obj][
-        'relationer_nul_til_mange']
+    compiled = db_helpers.get_registry()[obj]
+    relationer_nul_til_en = compiled.relations_to_one
+    relationer_nul_til_mange = compiled.relations_to_many
 
     relation_nul_til_mange = _generate_schema_array(
         {
@@ -420,9 +422,21 @@ def generate_json_schema(obj):
 
 
 SCHEMAS = {}
+VALIDATORS = {}
+
+_schema_registry = None
 
 
 def get_schema(obj_type):
+    global _schema_registry
+
+    # discard the schemas once the database structure changes
+    registry = db_helpers.get_registry()
+
+    if registry is not _schema_registry:
+        SCHEMAS.clear()
+        _schema_registry = registry
+
     try:
         return SCHEMAS[obj_type]
     except KeyError:
@@ -433,6 +447,35 @@ def get_schema(obj_type):
     return schema
 
 
+def get_validator(obj_type):
+    """
+    Get a validator for the JSON schema of the given LoRa object.
+
+    The schema is only checked, and the validator only created, once
+    per schema. Discarding the schema discards the validator as well.
+    :param obj_type: The type of LoRa object, i.e. 'bruger', 'organisation'
+    etc.
+    :return: A :mod:`jsonschema` validator instance.
+    """
+    schema = get_schema(obj_type)
+
+    try:
+        cached_schema, validator = VALIDATORS[obj_type]
+    except KeyError:
+        pass
+    else:
+        if cached_schema is schema:
+            return validator
+
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+
+    validator = cls(schema)
+    VALIDATORS[obj_type] = schema, validator
+
+    return validator
+
+
 def validate(input_json, obj_type):
     """
     Validate request JSON according to JSON schema.
@@ -441,4 +484,4 @@ def validate(input_json, obj_type):
     valid according to the JSON schema.
     """
 
-    jsonschema.validate(input_json, get_schema(obj_type))
+    get_validator(obj_type).validate(input_json)
@@ -197,6 +197,25 @@ CREATE INDEX aktivitet_id_idx
     ON aktivitet_registrering (aktivitet_id);
 
 
+CREATE INDEX aktivitet_registrering_idx_timeperiod_lower
+    ON aktivitet_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX aktivitet_registrering_idx_timeperiod
+    ON aktivitet_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX aktivitet_registrering_idx_current
+    ON aktivitet_registrering
+    USING btree
+    (aktivitet_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_aktivitet
     AFTER INSERT OR UPDATE OR DELETE ON aktivitet_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -204,6 +223,38 @@ CREATE TRIGGER notify_aktivitet
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_aktivitet
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_aktivitet. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_aktivitet sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE aktivitet_aktuel (
+    aktivitet_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT aktivitet_aktuel_pkey PRIMARY KEY (aktivitet_id),
+    CONSTRAINT aktivitet_aktuel_aktivitet_fkey FOREIGN KEY (aktivitet_id)
+        REFERENCES aktivitet (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE aktivitet_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX aktivitet_aktuel_idx_sorteringsnoegle
+    ON aktivitet_aktuel
+    USING btree
+    (sorteringsnoegle, aktivitet_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE aktivitet_attr_egenskaber_id_seq
@@ -335,6 +386,11 @@ ALTER TABLE aktivitet_attr_egenskaber
 
 
 
+CREATE INDEX aktivitet_attr_egenskaber_idx_virkning_timeperiod
+    ON aktivitet_attr_egenskaber
+    USING gist
+    (aktivitet_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX aktivitet_attr_egenskaber_idx_virkning_aktoerref
     ON aktivitet_attr_egenskaber
     USING btree
@@ -355,6 +411,30 @@ CREATE INDEX aktivitet_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_aktivitet_attr_egenskaber(
+    aktivitet_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).aktivitetnavn,
+        ($1).beskrivelse,
+        ($1).tidsforbrug::text,
+        ($1).formaal,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX aktivitet_attr_egenskaber_pat_search_text
+    ON aktivitet_attr_egenskaber
+    USING gin
+    (_as_search_text_aktivitet_attr_egenskaber(aktivitet_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -397,6 +477,11 @@ CREATE INDEX aktivitet_tils_status_idx_status
     USING btree
     (status);
   
+CREATE INDEX aktivitet_tils_status_idx_virkning_timeperiod
+    ON aktivitet_tils_status
+    USING gist
+    (aktivitet_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX aktivitet_tils_status_idx_virkning_aktoerref
     ON aktivitet_tils_status
     USING btree
@@ -450,6 +535,11 @@ CREATE INDEX aktivitet_tils_publiceret_idx_publiceret
     USING btree
     (publiceret);
   
+CREATE INDEX aktivitet_tils_publiceret_idx_virkning_timeperiod
+    ON aktivitet_tils_publiceret
+    USING gist
+    (aktivitet_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX aktivitet_tils_publiceret_idx_virkning_aktoerref
     ON aktivitet_tils_publiceret
     USING btree
@@ -560,6 +650,11 @@ CREATE INDEX aktivitet_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX aktivitet_relation_idx_virkning_timeperiod
+    ON aktivitet_relation
+    USING gist
+    (aktivitet_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX aktivitet_relation_idx_virkning_aktoerref
     ON aktivitet_relation
     USING btree
@@ -761,12 +856,17 @@ CREATE OR REPLACE FUNCTION _as_create_aktivitet_registrering(
     note text DEFAULT ''::text
 ) RETURNS aktivitet_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     aktivitet_registrering_id bigint;
     aktivitet_registrering    aktivitet_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE aktivitet_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -868,12 +968,8 @@ DECLARE
     auth_filtered_uuids uuid[];
 
     
-    rel_type_max_index_prev_rev int;
     rel_type_max_index_arr _aktivitetRelationMaxIndex[];
     aktivitet_rel_type_cardinality_unlimited aktivitetRelationKode[]:=ARRAY['udfoererklasse'::AktivitetRelationKode,'deltagerklasse'::AktivitetRelationKode,'objektklasse'::AktivitetRelationKode,'resultatklasse'::AktivitetRelationKode,'grundlagklasse'::AktivitetRelationKode,'facilitetklasse'::AktivitetRelationKode,'adresse'::AktivitetRelationKode,'geoobjekt'::AktivitetRelationKode,'position'::AktivitetRelationKode,'facilitet'::AktivitetRelationKode,'lokale'::AktivitetRelationKode,'aktivitetdokument'::AktivitetRelationKode,'aktivitetgrundlag'::AktivitetRelationKode,'aktivitetresultat'::AktivitetRelationKode,'udfoerer'::AktivitetRelationKode,'deltager'::AktivitetRelationKode]::aktivitetRelationKode[];
-    aktivitet_uuid_underscores text;
-    aktivitet_rel_seq_name text;
-    aktivitet_rel_type_cardinality_unlimited_present_in_argument aktivitetRelationKode[];
     
 BEGIN
     -- Create a new registrering
@@ -909,8 +1005,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -934,39 +1030,6 @@ BEGIN
              AND a.rel_type = ANY (aktivitet_rel_type_cardinality_unlimited)
         GROUP BY rel_type
     ) AS a;
-
- 
-    ---Create temporary sequences
-    
-    aktivitet_uuid_underscores:=replace(aktivitet_uuid::text, '-', '_');
-    
-
-    SELECT array_agg(DISTINCT a.RelType) INTO aktivitet_rel_type_cardinality_unlimited_present_in_argument FROM unnest(relationer) a WHERE a.RelType = ANY (aktivitet_rel_type_cardinality_unlimited);
-    
-
-    IF coalesce(array_length(aktivitet_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        FOREACH aktivitet_relation_navn IN ARRAY (aktivitet_rel_type_cardinality_unlimited_present_in_argument) LOOP
-            aktivitet_rel_seq_name := 'aktivitet_' || aktivitet_relation_navn::text || aktivitet_uuid_underscores;
-
-            rel_type_max_index_prev_rev := null;
-
-            SELECT a.indeks into rel_type_max_index_prev_rev
-              FROM unnest(rel_type_max_index_arr) a(relType,indeks)
-             WHERE a.relType=aktivitet_relation_navn;
-
-            IF rel_type_max_index_prev_rev IS NULL THEN
-              rel_type_max_index_prev_rev := 0;
-            END IF;
-
-            EXECUTE 'CREATE TEMPORARY SEQUENCE ' || aktivitet_rel_seq_name || '
-            INCREMENT 1
-            MINVALUE 1
-            MAXVALUE 9223372036854775807
-            START ' ||  (rel_type_max_index_prev_rev+1)::text ||'
-            CACHE 1;';
-
-        END LOOP;
-    END IF;
     
 
     INSERT INTO aktivitet_relation (aktivitet_registrering_id, virkning, rel_maal_uuid, rel_maal_urn, rel_type, objekt_type , rel_index, aktoer_attr )
@@ -982,8 +1045,9 @@ BEGIN
                     OR b.id IS NULL THEN
                     -- For new relations and relations with index given that
                     -- is not found in prev registrering, we'll assign new
-                    -- index values.
-                    nextval('aktivitet_' || a.relType::text || aktivitet_uuid_underscores)
+                    -- index values, numbered in the order given.
+                    coalesce(m.indeks, 0) + count(*) FILTER (WHERE a.indeks IS NULL
+                        OR b.id IS NULL) OVER (PARTITION BY a.relType ORDER BY a.ordinality ROWS UNBOUNDED PRECEDING)
                 ELSE
                     a.indeks
                 END
@@ -1004,22 +1068,9 @@ BEGIN
                 NULL
             END 
         FROM
-            unnest(relationer) AS a 
-        LEFT JOIN aktivitet_relation b ON a.relType = ANY (aktivitet_rel_type_cardinality_unlimited) AND b.aktivitet_registrering_id = prev_aktivitet_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index ;
-
-    
-    -- Drop temporary sequences
-    IF coalesce(array_length(aktivitet_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        
-        FOREACH aktivitet_relation_navn IN ARRAY (aktivitet_rel_type_cardinality_unlimited_present_in_argument)
-        
-        LOOP
-          aktivitet_rel_seq_name := 'aktivitet_' || aktivitet_relation_navn::text || aktivitet_uuid_underscores;
-          EXECUTE 'DROP SEQUENCE ' || aktivitet_rel_seq_name || ';';
-        END LOOP;
-    END IF;
-    
-
+            unnest(relationer) WITH ORDINALITY AS a 
+        LEFT JOIN aktivitet_relation b ON a.relType = ANY (aktivitet_rel_type_cardinality_unlimited) AND b.aktivitet_registrering_id = prev_aktivitet_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index
+        LEFT JOIN unnest(rel_type_max_index_arr) m (relType, indeks) ON m.relType = a.relType ;
 
     -- Ad 2)
     -- 0..1 relations
@@ -1397,6 +1448,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating aktivitet with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', aktivitet_uuid, to_json(read_new_aktivitet_reg), to_json(read_prev_aktivitet_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_aktivitet(aktivitet_uuid);
 
     return new_aktivitet_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -1439,11 +1491,7 @@ $$ DECLARE aktivitet_registrering_id bigint;
     auth_filtered_uuids uuid[];
 
     
-    aktivitet_relation_kode aktivitetRelationKode;
-    aktivitet_uuid_underscores text;
-    aktivitet_rel_seq_name text;
     aktivitet_rel_type_cardinality_unlimited aktivitetRelationKode[]:=ARRAY['udfoererklasse'::AktivitetRelationKode,'deltagerklasse'::AktivitetRelationKode,'objektklasse'::AktivitetRelationKode,'resultatklasse'::AktivitetRelationKode,'grundlagklasse'::AktivitetRelationKode,'facilitetklasse'::AktivitetRelationKode,'adresse'::AktivitetRelationKode,'geoobjekt'::AktivitetRelationKode,'position'::AktivitetRelationKode,'facilitet'::AktivitetRelationKode,'lokale'::AktivitetRelationKode,'aktivitetdokument'::AktivitetRelationKode,'aktivitetgrundlag'::AktivitetRelationKode,'aktivitetresultat'::AktivitetRelationKode,'udfoerer'::AktivitetRelationKode,'deltager'::AktivitetRelationKode]::aktivitetRelationKode[];
-    aktivitet_rel_type_cardinality_unlimited_present_in_argument aktivitetRelationKode[];
     
 
     does_exist boolean;
@@ -1600,25 +1648,6 @@ END IF;
 
 IF coalesce(array_length(aktivitet_registrering.relationer,1),0)>0 THEN
 
---Create temporary sequences
-aktivitet_uuid_underscores:=replace(aktivitet_uuid::text, '-', '_');
-
-SELECT array_agg(DISTINCT a.RelType) into aktivitet_rel_type_cardinality_unlimited_present_in_argument FROM unnest(aktivitet_registrering.relationer) a WHERE a.RelType = any (aktivitet_rel_type_cardinality_unlimited) ;
-IF coalesce(array_length(aktivitet_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-
-FOREACH aktivitet_relation_kode IN ARRAY (aktivitet_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  aktivitet_rel_seq_name := 'aktivitet_' || aktivitet_relation_kode::text || aktivitet_uuid_underscores;
-
-  EXECUTE 'CREATE TEMPORARY SEQUENCE ' || aktivitet_rel_seq_name || '
-  INCREMENT 1
-  MINVALUE 1
-  MAXVALUE 9223372036854775807
-  START 1
-  CACHE 1;';
-
-END LOOP;
-END IF;
 
 
     INSERT INTO aktivitet_relation (
@@ -1639,7 +1668,7 @@ END IF;
       a.relType,
       a.objektType,
       CASE WHEN a.relType = any (aktivitet_rel_type_cardinality_unlimited) THEN --rel_index
-      nextval('aktivitet_' || a.relType::text || aktivitet_uuid_underscores)
+      row_number() OVER (PARTITION BY a.relType ORDER BY a.ordinality)
       ELSE 
       NULL
       END,
@@ -1662,21 +1691,11 @@ END IF;
         NULL
       END
       
-    FROM unnest(aktivitet_registrering.relationer) a
+    FROM unnest(aktivitet_registrering.relationer) WITH ORDINALITY a
   ;
 
 
 
---Drop temporary sequences
-IF coalesce(array_length(aktivitet_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-FOREACH aktivitet_relation_kode IN ARRAY (aktivitet_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  aktivitet_rel_seq_name := 'aktivitet_' || aktivitet_relation_kode::text || aktivitet_uuid_underscores;
-  EXECUTE 'DROP SEQUENCE ' || aktivitet_rel_seq_name || ';';
-END LOOP;
-END IF;
-
-
 END IF;
 
 
@@ -1688,7 +1707,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_aktivitet(aktivitet_uuid);
 
 
 RETURN aktivitet_uuid;
@@ -1958,7 +1977,9 @@ CREATE OR REPLACE FUNCTION as_search_aktivitet(
     ,
     search_operator_greater_than_or_equal_attr_egenskaber AktivitetEgenskaberAttrType[]=null,
     search_operator_less_than_or_equal_attr_egenskaber    AktivitetEgenskaberAttrType[]=null
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -2281,21 +2302,29 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.aktivitet_id
-            
             FROM  aktivitet_attr_egenskaber a
             JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.aktivitetnavn ILIKE anyAttrValue OR
-                        a.beskrivelse ILIKE anyAttrValue OR
-                                    a.starttidspunkt::text ilike anyAttrValue OR
-                                    a.sluttidspunkt::text ilike anyAttrValue OR
-                                    a.tidsforbrug::text ilike anyAttrValue OR
-                        a.formaal ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_aktivitet_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.aktivitetnavn ILIKE anyAttrValue
+                        OR a.beskrivelse ILIKE anyAttrValue
+                        OR a.tidsforbrug::text ilike anyAttrValue
+                        OR a.formaal ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
+                OR
+                a.starttidspunkt::text ilike anyAttrValue
+                OR
+                a.sluttidspunkt::text ilike anyAttrValue
             )
             AND
             (
@@ -2304,7 +2333,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -2373,6 +2401,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT aktivitet_candidates_is_initialized) OR b.aktivitet_id = ANY (aktivitet_candidates) )
 
+            
 
         );
 
@@ -3534,8 +3563,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_aktivitet(aktivitet_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_aktivitet(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_aktivitet(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -3731,7 +3760,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_aktivitet(
     virkningSoeg TSTZRANGE,
     registreringObj    AktivitetRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     aktivitet_sorted_uuid uuid[];
@@ -3743,6 +3774,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in aktivitet_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(aktivitet_uuids) u(id)
+       LEFT JOIN aktivitet_aktuel c ON c.aktivitet_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.aktivitet_id
+                    FROM aktivitet_aktuel c
+                   WHERE c.aktivitet_id = ANY (aktivitet_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.aktivitet_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.aktivitet_id
+                FROM aktivitet_aktuel c
+               WHERE c.aktivitet_id = ANY (aktivitet_uuids)
+                 AND (c.sorteringsnoegle, c.aktivitet_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.aktivitet_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     aktivitet_sorted_uuid:=array(
           SELECT b.aktivitet_id
             FROM aktivitet_registrering b
@@ -3751,6 +3817,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.aktivitet_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.aktivitet_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.aktivitet_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -3760,6 +3832,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_aktivitet sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_aktivitet(
+    aktivitet_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    AktivitetRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM aktivitet_registrering b
+            JOIN aktivitet_attr_egenskaber a ON a.aktivitet_registrering_id=b.id
+           WHERE b.aktivitet_id = aktivitet_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -3772,272 +3872,293 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_aktivitet(
-	aktivitet_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_aktivitet(
+	aktivitet_uuid uuid,
 	registreringObjArr AktivitetRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	aktivitet_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	aktivitet_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj AktivitetEgenskaberAttrType;
-	
-  	tilsStatusTypeObj AktivitetStatusTilsType;
-  	tilsPubliceretTypeObj AktivitetPubliceretTilsType;
-	relationTypeObj AktivitetRelationType;
-	registreringObj AktivitetRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN aktivitet_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF aktivitet_uuids IS NULL OR coalesce(array_length(aktivitet_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-aktivitet_candidates:= aktivitet_uuids;
-
-
-
---RAISE DEBUG 'aktivitet_candidates_is_initialized step 1:%',aktivitet_candidates_is_initialized;
---RAISE DEBUG 'aktivitet_candidates step 1:%',aktivitet_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_aktivitet: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(aktivitet_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			aktivitet_candidates:=array(
-			SELECT DISTINCT
-			b.aktivitet_id 
-			FROM  aktivitet_attr_egenskaber a 
-			JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.aktivitetnavn IS NULL
-					OR 
-					a.aktivitetnavn = attrEgenskaberTypeObj.aktivitetnavn 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.beskrivelse IS NULL
-					OR 
-					a.beskrivelse = attrEgenskaberTypeObj.beskrivelse 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM aktivitet_attr_egenskaber a
+				JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.starttidspunkt IS NULL
-					OR 
-					a.starttidspunkt = attrEgenskaberTypeObj.starttidspunkt 
+					f.aktivitetnavn IS NULL
+					OR
+					a.aktivitetnavn = f.aktivitetnavn
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.sluttidspunkt IS NULL
-					OR 
-					a.sluttidspunkt = attrEgenskaberTypeObj.sluttidspunkt 
+					f.beskrivelse IS NULL
+					OR
+					a.beskrivelse = f.beskrivelse
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.tidsforbrug IS NULL
-					OR 
-					a.tidsforbrug = attrEgenskaberTypeObj.tidsforbrug 
+					f.starttidspunkt IS NULL
+					OR
+					a.starttidspunkt = f.starttidspunkt
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.formaal IS NULL
-					OR 
-					a.formaal = attrEgenskaberTypeObj.formaal 
+					f.sluttidspunkt IS NULL
+					OR
+					a.sluttidspunkt = f.sluttidspunkt
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.aktivitet_id = ANY (aktivitet_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'aktivitet_candidates_is_initialized step 3:%',aktivitet_candidates_is_initialized;
---RAISE DEBUG 'aktivitet_candidates step 3:%',aktivitet_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Status
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsStatus IS NULL THEN
-	--RAISE DEBUG 'as_search_aktivitet: skipping filtration on tilsStatus';
-ELSE
-	IF coalesce(array_length(aktivitet_candidates,1),0)>0 THEN 
-
-		FOREACH tilsStatusTypeObj IN ARRAY registreringObj.tilsStatus
-		LOOP
-			aktivitet_candidates:=array(
-			SELECT DISTINCT
-			b.aktivitet_id 
-			FROM  aktivitet_tils_status a
-			JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsStatusTypeObj.status IS NULL
+					f.tidsforbrug IS NULL
 					OR
-					tilsStatusTypeObj.status = a.status
+					a.tidsforbrug = f.tidsforbrug
 				)
-				AND b.aktivitet_id = ANY (aktivitet_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
---/**********************************************************//
---Filtration on state: Publiceret
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsPubliceret IS NULL THEN
-	--RAISE DEBUG 'as_search_aktivitet: skipping filtration on tilsPubliceret';
-ELSE
-	IF coalesce(array_length(aktivitet_candidates,1),0)>0 THEN 
-
-		FOREACH tilsPubliceretTypeObj IN ARRAY registreringObj.tilsPubliceret
-		LOOP
-			aktivitet_candidates:=array(
-			SELECT DISTINCT
-			b.aktivitet_id 
-			FROM  aktivitet_tils_publiceret a
-			JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
+				AND
 				(
-					tilsPubliceretTypeObj.publiceret IS NULL
-					OR
-					tilsPubliceretTypeObj.publiceret = a.publiceret
-				)
-				AND b.aktivitet_id = ANY (aktivitet_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer AktivitetRelationType[]
-*/
-
-
---RAISE DEBUG 'aktivitet_candidates_is_initialized step 4:%',aktivitet_candidates_is_initialized;
---RAISE DEBUG 'aktivitet_candidates step 4:%',aktivitet_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_aktivitet: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(aktivitet_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			aktivitet_candidates:=array(
-			SELECT DISTINCT
-			b.aktivitet_id 
-			FROM  aktivitet_relation a
-			JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
+					f.formaal IS NULL
 					OR
-					relationTypeObj.relType = a.rel_type
+					a.formaal = f.formaal
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.objektType IS NULL
+				b.aktivitet_id = aktivitet_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Status
+	--/**********************************************************//
+	AND (
+		r.tilsStatus IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsStatus) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM aktivitet_tils_status a
+				JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.status IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					f.status = a.status
 				)
-				AND
-				(
-					relationTypeObj.urn IS NULL
+				AND b.aktivitet_id = aktivitet_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Publiceret
+	--/**********************************************************//
+	AND (
+		r.tilsPubliceret IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsPubliceret) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM aktivitet_tils_publiceret a
+				JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.publiceret IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.publiceret = a.publiceret
 				)
-				AND b.aktivitet_id = ANY (aktivitet_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'aktivitet_candidates_is_initialized step 5:%',aktivitet_candidates_is_initialized;
---RAISE DEBUG 'aktivitet_candidates step 5:%',aktivitet_candidates;
-
-aktivitet_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (aktivitet_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (aktivitet_candidates) b(id)
+				AND b.aktivitet_id = aktivitet_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM aktivitet_relation a
+			JOIN aktivitet_registrering b on a.aktivitet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.aktivitet_id = aktivitet_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(aktivitet_passed_auth_filter,1),0)=coalesce(array_length(aktivitet_uuids,1),0) AND aktivitet_passed_auth_filter @>aktivitet_uuids THEN
-	RETURN aktivitet_passed_auth_filter;
-END IF;
+
+CREATE OR REPLACE FUNCTION _as_filter_unauth_aktivitet(
+	aktivitet_uuids uuid[],
+	registreringObjArr AktivitetRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	aktivitet_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(aktivitet_uuids) a(id)
+	WHERE _as_is_authorized_aktivitet(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN aktivitet_passed_auth_filter;
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in aktivitet_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_aktivitet(
+    aktivitet_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM aktivitet_registrering b
+     WHERE b.aktivitet_id = aktivitet_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM aktivitet_attr_egenskaber a
+         WHERE a.aktivitet_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM aktivitet_tils_status a
+         WHERE a.aktivitet_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM aktivitet_tils_publiceret a
+         WHERE a.aktivitet_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM aktivitet_relation a
+         WHERE a.aktivitet_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_aktivitet(
+        ARRAY[aktivitet_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM aktivitet_attr_egenskaber a
+         WHERE a.aktivitet_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM aktivitet_aktuel
+         WHERE aktivitet_id = aktivitet_uuid;
+    ELSE
+        INSERT INTO aktivitet_aktuel (
+            aktivitet_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            aktivitet_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (aktivitet_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -4202,6 +4323,25 @@ CREATE INDEX bruger_id_idx
     ON bruger_registrering (bruger_id);
 
 
+CREATE INDEX bruger_registrering_idx_timeperiod_lower
+    ON bruger_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX bruger_registrering_idx_timeperiod
+    ON bruger_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX bruger_registrering_idx_current
+    ON bruger_registrering
+    USING btree
+    (bruger_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_bruger
     AFTER INSERT OR UPDATE OR DELETE ON bruger_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -4209,6 +4349,38 @@ CREATE TRIGGER notify_bruger
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_bruger
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_bruger. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_bruger sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE bruger_aktuel (
+    bruger_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT bruger_aktuel_pkey PRIMARY KEY (bruger_id),
+    CONSTRAINT bruger_aktuel_bruger_fkey FOREIGN KEY (bruger_id)
+        REFERENCES bruger (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE bruger_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX bruger_aktuel_idx_sorteringsnoegle
+    ON bruger_aktuel
+    USING btree
+    (sorteringsnoegle, bruger_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE bruger_attr_egenskaber_id_seq
@@ -4289,6 +4461,11 @@ ALTER TABLE bruger_attr_egenskaber
 
 
 
+CREATE INDEX bruger_attr_egenskaber_idx_virkning_timeperiod
+    ON bruger_attr_egenskaber
+    USING gist
+    (bruger_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX bruger_attr_egenskaber_idx_virkning_aktoerref
     ON bruger_attr_egenskaber
     USING btree
@@ -4309,6 +4486,28 @@ CREATE INDEX bruger_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_bruger_attr_egenskaber(
+    bruger_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).brugernavn,
+        ($1).brugertype,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX bruger_attr_egenskaber_pat_search_text
+    ON bruger_attr_egenskaber
+    USING gin
+    (_as_search_text_bruger_attr_egenskaber(bruger_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -4351,6 +4550,11 @@ CREATE INDEX bruger_tils_gyldighed_idx_gyldighed
     USING btree
     (gyldighed);
   
+CREATE INDEX bruger_tils_gyldighed_idx_virkning_timeperiod
+    ON bruger_tils_gyldighed
+    USING gist
+    (bruger_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX bruger_tils_gyldighed_idx_virkning_aktoerref
     ON bruger_tils_gyldighed
     USING btree
@@ -4441,6 +4645,11 @@ CREATE INDEX bruger_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX bruger_relation_idx_virkning_timeperiod
+    ON bruger_relation
+    USING gist
+    (bruger_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX bruger_relation_idx_virkning_aktoerref
     ON bruger_relation
     USING btree
@@ -4614,12 +4823,17 @@ CREATE OR REPLACE FUNCTION _as_create_bruger_registrering(
     note text DEFAULT ''::text
 ) RETURNS bruger_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     bruger_registrering_id bigint;
     bruger_registrering    bruger_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE bruger_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -4753,8 +4967,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -4774,9 +4988,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -5064,6 +5275,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating bruger with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', bruger_uuid, to_json(read_new_bruger_reg), to_json(read_prev_bruger_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_bruger(bruger_uuid);
 
     return new_bruger_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -5242,7 +5454,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(bruger_registrering.relationer) a
+    FROM unnest(bruger_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -5256,7 +5468,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_bruger(bruger_uuid);
 
 
 RETURN bruger_uuid;
@@ -5486,7 +5698,9 @@ CREATE OR REPLACE FUNCTION as_search_bruger(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr BrugerRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -5784,17 +5998,23 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.bruger_id
-            
             FROM  bruger_attr_egenskaber a
             JOIN bruger_registrering b on a.bruger_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.brugernavn ILIKE anyAttrValue OR
-                        a.brugertype ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_bruger_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.brugernavn ILIKE anyAttrValue
+                        OR a.brugertype ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -5803,7 +6023,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -5872,6 +6091,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT bruger_candidates_is_initialized) OR b.bruger_id = ANY (bruger_candidates) )
 
+            
 
         );
 
@@ -6492,8 +6712,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_bruger(bruger_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_bruger(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_bruger(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -6682,7 +6902,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_bruger(
     virkningSoeg TSTZRANGE,
     registreringObj    BrugerRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     bruger_sorted_uuid uuid[];
@@ -6694,6 +6916,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in bruger_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(bruger_uuids) u(id)
+       LEFT JOIN bruger_aktuel c ON c.bruger_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.bruger_id
+                    FROM bruger_aktuel c
+                   WHERE c.bruger_id = ANY (bruger_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.bruger_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.bruger_id
+                FROM bruger_aktuel c
+               WHERE c.bruger_id = ANY (bruger_uuids)
+                 AND (c.sorteringsnoegle, c.bruger_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.bruger_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     bruger_sorted_uuid:=array(
           SELECT b.bruger_id
             FROM bruger_registrering b
@@ -6702,6 +6959,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.bruger_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.bruger_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.bruger_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -6711,6 +6974,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_bruger sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_bruger(
+    bruger_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    BrugerRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM bruger_registrering b
+            JOIN bruger_attr_egenskaber a ON a.bruger_registrering_id=b.id
+           WHERE b.bruger_id = bruger_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -6723,219 +7014,242 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_bruger(
-	bruger_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_bruger(
+	bruger_uuid uuid,
 	registreringObjArr BrugerRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	bruger_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	bruger_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj BrugerEgenskaberAttrType;
-	
-  	tilsGyldighedTypeObj BrugerGyldighedTilsType;
-	relationTypeObj BrugerRelationType;
-	registreringObj BrugerRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN bruger_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF bruger_uuids IS NULL OR coalesce(array_length(bruger_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-bruger_candidates:= bruger_uuids;
-
-
-
---RAISE DEBUG 'bruger_candidates_is_initialized step 1:%',bruger_candidates_is_initialized;
---RAISE DEBUG 'bruger_candidates step 1:%',bruger_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_bruger: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(bruger_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			bruger_candidates:=array(
-			SELECT DISTINCT
-			b.bruger_id 
-			FROM  bruger_attr_egenskaber a 
-			JOIN bruger_registrering b on a.bruger_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.brugernavn IS NULL
-					OR 
-					a.brugernavn = attrEgenskaberTypeObj.brugernavn 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.brugertype IS NULL
-					OR 
-					a.brugertype = attrEgenskaberTypeObj.brugertype 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM bruger_attr_egenskaber a
+				JOIN bruger_registrering b on a.bruger_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.bruger_id = ANY (bruger_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'bruger_candidates_is_initialized step 3:%',bruger_candidates_is_initialized;
---RAISE DEBUG 'bruger_candidates step 3:%',bruger_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Gyldighed
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsGyldighed IS NULL THEN
-	--RAISE DEBUG 'as_search_bruger: skipping filtration on tilsGyldighed';
-ELSE
-	IF coalesce(array_length(bruger_candidates,1),0)>0 THEN 
-
-		FOREACH tilsGyldighedTypeObj IN ARRAY registreringObj.tilsGyldighed
-		LOOP
-			bruger_candidates:=array(
-			SELECT DISTINCT
-			b.bruger_id 
-			FROM  bruger_tils_gyldighed a
-			JOIN bruger_registrering b on a.bruger_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsGyldighedTypeObj.gyldighed IS NULL
+					f.brugernavn IS NULL
 					OR
-					tilsGyldighedTypeObj.gyldighed = a.gyldighed
-				)
-				AND b.bruger_id = ANY (bruger_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer BrugerRelationType[]
-*/
-
-
---RAISE DEBUG 'bruger_candidates_is_initialized step 4:%',bruger_candidates_is_initialized;
---RAISE DEBUG 'bruger_candidates step 4:%',bruger_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_bruger: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(bruger_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			bruger_candidates:=array(
-			SELECT DISTINCT
-			b.bruger_id 
-			FROM  bruger_relation a
-			JOIN bruger_registrering b on a.bruger_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
-					OR
-					relationTypeObj.relType = a.rel_type
+					a.brugernavn = f.brugernavn
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.brugertype IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.brugertype = f.brugertype
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.bruger_id = bruger_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Gyldighed
+	--/**********************************************************//
+	AND (
+		r.tilsGyldighed IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsGyldighed) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM bruger_tils_gyldighed a
+				JOIN bruger_registrering b on a.bruger_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.gyldighed IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.gyldighed = a.gyldighed
 				)
-				AND b.bruger_id = ANY (bruger_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'bruger_candidates_is_initialized step 5:%',bruger_candidates_is_initialized;
---RAISE DEBUG 'bruger_candidates step 5:%',bruger_candidates;
-
-bruger_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (bruger_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (bruger_candidates) b(id)
+				AND b.bruger_id = bruger_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM bruger_relation a
+			JOIN bruger_registrering b on a.bruger_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.bruger_id = bruger_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(bruger_passed_auth_filter,1),0)=coalesce(array_length(bruger_uuids,1),0) AND bruger_passed_auth_filter @>bruger_uuids THEN
-	RETURN bruger_passed_auth_filter;
-END IF;
 
+CREATE OR REPLACE FUNCTION _as_filter_unauth_bruger(
+	bruger_uuids uuid[],
+	registreringObjArr BrugerRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	bruger_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(bruger_uuids) a(id)
+	WHERE _as_is_authorized_bruger(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN bruger_passed_auth_filter;
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in bruger_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_bruger(
+    bruger_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM bruger_registrering b
+     WHERE b.bruger_id = bruger_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM bruger_attr_egenskaber a
+         WHERE a.bruger_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM bruger_tils_gyldighed a
+         WHERE a.bruger_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM bruger_relation a
+         WHERE a.bruger_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_bruger(
+        ARRAY[bruger_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM bruger_attr_egenskaber a
+         WHERE a.bruger_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM bruger_aktuel
+         WHERE bruger_id = bruger_uuid;
+    ELSE
+        INSERT INTO bruger_aktuel (
+            bruger_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            bruger_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (bruger_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -7172,6 +7486,25 @@ CREATE INDEX dokument_id_idx
     ON dokument_registrering (dokument_id);
 
 
+CREATE INDEX dokument_registrering_idx_timeperiod_lower
+    ON dokument_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX dokument_registrering_idx_timeperiod
+    ON dokument_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX dokument_registrering_idx_current
+    ON dokument_registrering
+    USING btree
+    (dokument_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_dokument
     AFTER INSERT OR UPDATE OR DELETE ON dokument_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -7179,6 +7512,38 @@ CREATE TRIGGER notify_dokument
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_dokument
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_dokument. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_dokument sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE dokument_aktuel (
+    dokument_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT dokument_aktuel_pkey PRIMARY KEY (dokument_id),
+    CONSTRAINT dokument_aktuel_dokument_fkey FOREIGN KEY (dokument_id)
+        REFERENCES dokument (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE dokument_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX dokument_aktuel_idx_sorteringsnoegle
+    ON dokument_aktuel
+    USING btree
+    (sorteringsnoegle, dokument_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE dokument_attr_egenskaber_id_seq
@@ -7349,6 +7714,11 @@ ALTER TABLE dokument_attr_egenskaber
 
 
 
+CREATE INDEX dokument_attr_egenskaber_idx_virkning_timeperiod
+    ON dokument_attr_egenskaber
+    USING gist
+    (dokument_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_attr_egenskaber_idx_virkning_aktoerref
     ON dokument_attr_egenskaber
     USING btree
@@ -7369,6 +7739,35 @@ CREATE INDEX dokument_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_dokument_attr_egenskaber(
+    dokument_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).beskrivelse,
+        ($1).brevdato::text,
+        ($1).kassationskode,
+        ($1).major::text,
+        ($1).minor::text,
+        (($1).offentlighedundtaget).AlternativTitel,
+        (($1).offentlighedundtaget).Hjemmel,
+        ($1).titel,
+        ($1).dokumenttype,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX dokument_attr_egenskaber_pat_search_text
+    ON dokument_attr_egenskaber
+    USING gin
+    (_as_search_text_dokument_attr_egenskaber(dokument_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -7411,6 +7810,11 @@ CREATE INDEX dokument_tils_fremdrift_idx_fremdrift
     USING btree
     (fremdrift);
   
+CREATE INDEX dokument_tils_fremdrift_idx_virkning_timeperiod
+    ON dokument_tils_fremdrift
+    USING gist
+    (dokument_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_tils_fremdrift_idx_virkning_aktoerref
     ON dokument_tils_fremdrift
     USING btree
@@ -7501,6 +7905,11 @@ CREATE INDEX dokument_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX dokument_relation_idx_virkning_timeperiod
+    ON dokument_relation
+    USING gist
+    (dokument_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_relation_idx_virkning_aktoerref
     ON dokument_relation
     USING btree
@@ -7602,6 +8011,11 @@ CREATE INDEX dokument_variant_egenskaber_idx_produktion
     USING btree
     (produktion); 
 
+CREATE INDEX dokument_variant_egenskaber_idx_virkning_timeperiod
+    ON dokument_variant_egenskaber
+    USING gist
+    (variant_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_variant_egenskaber_idx_virkning_aktoerref
     ON dokument_variant_egenskaber
     USING btree
@@ -7717,6 +8131,11 @@ CREATE INDEX dokument_del_egenskaber_idx_mimetype
     USING btree
     (mimetype); 
 
+CREATE INDEX dokument_del_egenskaber_idx_virkning_timeperiod
+    ON dokument_del_egenskaber
+    USING gist
+    (del_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_del_egenskaber_idx_virkning_aktoerref
     ON dokument_del_egenskaber
     USING btree
@@ -7795,6 +8214,11 @@ CREATE INDEX dokument_del_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX dokument_del_relation_idx_virkning_timeperiod
+    ON dokument_del_relation
+    USING gist
+    (del_id, ((virkning).TimePeriod));
+
 CREATE INDEX dokument_del_relation_idx_virkning_aktoerref
     ON dokument_del_relation
     USING btree
@@ -8108,12 +8532,17 @@ CREATE OR REPLACE FUNCTION _as_create_dokument_registrering(
     note text DEFAULT ''::text
 ) RETURNS dokument_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     dokument_registrering_id bigint;
     dokument_registrering    dokument_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE dokument_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -8268,8 +8697,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -8289,9 +8718,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -9191,6 +9617,7 @@ END IF; --else block for skip on empty array for variants.
       RAISE EXCEPTION 'Aborted updating dokument with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', dokument_uuid, to_json(read_new_dokument_reg), to_json(read_prev_dokument_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_dokument(dokument_uuid);
 
     return new_dokument_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -9389,7 +9816,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(dokument_registrering.relationer) a
+    FROM unnest(dokument_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -9538,7 +9965,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_dokument(dokument_uuid);
 
 
 RETURN dokument_uuid;
@@ -9777,7 +10204,9 @@ CREATE OR REPLACE FUNCTION as_search_dokument(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr DokumentRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -10131,45 +10560,37 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.dokument_id
-            
-            FROM dokument_registrering b 
-            LEFT JOIN dokument_attr_egenskaber a on a.dokument_registrering_id=b.id and (virkningSoeg IS NULL or virkningSoeg && (a.virkning).TimePeriod )
-            LEFT JOIN dokument_variant c on c.dokument_registrering_id=b.id 
-            LEFT JOIN dokument_del f on f.variant_id=c.id
-            LEFT JOIN dokument_del_egenskaber d on d.del_id = f.id and (virkningSoeg IS NULL or virkningSoeg && (d.virkning).TimePeriod )
-            LEFT JOIN dokument_variant_egenskaber e on e.variant_id = c.id and (virkningSoeg IS NULL or virkningSoeg && (e.virkning).TimePeriod )
+            FROM  dokument_attr_egenskaber a
+            JOIN dokument_registrering b on a.dokument_registrering_id=b.id
             WHERE
             (
                 (
-                    a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.beskrivelse ILIKE anyAttrValue OR
-                                    a.brevdato::text ilike anyAttrValue OR
-                        a.kassationskode ILIKE anyAttrValue OR
-                                    a.major::text ilike anyAttrValue OR
-                                    a.minor::text ilike anyAttrValue OR
-                                    (a.offentlighedundtaget).Hjemmel ilike anyAttrValue OR (a.offentlighedundtaget).AlternativTitel ilike anyAttrValue OR
-                        a.titel ILIKE anyAttrValue OR
-                        a.dokumenttype ILIKE anyAttrValue
-                )
-                OR
-                (
-                    (c.varianttekst ilike anyAttrValue and e.id is not null) --varianttekst handled like it is logically part of variant egenskaber
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_dokument_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.beskrivelse ILIKE anyAttrValue
+                        OR a.brevdato::text ilike anyAttrValue
+                        OR a.kassationskode ILIKE anyAttrValue
+                        OR a.major::text ilike anyAttrValue
+                        OR a.minor::text ilike anyAttrValue
+                        OR (a.offentlighedundtaget).Hjemmel ilike anyAttrValue OR (a.offentlighedundtaget).AlternativTitel ilike anyAttrValue
+                        OR a.titel ILIKE anyAttrValue
+                        OR a.dokumenttype ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
                 )
+            )
+            AND
+            (
+                virkningSoeg IS NULL
                 OR
-                (
-                    (f.deltekst ilike anyAttrValue and d.id is not null ) --deltekst handled like it is logically part of del egenskaber
-                    OR
-                    d.indeks::text = anyAttrValue
-                    OR
-                    d.indhold ILIKE anyAttrValue
-                    OR
-                    d.lokation ILIKE anyAttrValue
-                    OR
-                    d.mimetype ILIKE anyAttrValue
-                )
+                virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -10238,240 +10659,337 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT dokument_candidates_is_initialized) OR b.dokument_id = ANY (dokument_candidates) )
 
-
-        );
-
-    dokument_candidates_is_initialized:=true;
-
-    END LOOP;
-
-END IF;
-
-
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Fremdrift
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsFremdrift IS NULL THEN
-    --RAISE DEBUG 'as_search_dokument: skipping filtration on tilsFremdrift';
-ELSE
-    IF (coalesce(array_length(dokument_candidates,1),0)>0 OR dokument_candidates_is_initialized IS FALSE ) THEN
-
-        FOREACH tilsFremdriftTypeObj IN ARRAY registreringObj.tilsFremdrift
-        LOOP
-            dokument_candidates:=array(
-            SELECT DISTINCT
-            b.dokument_id
-            FROM  dokument_tils_fremdrift a
-            JOIN dokument_registrering b on a.dokument_registrering_id=b.id
-            WHERE
-                (
-                    tilsFremdriftTypeObj.virkning IS NULL
-                    OR
-                    (
-                        (
-                             (tilsFremdriftTypeObj.virkning).TimePeriod IS NULL
-                            OR
-                            (tilsFremdriftTypeObj.virkning).TimePeriod && (a.virkning).TimePeriod
-                        )
-                        AND
-                        (
-                                (tilsFremdriftTypeObj.virkning).AktoerRef IS NULL OR (tilsFremdriftTypeObj.virkning).AktoerRef=(a.virkning).AktoerRef
-                        )
-                        AND
-                        (
-                                (tilsFremdriftTypeObj.virkning).AktoerTypeKode IS NULL OR (tilsFremdriftTypeObj.virkning).AktoerTypeKode=(a.virkning).AktoerTypeKode
-                        )
-                        AND
-                        (
-                                (tilsFremdriftTypeObj.virkning).NoteTekst IS NULL OR (a.virkning).NoteTekst ILIKE (tilsFremdriftTypeObj.virkning).NoteTekst
-                        )
-                    )
-                )
-                AND
-                (
-                    (NOT ((tilsFremdriftTypeObj.virkning) IS NULL OR (tilsFremdriftTypeObj.virkning).TimePeriod IS NULL)) --we have already filtered on virkning above
-                    OR
-                    (
-                        virkningSoeg IS NULL
-                        OR
-                        virkningSoeg && (a.virkning).TimePeriod
-                    )
-                )
-                AND
-                (
-                    tilsFremdriftTypeObj.fremdrift IS NULL
-                    OR
-                    tilsFremdriftTypeObj.fremdrift = a.fremdrift
-                )
-                AND
-                		(
-				(registreringObj.registrering) IS NULL 
-				OR
-				(
-					(
-						(registreringObj.registrering).timeperiod IS NULL 
-						OR
-						(registreringObj.registrering).timeperiod && (b.registrering).timeperiod
-					)
-					AND
-					(
-						(registreringObj.registrering).livscykluskode IS NULL 
-						OR
-						(registreringObj.registrering).livscykluskode = (b.registrering).livscykluskode 		
-					) 
-					AND
-					(
-						(registreringObj.registrering).brugerref IS NULL
-						OR
-						(registreringObj.registrering).brugerref = (b.registrering).brugerref
-					)
-					AND
-					(
-						(registreringObj.registrering).note IS NULL
-						OR
-						(b.registrering).note ILIKE (registreringObj.registrering).note
-					)
-			)
-		)
-		AND
-		(
-			(
-				((b.registrering).livscykluskode <> 'Slettet'::Livscykluskode )
-				AND
-					(
-						(registreringObj.registrering) IS NULL 
-						OR
-						(registreringObj.registrering).livscykluskode IS NULL 
-					)
-			)
-			OR
-			(
-				(NOT ((registreringObj.registrering) IS NULL))
-				AND
-				(registreringObj.registrering).livscykluskode IS NOT NULL 
-			)
-		)
-		AND
-		(
-			(
-			  (
-			  	(registreringObj.registrering) IS NULL
-			  	OR
-			  	(registreringObj.registrering).timeperiod IS NULL
-			  )
-			  AND
-			  upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			)  	
-		OR
-			(
-				(NOT ((registreringObj.registrering) IS NULL))
-				AND
-				((registreringObj.registrering).timeperiod IS NOT NULL)
-			)
-		)
-		AND
-		((NOT dokument_candidates_is_initialized) OR b.dokument_id = ANY (dokument_candidates) )
-
-    );
-
-
-            dokument_candidates_is_initialized:=true;
-
-
-        END LOOP;
-    END IF;
-END IF;
-
-/*
---relationer DokumentRelationType[]
-*/
-
-
---RAISE DEBUG 'dokument_candidates_is_initialized step 4:%',dokument_candidates_is_initialized;
---RAISE DEBUG 'dokument_candidates step 4:%',dokument_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL THEN
-    --RAISE DEBUG 'as_search_dokument: skipping filtration on relationer';
-ELSE
-    IF (coalesce(array_length(dokument_candidates,1),0)>0 OR NOT dokument_candidates_is_initialized) AND (registreringObj).relationer IS NOT NULL THEN
-        FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-        LOOP
-            dokument_candidates:=array(
+            
+            UNION
             SELECT DISTINCT
             b.dokument_id
-            FROM  dokument_relation a
-            JOIN dokument_registrering b on a.dokument_registrering_id=b.id
+            FROM dokument_registrering b
+            JOIN dokument_variant c on c.dokument_registrering_id=b.id
+            LEFT JOIN dokument_del f on f.variant_id=c.id
+            LEFT JOIN dokument_del_egenskaber d on d.del_id = f.id and (virkningSoeg IS NULL or virkningSoeg && (d.virkning).TimePeriod )
+            LEFT JOIN dokument_variant_egenskaber e on e.variant_id = c.id and (virkningSoeg IS NULL or virkningSoeg && (e.virkning).TimePeriod )
             WHERE
+            (
                 (
-                    relationTypeObj.virkning IS NULL
-                    OR
-                    (
-                        (
-                             (relationTypeObj.virkning).TimePeriod IS NULL
-                            OR
-                            (relationTypeObj.virkning).TimePeriod && (a.virkning).TimePeriod
-                        )
-                        AND
-                        (
-                                (relationTypeObj.virkning).AktoerRef IS NULL OR (relationTypeObj.virkning).AktoerRef=(a.virkning).AktoerRef
-                        )
-                        AND
-                        (
-                                (relationTypeObj.virkning).AktoerTypeKode IS NULL OR (relationTypeObj.virkning).AktoerTypeKode=(a.virkning).AktoerTypeKode
-                        )
-                        AND
-                        (
-                                (relationTypeObj.virkning).NoteTekst IS NULL OR (a.virkning).NoteTekst ILIKE (relationTypeObj.virkning).NoteTekst
-                        )
-                    )
-                )
-                AND
-                (
-                    (NOT (relationTypeObj.virkning IS NULL OR (relationTypeObj.virkning).TimePeriod IS NULL)) --we have already filtered on virkning above
-                    OR
-                    (
-                        virkningSoeg IS NULL
-                        OR
-                        virkningSoeg && (a.virkning).TimePeriod
-                    )
+                    (c.varianttekst ilike anyAttrValue and e.id is not null) --varianttekst handled like it is logically part of variant egenskaber
                 )
-                AND
+                OR
                 (
-                    relationTypeObj.relType IS NULL
+                    (f.deltekst ilike anyAttrValue and d.id is not null ) --deltekst handled like it is logically part of del egenskaber
                     OR
-                    relationTypeObj.relType = a.rel_type
-                )
-                AND
-                (
-                    relationTypeObj.uuid IS NULL
+                    d.indeks::text = anyAttrValue
                     OR
-                    relationTypeObj.uuid = a.rel_maal_uuid
-                )
-                AND
-                (
-                    relationTypeObj.objektType IS NULL
+                    d.indhold ILIKE anyAttrValue
                     OR
-                    relationTypeObj.objektType = a.objekt_type
-                )
-                AND
-                (
-                    relationTypeObj.urn IS NULL
+                    d.lokation ILIKE anyAttrValue
                     OR
-                    relationTypeObj.urn = a.rel_maal_urn
+                    d.mimetype ILIKE anyAttrValue
                 )
-                
-                
-                AND
-                		(
+            )
+            AND
+            		(
+				(registreringObj.registrering) IS NULL 
+				OR
+				(
+					(
+						(registreringObj.registrering).timeperiod IS NULL 
+						OR
+						(registreringObj.registrering).timeperiod && (b.registrering).timeperiod
+					)
+					AND
+					(
+						(registreringObj.registrering).livscykluskode IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode = (b.registrering).livscykluskode 		
+					) 
+					AND
+					(
+						(registreringObj.registrering).brugerref IS NULL
+						OR
+						(registreringObj.registrering).brugerref = (b.registrering).brugerref
+					)
+					AND
+					(
+						(registreringObj.registrering).note IS NULL
+						OR
+						(b.registrering).note ILIKE (registreringObj.registrering).note
+					)
+			)
+		)
+		AND
+		(
+			(
+				((b.registrering).livscykluskode <> 'Slettet'::Livscykluskode )
+				AND
+					(
+						(registreringObj.registrering) IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode IS NULL 
+					)
+			)
+			OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				(registreringObj.registrering).livscykluskode IS NOT NULL 
+			)
+		)
+		AND
+		(
+			(
+			  (
+			  	(registreringObj.registrering) IS NULL
+			  	OR
+			  	(registreringObj.registrering).timeperiod IS NULL
+			  )
+			  AND
+			  upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			)  	
+		OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				((registreringObj.registrering).timeperiod IS NOT NULL)
+			)
+		)
+		AND
+		((NOT dokument_candidates_is_initialized) OR b.dokument_id = ANY (dokument_candidates) )
+
+            
+
+        );
+
+    dokument_candidates_is_initialized:=true;
+
+    END LOOP;
+
+END IF;
+
+
+
+--RAISE DEBUG 'registrering,%',registreringObj;
+
+
+--/**********************************************************//
+--Filtration on state: Fremdrift
+--/**********************************************************//
+IF registreringObj IS NULL OR (registreringObj).tilsFremdrift IS NULL THEN
+    --RAISE DEBUG 'as_search_dokument: skipping filtration on tilsFremdrift';
+ELSE
+    IF (coalesce(array_length(dokument_candidates,1),0)>0 OR dokument_candidates_is_initialized IS FALSE ) THEN
+
+        FOREACH tilsFremdriftTypeObj IN ARRAY registreringObj.tilsFremdrift
+        LOOP
+            dokument_candidates:=array(
+            SELECT DISTINCT
+            b.dokument_id
+            FROM  dokument_tils_fremdrift a
+            JOIN dokument_registrering b on a.dokument_registrering_id=b.id
+            WHERE
+                (
+                    tilsFremdriftTypeObj.virkning IS NULL
+                    OR
+                    (
+                        (
+                             (tilsFremdriftTypeObj.virkning).TimePeriod IS NULL
+                            OR
+                            (tilsFremdriftTypeObj.virkning).TimePeriod && (a.virkning).TimePeriod
+                        )
+                        AND
+                        (
+                                (tilsFremdriftTypeObj.virkning).AktoerRef IS NULL OR (tilsFremdriftTypeObj.virkning).AktoerRef=(a.virkning).AktoerRef
+                        )
+                        AND
+                        (
+                                (tilsFremdriftTypeObj.virkning).AktoerTypeKode IS NULL OR (tilsFremdriftTypeObj.virkning).AktoerTypeKode=(a.virkning).AktoerTypeKode
+                        )
+                        AND
+                        (
+                                (tilsFremdriftTypeObj.virkning).NoteTekst IS NULL OR (a.virkning).NoteTekst ILIKE (tilsFremdriftTypeObj.virkning).NoteTekst
+                        )
+                    )
+                )
+                AND
+                (
+                    (NOT ((tilsFremdriftTypeObj.virkning) IS NULL OR (tilsFremdriftTypeObj.virkning).TimePeriod IS NULL)) --we have already filtered on virkning above
+                    OR
+                    (
+                        virkningSoeg IS NULL
+                        OR
+                        virkningSoeg && (a.virkning).TimePeriod
+                    )
+                )
+                AND
+                (
+                    tilsFremdriftTypeObj.fremdrift IS NULL
+                    OR
+                    tilsFremdriftTypeObj.fremdrift = a.fremdrift
+                )
+                AND
+                		(
+				(registreringObj.registrering) IS NULL 
+				OR
+				(
+					(
+						(registreringObj.registrering).timeperiod IS NULL 
+						OR
+						(registreringObj.registrering).timeperiod && (b.registrering).timeperiod
+					)
+					AND
+					(
+						(registreringObj.registrering).livscykluskode IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode = (b.registrering).livscykluskode 		
+					) 
+					AND
+					(
+						(registreringObj.registrering).brugerref IS NULL
+						OR
+						(registreringObj.registrering).brugerref = (b.registrering).brugerref
+					)
+					AND
+					(
+						(registreringObj.registrering).note IS NULL
+						OR
+						(b.registrering).note ILIKE (registreringObj.registrering).note
+					)
+			)
+		)
+		AND
+		(
+			(
+				((b.registrering).livscykluskode <> 'Slettet'::Livscykluskode )
+				AND
+					(
+						(registreringObj.registrering) IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode IS NULL 
+					)
+			)
+			OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				(registreringObj.registrering).livscykluskode IS NOT NULL 
+			)
+		)
+		AND
+		(
+			(
+			  (
+			  	(registreringObj.registrering) IS NULL
+			  	OR
+			  	(registreringObj.registrering).timeperiod IS NULL
+			  )
+			  AND
+			  upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			)  	
+		OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				((registreringObj.registrering).timeperiod IS NOT NULL)
+			)
+		)
+		AND
+		((NOT dokument_candidates_is_initialized) OR b.dokument_id = ANY (dokument_candidates) )
+
+    );
+
+
+            dokument_candidates_is_initialized:=true;
+
+
+        END LOOP;
+    END IF;
+END IF;
+
+/*
+--relationer DokumentRelationType[]
+*/
+
+
+--RAISE DEBUG 'dokument_candidates_is_initialized step 4:%',dokument_candidates_is_initialized;
+--RAISE DEBUG 'dokument_candidates step 4:%',dokument_candidates;
+
+--/**********************************************************//
+--Filtration on relations
+--/**********************************************************//
+
+
+IF registreringObj IS NULL OR (registreringObj).relationer IS NULL THEN
+    --RAISE DEBUG 'as_search_dokument: skipping filtration on relationer';
+ELSE
+    IF (coalesce(array_length(dokument_candidates,1),0)>0 OR NOT dokument_candidates_is_initialized) AND (registreringObj).relationer IS NOT NULL THEN
+        FOREACH relationTypeObj IN ARRAY registreringObj.relationer
+        LOOP
+            dokument_candidates:=array(
+            SELECT DISTINCT
+            b.dokument_id
+            FROM  dokument_relation a
+            JOIN dokument_registrering b on a.dokument_registrering_id=b.id
+            WHERE
+                (
+                    relationTypeObj.virkning IS NULL
+                    OR
+                    (
+                        (
+                             (relationTypeObj.virkning).TimePeriod IS NULL
+                            OR
+                            (relationTypeObj.virkning).TimePeriod && (a.virkning).TimePeriod
+                        )
+                        AND
+                        (
+                                (relationTypeObj.virkning).AktoerRef IS NULL OR (relationTypeObj.virkning).AktoerRef=(a.virkning).AktoerRef
+                        )
+                        AND
+                        (
+                                (relationTypeObj.virkning).AktoerTypeKode IS NULL OR (relationTypeObj.virkning).AktoerTypeKode=(a.virkning).AktoerTypeKode
+                        )
+                        AND
+                        (
+                                (relationTypeObj.virkning).NoteTekst IS NULL OR (a.virkning).NoteTekst ILIKE (relationTypeObj.virkning).NoteTekst
+                        )
+                    )
+                )
+                AND
+                (
+                    (NOT (relationTypeObj.virkning IS NULL OR (relationTypeObj.virkning).TimePeriod IS NULL)) --we have already filtered on virkning above
+                    OR
+                    (
+                        virkningSoeg IS NULL
+                        OR
+                        virkningSoeg && (a.virkning).TimePeriod
+                    )
+                )
+                AND
+                (
+                    relationTypeObj.relType IS NULL
+                    OR
+                    relationTypeObj.relType = a.rel_type
+                )
+                AND
+                (
+                    relationTypeObj.uuid IS NULL
+                    OR
+                    relationTypeObj.uuid = a.rel_maal_uuid
+                )
+                AND
+                (
+                    relationTypeObj.objektType IS NULL
+                    OR
+                    relationTypeObj.objektType = a.objekt_type
+                )
+                AND
+                (
+                    relationTypeObj.urn IS NULL
+                    OR
+                    relationTypeObj.urn = a.rel_maal_urn
+                )
+                
+                
+                AND
+                		(
 				(registreringObj.registrering) IS NULL 
 				OR
 				(
@@ -11408,8 +11926,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_dokument(dokument_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_dokument(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_dokument(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -11598,7 +12116,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_dokument(
     virkningSoeg TSTZRANGE,
     registreringObj    DokumentRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     dokument_sorted_uuid uuid[];
@@ -11610,6 +12130,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in dokument_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(dokument_uuids) u(id)
+       LEFT JOIN dokument_aktuel c ON c.dokument_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.dokument_id
+                    FROM dokument_aktuel c
+                   WHERE c.dokument_id = ANY (dokument_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.dokument_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.dokument_id
+                FROM dokument_aktuel c
+               WHERE c.dokument_id = ANY (dokument_uuids)
+                 AND (c.sorteringsnoegle, c.dokument_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.dokument_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     dokument_sorted_uuid:=array(
           SELECT b.dokument_id
             FROM dokument_registrering b
@@ -11618,6 +12173,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.dokument_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.dokument_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.dokument_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -11627,6 +12188,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_dokument sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_dokument(
+    dokument_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    DokumentRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM dokument_registrering b
+            JOIN dokument_attr_egenskaber a ON a.dokument_registrering_id=b.id
+           WHERE b.dokument_id = dokument_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -11639,267 +12228,307 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_dokument(
-	dokument_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_dokument(
+	dokument_uuid uuid,
 	registreringObjArr DokumentRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	dokument_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	dokument_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj DokumentEgenskaberAttrType;
-	
-  	tilsFremdriftTypeObj DokumentFremdriftTilsType;
-	relationTypeObj DokumentRelationType;
-	registreringObj DokumentRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN dokument_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF dokument_uuids IS NULL OR coalesce(array_length(dokument_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-dokument_candidates:= dokument_uuids;
-
-
-
---RAISE DEBUG 'dokument_candidates_is_initialized step 1:%',dokument_candidates_is_initialized;
---RAISE DEBUG 'dokument_candidates step 1:%',dokument_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_dokument: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(dokument_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			dokument_candidates:=array(
-			SELECT DISTINCT
-			b.dokument_id 
-			FROM  dokument_attr_egenskaber a 
-			JOIN dokument_registrering b on a.dokument_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM dokument_attr_egenskaber a
+				JOIN dokument_registrering b on a.dokument_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.beskrivelse IS NULL
-					OR 
-					a.beskrivelse = attrEgenskaberTypeObj.beskrivelse 
+					f.beskrivelse IS NULL
+					OR
+					a.beskrivelse = f.beskrivelse
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.brevdato IS NULL
-					OR 
-					a.brevdato = attrEgenskaberTypeObj.brevdato 
+					f.brevdato IS NULL
+					OR
+					a.brevdato = f.brevdato
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.kassationskode IS NULL
-					OR 
-					a.kassationskode = attrEgenskaberTypeObj.kassationskode 
+					f.kassationskode IS NULL
+					OR
+					a.kassationskode = f.kassationskode
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.major IS NULL
-					OR 
-					a.major = attrEgenskaberTypeObj.major 
+					f.major IS NULL
+					OR
+					a.major = f.major
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.minor IS NULL
-					OR 
-					a.minor = attrEgenskaberTypeObj.minor 
+					f.minor IS NULL
+					OR
+					a.minor = f.minor
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.offentlighedundtaget IS NULL
+					f.offentlighedundtaget IS NULL
 					OR
 						(
 							(
-								(attrEgenskaberTypeObj.offentlighedundtaget).AlternativTitel IS NULL
+								(f.offentlighedundtaget).AlternativTitel IS NULL
 								OR
-								(a.offentlighedundtaget).AlternativTitel = (attrEgenskaberTypeObj.offentlighedundtaget).AlternativTitel 
+								(a.offentlighedundtaget).AlternativTitel = (f.offentlighedundtaget).AlternativTitel
 							)
 							AND
 							(
-								(attrEgenskaberTypeObj.offentlighedundtaget).Hjemmel IS NULL
+								(f.offentlighedundtaget).Hjemmel IS NULL
 								OR
-								(a.offentlighedundtaget).Hjemmel = (attrEgenskaberTypeObj.offentlighedundtaget).Hjemmel
+								(a.offentlighedundtaget).Hjemmel = (f.offentlighedundtaget).Hjemmel
 							)
-						) 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.titel IS NULL
-					OR 
-					a.titel = attrEgenskaberTypeObj.titel 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.dokumenttype IS NULL
-					OR 
-					a.dokumenttype = attrEgenskaberTypeObj.dokumenttype 
+						)
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.dokument_id = ANY (dokument_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'dokument_candidates_is_initialized step 3:%',dokument_candidates_is_initialized;
---RAISE DEBUG 'dokument_candidates step 3:%',dokument_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Fremdrift
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsFremdrift IS NULL THEN
-	--RAISE DEBUG 'as_search_dokument: skipping filtration on tilsFremdrift';
-ELSE
-	IF coalesce(array_length(dokument_candidates,1),0)>0 THEN 
-
-		FOREACH tilsFremdriftTypeObj IN ARRAY registreringObj.tilsFremdrift
-		LOOP
-			dokument_candidates:=array(
-			SELECT DISTINCT
-			b.dokument_id 
-			FROM  dokument_tils_fremdrift a
-			JOIN dokument_registrering b on a.dokument_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsFremdriftTypeObj.fremdrift IS NULL
-					OR
-					tilsFremdriftTypeObj.fremdrift = a.fremdrift
-				)
-				AND b.dokument_id = ANY (dokument_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer DokumentRelationType[]
-*/
-
-
---RAISE DEBUG 'dokument_candidates_is_initialized step 4:%',dokument_candidates_is_initialized;
---RAISE DEBUG 'dokument_candidates step 4:%',dokument_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_dokument: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(dokument_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			dokument_candidates:=array(
-			SELECT DISTINCT
-			b.dokument_id 
-			FROM  dokument_relation a
-			JOIN dokument_registrering b on a.dokument_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
+					f.titel IS NULL
 					OR
-					relationTypeObj.relType = a.rel_type
+					a.titel = f.titel
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.dokumenttype IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.dokumenttype = f.dokumenttype
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.dokument_id = dokument_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Fremdrift
+	--/**********************************************************//
+	AND (
+		r.tilsFremdrift IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsFremdrift) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM dokument_tils_fremdrift a
+				JOIN dokument_registrering b on a.dokument_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.fremdrift IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.fremdrift = a.fremdrift
 				)
-				AND b.dokument_id = ANY (dokument_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'dokument_candidates_is_initialized step 5:%',dokument_candidates_is_initialized;
---RAISE DEBUG 'dokument_candidates step 5:%',dokument_candidates;
-
-dokument_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (dokument_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (dokument_candidates) b(id)
+				AND b.dokument_id = dokument_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM dokument_relation a
+			JOIN dokument_registrering b on a.dokument_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.dokument_id = dokument_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(dokument_passed_auth_filter,1),0)=coalesce(array_length(dokument_uuids,1),0) AND dokument_passed_auth_filter @>dokument_uuids THEN
-	RETURN dokument_passed_auth_filter;
-END IF;
 
+CREATE OR REPLACE FUNCTION _as_filter_unauth_dokument(
+	dokument_uuids uuid[],
+	registreringObjArr DokumentRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	dokument_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(dokument_uuids) a(id)
+	WHERE _as_is_authorized_dokument(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN dokument_passed_auth_filter;
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
+/*
+NOTICE: This file is auto-generated!
+*/
 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in dokument_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_dokument(
+    dokument_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM dokument_registrering b
+     WHERE b.dokument_id = dokument_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM dokument_attr_egenskaber a
+         WHERE a.dokument_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM dokument_tils_fremdrift a
+         WHERE a.dokument_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM dokument_variant_egenskaber a
+          JOIN dokument_variant b ON b.id = a.variant_id
+         WHERE b.dokument_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM dokument_del_egenskaber a
+          JOIN dokument_del c ON c.id = a.del_id
+          JOIN dokument_variant b ON b.id = c.variant_id
+         WHERE b.dokument_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM dokument_del_relation a
+          JOIN dokument_del c ON c.id = a.del_id
+          JOIN dokument_variant b ON b.id = c.variant_id
+         WHERE b.dokument_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM dokument_relation a
+         WHERE a.dokument_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_dokument(
+        ARRAY[dokument_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM dokument_attr_egenskaber a
+         WHERE a.dokument_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
+
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM dokument_aktuel
+         WHERE dokument_id = dokument_uuid;
+    ELSE
+        INSERT INTO dokument_aktuel (
+            dokument_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            dokument_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (dokument_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -12068,6 +12697,25 @@ CREATE INDEX facet_id_idx
     ON facet_registrering (facet_id);
 
 
+CREATE INDEX facet_registrering_idx_timeperiod_lower
+    ON facet_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX facet_registrering_idx_timeperiod
+    ON facet_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX facet_registrering_idx_current
+    ON facet_registrering
+    USING btree
+    (facet_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_facet
     AFTER INSERT OR UPDATE OR DELETE ON facet_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -12075,6 +12723,38 @@ CREATE TRIGGER notify_facet
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_facet
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_facet. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_facet sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE facet_aktuel (
+    facet_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT facet_aktuel_pkey PRIMARY KEY (facet_id),
+    CONSTRAINT facet_aktuel_facet_fkey FOREIGN KEY (facet_id)
+        REFERENCES facet (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE facet_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX facet_aktuel_idx_sorteringsnoegle
+    ON facet_aktuel
+    USING btree
+    (sorteringsnoegle, facet_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE facet_attr_egenskaber_id_seq
@@ -12203,6 +12883,11 @@ ALTER TABLE facet_attr_egenskaber
 
 
 
+CREATE INDEX facet_attr_egenskaber_idx_virkning_timeperiod
+    ON facet_attr_egenskaber
+    USING gist
+    (facet_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX facet_attr_egenskaber_idx_virkning_aktoerref
     ON facet_attr_egenskaber
     USING btree
@@ -12223,6 +12908,32 @@ CREATE INDEX facet_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_facet_attr_egenskaber(
+    facet_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).beskrivelse,
+        ($1).opbygning,
+        ($1).ophavsret,
+        ($1).plan,
+        ($1).supplement,
+        ($1).retskilde,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX facet_attr_egenskaber_pat_search_text
+    ON facet_attr_egenskaber
+    USING gin
+    (_as_search_text_facet_attr_egenskaber(facet_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -12265,6 +12976,11 @@ CREATE INDEX facet_tils_publiceret_idx_publiceret
     USING btree
     (publiceret);
   
+CREATE INDEX facet_tils_publiceret_idx_virkning_timeperiod
+    ON facet_tils_publiceret
+    USING gist
+    (facet_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX facet_tils_publiceret_idx_virkning_aktoerref
     ON facet_tils_publiceret
     USING btree
@@ -12355,6 +13071,11 @@ CREATE INDEX facet_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX facet_relation_idx_virkning_timeperiod
+    ON facet_relation
+    USING gist
+    (facet_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX facet_relation_idx_virkning_aktoerref
     ON facet_relation
     USING btree
@@ -12528,12 +13249,17 @@ CREATE OR REPLACE FUNCTION _as_create_facet_registrering(
     note text DEFAULT ''::text
 ) RETURNS facet_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     facet_registrering_id bigint;
     facet_registrering    facet_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE facet_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -12667,8 +13393,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -12688,9 +13414,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -13010,6 +13733,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating facet with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', facet_uuid, to_json(read_new_facet_reg), to_json(read_prev_facet_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_facet(facet_uuid);
 
     return new_facet_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -13196,7 +13920,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(facet_registrering.relationer) a
+    FROM unnest(facet_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -13210,7 +13934,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_facet(facet_uuid);
 
 
 RETURN facet_uuid;
@@ -13444,7 +14168,9 @@ CREATE OR REPLACE FUNCTION as_search_facet(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr FacetRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -13766,21 +14492,27 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.facet_id
-            
             FROM  facet_attr_egenskaber a
             JOIN facet_registrering b on a.facet_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.beskrivelse ILIKE anyAttrValue OR
-                        a.opbygning ILIKE anyAttrValue OR
-                        a.ophavsret ILIKE anyAttrValue OR
-                        a.plan ILIKE anyAttrValue OR
-                        a.supplement ILIKE anyAttrValue OR
-                        a.retskilde ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_facet_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.beskrivelse ILIKE anyAttrValue
+                        OR a.opbygning ILIKE anyAttrValue
+                        OR a.ophavsret ILIKE anyAttrValue
+                        OR a.plan ILIKE anyAttrValue
+                        OR a.supplement ILIKE anyAttrValue
+                        OR a.retskilde ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -13789,7 +14521,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -13858,6 +14589,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT facet_candidates_is_initialized) OR b.facet_id = ANY (facet_candidates) )
 
+            
 
         );
 
@@ -14478,8 +15210,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_facet(facet_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_facet(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_facet(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -14668,7 +15400,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_facet(
     virkningSoeg TSTZRANGE,
     registreringObj    FacetRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     facet_sorted_uuid uuid[];
@@ -14680,6 +15414,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in facet_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(facet_uuids) u(id)
+       LEFT JOIN facet_aktuel c ON c.facet_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.facet_id
+                    FROM facet_aktuel c
+                   WHERE c.facet_id = ANY (facet_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.facet_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.facet_id
+                FROM facet_aktuel c
+               WHERE c.facet_id = ANY (facet_uuids)
+                 AND (c.sorteringsnoegle, c.facet_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.facet_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     facet_sorted_uuid:=array(
           SELECT b.facet_id
             FROM facet_registrering b
@@ -14688,6 +15457,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.facet_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.facet_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.facet_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -14697,6 +15472,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_facet sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_facet(
+    facet_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    FacetRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM facet_registrering b
+            JOIN facet_attr_egenskaber a ON a.facet_registrering_id=b.id
+           WHERE b.facet_id = facet_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -14709,243 +15512,266 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_facet(
-	facet_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_facet(
+	facet_uuid uuid,
 	registreringObjArr FacetRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	facet_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	facet_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj FacetEgenskaberAttrType;
-	
-  	tilsPubliceretTypeObj FacetPubliceretTilsType;
-	relationTypeObj FacetRelationType;
-	registreringObj FacetRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN facet_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF facet_uuids IS NULL OR coalesce(array_length(facet_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-facet_candidates:= facet_uuids;
-
-
-
---RAISE DEBUG 'facet_candidates_is_initialized step 1:%',facet_candidates_is_initialized;
---RAISE DEBUG 'facet_candidates step 1:%',facet_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_facet: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(facet_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			facet_candidates:=array(
-			SELECT DISTINCT
-			b.facet_id 
-			FROM  facet_attr_egenskaber a 
-			JOIN facet_registrering b on a.facet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.beskrivelse IS NULL
-					OR 
-					a.beskrivelse = attrEgenskaberTypeObj.beskrivelse 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.opbygning IS NULL
-					OR 
-					a.opbygning = attrEgenskaberTypeObj.opbygning 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM facet_attr_egenskaber a
+				JOIN facet_registrering b on a.facet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.ophavsret IS NULL
-					OR 
-					a.ophavsret = attrEgenskaberTypeObj.ophavsret 
+					f.beskrivelse IS NULL
+					OR
+					a.beskrivelse = f.beskrivelse
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.plan IS NULL
-					OR 
-					a.plan = attrEgenskaberTypeObj.plan 
+					f.opbygning IS NULL
+					OR
+					a.opbygning = f.opbygning
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.supplement IS NULL
-					OR 
-					a.supplement = attrEgenskaberTypeObj.supplement 
+					f.ophavsret IS NULL
+					OR
+					a.ophavsret = f.ophavsret
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.retskilde IS NULL
-					OR 
-					a.retskilde = attrEgenskaberTypeObj.retskilde 
+					f.plan IS NULL
+					OR
+					a.plan = f.plan
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.facet_id = ANY (facet_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'facet_candidates_is_initialized step 3:%',facet_candidates_is_initialized;
---RAISE DEBUG 'facet_candidates step 3:%',facet_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Publiceret
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsPubliceret IS NULL THEN
-	--RAISE DEBUG 'as_search_facet: skipping filtration on tilsPubliceret';
-ELSE
-	IF coalesce(array_length(facet_candidates,1),0)>0 THEN 
-
-		FOREACH tilsPubliceretTypeObj IN ARRAY registreringObj.tilsPubliceret
-		LOOP
-			facet_candidates:=array(
-			SELECT DISTINCT
-			b.facet_id 
-			FROM  facet_tils_publiceret a
-			JOIN facet_registrering b on a.facet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsPubliceretTypeObj.publiceret IS NULL
+					f.supplement IS NULL
 					OR
-					tilsPubliceretTypeObj.publiceret = a.publiceret
-				)
-				AND b.facet_id = ANY (facet_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer FacetRelationType[]
-*/
-
-
---RAISE DEBUG 'facet_candidates_is_initialized step 4:%',facet_candidates_is_initialized;
---RAISE DEBUG 'facet_candidates step 4:%',facet_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_facet: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(facet_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			facet_candidates:=array(
-			SELECT DISTINCT
-			b.facet_id 
-			FROM  facet_relation a
-			JOIN facet_registrering b on a.facet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
-					OR
-					relationTypeObj.relType = a.rel_type
+					a.supplement = f.supplement
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.retskilde IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.retskilde = f.retskilde
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.facet_id = facet_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Publiceret
+	--/**********************************************************//
+	AND (
+		r.tilsPubliceret IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsPubliceret) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM facet_tils_publiceret a
+				JOIN facet_registrering b on a.facet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.publiceret IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.publiceret = a.publiceret
 				)
-				AND b.facet_id = ANY (facet_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'facet_candidates_is_initialized step 5:%',facet_candidates_is_initialized;
---RAISE DEBUG 'facet_candidates step 5:%',facet_candidates;
-
-facet_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (facet_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (facet_candidates) b(id)
+				AND b.facet_id = facet_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM facet_relation a
+			JOIN facet_registrering b on a.facet_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.facet_id = facet_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(facet_passed_auth_filter,1),0)=coalesce(array_length(facet_uuids,1),0) AND facet_passed_auth_filter @>facet_uuids THEN
-	RETURN facet_passed_auth_filter;
-END IF;
 
+CREATE OR REPLACE FUNCTION _as_filter_unauth_facet(
+	facet_uuids uuid[],
+	registreringObjArr FacetRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	facet_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(facet_uuids) a(id)
+	WHERE _as_is_authorized_facet(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN facet_passed_auth_filter;
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
+/*
+NOTICE: This file is auto-generated!
+*/
 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in facet_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_facet(
+    facet_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM facet_registrering b
+     WHERE b.facet_id = facet_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM facet_attr_egenskaber a
+         WHERE a.facet_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM facet_tils_publiceret a
+         WHERE a.facet_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM facet_relation a
+         WHERE a.facet_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_facet(
+        ARRAY[facet_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM facet_attr_egenskaber a
+         WHERE a.facet_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
+
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM facet_aktuel
+         WHERE facet_id = facet_uuid;
+    ELSE
+        INSERT INTO facet_aktuel (
+            facet_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            facet_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (facet_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -15128,6 +15954,25 @@ CREATE INDEX indsats_id_idx
     ON indsats_registrering (indsats_id);
 
 
+CREATE INDEX indsats_registrering_idx_timeperiod_lower
+    ON indsats_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX indsats_registrering_idx_timeperiod
+    ON indsats_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX indsats_registrering_idx_current
+    ON indsats_registrering
+    USING btree
+    (indsats_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_indsats
     AFTER INSERT OR UPDATE OR DELETE ON indsats_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -15135,6 +15980,38 @@ CREATE TRIGGER notify_indsats
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_indsats
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_indsats. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_indsats sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE indsats_aktuel (
+    indsats_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT indsats_aktuel_pkey PRIMARY KEY (indsats_id),
+    CONSTRAINT indsats_aktuel_indsats_fkey FOREIGN KEY (indsats_id)
+        REFERENCES indsats (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE indsats_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX indsats_aktuel_idx_sorteringsnoegle
+    ON indsats_aktuel
+    USING btree
+    (sorteringsnoegle, indsats_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE indsats_attr_egenskaber_id_seq
@@ -15229,6 +16106,11 @@ ALTER TABLE indsats_attr_egenskaber
 
 
 
+CREATE INDEX indsats_attr_egenskaber_idx_virkning_timeperiod
+    ON indsats_attr_egenskaber
+    USING gist
+    (indsats_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX indsats_attr_egenskaber_idx_virkning_aktoerref
     ON indsats_attr_egenskaber
     USING btree
@@ -15249,6 +16131,27 @@ CREATE INDEX indsats_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_indsats_attr_egenskaber(
+    indsats_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).beskrivelse,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX indsats_attr_egenskaber_pat_search_text
+    ON indsats_attr_egenskaber
+    USING gin
+    (_as_search_text_indsats_attr_egenskaber(indsats_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -15291,6 +16194,11 @@ CREATE INDEX indsats_tils_publiceret_idx_publiceret
     USING btree
     (publiceret);
   
+CREATE INDEX indsats_tils_publiceret_idx_virkning_timeperiod
+    ON indsats_tils_publiceret
+    USING gist
+    (indsats_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX indsats_tils_publiceret_idx_virkning_aktoerref
     ON indsats_tils_publiceret
     USING btree
@@ -15344,6 +16252,11 @@ CREATE INDEX indsats_tils_fremdrift_idx_fremdrift
     USING btree
     (fremdrift);
   
+CREATE INDEX indsats_tils_fremdrift_idx_virkning_timeperiod
+    ON indsats_tils_fremdrift
+    USING gist
+    (indsats_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX indsats_tils_fremdrift_idx_virkning_aktoerref
     ON indsats_tils_fremdrift
     USING btree
@@ -15441,6 +16354,11 @@ CREATE INDEX indsats_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX indsats_relation_idx_virkning_timeperiod
+    ON indsats_relation
+    USING gist
+    (indsats_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX indsats_relation_idx_virkning_aktoerref
     ON indsats_relation
     USING btree
@@ -15642,12 +16560,17 @@ CREATE OR REPLACE FUNCTION _as_create_indsats_registrering(
     note text DEFAULT ''::text
 ) RETURNS indsats_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     indsats_registrering_id bigint;
     indsats_registrering    indsats_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE indsats_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -15749,12 +16672,8 @@ DECLARE
     auth_filtered_uuids uuid[];
 
     
-    rel_type_max_index_prev_rev int;
     rel_type_max_index_arr _indsatsRelationMaxIndex[];
     indsats_rel_type_cardinality_unlimited indsatsRelationKode[]:=ARRAY['indsatskvalitet'::IndsatsRelationKode,'indsatsaktoer'::IndsatsRelationKode,'samtykke'::IndsatsRelationKode,'indsatssag'::IndsatsRelationKode,'indsatsdokument'::IndsatsRelationKode];
-    indsats_uuid_underscores text;
-    indsats_rel_seq_name text;
-    indsats_rel_type_cardinality_unlimited_present_in_argument IndsatsRelationKode[];
     
 BEGIN
     -- Create a new registrering
@@ -15790,8 +16709,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -15815,39 +16734,6 @@ BEGIN
              AND a.rel_type = ANY (indsats_rel_type_cardinality_unlimited)
         GROUP BY rel_type
     ) AS a;
-
- 
-    ---Create temporary sequences
-    
-    indsats_uuid_underscores:=replace(indsats_uuid::text, '-', '_');
-    
-
-    SELECT array_agg(DISTINCT a.RelType) INTO indsats_rel_type_cardinality_unlimited_present_in_argument FROM unnest(relationer) a WHERE a.RelType = ANY (indsats_rel_type_cardinality_unlimited);
-    
-
-    IF coalesce(array_length(indsats_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        FOREACH indsats_relation_navn IN ARRAY (indsats_rel_type_cardinality_unlimited_present_in_argument) LOOP
-            indsats_rel_seq_name := 'indsats_' || indsats_relation_navn::text || indsats_uuid_underscores;
-
-            rel_type_max_index_prev_rev := null;
-
-            SELECT a.indeks into rel_type_max_index_prev_rev
-              FROM unnest(rel_type_max_index_arr) a(relType,indeks)
-             WHERE a.relType=indsats_relation_navn;
-
-            IF rel_type_max_index_prev_rev IS NULL THEN
-              rel_type_max_index_prev_rev := 0;
-            END IF;
-
-            EXECUTE 'CREATE TEMPORARY SEQUENCE ' || indsats_rel_seq_name || '
-            INCREMENT 1
-            MINVALUE 1
-            MAXVALUE 9223372036854775807
-            START ' ||  (rel_type_max_index_prev_rev+1)::text ||'
-            CACHE 1;';
-
-        END LOOP;
-    END IF;
     
 
     INSERT INTO indsats_relation (indsats_registrering_id, virkning, rel_maal_uuid, rel_maal_urn, rel_type, objekt_type , rel_index )
@@ -15863,8 +16749,9 @@ BEGIN
                     OR b.id IS NULL THEN
                     -- For new relations and relations with index given that
                     -- is not found in prev registrering, we'll assign new
-                    -- index values.
-                    nextval('indsats_' || a.relType::text || indsats_uuid_underscores)
+                    -- index values, numbered in the order given.
+                    coalesce(m.indeks, 0) + count(*) FILTER (WHERE a.indeks IS NULL
+                        OR b.id IS NULL) OVER (PARTITION BY a.relType ORDER BY a.ordinality ROWS UNBOUNDED PRECEDING)
                 ELSE
                     a.indeks
                 END
@@ -15872,22 +16759,9 @@ BEGIN
                 NULL
             END 
         FROM
-            unnest(relationer) AS a 
-        LEFT JOIN indsats_relation b ON a.relType = ANY (indsats_rel_type_cardinality_unlimited) AND b.indsats_registrering_id = prev_indsats_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index ;
-
-    
-    -- Drop temporary sequences
-    IF coalesce(array_length(indsats_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        
-        FOREACH indsats_relation_navn IN ARRAY (indsats_rel_type_cardinality_unlimited_present_in_argument)
-        
-        LOOP
-          indsats_rel_seq_name := 'indsats_' || indsats_relation_navn::text || indsats_uuid_underscores;
-          EXECUTE 'DROP SEQUENCE ' || indsats_rel_seq_name || ';';
-        END LOOP;
-    END IF;
-    
-
+            unnest(relationer) WITH ORDINALITY AS a 
+        LEFT JOIN indsats_relation b ON a.relType = ANY (indsats_rel_type_cardinality_unlimited) AND b.indsats_registrering_id = prev_indsats_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index
+        LEFT JOIN unnest(rel_type_max_index_arr) m (relType, indeks) ON m.relType = a.relType ;
 
     -- Ad 2)
     -- 0..1 relations
@@ -16237,6 +17111,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating indsats with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', indsats_uuid, to_json(read_new_indsats_reg), to_json(read_prev_indsats_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_indsats(indsats_uuid);
 
     return new_indsats_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -16279,11 +17154,7 @@ $$ DECLARE indsats_registrering_id bigint;
     auth_filtered_uuids uuid[];
 
     
-    indsats_relation_kode indsatsRelationKode;
-    indsats_uuid_underscores text;
-    indsats_rel_seq_name text;
     indsats_rel_type_cardinality_unlimited indsatsRelationKode[]:=ARRAY['indsatskvalitet'::IndsatsRelationKode,'indsatsaktoer'::IndsatsRelationKode,'samtykke'::IndsatsRelationKode,'indsatssag'::IndsatsRelationKode,'indsatsdokument'::IndsatsRelationKode]::indsatsRelationKode[];
-    indsats_rel_type_cardinality_unlimited_present_in_argument indsatsRelationKode[];
     
 
     does_exist boolean;
@@ -16434,25 +17305,6 @@ END IF;
 
 IF coalesce(array_length(indsats_registrering.relationer,1),0)>0 THEN
 
---Create temporary sequences
-indsats_uuid_underscores:=replace(indsats_uuid::text, '-', '_');
-
-SELECT array_agg(DISTINCT a.RelType) into indsats_rel_type_cardinality_unlimited_present_in_argument FROM unnest(indsats_registrering.relationer) a WHERE a.RelType = any (indsats_rel_type_cardinality_unlimited) ;
-IF coalesce(array_length(indsats_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-
-FOREACH indsats_relation_kode IN ARRAY (indsats_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  indsats_rel_seq_name := 'indsats_' || indsats_relation_kode::text || indsats_uuid_underscores;
-
-  EXECUTE 'CREATE TEMPORARY SEQUENCE ' || indsats_rel_seq_name || '
-  INCREMENT 1
-  MINVALUE 1
-  MAXVALUE 9223372036854775807
-  START 1
-  CACHE 1;';
-
-END LOOP;
-END IF;
 
 
     INSERT INTO indsats_relation (
@@ -16472,25 +17324,15 @@ END IF;
       a.relType,
       a.objektType,
       CASE WHEN a.relType = any (indsats_rel_type_cardinality_unlimited) THEN --rel_index
-      nextval('indsats_' || a.relType::text || indsats_uuid_underscores)
+      row_number() OVER (PARTITION BY a.relType ORDER BY a.ordinality)
       ELSE 
       NULL
       END
-    FROM unnest(indsats_registrering.relationer) a
+    FROM unnest(indsats_registrering.relationer) WITH ORDINALITY a
   ;
 
 
 
---Drop temporary sequences
-IF coalesce(array_length(indsats_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-FOREACH indsats_relation_kode IN ARRAY (indsats_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  indsats_rel_seq_name := 'indsats_' || indsats_relation_kode::text || indsats_uuid_underscores;
-  EXECUTE 'DROP SEQUENCE ' || indsats_rel_seq_name || ';';
-END LOOP;
-END IF;
-
-
 END IF;
 
 
@@ -16502,7 +17344,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_indsats(indsats_uuid);
 
 
 RETURN indsats_uuid;
@@ -16768,7 +17610,9 @@ CREATE OR REPLACE FUNCTION as_search_indsats(
     ,
     search_operator_greater_than_or_equal_attr_egenskaber IndsatsEgenskaberAttrType[]=null,
     search_operator_less_than_or_equal_attr_egenskaber    IndsatsEgenskaberAttrType[]=null
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -17073,18 +17917,26 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.indsats_id
-            
             FROM  indsats_attr_egenskaber a
             JOIN indsats_registrering b on a.indsats_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.beskrivelse ILIKE anyAttrValue OR
-                                    a.starttidspunkt::text ilike anyAttrValue OR
-                                    a.sluttidspunkt::text ilike anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_indsats_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.beskrivelse ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
+                OR
+                a.starttidspunkt::text ilike anyAttrValue
+                OR
+                a.sluttidspunkt::text ilike anyAttrValue
             )
             AND
             (
@@ -17093,7 +17945,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -17162,6 +18013,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT indsats_candidates_is_initialized) OR b.indsats_id = ANY (indsats_candidates) )
 
+            
 
         );
 
@@ -18244,8 +19096,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_indsats(indsats_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_indsats(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_indsats(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -18441,7 +19293,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_indsats(
     virkningSoeg TSTZRANGE,
     registreringObj    IndsatsRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     indsats_sorted_uuid uuid[];
@@ -18453,6 +19307,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in indsats_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(indsats_uuids) u(id)
+       LEFT JOIN indsats_aktuel c ON c.indsats_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.indsats_id
+                    FROM indsats_aktuel c
+                   WHERE c.indsats_id = ANY (indsats_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.indsats_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.indsats_id
+                FROM indsats_aktuel c
+               WHERE c.indsats_id = ANY (indsats_uuids)
+                 AND (c.sorteringsnoegle, c.indsats_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.indsats_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     indsats_sorted_uuid:=array(
           SELECT b.indsats_id
             FROM indsats_registrering b
@@ -18461,6 +19350,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.indsats_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.indsats_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.indsats_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -18470,6 +19365,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_indsats sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_indsats(
+    indsats_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    IndsatsRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM indsats_registrering b
+            JOIN indsats_attr_egenskaber a ON a.indsats_registrering_id=b.id
+           WHERE b.indsats_id = indsats_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -18482,254 +19405,275 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_indsats(
-	indsats_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_indsats(
+	indsats_uuid uuid,
 	registreringObjArr IndsatsRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	indsats_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	indsats_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj IndsatsEgenskaberAttrType;
-	
-  	tilsPubliceretTypeObj IndsatsPubliceretTilsType;
-  	tilsFremdriftTypeObj IndsatsFremdriftTilsType;
-	relationTypeObj IndsatsRelationType;
-	registreringObj IndsatsRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN indsats_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF indsats_uuids IS NULL OR coalesce(array_length(indsats_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-indsats_candidates:= indsats_uuids;
-
-
-
---RAISE DEBUG 'indsats_candidates_is_initialized step 1:%',indsats_candidates_is_initialized;
---RAISE DEBUG 'indsats_candidates step 1:%',indsats_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_indsats: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(indsats_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			indsats_candidates:=array(
-			SELECT DISTINCT
-			b.indsats_id 
-			FROM  indsats_attr_egenskaber a 
-			JOIN indsats_registrering b on a.indsats_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.beskrivelse IS NULL
-					OR 
-					a.beskrivelse = attrEgenskaberTypeObj.beskrivelse 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.starttidspunkt IS NULL
-					OR 
-					a.starttidspunkt = attrEgenskaberTypeObj.starttidspunkt 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM indsats_attr_egenskaber a
+				JOIN indsats_registrering b on a.indsats_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.sluttidspunkt IS NULL
-					OR 
-					a.sluttidspunkt = attrEgenskaberTypeObj.sluttidspunkt 
+					f.beskrivelse IS NULL
+					OR
+					a.beskrivelse = f.beskrivelse
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.indsats_id = ANY (indsats_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'indsats_candidates_is_initialized step 3:%',indsats_candidates_is_initialized;
---RAISE DEBUG 'indsats_candidates step 3:%',indsats_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Publiceret
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsPubliceret IS NULL THEN
-	--RAISE DEBUG 'as_search_indsats: skipping filtration on tilsPubliceret';
-ELSE
-	IF coalesce(array_length(indsats_candidates,1),0)>0 THEN 
-
-		FOREACH tilsPubliceretTypeObj IN ARRAY registreringObj.tilsPubliceret
-		LOOP
-			indsats_candidates:=array(
-			SELECT DISTINCT
-			b.indsats_id 
-			FROM  indsats_tils_publiceret a
-			JOIN indsats_registrering b on a.indsats_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsPubliceretTypeObj.publiceret IS NULL
+					f.starttidspunkt IS NULL
 					OR
-					tilsPubliceretTypeObj.publiceret = a.publiceret
+					a.starttidspunkt = f.starttidspunkt
 				)
-				AND b.indsats_id = ANY (indsats_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
---/**********************************************************//
---Filtration on state: Fremdrift
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsFremdrift IS NULL THEN
-	--RAISE DEBUG 'as_search_indsats: skipping filtration on tilsFremdrift';
-ELSE
-	IF coalesce(array_length(indsats_candidates,1),0)>0 THEN 
-
-		FOREACH tilsFremdriftTypeObj IN ARRAY registreringObj.tilsFremdrift
-		LOOP
-			indsats_candidates:=array(
-			SELECT DISTINCT
-			b.indsats_id 
-			FROM  indsats_tils_fremdrift a
-			JOIN indsats_registrering b on a.indsats_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
+				AND
 				(
-					tilsFremdriftTypeObj.fremdrift IS NULL
-					OR
-					tilsFremdriftTypeObj.fremdrift = a.fremdrift
-				)
-				AND b.indsats_id = ANY (indsats_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer IndsatsRelationType[]
-*/
-
-
---RAISE DEBUG 'indsats_candidates_is_initialized step 4:%',indsats_candidates_is_initialized;
---RAISE DEBUG 'indsats_candidates step 4:%',indsats_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_indsats: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(indsats_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			indsats_candidates:=array(
-			SELECT DISTINCT
-			b.indsats_id 
-			FROM  indsats_relation a
-			JOIN indsats_registrering b on a.indsats_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
+					f.sluttidspunkt IS NULL
 					OR
-					relationTypeObj.relType = a.rel_type
+					a.sluttidspunkt = f.sluttidspunkt
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.objektType IS NULL
+				b.indsats_id = indsats_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Publiceret
+	--/**********************************************************//
+	AND (
+		r.tilsPubliceret IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsPubliceret) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM indsats_tils_publiceret a
+				JOIN indsats_registrering b on a.indsats_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.publiceret IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					f.publiceret = a.publiceret
 				)
-				AND
-				(
-					relationTypeObj.urn IS NULL
+				AND b.indsats_id = indsats_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Fremdrift
+	--/**********************************************************//
+	AND (
+		r.tilsFremdrift IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsFremdrift) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM indsats_tils_fremdrift a
+				JOIN indsats_registrering b on a.indsats_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.fremdrift IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.fremdrift = a.fremdrift
 				)
-				AND b.indsats_id = ANY (indsats_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'indsats_candidates_is_initialized step 5:%',indsats_candidates_is_initialized;
---RAISE DEBUG 'indsats_candidates step 5:%',indsats_candidates;
-
-indsats_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (indsats_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (indsats_candidates) b(id)
+				AND b.indsats_id = indsats_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM indsats_relation a
+			JOIN indsats_registrering b on a.indsats_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.indsats_id = indsats_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(indsats_passed_auth_filter,1),0)=coalesce(array_length(indsats_uuids,1),0) AND indsats_passed_auth_filter @>indsats_uuids THEN
-	RETURN indsats_passed_auth_filter;
-END IF;
+
+CREATE OR REPLACE FUNCTION _as_filter_unauth_indsats(
+	indsats_uuids uuid[],
+	registreringObjArr IndsatsRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	indsats_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(indsats_uuids) a(id)
+	WHERE _as_is_authorized_indsats(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN indsats_passed_auth_filter;
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in indsats_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_indsats(
+    indsats_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM indsats_registrering b
+     WHERE b.indsats_id = indsats_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM indsats_attr_egenskaber a
+         WHERE a.indsats_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM indsats_tils_publiceret a
+         WHERE a.indsats_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM indsats_tils_fremdrift a
+         WHERE a.indsats_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM indsats_relation a
+         WHERE a.indsats_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_indsats(
+        ARRAY[indsats_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM indsats_attr_egenskaber a
+         WHERE a.indsats_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM indsats_aktuel
+         WHERE indsats_id = indsats_uuid;
+    ELSE
+        INSERT INTO indsats_aktuel (
+            indsats_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            indsats_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (indsats_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -18894,6 +19838,25 @@ CREATE INDEX interessefaellesskab_id_idx
     ON interessefaellesskab_registrering (interessefaellesskab_id);
 
 
+CREATE INDEX interessefaellesskab_registrering_idx_timeperiod_lower
+    ON interessefaellesskab_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX interessefaellesskab_registrering_idx_timeperiod
+    ON interessefaellesskab_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX interessefaellesskab_registrering_idx_current
+    ON interessefaellesskab_registrering
+    USING btree
+    (interessefaellesskab_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_interessefaellesskab
     AFTER INSERT OR UPDATE OR DELETE ON interessefaellesskab_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -18901,6 +19864,38 @@ CREATE TRIGGER notify_interessefaellesskab
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_interessefaellesskab
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_interessefaellesskab. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_interessefaellesskab sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE interessefaellesskab_aktuel (
+    interessefaellesskab_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT interessefaellesskab_aktuel_pkey PRIMARY KEY (interessefaellesskab_id),
+    CONSTRAINT interessefaellesskab_aktuel_interessefaellesskab_fkey FOREIGN KEY (interessefaellesskab_id)
+        REFERENCES interessefaellesskab (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE interessefaellesskab_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX interessefaellesskab_aktuel_idx_sorteringsnoegle
+    ON interessefaellesskab_aktuel
+    USING btree
+    (sorteringsnoegle, interessefaellesskab_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE interessefaellesskab_attr_egenskaber_id_seq
@@ -18981,6 +19976,11 @@ ALTER TABLE interessefaellesskab_attr_egenskaber
 
 
 
+CREATE INDEX interessefaellesskab_attr_egenskaber_idx_virkning_timeperiod
+    ON interessefaellesskab_attr_egenskaber
+    USING gist
+    (interessefaellesskab_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX interessefaellesskab_attr_egenskaber_idx_virkning_aktoerref
     ON interessefaellesskab_attr_egenskaber
     USING btree
@@ -19001,6 +20001,28 @@ CREATE INDEX interessefaellesskab_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_interessefaellesskab_attr_egenskaber(
+    interessefaellesskab_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).interessefaellesskabsnavn,
+        ($1).interessefaellesskabstype,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX interessefaellesskab_attr_egenskaber_pat_search_text
+    ON interessefaellesskab_attr_egenskaber
+    USING gin
+    (_as_search_text_interessefaellesskab_attr_egenskaber(interessefaellesskab_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -19043,6 +20065,11 @@ CREATE INDEX interessefaellesskab_tils_gyldighed_idx_gyldighed
     USING btree
     (gyldighed);
   
+CREATE INDEX interessefaellesskab_tils_gyldighed_idx_virkning_timeperiod
+    ON interessefaellesskab_tils_gyldighed
+    USING gist
+    (interessefaellesskab_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX interessefaellesskab_tils_gyldighed_idx_virkning_aktoerref
     ON interessefaellesskab_tils_gyldighed
     USING btree
@@ -19133,6 +20160,11 @@ CREATE INDEX interessefaellesskab_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX interessefaellesskab_relation_idx_virkning_timeperiod
+    ON interessefaellesskab_relation
+    USING gist
+    (interessefaellesskab_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX interessefaellesskab_relation_idx_virkning_aktoerref
     ON interessefaellesskab_relation
     USING btree
@@ -19306,12 +20338,17 @@ CREATE OR REPLACE FUNCTION _as_create_interessefaellesskab_registrering(
     note text DEFAULT ''::text
 ) RETURNS interessefaellesskab_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     interessefaellesskab_registrering_id bigint;
     interessefaellesskab_registrering    interessefaellesskab_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE interessefaellesskab_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -19445,8 +20482,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -19466,9 +20503,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -19756,6 +20790,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating interessefaellesskab with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', interessefaellesskab_uuid, to_json(read_new_interessefaellesskab_reg), to_json(read_prev_interessefaellesskab_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_interessefaellesskab(interessefaellesskab_uuid);
 
     return new_interessefaellesskab_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -19934,7 +20969,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(interessefaellesskab_registrering.relationer) a
+    FROM unnest(interessefaellesskab_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -19948,7 +20983,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_interessefaellesskab(interessefaellesskab_uuid);
 
 
 RETURN interessefaellesskab_uuid;
@@ -20178,7 +21213,9 @@ CREATE OR REPLACE FUNCTION as_search_interessefaellesskab(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr InteressefaellesskabRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -20476,17 +21513,23 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.interessefaellesskab_id
-            
             FROM  interessefaellesskab_attr_egenskaber a
             JOIN interessefaellesskab_registrering b on a.interessefaellesskab_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.interessefaellesskabsnavn ILIKE anyAttrValue OR
-                        a.interessefaellesskabstype ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_interessefaellesskab_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.interessefaellesskabsnavn ILIKE anyAttrValue
+                        OR a.interessefaellesskabstype ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -20495,7 +21538,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -20564,6 +21606,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT interessefaellesskab_candidates_is_initialized) OR b.interessefaellesskab_id = ANY (interessefaellesskab_candidates) )
 
+            
 
         );
 
@@ -21184,8 +22227,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_interessefaellesskab(interessefaellesskab_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_interessefaellesskab(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_interessefaellesskab(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -21374,7 +22417,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_interessefaellesskab(
     virkningSoeg TSTZRANGE,
     registreringObj    InteressefaellesskabRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     interessefaellesskab_sorted_uuid uuid[];
@@ -21386,6 +22431,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in interessefaellesskab_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(interessefaellesskab_uuids) u(id)
+       LEFT JOIN interessefaellesskab_aktuel c ON c.interessefaellesskab_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.interessefaellesskab_id
+                    FROM interessefaellesskab_aktuel c
+                   WHERE c.interessefaellesskab_id = ANY (interessefaellesskab_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.interessefaellesskab_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.interessefaellesskab_id
+                FROM interessefaellesskab_aktuel c
+               WHERE c.interessefaellesskab_id = ANY (interessefaellesskab_uuids)
+                 AND (c.sorteringsnoegle, c.interessefaellesskab_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.interessefaellesskab_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     interessefaellesskab_sorted_uuid:=array(
           SELECT b.interessefaellesskab_id
             FROM interessefaellesskab_registrering b
@@ -21394,6 +22474,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.interessefaellesskab_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.interessefaellesskab_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.interessefaellesskab_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -21403,6 +22489,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_interessefaellesskab sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_interessefaellesskab(
+    interessefaellesskab_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    InteressefaellesskabRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM interessefaellesskab_registrering b
+            JOIN interessefaellesskab_attr_egenskaber a ON a.interessefaellesskab_registrering_id=b.id
+           WHERE b.interessefaellesskab_id = interessefaellesskab_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -21415,219 +22529,242 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_interessefaellesskab(
-	interessefaellesskab_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_interessefaellesskab(
+	interessefaellesskab_uuid uuid,
 	registreringObjArr InteressefaellesskabRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	interessefaellesskab_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	interessefaellesskab_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj InteressefaellesskabEgenskaberAttrType;
-	
-  	tilsGyldighedTypeObj InteressefaellesskabGyldighedTilsType;
-	relationTypeObj InteressefaellesskabRelationType;
-	registreringObj InteressefaellesskabRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN interessefaellesskab_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF interessefaellesskab_uuids IS NULL OR coalesce(array_length(interessefaellesskab_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-interessefaellesskab_candidates:= interessefaellesskab_uuids;
-
-
-
---RAISE DEBUG 'interessefaellesskab_candidates_is_initialized step 1:%',interessefaellesskab_candidates_is_initialized;
---RAISE DEBUG 'interessefaellesskab_candidates step 1:%',interessefaellesskab_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_interessefaellesskab: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(interessefaellesskab_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			interessefaellesskab_candidates:=array(
-			SELECT DISTINCT
-			b.interessefaellesskab_id 
-			FROM  interessefaellesskab_attr_egenskaber a 
-			JOIN interessefaellesskab_registrering b on a.interessefaellesskab_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.interessefaellesskabsnavn IS NULL
-					OR 
-					a.interessefaellesskabsnavn = attrEgenskaberTypeObj.interessefaellesskabsnavn 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.interessefaellesskabstype IS NULL
-					OR 
-					a.interessefaellesskabstype = attrEgenskaberTypeObj.interessefaellesskabstype 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM interessefaellesskab_attr_egenskaber a
+				JOIN interessefaellesskab_registrering b on a.interessefaellesskab_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.interessefaellesskab_id = ANY (interessefaellesskab_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'interessefaellesskab_candidates_is_initialized step 3:%',interessefaellesskab_candidates_is_initialized;
---RAISE DEBUG 'interessefaellesskab_candidates step 3:%',interessefaellesskab_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Gyldighed
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsGyldighed IS NULL THEN
-	--RAISE DEBUG 'as_search_interessefaellesskab: skipping filtration on tilsGyldighed';
-ELSE
-	IF coalesce(array_length(interessefaellesskab_candidates,1),0)>0 THEN 
-
-		FOREACH tilsGyldighedTypeObj IN ARRAY registreringObj.tilsGyldighed
-		LOOP
-			interessefaellesskab_candidates:=array(
-			SELECT DISTINCT
-			b.interessefaellesskab_id 
-			FROM  interessefaellesskab_tils_gyldighed a
-			JOIN interessefaellesskab_registrering b on a.interessefaellesskab_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsGyldighedTypeObj.gyldighed IS NULL
+					f.interessefaellesskabsnavn IS NULL
 					OR
-					tilsGyldighedTypeObj.gyldighed = a.gyldighed
-				)
-				AND b.interessefaellesskab_id = ANY (interessefaellesskab_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer InteressefaellesskabRelationType[]
-*/
-
-
---RAISE DEBUG 'interessefaellesskab_candidates_is_initialized step 4:%',interessefaellesskab_candidates_is_initialized;
---RAISE DEBUG 'interessefaellesskab_candidates step 4:%',interessefaellesskab_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_interessefaellesskab: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(interessefaellesskab_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			interessefaellesskab_candidates:=array(
-			SELECT DISTINCT
-			b.interessefaellesskab_id 
-			FROM  interessefaellesskab_relation a
-			JOIN interessefaellesskab_registrering b on a.interessefaellesskab_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
-					OR
-					relationTypeObj.relType = a.rel_type
+					a.interessefaellesskabsnavn = f.interessefaellesskabsnavn
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.interessefaellesskabstype IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.interessefaellesskabstype = f.interessefaellesskabstype
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.interessefaellesskab_id = interessefaellesskab_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Gyldighed
+	--/**********************************************************//
+	AND (
+		r.tilsGyldighed IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsGyldighed) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM interessefaellesskab_tils_gyldighed a
+				JOIN interessefaellesskab_registrering b on a.interessefaellesskab_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.gyldighed IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.gyldighed = a.gyldighed
 				)
-				AND b.interessefaellesskab_id = ANY (interessefaellesskab_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'interessefaellesskab_candidates_is_initialized step 5:%',interessefaellesskab_candidates_is_initialized;
---RAISE DEBUG 'interessefaellesskab_candidates step 5:%',interessefaellesskab_candidates;
-
-interessefaellesskab_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (interessefaellesskab_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (interessefaellesskab_candidates) b(id)
+				AND b.interessefaellesskab_id = interessefaellesskab_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM interessefaellesskab_relation a
+			JOIN interessefaellesskab_registrering b on a.interessefaellesskab_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.interessefaellesskab_id = interessefaellesskab_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(interessefaellesskab_passed_auth_filter,1),0)=coalesce(array_length(interessefaellesskab_uuids,1),0) AND interessefaellesskab_passed_auth_filter @>interessefaellesskab_uuids THEN
-	RETURN interessefaellesskab_passed_auth_filter;
-END IF;
 
+CREATE OR REPLACE FUNCTION _as_filter_unauth_interessefaellesskab(
+	interessefaellesskab_uuids uuid[],
+	registreringObjArr InteressefaellesskabRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	interessefaellesskab_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(interessefaellesskab_uuids) a(id)
+	WHERE _as_is_authorized_interessefaellesskab(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN interessefaellesskab_passed_auth_filter;
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in interessefaellesskab_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_interessefaellesskab(
+    interessefaellesskab_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM interessefaellesskab_registrering b
+     WHERE b.interessefaellesskab_id = interessefaellesskab_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM interessefaellesskab_attr_egenskaber a
+         WHERE a.interessefaellesskab_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM interessefaellesskab_tils_gyldighed a
+         WHERE a.interessefaellesskab_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM interessefaellesskab_relation a
+         WHERE a.interessefaellesskab_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_interessefaellesskab(
+        ARRAY[interessefaellesskab_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM interessefaellesskab_attr_egenskaber a
+         WHERE a.interessefaellesskab_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM interessefaellesskab_aktuel
+         WHERE interessefaellesskab_id = interessefaellesskab_uuid;
+    ELSE
+        INSERT INTO interessefaellesskab_aktuel (
+            interessefaellesskab_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            interessefaellesskab_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (interessefaellesskab_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -21793,6 +22930,25 @@ CREATE INDEX itsystem_id_idx
     ON itsystem_registrering (itsystem_id);
 
 
+CREATE INDEX itsystem_registrering_idx_timeperiod_lower
+    ON itsystem_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX itsystem_registrering_idx_timeperiod
+    ON itsystem_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX itsystem_registrering_idx_current
+    ON itsystem_registrering
+    USING btree
+    (itsystem_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_itsystem
     AFTER INSERT OR UPDATE OR DELETE ON itsystem_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -21800,6 +22956,38 @@ CREATE TRIGGER notify_itsystem
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_itsystem
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_itsystem. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_itsystem sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE itsystem_aktuel (
+    itsystem_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT itsystem_aktuel_pkey PRIMARY KEY (itsystem_id),
+    CONSTRAINT itsystem_aktuel_itsystem_fkey FOREIGN KEY (itsystem_id)
+        REFERENCES itsystem (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE itsystem_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX itsystem_aktuel_idx_sorteringsnoegle
+    ON itsystem_aktuel
+    USING btree
+    (sorteringsnoegle, itsystem_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE itsystem_attr_egenskaber_id_seq
@@ -21890,6 +23078,11 @@ ALTER TABLE itsystem_attr_egenskaber
 
 
 
+CREATE INDEX itsystem_attr_egenskaber_idx_virkning_timeperiod
+    ON itsystem_attr_egenskaber
+    USING gist
+    (itsystem_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX itsystem_attr_egenskaber_idx_virkning_aktoerref
     ON itsystem_attr_egenskaber
     USING btree
@@ -21910,6 +23103,29 @@ CREATE INDEX itsystem_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_itsystem_attr_egenskaber(
+    itsystem_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).itsystemnavn,
+        ($1).itsystemtype,
+        array_to_string(($1).konfigurationreference, E'\n'),
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX itsystem_attr_egenskaber_pat_search_text
+    ON itsystem_attr_egenskaber
+    USING gin
+    (_as_search_text_itsystem_attr_egenskaber(itsystem_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -21952,6 +23168,11 @@ CREATE INDEX itsystem_tils_gyldighed_idx_gyldighed
     USING btree
     (gyldighed);
   
+CREATE INDEX itsystem_tils_gyldighed_idx_virkning_timeperiod
+    ON itsystem_tils_gyldighed
+    USING gist
+    (itsystem_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX itsystem_tils_gyldighed_idx_virkning_aktoerref
     ON itsystem_tils_gyldighed
     USING btree
@@ -22042,6 +23263,11 @@ CREATE INDEX itsystem_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX itsystem_relation_idx_virkning_timeperiod
+    ON itsystem_relation
+    USING gist
+    (itsystem_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX itsystem_relation_idx_virkning_aktoerref
     ON itsystem_relation
     USING btree
@@ -22215,12 +23441,17 @@ CREATE OR REPLACE FUNCTION _as_create_itsystem_registrering(
     note text DEFAULT ''::text
 ) RETURNS itsystem_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     itsystem_registrering_id bigint;
     itsystem_registrering    itsystem_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE itsystem_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -22354,8 +23585,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -22375,9 +23606,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -22673,6 +23901,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating itsystem with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', itsystem_uuid, to_json(read_new_itsystem_reg), to_json(read_prev_itsystem_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_itsystem(itsystem_uuid);
 
     return new_itsystem_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -22853,7 +24082,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(itsystem_registrering.relationer) a
+    FROM unnest(itsystem_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -22867,7 +24096,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_itsystem(itsystem_uuid);
 
 
 RETURN itsystem_uuid;
@@ -23098,7 +24327,9 @@ CREATE OR REPLACE FUNCTION as_search_itsystem(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr ItsystemRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -23402,18 +24633,24 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.itsystem_id
-            
             FROM  itsystem_attr_egenskaber a
             JOIN itsystem_registrering b on a.itsystem_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.itsystemnavn ILIKE anyAttrValue OR
-                        a.itsystemtype ILIKE anyAttrValue OR
-                              _as_search_ilike_array(anyAttrValue,a.konfigurationreference) OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_itsystem_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.itsystemnavn ILIKE anyAttrValue
+                        OR a.itsystemtype ILIKE anyAttrValue
+                        OR _as_search_ilike_array(anyAttrValue,a.konfigurationreference)
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -23422,7 +24659,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -23491,6 +24727,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT itsystem_candidates_is_initialized) OR b.itsystem_id = ANY (itsystem_candidates) )
 
+            
 
         );
 
@@ -24111,8 +25348,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_itsystem(itsystem_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_itsystem(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_itsystem(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -24301,7 +25538,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_itsystem(
     virkningSoeg TSTZRANGE,
     registreringObj    ItsystemRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     itsystem_sorted_uuid uuid[];
@@ -24313,6 +25552,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in itsystem_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(itsystem_uuids) u(id)
+       LEFT JOIN itsystem_aktuel c ON c.itsystem_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.itsystem_id
+                    FROM itsystem_aktuel c
+                   WHERE c.itsystem_id = ANY (itsystem_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.itsystem_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.itsystem_id
+                FROM itsystem_aktuel c
+               WHERE c.itsystem_id = ANY (itsystem_uuids)
+                 AND (c.sorteringsnoegle, c.itsystem_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.itsystem_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     itsystem_sorted_uuid:=array(
           SELECT b.itsystem_id
             FROM itsystem_registrering b
@@ -24321,6 +25595,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.itsystem_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.itsystem_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.itsystem_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -24330,6 +25610,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_itsystem sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_itsystem(
+    itsystem_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    ItsystemRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM itsystem_registrering b
+            JOIN itsystem_attr_egenskaber a ON a.itsystem_registrering_id=b.id
+           WHERE b.itsystem_id = itsystem_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -24342,225 +25650,248 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_itsystem(
-	itsystem_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_itsystem(
+	itsystem_uuid uuid,
 	registreringObjArr ItsystemRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	itsystem_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	itsystem_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj ItsystemEgenskaberAttrType;
-	
-  	tilsGyldighedTypeObj ItsystemGyldighedTilsType;
-	relationTypeObj ItsystemRelationType;
-	registreringObj ItsystemRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN itsystem_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF itsystem_uuids IS NULL OR coalesce(array_length(itsystem_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-itsystem_candidates:= itsystem_uuids;
-
-
-
---RAISE DEBUG 'itsystem_candidates_is_initialized step 1:%',itsystem_candidates_is_initialized;
---RAISE DEBUG 'itsystem_candidates step 1:%',itsystem_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_itsystem: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(itsystem_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			itsystem_candidates:=array(
-			SELECT DISTINCT
-			b.itsystem_id 
-			FROM  itsystem_attr_egenskaber a 
-			JOIN itsystem_registrering b on a.itsystem_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.itsystemnavn IS NULL
-					OR 
-					a.itsystemnavn = attrEgenskaberTypeObj.itsystemnavn 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.itsystemtype IS NULL
-					OR 
-					a.itsystemtype = attrEgenskaberTypeObj.itsystemtype 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM itsystem_attr_egenskaber a
+				JOIN itsystem_registrering b on a.itsystem_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.konfigurationreference IS NULL
+					f.itsystemnavn IS NULL
 					OR
-						((coalesce(array_length(attrEgenskaberTypeObj.konfigurationreference,1),0)=0 AND coalesce(array_length(a.konfigurationreference,1),0)=0 ) OR (attrEgenskaberTypeObj.konfigurationreference @> a.konfigurationreference AND a.konfigurationreference @>attrEgenskaberTypeObj.konfigurationreference  )) 
+					a.itsystemnavn = f.itsystemnavn
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.itsystem_id = ANY (itsystem_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'itsystem_candidates_is_initialized step 3:%',itsystem_candidates_is_initialized;
---RAISE DEBUG 'itsystem_candidates step 3:%',itsystem_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Gyldighed
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsGyldighed IS NULL THEN
-	--RAISE DEBUG 'as_search_itsystem: skipping filtration on tilsGyldighed';
-ELSE
-	IF coalesce(array_length(itsystem_candidates,1),0)>0 THEN 
-
-		FOREACH tilsGyldighedTypeObj IN ARRAY registreringObj.tilsGyldighed
-		LOOP
-			itsystem_candidates:=array(
-			SELECT DISTINCT
-			b.itsystem_id 
-			FROM  itsystem_tils_gyldighed a
-			JOIN itsystem_registrering b on a.itsystem_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsGyldighedTypeObj.gyldighed IS NULL
+					f.itsystemtype IS NULL
 					OR
-					tilsGyldighedTypeObj.gyldighed = a.gyldighed
-				)
-				AND b.itsystem_id = ANY (itsystem_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer ItsystemRelationType[]
-*/
-
-
---RAISE DEBUG 'itsystem_candidates_is_initialized step 4:%',itsystem_candidates_is_initialized;
---RAISE DEBUG 'itsystem_candidates step 4:%',itsystem_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_itsystem: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(itsystem_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			itsystem_candidates:=array(
-			SELECT DISTINCT
-			b.itsystem_id 
-			FROM  itsystem_relation a
-			JOIN itsystem_registrering b on a.itsystem_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
-					OR
-					relationTypeObj.relType = a.rel_type
+					a.itsystemtype = f.itsystemtype
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.konfigurationreference IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+						((coalesce(array_length(f.konfigurationreference,1),0)=0 AND coalesce(array_length(a.konfigurationreference,1),0)=0 ) OR (f.konfigurationreference @> a.konfigurationreference AND a.konfigurationreference @> f.konfigurationreference))
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.itsystem_id = itsystem_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Gyldighed
+	--/**********************************************************//
+	AND (
+		r.tilsGyldighed IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsGyldighed) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM itsystem_tils_gyldighed a
+				JOIN itsystem_registrering b on a.itsystem_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.gyldighed IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.gyldighed = a.gyldighed
 				)
-				AND b.itsystem_id = ANY (itsystem_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'itsystem_candidates_is_initialized step 5:%',itsystem_candidates_is_initialized;
---RAISE DEBUG 'itsystem_candidates step 5:%',itsystem_candidates;
-
-itsystem_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (itsystem_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (itsystem_candidates) b(id)
+				AND b.itsystem_id = itsystem_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM itsystem_relation a
+			JOIN itsystem_registrering b on a.itsystem_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.itsystem_id = itsystem_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(itsystem_passed_auth_filter,1),0)=coalesce(array_length(itsystem_uuids,1),0) AND itsystem_passed_auth_filter @>itsystem_uuids THEN
-	RETURN itsystem_passed_auth_filter;
-END IF;
 
+CREATE OR REPLACE FUNCTION _as_filter_unauth_itsystem(
+	itsystem_uuids uuid[],
+	registreringObjArr ItsystemRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	itsystem_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(itsystem_uuids) a(id)
+	WHERE _as_is_authorized_itsystem(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN itsystem_passed_auth_filter;
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in itsystem_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_itsystem(
+    itsystem_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM itsystem_registrering b
+     WHERE b.itsystem_id = itsystem_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM itsystem_attr_egenskaber a
+         WHERE a.itsystem_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM itsystem_tils_gyldighed a
+         WHERE a.itsystem_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM itsystem_relation a
+         WHERE a.itsystem_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_itsystem(
+        ARRAY[itsystem_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM itsystem_attr_egenskaber a
+         WHERE a.itsystem_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM itsystem_aktuel
+         WHERE itsystem_id = itsystem_uuid;
+    ELSE
+        INSERT INTO itsystem_aktuel (
+            itsystem_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            itsystem_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (itsystem_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -24738,6 +26069,25 @@ CREATE INDEX klasse_id_idx
     ON klasse_registrering (klasse_id);
 
 
+CREATE INDEX klasse_registrering_idx_timeperiod_lower
+    ON klasse_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX klasse_registrering_idx_timeperiod
+    ON klasse_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX klasse_registrering_idx_current
+    ON klasse_registrering
+    USING btree
+    (klasse_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_klasse
     AFTER INSERT OR UPDATE OR DELETE ON klasse_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -24745,6 +26095,38 @@ CREATE TRIGGER notify_klasse
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_klasse
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_klasse. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_klasse sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE klasse_aktuel (
+    klasse_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT klasse_aktuel_pkey PRIMARY KEY (klasse_id),
+    CONSTRAINT klasse_aktuel_klasse_fkey FOREIGN KEY (klasse_id)
+        REFERENCES klasse (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE klasse_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX klasse_aktuel_idx_sorteringsnoegle
+    ON klasse_aktuel
+    USING btree
+    (sorteringsnoegle, klasse_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE klasse_attr_egenskaber_id_seq
@@ -24873,6 +26255,11 @@ ALTER TABLE klasse_attr_egenskaber
 
 
 
+CREATE INDEX klasse_attr_egenskaber_idx_virkning_timeperiod
+    ON klasse_attr_egenskaber
+    USING gist
+    (klasse_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX klasse_attr_egenskaber_idx_virkning_aktoerref
     ON klasse_attr_egenskaber
     USING btree
@@ -24893,6 +26280,32 @@ CREATE INDEX klasse_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_klasse_attr_egenskaber(
+    klasse_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).beskrivelse,
+        ($1).eksempel,
+        ($1).omfang,
+        ($1).titel,
+        ($1).retskilde,
+        ($1).aendringsnotat,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX klasse_attr_egenskaber_pat_search_text
+    ON klasse_attr_egenskaber
+    USING gin
+    (_as_search_text_klasse_attr_egenskaber(klasse_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -24992,6 +26405,11 @@ CREATE INDEX klasse_tils_publiceret_idx_publiceret
     USING btree
     (publiceret);
   
+CREATE INDEX klasse_tils_publiceret_idx_virkning_timeperiod
+    ON klasse_tils_publiceret
+    USING gist
+    (klasse_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX klasse_tils_publiceret_idx_virkning_aktoerref
     ON klasse_tils_publiceret
     USING btree
@@ -25082,6 +26500,11 @@ CREATE INDEX klasse_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX klasse_relation_idx_virkning_timeperiod
+    ON klasse_relation
+    USING gist
+    (klasse_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX klasse_relation_idx_virkning_aktoerref
     ON klasse_relation
     USING btree
@@ -25286,12 +26709,17 @@ CREATE OR REPLACE FUNCTION _as_create_klasse_registrering(
     note text DEFAULT ''::text
 ) RETURNS klasse_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     klasse_registrering_id bigint;
     klasse_registrering    klasse_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE klasse_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -25428,8 +26856,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -25449,9 +26877,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -25833,6 +27258,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating klasse with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', klasse_uuid, to_json(read_new_klasse_reg), to_json(read_prev_klasse_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_klasse(klasse_uuid);
 
     return new_klasse_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -26051,7 +27477,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(klasse_registrering.relationer) a
+    FROM unnest(klasse_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -26065,7 +27491,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_klasse(klasse_uuid);
 
 
 RETURN klasse_uuid;
@@ -26347,7 +27773,9 @@ CREATE OR REPLACE FUNCTION as_search_klasse(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr KlasseRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -26727,30 +28155,117 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.klasse_id
-            
             FROM  klasse_attr_egenskaber a
             JOIN klasse_registrering b on a.klasse_registrering_id=b.id
-            
-            LEFT JOIN klasse_attr_egenskaber_soegeord c on a.id=c.klasse_attr_egenskaber_id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.beskrivelse ILIKE anyAttrValue OR
-                        a.eksempel ILIKE anyAttrValue OR
-                        a.omfang ILIKE anyAttrValue OR
-                        a.titel ILIKE anyAttrValue OR
-                        a.retskilde ILIKE anyAttrValue OR
-                        a.aendringsnotat ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_klasse_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.beskrivelse ILIKE anyAttrValue
+                        OR a.eksempel ILIKE anyAttrValue
+                        OR a.omfang ILIKE anyAttrValue
+                        OR a.titel ILIKE anyAttrValue
+                        OR a.retskilde ILIKE anyAttrValue
+                        OR a.aendringsnotat ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
+            )
+            AND
+            (
+                virkningSoeg IS NULL
                 OR
+                virkningSoeg && (a.virkning).TimePeriod
+            )
+            AND
+            		(
+				(registreringObj.registrering) IS NULL 
+				OR
+				(
+					(
+						(registreringObj.registrering).timeperiod IS NULL 
+						OR
+						(registreringObj.registrering).timeperiod && (b.registrering).timeperiod
+					)
+					AND
+					(
+						(registreringObj.registrering).livscykluskode IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode = (b.registrering).livscykluskode 		
+					) 
+					AND
+					(
+						(registreringObj.registrering).brugerref IS NULL
+						OR
+						(registreringObj.registrering).brugerref = (b.registrering).brugerref
+					)
+					AND
+					(
+						(registreringObj.registrering).note IS NULL
+						OR
+						(b.registrering).note ILIKE (registreringObj.registrering).note
+					)
+			)
+		)
+		AND
+		(
+			(
+				((b.registrering).livscykluskode <> 'Slettet'::Livscykluskode )
+				AND
+					(
+						(registreringObj.registrering) IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode IS NULL 
+					)
+			)
+			OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				(registreringObj.registrering).livscykluskode IS NOT NULL 
+			)
+		)
+		AND
+		(
+			(
+			  (
+			  	(registreringObj.registrering) IS NULL
+			  	OR
+			  	(registreringObj.registrering).timeperiod IS NULL
+			  )
+			  AND
+			  upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			)  	
+		OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				((registreringObj.registrering).timeperiod IS NOT NULL)
+			)
+		)
+		AND
+		((NOT klasse_candidates_is_initialized) OR b.klasse_id = ANY (klasse_candidates) )
+
+            
+            UNION
+            SELECT DISTINCT
+            b.klasse_id
+            FROM klasse_attr_egenskaber a
+            JOIN klasse_registrering b on a.klasse_registrering_id=b.id
+            JOIN klasse_attr_egenskaber_soegeord c on a.id=c.klasse_attr_egenskaber_id
+            WHERE
+            (
                 c.soegeordidentifikator ILIKE anyAttrValue
                 OR
                 c.beskrivelse ILIKE anyAttrValue
                 OR
                 c.soegeordskategori ILIKE anyAttrValue
-                
             )
             AND
             (
@@ -26759,7 +28274,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -26828,6 +28342,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT klasse_candidates_is_initialized) OR b.klasse_id = ANY (klasse_candidates) )
 
+            
 
         );
 
@@ -27448,8 +28963,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_klasse(klasse_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_klasse(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_klasse(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -27638,7 +29153,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_klasse(
     virkningSoeg TSTZRANGE,
     registreringObj    KlasseRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     klasse_sorted_uuid uuid[];
@@ -27650,6 +29167,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in klasse_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(klasse_uuids) u(id)
+       LEFT JOIN klasse_aktuel c ON c.klasse_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.klasse_id
+                    FROM klasse_aktuel c
+                   WHERE c.klasse_id = ANY (klasse_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.klasse_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.klasse_id
+                FROM klasse_aktuel c
+               WHERE c.klasse_id = ANY (klasse_uuids)
+                 AND (c.sorteringsnoegle, c.klasse_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.klasse_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     klasse_sorted_uuid:=array(
           SELECT b.klasse_id
             FROM klasse_registrering b
@@ -27658,6 +29210,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.klasse_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.klasse_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.klasse_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -27667,6 +29225,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_klasse sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_klasse(
+    klasse_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    KlasseRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM klasse_registrering b
+            JOIN klasse_attr_egenskaber a ON a.klasse_registrering_id=b.id
+           WHERE b.klasse_id = klasse_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -27679,243 +29265,266 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_klasse(
-	klasse_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_klasse(
+	klasse_uuid uuid,
 	registreringObjArr KlasseRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	klasse_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	klasse_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj KlasseEgenskaberAttrType;
-	
-  	tilsPubliceretTypeObj KlassePubliceretTilsType;
-	relationTypeObj KlasseRelationType;
-	registreringObj KlasseRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN klasse_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF klasse_uuids IS NULL OR coalesce(array_length(klasse_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-klasse_candidates:= klasse_uuids;
-
-
-
---RAISE DEBUG 'klasse_candidates_is_initialized step 1:%',klasse_candidates_is_initialized;
---RAISE DEBUG 'klasse_candidates step 1:%',klasse_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_klasse: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(klasse_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			klasse_candidates:=array(
-			SELECT DISTINCT
-			b.klasse_id 
-			FROM  klasse_attr_egenskaber a 
-			JOIN klasse_registrering b on a.klasse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.beskrivelse IS NULL
-					OR 
-					a.beskrivelse = attrEgenskaberTypeObj.beskrivelse 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.eksempel IS NULL
-					OR 
-					a.eksempel = attrEgenskaberTypeObj.eksempel 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM klasse_attr_egenskaber a
+				JOIN klasse_registrering b on a.klasse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.omfang IS NULL
-					OR 
-					a.omfang = attrEgenskaberTypeObj.omfang 
+					f.beskrivelse IS NULL
+					OR
+					a.beskrivelse = f.beskrivelse
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.titel IS NULL
-					OR 
-					a.titel = attrEgenskaberTypeObj.titel 
+					f.eksempel IS NULL
+					OR
+					a.eksempel = f.eksempel
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.retskilde IS NULL
-					OR 
-					a.retskilde = attrEgenskaberTypeObj.retskilde 
+					f.omfang IS NULL
+					OR
+					a.omfang = f.omfang
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.aendringsnotat IS NULL
-					OR 
-					a.aendringsnotat = attrEgenskaberTypeObj.aendringsnotat 
+					f.titel IS NULL
+					OR
+					a.titel = f.titel
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.klasse_id = ANY (klasse_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'klasse_candidates_is_initialized step 3:%',klasse_candidates_is_initialized;
---RAISE DEBUG 'klasse_candidates step 3:%',klasse_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Publiceret
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsPubliceret IS NULL THEN
-	--RAISE DEBUG 'as_search_klasse: skipping filtration on tilsPubliceret';
-ELSE
-	IF coalesce(array_length(klasse_candidates,1),0)>0 THEN 
-
-		FOREACH tilsPubliceretTypeObj IN ARRAY registreringObj.tilsPubliceret
-		LOOP
-			klasse_candidates:=array(
-			SELECT DISTINCT
-			b.klasse_id 
-			FROM  klasse_tils_publiceret a
-			JOIN klasse_registrering b on a.klasse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsPubliceretTypeObj.publiceret IS NULL
+					f.retskilde IS NULL
 					OR
-					tilsPubliceretTypeObj.publiceret = a.publiceret
-				)
-				AND b.klasse_id = ANY (klasse_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer KlasseRelationType[]
-*/
-
-
---RAISE DEBUG 'klasse_candidates_is_initialized step 4:%',klasse_candidates_is_initialized;
---RAISE DEBUG 'klasse_candidates step 4:%',klasse_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_klasse: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(klasse_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			klasse_candidates:=array(
-			SELECT DISTINCT
-			b.klasse_id 
-			FROM  klasse_relation a
-			JOIN klasse_registrering b on a.klasse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
-					OR
-					relationTypeObj.relType = a.rel_type
+					a.retskilde = f.retskilde
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.aendringsnotat IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.aendringsnotat = f.aendringsnotat
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.klasse_id = klasse_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Publiceret
+	--/**********************************************************//
+	AND (
+		r.tilsPubliceret IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsPubliceret) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM klasse_tils_publiceret a
+				JOIN klasse_registrering b on a.klasse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.publiceret IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.publiceret = a.publiceret
 				)
-				AND b.klasse_id = ANY (klasse_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'klasse_candidates_is_initialized step 5:%',klasse_candidates_is_initialized;
---RAISE DEBUG 'klasse_candidates step 5:%',klasse_candidates;
-
-klasse_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (klasse_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (klasse_candidates) b(id)
+				AND b.klasse_id = klasse_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM klasse_relation a
+			JOIN klasse_registrering b on a.klasse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.klasse_id = klasse_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(klasse_passed_auth_filter,1),0)=coalesce(array_length(klasse_uuids,1),0) AND klasse_passed_auth_filter @>klasse_uuids THEN
-	RETURN klasse_passed_auth_filter;
-END IF;
+
+CREATE OR REPLACE FUNCTION _as_filter_unauth_klasse(
+	klasse_uuids uuid[],
+	registreringObjArr KlasseRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	klasse_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(klasse_uuids) a(id)
+	WHERE _as_is_authorized_klasse(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN klasse_passed_auth_filter;
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in klasse_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_klasse(
+    klasse_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM klasse_registrering b
+     WHERE b.klasse_id = klasse_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM klasse_attr_egenskaber a
+         WHERE a.klasse_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM klasse_tils_publiceret a
+         WHERE a.klasse_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM klasse_relation a
+         WHERE a.klasse_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_klasse(
+        ARRAY[klasse_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM klasse_attr_egenskaber a
+         WHERE a.klasse_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM klasse_aktuel
+         WHERE klasse_id = klasse_uuid;
+    ELSE
+        INSERT INTO klasse_aktuel (
+            klasse_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            klasse_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (klasse_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -28081,6 +29690,25 @@ CREATE INDEX klassifikation_id_idx
     ON klassifikation_registrering (klassifikation_id);
 
 
+CREATE INDEX klassifikation_registrering_idx_timeperiod_lower
+    ON klassifikation_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX klassifikation_registrering_idx_timeperiod
+    ON klassifikation_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX klassifikation_registrering_idx_current
+    ON klassifikation_registrering
+    USING btree
+    (klassifikation_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_klassifikation
     AFTER INSERT OR UPDATE OR DELETE ON klassifikation_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -28088,6 +29716,38 @@ CREATE TRIGGER notify_klassifikation
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_klassifikation
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_klassifikation. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_klassifikation sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE klassifikation_aktuel (
+    klassifikation_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT klassifikation_aktuel_pkey PRIMARY KEY (klassifikation_id),
+    CONSTRAINT klassifikation_aktuel_klassifikation_fkey FOREIGN KEY (klassifikation_id)
+        REFERENCES klassifikation (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE klassifikation_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX klassifikation_aktuel_idx_sorteringsnoegle
+    ON klassifikation_aktuel
+    USING btree
+    (sorteringsnoegle, klassifikation_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE klassifikation_attr_egenskaber_id_seq
@@ -28180,6 +29840,11 @@ ALTER TABLE klassifikation_attr_egenskaber
 
 
 
+CREATE INDEX klassifikation_attr_egenskaber_idx_virkning_timeperiod
+    ON klassifikation_attr_egenskaber
+    USING gist
+    (klassifikation_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX klassifikation_attr_egenskaber_idx_virkning_aktoerref
     ON klassifikation_attr_egenskaber
     USING btree
@@ -28200,6 +29865,29 @@ CREATE INDEX klassifikation_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_klassifikation_attr_egenskaber(
+    klassifikation_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).beskrivelse,
+        ($1).kaldenavn,
+        ($1).ophavsret,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX klassifikation_attr_egenskaber_pat_search_text
+    ON klassifikation_attr_egenskaber
+    USING gin
+    (_as_search_text_klassifikation_attr_egenskaber(klassifikation_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -28242,6 +29930,11 @@ CREATE INDEX klassifikation_tils_publiceret_idx_publiceret
     USING btree
     (publiceret);
   
+CREATE INDEX klassifikation_tils_publiceret_idx_virkning_timeperiod
+    ON klassifikation_tils_publiceret
+    USING gist
+    (klassifikation_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX klassifikation_tils_publiceret_idx_virkning_aktoerref
     ON klassifikation_tils_publiceret
     USING btree
@@ -28332,6 +30025,11 @@ CREATE INDEX klassifikation_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX klassifikation_relation_idx_virkning_timeperiod
+    ON klassifikation_relation
+    USING gist
+    (klassifikation_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX klassifikation_relation_idx_virkning_aktoerref
     ON klassifikation_relation
     USING btree
@@ -28505,12 +30203,17 @@ CREATE OR REPLACE FUNCTION _as_create_klassifikation_registrering(
     note text DEFAULT ''::text
 ) RETURNS klassifikation_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     klassifikation_registrering_id bigint;
     klassifikation_registrering    klassifikation_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE klassifikation_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -28644,8 +30347,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -28665,9 +30368,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -28963,6 +30663,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating klassifikation with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', klassifikation_uuid, to_json(read_new_klassifikation_reg), to_json(read_prev_klassifikation_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_klassifikation(klassifikation_uuid);
 
     return new_klassifikation_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -29143,7 +30844,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(klassifikation_registrering.relationer) a
+    FROM unnest(klassifikation_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -29157,7 +30858,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_klassifikation(klassifikation_uuid);
 
 
 RETURN klassifikation_uuid;
@@ -29388,7 +31089,9 @@ CREATE OR REPLACE FUNCTION as_search_klassifikation(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr KlassifikationRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -29670,117 +31373,123 @@ ELSE
 		AND
 		((NOT klassifikation_candidates_is_initialized) OR b.klassifikation_id = ANY (klassifikation_candidates) )
 
-            );
-
-
-            klassifikation_candidates_is_initialized:=true;
-
-        END LOOP;
-    END IF;
-END IF;
---RAISE DEBUG 'klassifikation_candidates_is_initialized step 3:%',klassifikation_candidates_is_initialized;
---RAISE DEBUG 'klassifikation_candidates step 3:%',klassifikation_candidates;
-
---/**********************************************************//
---Filtration on anyAttrValueArr
---/**********************************************************//
-IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
-
-    FOREACH anyAttrValue IN ARRAY anyAttrValueArr
-    LOOP
-        klassifikation_candidates:=array(
-
-            SELECT DISTINCT
-            b.klassifikation_id
+            );
+
+
+            klassifikation_candidates_is_initialized:=true;
+
+        END LOOP;
+    END IF;
+END IF;
+--RAISE DEBUG 'klassifikation_candidates_is_initialized step 3:%',klassifikation_candidates_is_initialized;
+--RAISE DEBUG 'klassifikation_candidates step 3:%',klassifikation_candidates;
+
+--/**********************************************************//
+--Filtration on anyAttrValueArr
+--/**********************************************************//
+IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
+
+    FOREACH anyAttrValue IN ARRAY anyAttrValueArr
+    LOOP
+        klassifikation_candidates:=array(
+
+            SELECT DISTINCT
+            b.klassifikation_id
+            FROM  klassifikation_attr_egenskaber a
+            JOIN klassifikation_registrering b on a.klassifikation_registrering_id=b.id
+            WHERE
+            (
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_klassifikation_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.beskrivelse ILIKE anyAttrValue
+                        OR a.kaldenavn ILIKE anyAttrValue
+                        OR a.ophavsret ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
+            )
+            AND
+            (
+                virkningSoeg IS NULL
+                OR
+                virkningSoeg && (a.virkning).TimePeriod
+            )
+            AND
+            		(
+				(registreringObj.registrering) IS NULL 
+				OR
+				(
+					(
+						(registreringObj.registrering).timeperiod IS NULL 
+						OR
+						(registreringObj.registrering).timeperiod && (b.registrering).timeperiod
+					)
+					AND
+					(
+						(registreringObj.registrering).livscykluskode IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode = (b.registrering).livscykluskode 		
+					) 
+					AND
+					(
+						(registreringObj.registrering).brugerref IS NULL
+						OR
+						(registreringObj.registrering).brugerref = (b.registrering).brugerref
+					)
+					AND
+					(
+						(registreringObj.registrering).note IS NULL
+						OR
+						(b.registrering).note ILIKE (registreringObj.registrering).note
+					)
+			)
+		)
+		AND
+		(
+			(
+				((b.registrering).livscykluskode <> 'Slettet'::Livscykluskode )
+				AND
+					(
+						(registreringObj.registrering) IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode IS NULL 
+					)
+			)
+			OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				(registreringObj.registrering).livscykluskode IS NOT NULL 
+			)
+		)
+		AND
+		(
+			(
+			  (
+			  	(registreringObj.registrering) IS NULL
+			  	OR
+			  	(registreringObj.registrering).timeperiod IS NULL
+			  )
+			  AND
+			  upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			)  	
+		OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				((registreringObj.registrering).timeperiod IS NOT NULL)
+			)
+		)
+		AND
+		((NOT klassifikation_candidates_is_initialized) OR b.klassifikation_id = ANY (klassifikation_candidates) )
+
             
-            FROM  klassifikation_attr_egenskaber a
-            JOIN klassifikation_registrering b on a.klassifikation_registrering_id=b.id
-            
-            WHERE
-            (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.beskrivelse ILIKE anyAttrValue OR
-                        a.kaldenavn ILIKE anyAttrValue OR
-                        a.ophavsret ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
-            )
-            AND
-            (
-                virkningSoeg IS NULL
-                OR
-                virkningSoeg && (a.virkning).TimePeriod
-            )
-            AND
-            
-            		(
-				(registreringObj.registrering) IS NULL 
-				OR
-				(
-					(
-						(registreringObj.registrering).timeperiod IS NULL 
-						OR
-						(registreringObj.registrering).timeperiod && (b.registrering).timeperiod
-					)
-					AND
-					(
-						(registreringObj.registrering).livscykluskode IS NULL 
-						OR
-						(registreringObj.registrering).livscykluskode = (b.registrering).livscykluskode 		
-					) 
-					AND
-					(
-						(registreringObj.registrering).brugerref IS NULL
-						OR
-						(registreringObj.registrering).brugerref = (b.registrering).brugerref
-					)
-					AND
-					(
-						(registreringObj.registrering).note IS NULL
-						OR
-						(b.registrering).note ILIKE (registreringObj.registrering).note
-					)
-			)
-		)
-		AND
-		(
-			(
-				((b.registrering).livscykluskode <> 'Slettet'::Livscykluskode )
-				AND
-					(
-						(registreringObj.registrering) IS NULL 
-						OR
-						(registreringObj.registrering).livscykluskode IS NULL 
-					)
-			)
-			OR
-			(
-				(NOT ((registreringObj.registrering) IS NULL))
-				AND
-				(registreringObj.registrering).livscykluskode IS NOT NULL 
-			)
-		)
-		AND
-		(
-			(
-			  (
-			  	(registreringObj.registrering) IS NULL
-			  	OR
-			  	(registreringObj.registrering).timeperiod IS NULL
-			  )
-			  AND
-			  upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			)  	
-		OR
-			(
-				(NOT ((registreringObj.registrering) IS NULL))
-				AND
-				((registreringObj.registrering).timeperiod IS NOT NULL)
-			)
-		)
-		AND
-		((NOT klassifikation_candidates_is_initialized) OR b.klassifikation_id = ANY (klassifikation_candidates) )
-
 
         );
 
@@ -30401,8 +32110,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_klassifikation(klassifikation_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_klassifikation(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_klassifikation(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -30591,7 +32300,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_klassifikation(
     virkningSoeg TSTZRANGE,
     registreringObj    KlassifikationRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     klassifikation_sorted_uuid uuid[];
@@ -30603,6 +32314,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in klassifikation_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(klassifikation_uuids) u(id)
+       LEFT JOIN klassifikation_aktuel c ON c.klassifikation_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.klassifikation_id
+                    FROM klassifikation_aktuel c
+                   WHERE c.klassifikation_id = ANY (klassifikation_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.klassifikation_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.klassifikation_id
+                FROM klassifikation_aktuel c
+               WHERE c.klassifikation_id = ANY (klassifikation_uuids)
+                 AND (c.sorteringsnoegle, c.klassifikation_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.klassifikation_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     klassifikation_sorted_uuid:=array(
           SELECT b.klassifikation_id
             FROM klassifikation_registrering b
@@ -30611,6 +32357,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.klassifikation_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.klassifikation_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.klassifikation_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -30620,6 +32372,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_klassifikation sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_klassifikation(
+    klassifikation_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    KlassifikationRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM klassifikation_registrering b
+            JOIN klassifikation_attr_egenskaber a ON a.klassifikation_registrering_id=b.id
+           WHERE b.klassifikation_id = klassifikation_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -30632,225 +32412,248 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_klassifikation(
-	klassifikation_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_klassifikation(
+	klassifikation_uuid uuid,
 	registreringObjArr KlassifikationRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	klassifikation_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	klassifikation_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj KlassifikationEgenskaberAttrType;
-	
-  	tilsPubliceretTypeObj KlassifikationPubliceretTilsType;
-	relationTypeObj KlassifikationRelationType;
-	registreringObj KlassifikationRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN klassifikation_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF klassifikation_uuids IS NULL OR coalesce(array_length(klassifikation_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-klassifikation_candidates:= klassifikation_uuids;
-
-
-
---RAISE DEBUG 'klassifikation_candidates_is_initialized step 1:%',klassifikation_candidates_is_initialized;
---RAISE DEBUG 'klassifikation_candidates step 1:%',klassifikation_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_klassifikation: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(klassifikation_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			klassifikation_candidates:=array(
-			SELECT DISTINCT
-			b.klassifikation_id 
-			FROM  klassifikation_attr_egenskaber a 
-			JOIN klassifikation_registrering b on a.klassifikation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.beskrivelse IS NULL
-					OR 
-					a.beskrivelse = attrEgenskaberTypeObj.beskrivelse 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.kaldenavn IS NULL
-					OR 
-					a.kaldenavn = attrEgenskaberTypeObj.kaldenavn 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM klassifikation_attr_egenskaber a
+				JOIN klassifikation_registrering b on a.klassifikation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.ophavsret IS NULL
-					OR 
-					a.ophavsret = attrEgenskaberTypeObj.ophavsret 
+					f.beskrivelse IS NULL
+					OR
+					a.beskrivelse = f.beskrivelse
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.klassifikation_id = ANY (klassifikation_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'klassifikation_candidates_is_initialized step 3:%',klassifikation_candidates_is_initialized;
---RAISE DEBUG 'klassifikation_candidates step 3:%',klassifikation_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Publiceret
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsPubliceret IS NULL THEN
-	--RAISE DEBUG 'as_search_klassifikation: skipping filtration on tilsPubliceret';
-ELSE
-	IF coalesce(array_length(klassifikation_candidates,1),0)>0 THEN 
-
-		FOREACH tilsPubliceretTypeObj IN ARRAY registreringObj.tilsPubliceret
-		LOOP
-			klassifikation_candidates:=array(
-			SELECT DISTINCT
-			b.klassifikation_id 
-			FROM  klassifikation_tils_publiceret a
-			JOIN klassifikation_registrering b on a.klassifikation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsPubliceretTypeObj.publiceret IS NULL
+					f.kaldenavn IS NULL
 					OR
-					tilsPubliceretTypeObj.publiceret = a.publiceret
-				)
-				AND b.klassifikation_id = ANY (klassifikation_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer KlassifikationRelationType[]
-*/
-
-
---RAISE DEBUG 'klassifikation_candidates_is_initialized step 4:%',klassifikation_candidates_is_initialized;
---RAISE DEBUG 'klassifikation_candidates step 4:%',klassifikation_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_klassifikation: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(klassifikation_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			klassifikation_candidates:=array(
-			SELECT DISTINCT
-			b.klassifikation_id 
-			FROM  klassifikation_relation a
-			JOIN klassifikation_registrering b on a.klassifikation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
-					OR
-					relationTypeObj.relType = a.rel_type
+					a.kaldenavn = f.kaldenavn
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.ophavsret IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.ophavsret = f.ophavsret
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.klassifikation_id = klassifikation_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Publiceret
+	--/**********************************************************//
+	AND (
+		r.tilsPubliceret IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsPubliceret) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM klassifikation_tils_publiceret a
+				JOIN klassifikation_registrering b on a.klassifikation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.publiceret IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.publiceret = a.publiceret
 				)
-				AND b.klassifikation_id = ANY (klassifikation_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'klassifikation_candidates_is_initialized step 5:%',klassifikation_candidates_is_initialized;
---RAISE DEBUG 'klassifikation_candidates step 5:%',klassifikation_candidates;
-
-klassifikation_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (klassifikation_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (klassifikation_candidates) b(id)
+				AND b.klassifikation_id = klassifikation_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM klassifikation_relation a
+			JOIN klassifikation_registrering b on a.klassifikation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.klassifikation_id = klassifikation_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(klassifikation_passed_auth_filter,1),0)=coalesce(array_length(klassifikation_uuids,1),0) AND klassifikation_passed_auth_filter @>klassifikation_uuids THEN
-	RETURN klassifikation_passed_auth_filter;
-END IF;
 
+CREATE OR REPLACE FUNCTION _as_filter_unauth_klassifikation(
+	klassifikation_uuids uuid[],
+	registreringObjArr KlassifikationRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	klassifikation_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(klassifikation_uuids) a(id)
+	WHERE _as_is_authorized_klassifikation(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN klassifikation_passed_auth_filter;
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
+/*
+NOTICE: This file is auto-generated!
+*/
 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in klassifikation_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_klassifikation(
+    klassifikation_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM klassifikation_registrering b
+     WHERE b.klassifikation_id = klassifikation_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM klassifikation_attr_egenskaber a
+         WHERE a.klassifikation_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM klassifikation_tils_publiceret a
+         WHERE a.klassifikation_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM klassifikation_relation a
+         WHERE a.klassifikation_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_klassifikation(
+        ARRAY[klassifikation_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM klassifikation_attr_egenskaber a
+         WHERE a.klassifikation_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
+
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM klassifikation_aktuel
+         WHERE klassifikation_id = klassifikation_uuid;
+    ELSE
+        INSERT INTO klassifikation_aktuel (
+            klassifikation_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            klassifikation_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (klassifikation_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -31020,6 +32823,25 @@ CREATE INDEX loghaendelse_id_idx
     ON loghaendelse_registrering (loghaendelse_id);
 
 
+CREATE INDEX loghaendelse_registrering_idx_timeperiod_lower
+    ON loghaendelse_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX loghaendelse_registrering_idx_timeperiod
+    ON loghaendelse_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX loghaendelse_registrering_idx_current
+    ON loghaendelse_registrering
+    USING btree
+    (loghaendelse_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_loghaendelse
     AFTER INSERT OR UPDATE OR DELETE ON loghaendelse_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -31027,6 +32849,38 @@ CREATE TRIGGER notify_loghaendelse
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_loghaendelse
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_loghaendelse. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_loghaendelse sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE loghaendelse_aktuel (
+    loghaendelse_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT loghaendelse_aktuel_pkey PRIMARY KEY (loghaendelse_id),
+    CONSTRAINT loghaendelse_aktuel_loghaendelse_fkey FOREIGN KEY (loghaendelse_id)
+        REFERENCES loghaendelse (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE loghaendelse_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX loghaendelse_aktuel_idx_sorteringsnoegle
+    ON loghaendelse_aktuel
+    USING btree
+    (sorteringsnoegle, loghaendelse_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE loghaendelse_attr_egenskaber_id_seq
@@ -31167,6 +33021,11 @@ ALTER TABLE loghaendelse_attr_egenskaber
 
 
 
+CREATE INDEX loghaendelse_attr_egenskaber_idx_virkning_timeperiod
+    ON loghaendelse_attr_egenskaber
+    USING gist
+    (loghaendelse_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX loghaendelse_attr_egenskaber_idx_virkning_aktoerref
     ON loghaendelse_attr_egenskaber
     USING btree
@@ -31187,6 +33046,33 @@ CREATE INDEX loghaendelse_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_loghaendelse_attr_egenskaber(
+    loghaendelse_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).service,
+        ($1).klasse,
+        ($1).tidspunkt,
+        ($1).operation,
+        ($1).objekttype,
+        ($1).returkode,
+        ($1).returtekst,
+        ($1).note,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX loghaendelse_attr_egenskaber_pat_search_text
+    ON loghaendelse_attr_egenskaber
+    USING gin
+    (_as_search_text_loghaendelse_attr_egenskaber(loghaendelse_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -31229,6 +33115,11 @@ CREATE INDEX loghaendelse_tils_gyldighed_idx_gyldighed
     USING btree
     (gyldighed);
   
+CREATE INDEX loghaendelse_tils_gyldighed_idx_virkning_timeperiod
+    ON loghaendelse_tils_gyldighed
+    USING gist
+    (loghaendelse_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX loghaendelse_tils_gyldighed_idx_virkning_aktoerref
     ON loghaendelse_tils_gyldighed
     USING btree
@@ -31319,6 +33210,11 @@ CREATE INDEX loghaendelse_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX loghaendelse_relation_idx_virkning_timeperiod
+    ON loghaendelse_relation
+    USING gist
+    (loghaendelse_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX loghaendelse_relation_idx_virkning_aktoerref
     ON loghaendelse_relation
     USING btree
@@ -31492,12 +33388,17 @@ CREATE OR REPLACE FUNCTION _as_create_loghaendelse_registrering(
     note text DEFAULT ''::text
 ) RETURNS loghaendelse_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     loghaendelse_registrering_id bigint;
     loghaendelse_registrering    loghaendelse_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE loghaendelse_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -31631,8 +33532,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -31652,9 +33553,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -31982,6 +33880,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating loghaendelse with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', loghaendelse_uuid, to_json(read_new_loghaendelse_reg), to_json(read_prev_loghaendelse_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_loghaendelse(loghaendelse_uuid);
 
     return new_loghaendelse_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -32170,7 +34069,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(loghaendelse_registrering.relationer) a
+    FROM unnest(loghaendelse_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -32184,7 +34083,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_loghaendelse(loghaendelse_uuid);
 
 
 RETURN loghaendelse_uuid;
@@ -32419,7 +34318,9 @@ CREATE OR REPLACE FUNCTION as_search_loghaendelse(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr LoghaendelseRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -32747,22 +34648,28 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.loghaendelse_id
-            
             FROM  loghaendelse_attr_egenskaber a
             JOIN loghaendelse_registrering b on a.loghaendelse_registrering_id=b.id
-            
             WHERE
             (
-                        a.service ILIKE anyAttrValue OR
-                        a.klasse ILIKE anyAttrValue OR
-                        a.tidspunkt ILIKE anyAttrValue OR
-                        a.operation ILIKE anyAttrValue OR
-                        a.objekttype ILIKE anyAttrValue OR
-                        a.returkode ILIKE anyAttrValue OR
-                        a.returtekst ILIKE anyAttrValue OR
-                        a.note ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_loghaendelse_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.service ILIKE anyAttrValue
+                        OR a.klasse ILIKE anyAttrValue
+                        OR a.tidspunkt ILIKE anyAttrValue
+                        OR a.operation ILIKE anyAttrValue
+                        OR a.objekttype ILIKE anyAttrValue
+                        OR a.returkode ILIKE anyAttrValue
+                        OR a.returtekst ILIKE anyAttrValue
+                        OR a.note ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -32771,7 +34678,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -32840,6 +34746,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT loghaendelse_candidates_is_initialized) OR b.loghaendelse_id = ANY (loghaendelse_candidates) )
 
+            
 
         );
 
@@ -33460,8 +35367,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_loghaendelse(loghaendelse_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_loghaendelse(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_loghaendelse(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -33650,7 +35557,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_loghaendelse(
     virkningSoeg TSTZRANGE,
     registreringObj    LoghaendelseRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     loghaendelse_sorted_uuid uuid[];
@@ -33670,6 +35579,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.loghaendelse_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.loghaendelse_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.loghaendelse_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -33679,6 +35594,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_loghaendelse sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_loghaendelse(
+    loghaendelse_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    LoghaendelseRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM loghaendelse_registrering b
+            JOIN loghaendelse_attr_egenskaber a ON a.loghaendelse_registrering_id=b.id
+           WHERE b.loghaendelse_id = loghaendelse_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -33691,249 +35634,265 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_loghaendelse(
-	loghaendelse_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_loghaendelse(
+	loghaendelse_uuid uuid,
 	registreringObjArr LoghaendelseRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	loghaendelse_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	loghaendelse_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj LoghaendelseEgenskaberAttrType;
-	
-  	tilsGyldighedTypeObj LoghaendelseGyldighedTilsType;
-	relationTypeObj LoghaendelseRelationType;
-	registreringObj LoghaendelseRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN loghaendelse_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF loghaendelse_uuids IS NULL OR coalesce(array_length(loghaendelse_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-loghaendelse_candidates:= loghaendelse_uuids;
-
-
-
---RAISE DEBUG 'loghaendelse_candidates_is_initialized step 1:%',loghaendelse_candidates_is_initialized;
---RAISE DEBUG 'loghaendelse_candidates step 1:%',loghaendelse_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_loghaendelse: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(loghaendelse_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			loghaendelse_candidates:=array(
-			SELECT DISTINCT
-			b.loghaendelse_id 
-			FROM  loghaendelse_attr_egenskaber a 
-			JOIN loghaendelse_registrering b on a.loghaendelse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.service IS NULL
-					OR 
-					a.service = attrEgenskaberTypeObj.service 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.klasse IS NULL
-					OR 
-					a.klasse = attrEgenskaberTypeObj.klasse 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.tidspunkt IS NULL
-					OR 
-					a.tidspunkt = attrEgenskaberTypeObj.tidspunkt 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM loghaendelse_attr_egenskaber a
+				JOIN loghaendelse_registrering b on a.loghaendelse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.service IS NULL
+					OR
+					a.service = f.service
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.operation IS NULL
-					OR 
-					a.operation = attrEgenskaberTypeObj.operation 
+					f.klasse IS NULL
+					OR
+					a.klasse = f.klasse
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.objekttype IS NULL
-					OR 
-					a.objekttype = attrEgenskaberTypeObj.objekttype 
+					f.tidspunkt IS NULL
+					OR
+					a.tidspunkt = f.tidspunkt
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.returkode IS NULL
-					OR 
-					a.returkode = attrEgenskaberTypeObj.returkode 
+					f.operation IS NULL
+					OR
+					a.operation = f.operation
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.returtekst IS NULL
-					OR 
-					a.returtekst = attrEgenskaberTypeObj.returtekst 
+					f.objekttype IS NULL
+					OR
+					a.objekttype = f.objekttype
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.note IS NULL
-					OR 
-					a.note = attrEgenskaberTypeObj.note 
+					f.returkode IS NULL
+					OR
+					a.returkode = f.returkode
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.loghaendelse_id = ANY (loghaendelse_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'loghaendelse_candidates_is_initialized step 3:%',loghaendelse_candidates_is_initialized;
---RAISE DEBUG 'loghaendelse_candidates step 3:%',loghaendelse_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Gyldighed
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsGyldighed IS NULL THEN
-	--RAISE DEBUG 'as_search_loghaendelse: skipping filtration on tilsGyldighed';
-ELSE
-	IF coalesce(array_length(loghaendelse_candidates,1),0)>0 THEN 
-
-		FOREACH tilsGyldighedTypeObj IN ARRAY registreringObj.tilsGyldighed
-		LOOP
-			loghaendelse_candidates:=array(
-			SELECT DISTINCT
-			b.loghaendelse_id 
-			FROM  loghaendelse_tils_gyldighed a
-			JOIN loghaendelse_registrering b on a.loghaendelse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsGyldighedTypeObj.gyldighed IS NULL
+					f.returtekst IS NULL
 					OR
-					tilsGyldighedTypeObj.gyldighed = a.gyldighed
-				)
-				AND b.loghaendelse_id = ANY (loghaendelse_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer LoghaendelseRelationType[]
-*/
-
-
---RAISE DEBUG 'loghaendelse_candidates_is_initialized step 4:%',loghaendelse_candidates_is_initialized;
---RAISE DEBUG 'loghaendelse_candidates step 4:%',loghaendelse_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_loghaendelse: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(loghaendelse_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			loghaendelse_candidates:=array(
-			SELECT DISTINCT
-			b.loghaendelse_id 
-			FROM  loghaendelse_relation a
-			JOIN loghaendelse_registrering b on a.loghaendelse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
-					OR
-					relationTypeObj.relType = a.rel_type
+					a.returtekst = f.returtekst
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.note IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.note = f.note
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.loghaendelse_id = loghaendelse_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Gyldighed
+	--/**********************************************************//
+	AND (
+		r.tilsGyldighed IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsGyldighed) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM loghaendelse_tils_gyldighed a
+				JOIN loghaendelse_registrering b on a.loghaendelse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.gyldighed IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.gyldighed = a.gyldighed
 				)
-				AND b.loghaendelse_id = ANY (loghaendelse_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
+				AND b.loghaendelse_id = loghaendelse_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM loghaendelse_relation a
+			JOIN loghaendelse_registrering b on a.loghaendelse_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.loghaendelse_id = loghaendelse_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
+);
+$$ LANGUAGE sql STABLE;
 
---RAISE DEBUG 'loghaendelse_candidates_is_initialized step 5:%',loghaendelse_candidates_is_initialized;
---RAISE DEBUG 'loghaendelse_candidates step 5:%',loghaendelse_candidates;
 
-loghaendelse_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (loghaendelse_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (loghaendelse_candidates) b(id)
-);
+CREATE OR REPLACE FUNCTION _as_filter_unauth_loghaendelse(
+	loghaendelse_uuids uuid[],
+	registreringObjArr LoghaendelseRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	loghaendelse_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(loghaendelse_uuids) a(id)
+	WHERE _as_is_authorized_loghaendelse(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(loghaendelse_passed_auth_filter,1),0)=coalesce(array_length(loghaendelse_uuids,1),0) AND loghaendelse_passed_auth_filter @>loghaendelse_uuids THEN
-	RETURN loghaendelse_passed_auth_filter;
-END IF;
 
 
-END LOOP; --LOOP registreringObj
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-RETURN loghaendelse_passed_auth_filter;
+/*
+NOTICE: This file is auto-generated!
+*/
 
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
+-- Store the current registration of the given object, as listed at the
+-- current time, in loghaendelse_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_loghaendelse(
+    loghaendelse_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM loghaendelse_registrering b
+     WHERE b.loghaendelse_id = loghaendelse_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM loghaendelse_attr_egenskaber a
+         WHERE a.loghaendelse_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM loghaendelse_tils_gyldighed a
+         WHERE a.loghaendelse_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM loghaendelse_relation a
+         WHERE a.loghaendelse_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
 
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
 
+    aktuel_objekt := (as_list_loghaendelse(
+        ARRAY[loghaendelse_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM loghaendelse_aktuel
+         WHERE loghaendelse_id = loghaendelse_uuid;
+    ELSE
+        INSERT INTO loghaendelse_aktuel (
+            loghaendelse_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            loghaendelse_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (loghaendelse_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -34097,6 +36056,25 @@ CREATE INDEX organisation_id_idx
     ON organisation_registrering (organisation_id);
 
 
+CREATE INDEX organisation_registrering_idx_timeperiod_lower
+    ON organisation_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX organisation_registrering_idx_timeperiod
+    ON organisation_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX organisation_registrering_idx_current
+    ON organisation_registrering
+    USING btree
+    (organisation_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_organisation
     AFTER INSERT OR UPDATE OR DELETE ON organisation_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -34104,6 +36082,38 @@ CREATE TRIGGER notify_organisation
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_organisation
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_organisation. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_organisation sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE organisation_aktuel (
+    organisation_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT organisation_aktuel_pkey PRIMARY KEY (organisation_id),
+    CONSTRAINT organisation_aktuel_organisation_fkey FOREIGN KEY (organisation_id)
+        REFERENCES organisation (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE organisation_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX organisation_aktuel_idx_sorteringsnoegle
+    ON organisation_aktuel
+    USING btree
+    (sorteringsnoegle, organisation_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE organisation_attr_egenskaber_id_seq
@@ -34172,6 +36182,11 @@ ALTER TABLE organisation_attr_egenskaber
 
 
 
+CREATE INDEX organisation_attr_egenskaber_idx_virkning_timeperiod
+    ON organisation_attr_egenskaber
+    USING gist
+    (organisation_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisation_attr_egenskaber_idx_virkning_aktoerref
     ON organisation_attr_egenskaber
     USING btree
@@ -34192,6 +36207,27 @@ CREATE INDEX organisation_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_organisation_attr_egenskaber(
+    organisation_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).organisationsnavn,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX organisation_attr_egenskaber_pat_search_text
+    ON organisation_attr_egenskaber
+    USING gin
+    (_as_search_text_organisation_attr_egenskaber(organisation_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -34234,6 +36270,11 @@ CREATE INDEX organisation_tils_gyldighed_idx_gyldighed
     USING btree
     (gyldighed);
   
+CREATE INDEX organisation_tils_gyldighed_idx_virkning_timeperiod
+    ON organisation_tils_gyldighed
+    USING gist
+    (organisation_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisation_tils_gyldighed_idx_virkning_aktoerref
     ON organisation_tils_gyldighed
     USING btree
@@ -34324,6 +36365,11 @@ CREATE INDEX organisation_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX organisation_relation_idx_virkning_timeperiod
+    ON organisation_relation
+    USING gist
+    (organisation_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisation_relation_idx_virkning_aktoerref
     ON organisation_relation
     USING btree
@@ -34497,12 +36543,17 @@ CREATE OR REPLACE FUNCTION _as_create_organisation_registrering(
     note text DEFAULT ''::text
 ) RETURNS organisation_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     organisation_registrering_id bigint;
     organisation_registrering    organisation_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE organisation_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -34636,8 +36687,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -34657,9 +36708,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -34939,6 +36987,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating organisation with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', organisation_uuid, to_json(read_new_organisation_reg), to_json(read_prev_organisation_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_organisation(organisation_uuid);
 
     return new_organisation_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -35115,7 +37164,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(organisation_registrering.relationer) a
+    FROM unnest(organisation_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -35129,7 +37178,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_organisation(organisation_uuid);
 
 
 RETURN organisation_uuid;
@@ -35358,7 +37407,9 @@ CREATE OR REPLACE FUNCTION as_search_organisation(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr OrganisationRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -35650,16 +37701,22 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.organisation_id
-            
             FROM  organisation_attr_egenskaber a
             JOIN organisation_registrering b on a.organisation_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.organisationsnavn ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_organisation_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.organisationsnavn ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -35668,7 +37725,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -35737,6 +37793,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT organisation_candidates_is_initialized) OR b.organisation_id = ANY (organisation_candidates) )
 
+            
 
         );
 
@@ -36357,8 +38414,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_organisation(organisation_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_organisation(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_organisation(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -36547,7 +38604,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_organisation(
     virkningSoeg TSTZRANGE,
     registreringObj    OrganisationRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     organisation_sorted_uuid uuid[];
@@ -36559,6 +38618,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in organisation_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(organisation_uuids) u(id)
+       LEFT JOIN organisation_aktuel c ON c.organisation_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.organisation_id
+                    FROM organisation_aktuel c
+                   WHERE c.organisation_id = ANY (organisation_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.organisation_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.organisation_id
+                FROM organisation_aktuel c
+               WHERE c.organisation_id = ANY (organisation_uuids)
+                 AND (c.sorteringsnoegle, c.organisation_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.organisation_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     organisation_sorted_uuid:=array(
           SELECT b.organisation_id
             FROM organisation_registrering b
@@ -36567,6 +38661,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.organisation_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.organisation_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.organisation_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -36576,6 +38676,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_organisation sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_organisation(
+    organisation_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    OrganisationRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM organisation_registrering b
+            JOIN organisation_attr_egenskaber a ON a.organisation_registrering_id=b.id
+           WHERE b.organisation_id = organisation_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -36588,213 +38716,236 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_organisation(
-	organisation_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_organisation(
+	organisation_uuid uuid,
 	registreringObjArr OrganisationRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	organisation_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	organisation_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj OrganisationEgenskaberAttrType;
-	
-  	tilsGyldighedTypeObj OrganisationGyldighedTilsType;
-	relationTypeObj OrganisationRelationType;
-	registreringObj OrganisationRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN organisation_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF organisation_uuids IS NULL OR coalesce(array_length(organisation_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-organisation_candidates:= organisation_uuids;
-
-
-
---RAISE DEBUG 'organisation_candidates_is_initialized step 1:%',organisation_candidates_is_initialized;
---RAISE DEBUG 'organisation_candidates step 1:%',organisation_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_organisation: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(organisation_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			organisation_candidates:=array(
-			SELECT DISTINCT
-			b.organisation_id 
-			FROM  organisation_attr_egenskaber a 
-			JOIN organisation_registrering b on a.organisation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.organisationsnavn IS NULL
-					OR 
-					a.organisationsnavn = attrEgenskaberTypeObj.organisationsnavn 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.organisation_id = ANY (organisation_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'organisation_candidates_is_initialized step 3:%',organisation_candidates_is_initialized;
---RAISE DEBUG 'organisation_candidates step 3:%',organisation_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Gyldighed
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsGyldighed IS NULL THEN
-	--RAISE DEBUG 'as_search_organisation: skipping filtration on tilsGyldighed';
-ELSE
-	IF coalesce(array_length(organisation_candidates,1),0)>0 THEN 
-
-		FOREACH tilsGyldighedTypeObj IN ARRAY registreringObj.tilsGyldighed
-		LOOP
-			organisation_candidates:=array(
-			SELECT DISTINCT
-			b.organisation_id 
-			FROM  organisation_tils_gyldighed a
-			JOIN organisation_registrering b on a.organisation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsGyldighedTypeObj.gyldighed IS NULL
-					OR
-					tilsGyldighedTypeObj.gyldighed = a.gyldighed
-				)
-				AND b.organisation_id = ANY (organisation_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer OrganisationRelationType[]
-*/
-
-
---RAISE DEBUG 'organisation_candidates_is_initialized step 4:%',organisation_candidates_is_initialized;
---RAISE DEBUG 'organisation_candidates step 4:%',organisation_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_organisation: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(organisation_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			organisation_candidates:=array(
-			SELECT DISTINCT
-			b.organisation_id 
-			FROM  organisation_relation a
-			JOIN organisation_registrering b on a.organisation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM organisation_attr_egenskaber a
+				JOIN organisation_registrering b on a.organisation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
 					OR
-					relationTypeObj.relType = a.rel_type
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.organisationsnavn IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.organisationsnavn = f.organisationsnavn
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.organisation_id = organisation_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Gyldighed
+	--/**********************************************************//
+	AND (
+		r.tilsGyldighed IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsGyldighed) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM organisation_tils_gyldighed a
+				JOIN organisation_registrering b on a.organisation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.gyldighed IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.gyldighed = a.gyldighed
 				)
-				AND b.organisation_id = ANY (organisation_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'organisation_candidates_is_initialized step 5:%',organisation_candidates_is_initialized;
---RAISE DEBUG 'organisation_candidates step 5:%',organisation_candidates;
-
-organisation_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (organisation_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (organisation_candidates) b(id)
+				AND b.organisation_id = organisation_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM organisation_relation a
+			JOIN organisation_registrering b on a.organisation_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.organisation_id = organisation_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(organisation_passed_auth_filter,1),0)=coalesce(array_length(organisation_uuids,1),0) AND organisation_passed_auth_filter @>organisation_uuids THEN
-	RETURN organisation_passed_auth_filter;
-END IF;
 
+CREATE OR REPLACE FUNCTION _as_filter_unauth_organisation(
+	organisation_uuids uuid[],
+	registreringObjArr OrganisationRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	organisation_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(organisation_uuids) a(id)
+	WHERE _as_is_authorized_organisation(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN organisation_passed_auth_filter;
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
+/*
+NOTICE: This file is auto-generated!
+*/
 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in organisation_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_organisation(
+    organisation_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM organisation_registrering b
+     WHERE b.organisation_id = organisation_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM organisation_attr_egenskaber a
+         WHERE a.organisation_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM organisation_tils_gyldighed a
+         WHERE a.organisation_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM organisation_relation a
+         WHERE a.organisation_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_organisation(
+        ARRAY[organisation_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM organisation_attr_egenskaber a
+         WHERE a.organisation_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
+
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM organisation_aktuel
+         WHERE organisation_id = organisation_uuid;
+    ELSE
+        INSERT INTO organisation_aktuel (
+            organisation_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            organisation_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (organisation_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -36958,6 +39109,25 @@ CREATE INDEX organisationenhed_id_idx
     ON organisationenhed_registrering (organisationenhed_id);
 
 
+CREATE INDEX organisationenhed_registrering_idx_timeperiod_lower
+    ON organisationenhed_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX organisationenhed_registrering_idx_timeperiod
+    ON organisationenhed_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX organisationenhed_registrering_idx_current
+    ON organisationenhed_registrering
+    USING btree
+    (organisationenhed_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_organisationenhed
     AFTER INSERT OR UPDATE OR DELETE ON organisationenhed_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -36965,6 +39135,38 @@ CREATE TRIGGER notify_organisationenhed
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_organisationenhed
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_organisationenhed. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_organisationenhed sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE organisationenhed_aktuel (
+    organisationenhed_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT organisationenhed_aktuel_pkey PRIMARY KEY (organisationenhed_id),
+    CONSTRAINT organisationenhed_aktuel_organisationenhed_fkey FOREIGN KEY (organisationenhed_id)
+        REFERENCES organisationenhed (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE organisationenhed_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX organisationenhed_aktuel_idx_sorteringsnoegle
+    ON organisationenhed_aktuel
+    USING btree
+    (sorteringsnoegle, organisationenhed_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE organisationenhed_attr_egenskaber_id_seq
@@ -37033,6 +39235,11 @@ ALTER TABLE organisationenhed_attr_egenskaber
 
 
 
+CREATE INDEX organisationenhed_attr_egenskaber_idx_virkning_timeperiod
+    ON organisationenhed_attr_egenskaber
+    USING gist
+    (organisationenhed_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisationenhed_attr_egenskaber_idx_virkning_aktoerref
     ON organisationenhed_attr_egenskaber
     USING btree
@@ -37053,6 +39260,27 @@ CREATE INDEX organisationenhed_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_organisationenhed_attr_egenskaber(
+    organisationenhed_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).enhedsnavn,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX organisationenhed_attr_egenskaber_pat_search_text
+    ON organisationenhed_attr_egenskaber
+    USING gin
+    (_as_search_text_organisationenhed_attr_egenskaber(organisationenhed_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -37095,6 +39323,11 @@ CREATE INDEX organisationenhed_tils_gyldighed_idx_gyldighed
     USING btree
     (gyldighed);
   
+CREATE INDEX organisationenhed_tils_gyldighed_idx_virkning_timeperiod
+    ON organisationenhed_tils_gyldighed
+    USING gist
+    (organisationenhed_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisationenhed_tils_gyldighed_idx_virkning_aktoerref
     ON organisationenhed_tils_gyldighed
     USING btree
@@ -37185,6 +39418,11 @@ CREATE INDEX organisationenhed_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX organisationenhed_relation_idx_virkning_timeperiod
+    ON organisationenhed_relation
+    USING gist
+    (organisationenhed_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisationenhed_relation_idx_virkning_aktoerref
     ON organisationenhed_relation
     USING btree
@@ -37358,12 +39596,17 @@ CREATE OR REPLACE FUNCTION _as_create_organisationenhed_registrering(
     note text DEFAULT ''::text
 ) RETURNS organisationenhed_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     organisationenhed_registrering_id bigint;
     organisationenhed_registrering    organisationenhed_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE organisationenhed_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -37497,8 +39740,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -37518,9 +39761,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -37800,6 +40040,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating organisationenhed with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', organisationenhed_uuid, to_json(read_new_organisationenhed_reg), to_json(read_prev_organisationenhed_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_organisationenhed(organisationenhed_uuid);
 
     return new_organisationenhed_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -37976,7 +40217,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(organisationenhed_registrering.relationer) a
+    FROM unnest(organisationenhed_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -37990,7 +40231,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_organisationenhed(organisationenhed_uuid);
 
 
 RETURN organisationenhed_uuid;
@@ -38219,7 +40460,9 @@ CREATE OR REPLACE FUNCTION as_search_organisationenhed(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr OrganisationenhedRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -38489,115 +40732,121 @@ ELSE
 		AND
 		((NOT organisationenhed_candidates_is_initialized) OR b.organisationenhed_id = ANY (organisationenhed_candidates) )
 
-            );
-
-
-            organisationenhed_candidates_is_initialized:=true;
-
-        END LOOP;
-    END IF;
-END IF;
---RAISE DEBUG 'organisationenhed_candidates_is_initialized step 3:%',organisationenhed_candidates_is_initialized;
---RAISE DEBUG 'organisationenhed_candidates step 3:%',organisationenhed_candidates;
-
---/**********************************************************//
---Filtration on anyAttrValueArr
---/**********************************************************//
-IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
-
-    FOREACH anyAttrValue IN ARRAY anyAttrValueArr
-    LOOP
-        organisationenhed_candidates:=array(
-
-            SELECT DISTINCT
-            b.organisationenhed_id
+            );
+
+
+            organisationenhed_candidates_is_initialized:=true;
+
+        END LOOP;
+    END IF;
+END IF;
+--RAISE DEBUG 'organisationenhed_candidates_is_initialized step 3:%',organisationenhed_candidates_is_initialized;
+--RAISE DEBUG 'organisationenhed_candidates step 3:%',organisationenhed_candidates;
+
+--/**********************************************************//
+--Filtration on anyAttrValueArr
+--/**********************************************************//
+IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
+
+    FOREACH anyAttrValue IN ARRAY anyAttrValueArr
+    LOOP
+        organisationenhed_candidates:=array(
+
+            SELECT DISTINCT
+            b.organisationenhed_id
+            FROM  organisationenhed_attr_egenskaber a
+            JOIN organisationenhed_registrering b on a.organisationenhed_registrering_id=b.id
+            WHERE
+            (
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_organisationenhed_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.enhedsnavn ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
+            )
+            AND
+            (
+                virkningSoeg IS NULL
+                OR
+                virkningSoeg && (a.virkning).TimePeriod
+            )
+            AND
+            		(
+				(registreringObj.registrering) IS NULL 
+				OR
+				(
+					(
+						(registreringObj.registrering).timeperiod IS NULL 
+						OR
+						(registreringObj.registrering).timeperiod && (b.registrering).timeperiod
+					)
+					AND
+					(
+						(registreringObj.registrering).livscykluskode IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode = (b.registrering).livscykluskode 		
+					) 
+					AND
+					(
+						(registreringObj.registrering).brugerref IS NULL
+						OR
+						(registreringObj.registrering).brugerref = (b.registrering).brugerref
+					)
+					AND
+					(
+						(registreringObj.registrering).note IS NULL
+						OR
+						(b.registrering).note ILIKE (registreringObj.registrering).note
+					)
+			)
+		)
+		AND
+		(
+			(
+				((b.registrering).livscykluskode <> 'Slettet'::Livscykluskode )
+				AND
+					(
+						(registreringObj.registrering) IS NULL 
+						OR
+						(registreringObj.registrering).livscykluskode IS NULL 
+					)
+			)
+			OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				(registreringObj.registrering).livscykluskode IS NOT NULL 
+			)
+		)
+		AND
+		(
+			(
+			  (
+			  	(registreringObj.registrering) IS NULL
+			  	OR
+			  	(registreringObj.registrering).timeperiod IS NULL
+			  )
+			  AND
+			  upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			)  	
+		OR
+			(
+				(NOT ((registreringObj.registrering) IS NULL))
+				AND
+				((registreringObj.registrering).timeperiod IS NOT NULL)
+			)
+		)
+		AND
+		((NOT organisationenhed_candidates_is_initialized) OR b.organisationenhed_id = ANY (organisationenhed_candidates) )
+
             
-            FROM  organisationenhed_attr_egenskaber a
-            JOIN organisationenhed_registrering b on a.organisationenhed_registrering_id=b.id
-            
-            WHERE
-            (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.enhedsnavn ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
-            )
-            AND
-            (
-                virkningSoeg IS NULL
-                OR
-                virkningSoeg && (a.virkning).TimePeriod
-            )
-            AND
-            
-            		(
-				(registreringObj.registrering) IS NULL 
-				OR
-				(
-					(
-						(registreringObj.registrering).timeperiod IS NULL 
-						OR
-						(registreringObj.registrering).timeperiod && (b.registrering).timeperiod
-					)
-					AND
-					(
-						(registreringObj.registrering).livscykluskode IS NULL 
-						OR
-						(registreringObj.registrering).livscykluskode = (b.registrering).livscykluskode 		
-					) 
-					AND
-					(
-						(registreringObj.registrering).brugerref IS NULL
-						OR
-						(registreringObj.registrering).brugerref = (b.registrering).brugerref
-					)
-					AND
-					(
-						(registreringObj.registrering).note IS NULL
-						OR
-						(b.registrering).note ILIKE (registreringObj.registrering).note
-					)
-			)
-		)
-		AND
-		(
-			(
-				((b.registrering).livscykluskode <> 'Slettet'::Livscykluskode )
-				AND
-					(
-						(registreringObj.registrering) IS NULL 
-						OR
-						(registreringObj.registrering).livscykluskode IS NULL 
-					)
-			)
-			OR
-			(
-				(NOT ((registreringObj.registrering) IS NULL))
-				AND
-				(registreringObj.registrering).livscykluskode IS NOT NULL 
-			)
-		)
-		AND
-		(
-			(
-			  (
-			  	(registreringObj.registrering) IS NULL
-			  	OR
-			  	(registreringObj.registrering).timeperiod IS NULL
-			  )
-			  AND
-			  upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			)  	
-		OR
-			(
-				(NOT ((registreringObj.registrering) IS NULL))
-				AND
-				((registreringObj.registrering).timeperiod IS NOT NULL)
-			)
-		)
-		AND
-		((NOT organisationenhed_candidates_is_initialized) OR b.organisationenhed_id = ANY (organisationenhed_candidates) )
-
 
         );
 
@@ -39218,8 +41467,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_organisationenhed(organisationenhed_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_organisationenhed(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_organisationenhed(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -39408,7 +41657,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_organisationenhed(
     virkningSoeg TSTZRANGE,
     registreringObj    OrganisationenhedRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     organisationenhed_sorted_uuid uuid[];
@@ -39420,6 +41671,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in organisationenhed_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(organisationenhed_uuids) u(id)
+       LEFT JOIN organisationenhed_aktuel c ON c.organisationenhed_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.organisationenhed_id
+                    FROM organisationenhed_aktuel c
+                   WHERE c.organisationenhed_id = ANY (organisationenhed_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.organisationenhed_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.organisationenhed_id
+                FROM organisationenhed_aktuel c
+               WHERE c.organisationenhed_id = ANY (organisationenhed_uuids)
+                 AND (c.sorteringsnoegle, c.organisationenhed_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.organisationenhed_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     organisationenhed_sorted_uuid:=array(
           SELECT b.organisationenhed_id
             FROM organisationenhed_registrering b
@@ -39428,6 +41714,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.organisationenhed_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.organisationenhed_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.organisationenhed_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -39437,6 +41729,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_organisationenhed sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_organisationenhed(
+    organisationenhed_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    OrganisationenhedRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM organisationenhed_registrering b
+            JOIN organisationenhed_attr_egenskaber a ON a.organisationenhed_registrering_id=b.id
+           WHERE b.organisationenhed_id = organisationenhed_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -39449,213 +41769,236 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_organisationenhed(
-	organisationenhed_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_organisationenhed(
+	organisationenhed_uuid uuid,
 	registreringObjArr OrganisationenhedRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	organisationenhed_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	organisationenhed_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj OrganisationenhedEgenskaberAttrType;
-	
-  	tilsGyldighedTypeObj OrganisationenhedGyldighedTilsType;
-	relationTypeObj OrganisationenhedRelationType;
-	registreringObj OrganisationenhedRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN organisationenhed_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF organisationenhed_uuids IS NULL OR coalesce(array_length(organisationenhed_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-organisationenhed_candidates:= organisationenhed_uuids;
-
-
-
---RAISE DEBUG 'organisationenhed_candidates_is_initialized step 1:%',organisationenhed_candidates_is_initialized;
---RAISE DEBUG 'organisationenhed_candidates step 1:%',organisationenhed_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_organisationenhed: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(organisationenhed_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			organisationenhed_candidates:=array(
-			SELECT DISTINCT
-			b.organisationenhed_id 
-			FROM  organisationenhed_attr_egenskaber a 
-			JOIN organisationenhed_registrering b on a.organisationenhed_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.enhedsnavn IS NULL
-					OR 
-					a.enhedsnavn = attrEgenskaberTypeObj.enhedsnavn 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.organisationenhed_id = ANY (organisationenhed_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'organisationenhed_candidates_is_initialized step 3:%',organisationenhed_candidates_is_initialized;
---RAISE DEBUG 'organisationenhed_candidates step 3:%',organisationenhed_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Gyldighed
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsGyldighed IS NULL THEN
-	--RAISE DEBUG 'as_search_organisationenhed: skipping filtration on tilsGyldighed';
-ELSE
-	IF coalesce(array_length(organisationenhed_candidates,1),0)>0 THEN 
-
-		FOREACH tilsGyldighedTypeObj IN ARRAY registreringObj.tilsGyldighed
-		LOOP
-			organisationenhed_candidates:=array(
-			SELECT DISTINCT
-			b.organisationenhed_id 
-			FROM  organisationenhed_tils_gyldighed a
-			JOIN organisationenhed_registrering b on a.organisationenhed_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsGyldighedTypeObj.gyldighed IS NULL
-					OR
-					tilsGyldighedTypeObj.gyldighed = a.gyldighed
-				)
-				AND b.organisationenhed_id = ANY (organisationenhed_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer OrganisationenhedRelationType[]
-*/
-
-
---RAISE DEBUG 'organisationenhed_candidates_is_initialized step 4:%',organisationenhed_candidates_is_initialized;
---RAISE DEBUG 'organisationenhed_candidates step 4:%',organisationenhed_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_organisationenhed: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(organisationenhed_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			organisationenhed_candidates:=array(
-			SELECT DISTINCT
-			b.organisationenhed_id 
-			FROM  organisationenhed_relation a
-			JOIN organisationenhed_registrering b on a.organisationenhed_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM organisationenhed_attr_egenskaber a
+				JOIN organisationenhed_registrering b on a.organisationenhed_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
 					OR
-					relationTypeObj.relType = a.rel_type
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.enhedsnavn IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.enhedsnavn = f.enhedsnavn
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.organisationenhed_id = organisationenhed_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Gyldighed
+	--/**********************************************************//
+	AND (
+		r.tilsGyldighed IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsGyldighed) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM organisationenhed_tils_gyldighed a
+				JOIN organisationenhed_registrering b on a.organisationenhed_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.gyldighed IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.gyldighed = a.gyldighed
 				)
-				AND b.organisationenhed_id = ANY (organisationenhed_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'organisationenhed_candidates_is_initialized step 5:%',organisationenhed_candidates_is_initialized;
---RAISE DEBUG 'organisationenhed_candidates step 5:%',organisationenhed_candidates;
-
-organisationenhed_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (organisationenhed_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (organisationenhed_candidates) b(id)
+				AND b.organisationenhed_id = organisationenhed_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM organisationenhed_relation a
+			JOIN organisationenhed_registrering b on a.organisationenhed_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.organisationenhed_id = organisationenhed_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(organisationenhed_passed_auth_filter,1),0)=coalesce(array_length(organisationenhed_uuids,1),0) AND organisationenhed_passed_auth_filter @>organisationenhed_uuids THEN
-	RETURN organisationenhed_passed_auth_filter;
-END IF;
 
+CREATE OR REPLACE FUNCTION _as_filter_unauth_organisationenhed(
+	organisationenhed_uuids uuid[],
+	registreringObjArr OrganisationenhedRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	organisationenhed_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(organisationenhed_uuids) a(id)
+	WHERE _as_is_authorized_organisationenhed(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN organisationenhed_passed_auth_filter;
 
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
+/*
+NOTICE: This file is auto-generated!
+*/
 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in organisationenhed_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_organisationenhed(
+    organisationenhed_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM organisationenhed_registrering b
+     WHERE b.organisationenhed_id = organisationenhed_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM organisationenhed_attr_egenskaber a
+         WHERE a.organisationenhed_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM organisationenhed_tils_gyldighed a
+         WHERE a.organisationenhed_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM organisationenhed_relation a
+         WHERE a.organisationenhed_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_organisationenhed(
+        ARRAY[organisationenhed_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM organisationenhed_attr_egenskaber a
+         WHERE a.organisationenhed_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
+
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM organisationenhed_aktuel
+         WHERE organisationenhed_id = organisationenhed_uuid;
+    ELSE
+        INSERT INTO organisationenhed_aktuel (
+            organisationenhed_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            organisationenhed_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (organisationenhed_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -39819,6 +42162,25 @@ CREATE INDEX organisationfunktion_id_idx
     ON organisationfunktion_registrering (organisationfunktion_id);
 
 
+CREATE INDEX organisationfunktion_registrering_idx_timeperiod_lower
+    ON organisationfunktion_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX organisationfunktion_registrering_idx_timeperiod
+    ON organisationfunktion_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX organisationfunktion_registrering_idx_current
+    ON organisationfunktion_registrering
+    USING btree
+    (organisationfunktion_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_organisationfunktion
     AFTER INSERT OR UPDATE OR DELETE ON organisationfunktion_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -39826,6 +42188,38 @@ CREATE TRIGGER notify_organisationfunktion
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_organisationfunktion
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_organisationfunktion. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_organisationfunktion sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE organisationfunktion_aktuel (
+    organisationfunktion_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT organisationfunktion_aktuel_pkey PRIMARY KEY (organisationfunktion_id),
+    CONSTRAINT organisationfunktion_aktuel_organisationfunktion_fkey FOREIGN KEY (organisationfunktion_id)
+        REFERENCES organisationfunktion (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE organisationfunktion_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX organisationfunktion_aktuel_idx_sorteringsnoegle
+    ON organisationfunktion_aktuel
+    USING btree
+    (sorteringsnoegle, organisationfunktion_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE organisationfunktion_attr_egenskaber_id_seq
@@ -39894,6 +42288,11 @@ ALTER TABLE organisationfunktion_attr_egenskaber
 
 
 
+CREATE INDEX organisationfunktion_attr_egenskaber_idx_virkning_timeperiod
+    ON organisationfunktion_attr_egenskaber
+    USING gist
+    (organisationfunktion_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisationfunktion_attr_egenskaber_idx_virkning_aktoerref
     ON organisationfunktion_attr_egenskaber
     USING btree
@@ -39914,6 +42313,27 @@ CREATE INDEX organisationfunktion_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_organisationfunktion_attr_egenskaber(
+    organisationfunktion_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).funktionsnavn,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX organisationfunktion_attr_egenskaber_pat_search_text
+    ON organisationfunktion_attr_egenskaber
+    USING gin
+    (_as_search_text_organisationfunktion_attr_egenskaber(organisationfunktion_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -39956,6 +42376,11 @@ CREATE INDEX organisationfunktion_tils_gyldighed_idx_gyldighed
     USING btree
     (gyldighed);
   
+CREATE INDEX organisationfunktion_tils_gyldighed_idx_virkning_timeperiod
+    ON organisationfunktion_tils_gyldighed
+    USING gist
+    (organisationfunktion_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisationfunktion_tils_gyldighed_idx_virkning_aktoerref
     ON organisationfunktion_tils_gyldighed
     USING btree
@@ -40046,6 +42471,11 @@ CREATE INDEX organisationfunktion_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX organisationfunktion_relation_idx_virkning_timeperiod
+    ON organisationfunktion_relation
+    USING gist
+    (organisationfunktion_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX organisationfunktion_relation_idx_virkning_aktoerref
     ON organisationfunktion_relation
     USING btree
@@ -40219,12 +42649,17 @@ CREATE OR REPLACE FUNCTION _as_create_organisationfunktion_registrering(
     note text DEFAULT ''::text
 ) RETURNS organisationfunktion_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     organisationfunktion_registrering_id bigint;
     organisationfunktion_registrering    organisationfunktion_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE organisationfunktion_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -40358,8 +42793,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -40379,9 +42814,6 @@ BEGIN
         FROM
             unnest(relationer) AS a ;
 
-    
-
-
     -- Ad 2)
     -- 0..1 relations
 
@@ -40661,6 +43093,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating organisationfunktion with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', organisationfunktion_uuid, to_json(read_new_organisationfunktion_reg), to_json(read_prev_organisationfunktion_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_organisationfunktion(organisationfunktion_uuid);
 
     return new_organisationfunktion_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -40837,7 +43270,7 @@ END IF;
       a.urn,
       a.relType,
       a.objektType
-    FROM unnest(organisationfunktion_registrering.relationer) a
+    FROM unnest(organisationfunktion_registrering.relationer) WITH ORDINALITY a
   ;
 
 
@@ -40851,7 +43284,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_organisationfunktion(organisationfunktion_uuid);
 
 
 RETURN organisationfunktion_uuid;
@@ -41080,7 +43513,9 @@ CREATE OR REPLACE FUNCTION as_search_organisationfunktion(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr OrganisationfunktionRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -41372,16 +43807,22 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.organisationfunktion_id
-            
             FROM  organisationfunktion_attr_egenskaber a
             JOIN organisationfunktion_registrering b on a.organisationfunktion_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.funktionsnavn ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_organisationfunktion_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.funktionsnavn ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -41390,7 +43831,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -41459,6 +43899,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT organisationfunktion_candidates_is_initialized) OR b.organisationfunktion_id = ANY (organisationfunktion_candidates) )
 
+            
 
         );
 
@@ -42079,8 +44520,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_organisationfunktion(organisationfunktion_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_organisationfunktion(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_organisationfunktion(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -42269,7 +44710,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_organisationfunktion(
     virkningSoeg TSTZRANGE,
     registreringObj    OrganisationfunktionRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     organisationfunktion_sorted_uuid uuid[];
@@ -42281,6 +44724,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in organisationfunktion_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(organisationfunktion_uuids) u(id)
+       LEFT JOIN organisationfunktion_aktuel c ON c.organisationfunktion_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.organisationfunktion_id
+                    FROM organisationfunktion_aktuel c
+                   WHERE c.organisationfunktion_id = ANY (organisationfunktion_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.organisationfunktion_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.organisationfunktion_id
+                FROM organisationfunktion_aktuel c
+               WHERE c.organisationfunktion_id = ANY (organisationfunktion_uuids)
+                 AND (c.sorteringsnoegle, c.organisationfunktion_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.organisationfunktion_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     organisationfunktion_sorted_uuid:=array(
           SELECT b.organisationfunktion_id
             FROM organisationfunktion_registrering b
@@ -42289,6 +44767,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.organisationfunktion_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.organisationfunktion_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.organisationfunktion_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -42298,6 +44782,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_organisationfunktion sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_organisationfunktion(
+    organisationfunktion_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    OrganisationfunktionRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM organisationfunktion_registrering b
+            JOIN organisationfunktion_attr_egenskaber a ON a.organisationfunktion_registrering_id=b.id
+           WHERE b.organisationfunktion_id = organisationfunktion_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -42310,213 +44822,236 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_organisationfunktion(
-	organisationfunktion_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_organisationfunktion(
+	organisationfunktion_uuid uuid,
 	registreringObjArr OrganisationfunktionRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	organisationfunktion_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	organisationfunktion_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj OrganisationfunktionEgenskaberAttrType;
-	
-  	tilsGyldighedTypeObj OrganisationfunktionGyldighedTilsType;
-	relationTypeObj OrganisationfunktionRelationType;
-	registreringObj OrganisationfunktionRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN organisationfunktion_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF organisationfunktion_uuids IS NULL OR coalesce(array_length(organisationfunktion_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-organisationfunktion_candidates:= organisationfunktion_uuids;
-
-
-
---RAISE DEBUG 'organisationfunktion_candidates_is_initialized step 1:%',organisationfunktion_candidates_is_initialized;
---RAISE DEBUG 'organisationfunktion_candidates step 1:%',organisationfunktion_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_organisationfunktion: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(organisationfunktion_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			organisationfunktion_candidates:=array(
-			SELECT DISTINCT
-			b.organisationfunktion_id 
-			FROM  organisationfunktion_attr_egenskaber a 
-			JOIN organisationfunktion_registrering b on a.organisationfunktion_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.funktionsnavn IS NULL
-					OR 
-					a.funktionsnavn = attrEgenskaberTypeObj.funktionsnavn 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.organisationfunktion_id = ANY (organisationfunktion_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'organisationfunktion_candidates_is_initialized step 3:%',organisationfunktion_candidates_is_initialized;
---RAISE DEBUG 'organisationfunktion_candidates step 3:%',organisationfunktion_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Gyldighed
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsGyldighed IS NULL THEN
-	--RAISE DEBUG 'as_search_organisationfunktion: skipping filtration on tilsGyldighed';
-ELSE
-	IF coalesce(array_length(organisationfunktion_candidates,1),0)>0 THEN 
-
-		FOREACH tilsGyldighedTypeObj IN ARRAY registreringObj.tilsGyldighed
-		LOOP
-			organisationfunktion_candidates:=array(
-			SELECT DISTINCT
-			b.organisationfunktion_id 
-			FROM  organisationfunktion_tils_gyldighed a
-			JOIN organisationfunktion_registrering b on a.organisationfunktion_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsGyldighedTypeObj.gyldighed IS NULL
-					OR
-					tilsGyldighedTypeObj.gyldighed = a.gyldighed
-				)
-				AND b.organisationfunktion_id = ANY (organisationfunktion_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer OrganisationfunktionRelationType[]
-*/
-
-
---RAISE DEBUG 'organisationfunktion_candidates_is_initialized step 4:%',organisationfunktion_candidates_is_initialized;
---RAISE DEBUG 'organisationfunktion_candidates step 4:%',organisationfunktion_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_organisationfunktion: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(organisationfunktion_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			organisationfunktion_candidates:=array(
-			SELECT DISTINCT
-			b.organisationfunktion_id 
-			FROM  organisationfunktion_relation a
-			JOIN organisationfunktion_registrering b on a.organisationfunktion_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM organisationfunktion_attr_egenskaber a
+				JOIN organisationfunktion_registrering b on a.organisationfunktion_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
 					OR
-					relationTypeObj.relType = a.rel_type
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.funktionsnavn IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.funktionsnavn = f.funktionsnavn
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.organisationfunktion_id = organisationfunktion_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Gyldighed
+	--/**********************************************************//
+	AND (
+		r.tilsGyldighed IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsGyldighed) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM organisationfunktion_tils_gyldighed a
+				JOIN organisationfunktion_registrering b on a.organisationfunktion_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.gyldighed IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.gyldighed = a.gyldighed
 				)
-				AND b.organisationfunktion_id = ANY (organisationfunktion_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'organisationfunktion_candidates_is_initialized step 5:%',organisationfunktion_candidates_is_initialized;
---RAISE DEBUG 'organisationfunktion_candidates step 5:%',organisationfunktion_candidates;
-
-organisationfunktion_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (organisationfunktion_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (organisationfunktion_candidates) b(id)
+				AND b.organisationfunktion_id = organisationfunktion_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM organisationfunktion_relation a
+			JOIN organisationfunktion_registrering b on a.organisationfunktion_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.organisationfunktion_id = organisationfunktion_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(organisationfunktion_passed_auth_filter,1),0)=coalesce(array_length(organisationfunktion_uuids,1),0) AND organisationfunktion_passed_auth_filter @>organisationfunktion_uuids THEN
-	RETURN organisationfunktion_passed_auth_filter;
-END IF;
+
+CREATE OR REPLACE FUNCTION _as_filter_unauth_organisationfunktion(
+	organisationfunktion_uuids uuid[],
+	registreringObjArr OrganisationfunktionRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	organisationfunktion_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(organisationfunktion_uuids) a(id)
+	WHERE _as_is_authorized_organisationfunktion(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN organisationfunktion_passed_auth_filter;
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in organisationfunktion_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_organisationfunktion(
+    organisationfunktion_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM organisationfunktion_registrering b
+     WHERE b.organisationfunktion_id = organisationfunktion_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM organisationfunktion_attr_egenskaber a
+         WHERE a.organisationfunktion_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM organisationfunktion_tils_gyldighed a
+         WHERE a.organisationfunktion_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM organisationfunktion_relation a
+         WHERE a.organisationfunktion_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_organisationfunktion(
+        ARRAY[organisationfunktion_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM organisationfunktion_attr_egenskaber a
+         WHERE a.organisationfunktion_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM organisationfunktion_aktuel
+         WHERE organisationfunktion_id = organisationfunktion_uuid;
+    ELSE
+        INSERT INTO organisationfunktion_aktuel (
+            organisationfunktion_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            organisationfunktion_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (organisationfunktion_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -42712,6 +45247,25 @@ CREATE INDEX sag_id_idx
     ON sag_registrering (sag_id);
 
 
+CREATE INDEX sag_registrering_idx_timeperiod_lower
+    ON sag_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX sag_registrering_idx_timeperiod
+    ON sag_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX sag_registrering_idx_current
+    ON sag_registrering
+    USING btree
+    (sag_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_sag
     AFTER INSERT OR UPDATE OR DELETE ON sag_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -42719,6 +45273,38 @@ CREATE TRIGGER notify_sag
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_sag
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_sag. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_sag sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE sag_aktuel (
+    sag_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT sag_aktuel_pkey PRIMARY KEY (sag_id),
+    CONSTRAINT sag_aktuel_sag_fkey FOREIGN KEY (sag_id)
+        REFERENCES sag (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE sag_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX sag_aktuel_idx_sorteringsnoegle
+    ON sag_aktuel
+    USING btree
+    (sorteringsnoegle, sag_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE sag_attr_egenskaber_id_seq
@@ -42888,6 +45474,11 @@ ALTER TABLE sag_attr_egenskaber
 
 
 
+CREATE INDEX sag_attr_egenskaber_idx_virkning_timeperiod
+    ON sag_attr_egenskaber
+    USING gist
+    (sag_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX sag_attr_egenskaber_idx_virkning_aktoerref
     ON sag_attr_egenskaber
     USING btree
@@ -42908,6 +45499,33 @@ CREATE INDEX sag_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_sag_attr_egenskaber(
+    sag_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).beskrivelse,
+        ($1).hjemmel,
+        ($1).kassationskode,
+        (($1).offentlighedundtaget).AlternativTitel,
+        (($1).offentlighedundtaget).Hjemmel,
+        ($1).sagsnummer,
+        ($1).titel,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX sag_attr_egenskaber_pat_search_text
+    ON sag_attr_egenskaber
+    USING gin
+    (_as_search_text_sag_attr_egenskaber(sag_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -42950,6 +45568,11 @@ CREATE INDEX sag_tils_fremdrift_idx_fremdrift
     USING btree
     (fremdrift);
   
+CREATE INDEX sag_tils_fremdrift_idx_virkning_timeperiod
+    ON sag_tils_fremdrift
+    USING gist
+    (sag_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX sag_tils_fremdrift_idx_virkning_aktoerref
     ON sag_tils_fremdrift
     USING btree
@@ -43053,6 +45676,11 @@ CREATE INDEX sag_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX sag_relation_idx_virkning_timeperiod
+    ON sag_relation
+    USING gist
+    (sag_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX sag_relation_idx_virkning_aktoerref
     ON sag_relation
     USING btree
@@ -43226,12 +45854,17 @@ CREATE OR REPLACE FUNCTION _as_create_sag_registrering(
     note text DEFAULT ''::text
 ) RETURNS sag_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     sag_registrering_id bigint;
     sag_registrering    sag_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE sag_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -43331,12 +45964,8 @@ DECLARE
     auth_filtered_uuids uuid[];
 
     
-    rel_type_max_index_prev_rev int;
     rel_type_max_index_arr _SagRelationMaxIndex[];
     sag_rel_type_cardinality_unlimited SagRelationKode[]:=ARRAY['andetarkiv'::SagRelationKode,'andrebehandlere'::SagRelationKode,'sekundaerpart'::SagRelationKode,'andresager'::SagRelationKode,'byggeri'::SagRelationKode,'fredning'::SagRelationKode,'journalpost'::SagRelationKode]::SagRelationKode[];
-    sag_uuid_underscores text;
-    sag_rel_seq_name text;
-    sag_rel_type_cardinality_unlimited_present_in_argument sagRelationKode[];
     
 BEGIN
     -- Create a new registrering
@@ -43372,8 +46001,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -43397,39 +46026,6 @@ BEGIN
              AND a.rel_type = ANY (sag_rel_type_cardinality_unlimited)
         GROUP BY rel_type
     ) AS a;
-
- 
-    ---Create temporary sequences
-    
-    sag_uuid_underscores:=replace(sag_uuid::text, '-', '_');
-    
-
-    SELECT array_agg(DISTINCT a.RelType) INTO sag_rel_type_cardinality_unlimited_present_in_argument FROM unnest(relationer) a WHERE a.RelType = ANY (sag_rel_type_cardinality_unlimited);
-    
-
-    IF coalesce(array_length(sag_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        FOREACH sag_relation_navn IN ARRAY (sag_rel_type_cardinality_unlimited_present_in_argument) LOOP
-            sag_rel_seq_name := 'sag_' || sag_relation_navn::text || sag_uuid_underscores;
-
-            rel_type_max_index_prev_rev := null;
-
-            SELECT a.indeks into rel_type_max_index_prev_rev
-              FROM unnest(rel_type_max_index_arr) a(relType,indeks)
-             WHERE a.relType=sag_relation_navn;
-
-            IF rel_type_max_index_prev_rev IS NULL THEN
-              rel_type_max_index_prev_rev := 0;
-            END IF;
-
-            EXECUTE 'CREATE TEMPORARY SEQUENCE ' || sag_rel_seq_name || '
-            INCREMENT 1
-            MINVALUE 1
-            MAXVALUE 9223372036854775807
-            START ' ||  (rel_type_max_index_prev_rev+1)::text ||'
-            CACHE 1;';
-
-        END LOOP;
-    END IF;
     
 
     INSERT INTO sag_relation (sag_registrering_id, virkning, rel_maal_uuid, rel_maal_urn, rel_type, objekt_type , rel_index, rel_type_spec, journal_notat, journal_dokument_attr )
@@ -43445,8 +46041,9 @@ BEGIN
                     OR b.id IS NULL THEN
                     -- For new relations and relations with index given that
                     -- is not found in prev registrering, we'll assign new
-                    -- index values.
-                    nextval('sag_' || a.relType::text || sag_uuid_underscores)
+                    -- index values, numbered in the order given.
+                    coalesce(m.indeks, 0) + count(*) FILTER (WHERE a.indeks IS NULL
+                        OR b.id IS NULL) OVER (PARTITION BY a.relType ORDER BY a.ordinality ROWS UNBOUNDED PRECEDING)
                 ELSE
                     a.indeks
                 END
@@ -43476,22 +46073,9 @@ BEGIN
                 NULL
             END 
         FROM
-            unnest(relationer) AS a 
-        LEFT JOIN sag_relation b ON a.relType = ANY (sag_rel_type_cardinality_unlimited) AND b.sag_registrering_id = prev_sag_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index ;
-
-    
-    -- Drop temporary sequences
-    IF coalesce(array_length(sag_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        
-        FOREACH sag_relation_navn IN ARRAY (sag_rel_type_cardinality_unlimited_present_in_argument)
-        
-        LOOP
-          sag_rel_seq_name := 'sag_' || sag_relation_navn::text || sag_uuid_underscores;
-          EXECUTE 'DROP SEQUENCE ' || sag_rel_seq_name || ';';
-        END LOOP;
-    END IF;
-    
-
+            unnest(relationer) WITH ORDINALITY AS a 
+        LEFT JOIN sag_relation b ON a.relType = ANY (sag_rel_type_cardinality_unlimited) AND b.sag_registrering_id = prev_sag_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index
+        LEFT JOIN unnest(rel_type_max_index_arr) m (relType, indeks) ON m.relType = a.relType ;
 
     -- Ad 2)
     -- 0..1 relations
@@ -43843,6 +46427,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating sag with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', sag_uuid, to_json(read_new_sag_reg), to_json(read_prev_sag_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_sag(sag_uuid);
 
     return new_sag_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -43879,17 +46464,12 @@ $$ DECLARE sag_registrering_id bigint;
     sag_relationer SagRelationType;
 
     
-    sag_relation_kode SagRelationKode;
-    sag_uuid_underscores text;
-    sag_rel_seq_name text;
     sag_rel_type_cardinality_unlimited SagRelationKode[]:=ARRAY['andetarkiv'::SagRelationKode,'andrebehandlere'::SagRelationKode,'sekundaerpart'::SagRelationKode,'andresager'::SagRelationKode,'byggeri'::SagRelationKode,'fredning'::SagRelationKode,'journalpost'::SagRelationKode]::SagRelationKode[];
     
 
     auth_filtered_uuids uuid[];
 
     
-    sag_rel_type_cardinality_unlimited_present_in_argument sagRelationKode[];
-    
 
     does_exist boolean;
     new_sag_registrering sag_registrering;
@@ -44026,25 +46606,6 @@ END IF;
 
 IF coalesce(array_length(sag_registrering.relationer,1),0)>0 THEN
 
---Create temporary sequences
-sag_uuid_underscores:=replace(sag_uuid::text, '-', '_');
-
-SELECT array_agg(DISTINCT a.RelType) into sag_rel_type_cardinality_unlimited_present_in_argument FROM unnest(sag_registrering.relationer) a WHERE a.RelType = any (sag_rel_type_cardinality_unlimited) ;
-IF coalesce(array_length(sag_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-
-FOREACH sag_relation_kode IN ARRAY (sag_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  sag_rel_seq_name := 'sag_' || sag_relation_kode::text || sag_uuid_underscores;
-
-  EXECUTE 'CREATE TEMPORARY SEQUENCE ' || sag_rel_seq_name || '
-  INCREMENT 1
-  MINVALUE 1
-  MAXVALUE 9223372036854775807
-  START 1
-  CACHE 1;';
-
-END LOOP;
-END IF;
 
 
     INSERT INTO sag_relation (
@@ -44067,7 +46628,7 @@ END IF;
       a.relType,
       a.objektType,
       CASE WHEN a.relType = any (sag_rel_type_cardinality_unlimited) THEN --rel_index
-      nextval('sag_' || a.relType::text || sag_uuid_underscores)
+      row_number() OVER (PARTITION BY a.relType ORDER BY a.ordinality)
       ELSE 
       NULL
       END,
@@ -44113,21 +46674,11 @@ END IF;
        NULL
       END
       
-    FROM unnest(sag_registrering.relationer) a
+    FROM unnest(sag_registrering.relationer) WITH ORDINALITY a
   ;
 
 
 
---Drop temporary sequences
-IF coalesce(array_length(sag_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-FOREACH sag_relation_kode IN ARRAY (sag_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  sag_rel_seq_name := 'sag_' || sag_relation_kode::text || sag_uuid_underscores;
-  EXECUTE 'DROP SEQUENCE ' || sag_rel_seq_name || ';';
-END LOOP;
-END IF;
-
-
 END IF;
 
 
@@ -44139,7 +46690,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_sag(sag_uuid);
 
 
 RETURN sag_uuid;
@@ -44379,7 +46930,9 @@ CREATE OR REPLACE FUNCTION as_search_sag(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr SagRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -44725,25 +47278,27 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.sag_id
-            
             FROM  sag_attr_egenskaber a
             JOIN sag_registrering b on a.sag_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                                -- boolean is skipped intentionally
-                                
-                        a.beskrivelse ILIKE anyAttrValue OR
-                        a.hjemmel ILIKE anyAttrValue OR
-                        a.kassationskode ILIKE anyAttrValue OR
-                                    (a.offentlighedundtaget).Hjemmel ilike anyAttrValue OR (a.offentlighedundtaget).AlternativTitel ilike anyAttrValue OR
-                                -- boolean is skipped intentionally
-                                
-                        a.sagsnummer ILIKE anyAttrValue OR
-                        a.titel ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_sag_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.beskrivelse ILIKE anyAttrValue
+                        OR a.hjemmel ILIKE anyAttrValue
+                        OR a.kassationskode ILIKE anyAttrValue
+                        OR (a.offentlighedundtaget).Hjemmel ilike anyAttrValue OR (a.offentlighedundtaget).AlternativTitel ilike anyAttrValue
+                        OR a.sagsnummer ILIKE anyAttrValue
+                        OR a.titel ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -44752,7 +47307,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -44821,6 +47375,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT sag_candidates_is_initialized) OR b.sag_id = ANY (sag_candidates) )
 
+            
 
         );
 
@@ -45508,8 +48063,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_sag(sag_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_sag(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_sag(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -45698,7 +48253,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_sag(
     virkningSoeg TSTZRANGE,
     registreringObj    SagRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     sag_sorted_uuid uuid[];
@@ -45710,6 +48267,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in sag_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(sag_uuids) u(id)
+       LEFT JOIN sag_aktuel c ON c.sag_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.sag_id
+                    FROM sag_aktuel c
+                   WHERE c.sag_id = ANY (sag_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.sag_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.sag_id
+                FROM sag_aktuel c
+               WHERE c.sag_id = ANY (sag_uuids)
+                 AND (c.sorteringsnoegle, c.sag_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.sag_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     sag_sorted_uuid:=array(
           SELECT b.sag_id
             FROM sag_registrering b
@@ -45718,6 +48310,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.sag_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.sag_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.sag_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -45727,6 +48325,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_sag sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_sag(
+    sag_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    SagRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM sag_registrering b
+            JOIN sag_attr_egenskaber a ON a.sag_registrering_id=b.id
+           WHERE b.sag_id = sag_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -45739,267 +48365,290 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_sag(
-	sag_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_sag(
+	sag_uuid uuid,
 	registreringObjArr SagRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	sag_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	sag_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj SagEgenskaberAttrType;
-	
-  	tilsFremdriftTypeObj SagFremdriftTilsType;
-	relationTypeObj SagRelationType;
-	registreringObj SagRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN sag_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF sag_uuids IS NULL OR coalesce(array_length(sag_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-sag_candidates:= sag_uuids;
-
-
-
---RAISE DEBUG 'sag_candidates_is_initialized step 1:%',sag_candidates_is_initialized;
---RAISE DEBUG 'sag_candidates step 1:%',sag_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_sag: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(sag_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			sag_candidates:=array(
-			SELECT DISTINCT
-			b.sag_id 
-			FROM  sag_attr_egenskaber a 
-			JOIN sag_registrering b on a.sag_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM sag_attr_egenskaber a
+				JOIN sag_registrering b on a.sag_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
+					OR
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.afleveret IS NULL
-					OR 
-					a.afleveret = attrEgenskaberTypeObj.afleveret 
+					f.afleveret IS NULL
+					OR
+					a.afleveret = f.afleveret
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.beskrivelse IS NULL
-					OR 
-					a.beskrivelse = attrEgenskaberTypeObj.beskrivelse 
+					f.beskrivelse IS NULL
+					OR
+					a.beskrivelse = f.beskrivelse
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.hjemmel IS NULL
-					OR 
-					a.hjemmel = attrEgenskaberTypeObj.hjemmel 
+					f.hjemmel IS NULL
+					OR
+					a.hjemmel = f.hjemmel
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.kassationskode IS NULL
-					OR 
-					a.kassationskode = attrEgenskaberTypeObj.kassationskode 
+					f.kassationskode IS NULL
+					OR
+					a.kassationskode = f.kassationskode
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.offentlighedundtaget IS NULL
+					f.offentlighedundtaget IS NULL
 					OR
 						(
 							(
-								(attrEgenskaberTypeObj.offentlighedundtaget).AlternativTitel IS NULL
+								(f.offentlighedundtaget).AlternativTitel IS NULL
 								OR
-								(a.offentlighedundtaget).AlternativTitel = (attrEgenskaberTypeObj.offentlighedundtaget).AlternativTitel 
+								(a.offentlighedundtaget).AlternativTitel = (f.offentlighedundtaget).AlternativTitel
 							)
 							AND
 							(
-								(attrEgenskaberTypeObj.offentlighedundtaget).Hjemmel IS NULL
+								(f.offentlighedundtaget).Hjemmel IS NULL
 								OR
-								(a.offentlighedundtaget).Hjemmel = (attrEgenskaberTypeObj.offentlighedundtaget).Hjemmel
+								(a.offentlighedundtaget).Hjemmel = (f.offentlighedundtaget).Hjemmel
 							)
-						) 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.principiel IS NULL
-					OR 
-					a.principiel = attrEgenskaberTypeObj.principiel 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.sagsnummer IS NULL
-					OR 
-					a.sagsnummer = attrEgenskaberTypeObj.sagsnummer 
+						)
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.titel IS NULL
-					OR 
-					a.titel = attrEgenskaberTypeObj.titel 
+					f.principiel IS NULL
+					OR
+					a.principiel = f.principiel
 				)
 				AND
 				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.sag_id = ANY (sag_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'sag_candidates_is_initialized step 3:%',sag_candidates_is_initialized;
---RAISE DEBUG 'sag_candidates step 3:%',sag_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Fremdrift
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsFremdrift IS NULL THEN
-	--RAISE DEBUG 'as_search_sag: skipping filtration on tilsFremdrift';
-ELSE
-	IF coalesce(array_length(sag_candidates,1),0)>0 THEN 
-
-		FOREACH tilsFremdriftTypeObj IN ARRAY registreringObj.tilsFremdrift
-		LOOP
-			sag_candidates:=array(
-			SELECT DISTINCT
-			b.sag_id 
-			FROM  sag_tils_fremdrift a
-			JOIN sag_registrering b on a.sag_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsFremdriftTypeObj.fremdrift IS NULL
+					f.sagsnummer IS NULL
 					OR
-					tilsFremdriftTypeObj.fremdrift = a.fremdrift
-				)
-				AND b.sag_id = ANY (sag_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer SagRelationType[]
-*/
-
-
---RAISE DEBUG 'sag_candidates_is_initialized step 4:%',sag_candidates_is_initialized;
---RAISE DEBUG 'sag_candidates step 4:%',sag_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_sag: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(sag_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			sag_candidates:=array(
-			SELECT DISTINCT
-			b.sag_id 
-			FROM  sag_relation a
-			JOIN sag_registrering b on a.sag_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
-					OR
-					relationTypeObj.relType = a.rel_type
+					a.sagsnummer = f.sagsnummer
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.titel IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.titel = f.titel
 				)
 				AND
 				(
-					relationTypeObj.objektType IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.urn IS NULL
+				b.sag_id = sag_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Fremdrift
+	--/**********************************************************//
+	AND (
+		r.tilsFremdrift IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsFremdrift) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM sag_tils_fremdrift a
+				JOIN sag_registrering b on a.sag_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.fremdrift IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.fremdrift = a.fremdrift
 				)
-				AND b.sag_id = ANY (sag_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'sag_candidates_is_initialized step 5:%',sag_candidates_is_initialized;
---RAISE DEBUG 'sag_candidates step 5:%',sag_candidates;
-
-sag_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (sag_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (sag_candidates) b(id)
+				AND b.sag_id = sag_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM sag_relation a
+			JOIN sag_registrering b on a.sag_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.sag_id = sag_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(sag_passed_auth_filter,1),0)=coalesce(array_length(sag_uuids,1),0) AND sag_passed_auth_filter @>sag_uuids THEN
-	RETURN sag_passed_auth_filter;
-END IF;
+
+CREATE OR REPLACE FUNCTION _as_filter_unauth_sag(
+	sag_uuids uuid[],
+	registreringObjArr SagRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	sag_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(sag_uuids) a(id)
+	WHERE _as_is_authorized_sag(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN sag_passed_auth_filter;
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in sag_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_sag(
+    sag_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM sag_registrering b
+     WHERE b.sag_id = sag_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM sag_attr_egenskaber a
+         WHERE a.sag_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM sag_tils_fremdrift a
+         WHERE a.sag_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM sag_relation a
+         WHERE a.sag_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_sag(
+        ARRAY[sag_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM sag_attr_egenskaber a
+         WHERE a.sag_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM sag_aktuel
+         WHERE sag_id = sag_uuid;
+    ELSE
+        INSERT INTO sag_aktuel (
+            sag_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            sag_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (sag_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
 
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
@@ -46185,6 +48834,25 @@ CREATE INDEX tilstand_id_idx
     ON tilstand_registrering (tilstand_id);
 
 
+CREATE INDEX tilstand_registrering_idx_timeperiod_lower
+    ON tilstand_registrering
+    USING btree
+    (lower((registrering).timeperiod), id);
+
+
+CREATE INDEX tilstand_registrering_idx_timeperiod
+    ON tilstand_registrering
+    USING gist
+    (((registrering).timeperiod));
+
+
+CREATE INDEX tilstand_registrering_idx_current
+    ON tilstand_registrering
+    USING btree
+    (tilstand_id)
+    WHERE upper((registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+
 CREATE TRIGGER notify_tilstand
     AFTER INSERT OR UPDATE OR DELETE ON tilstand_registrering
     FOR EACH ROW EXECUTE PROCEDURE notify_event();
@@ -46192,6 +48860,38 @@ CREATE TRIGGER notify_tilstand
 
 /****************************************************************************/
 
+-- The current registration of each object as listed by as_list_tilstand
+-- at any time within the virkning period, maintained by
+-- _as_refresh_aktuel_tilstand. The output depends on the time zone it
+-- was rendered in. The sort key is the one _as_sorted_tilstand sorts
+-- the object by when searching within the virkning period.
+CREATE TABLE tilstand_aktuel (
+    tilstand_id uuid NOT NULL,
+    virkning tstzrange NOT NULL,
+    tidszone text NOT NULL,
+    objekt json NOT NULL,
+    sorteringsnoegle text[],
+    CONSTRAINT tilstand_aktuel_pkey PRIMARY KEY (tilstand_id),
+    CONSTRAINT tilstand_aktuel_tilstand_fkey FOREIGN KEY (tilstand_id)
+        REFERENCES tilstand (id) MATCH SIMPLE
+        ON UPDATE NO ACTION ON DELETE NO ACTION
+)
+WITH (
+  OIDS=FALSE
+);
+
+ALTER TABLE tilstand_aktuel
+  OWNER TO mox;
+
+
+CREATE INDEX tilstand_aktuel_idx_sorteringsnoegle
+    ON tilstand_aktuel
+    USING btree
+    (sorteringsnoegle, tilstand_id);
+
+
+/****************************************************************************/
+
 
 
 CREATE SEQUENCE tilstand_attr_egenskaber_id_seq
@@ -46260,6 +48960,11 @@ ALTER TABLE tilstand_attr_egenskaber
 
 
 
+CREATE INDEX tilstand_attr_egenskaber_idx_virkning_timeperiod
+    ON tilstand_attr_egenskaber
+    USING gist
+    (tilstand_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX tilstand_attr_egenskaber_idx_virkning_aktoerref
     ON tilstand_attr_egenskaber
     USING btree
@@ -46280,6 +48985,27 @@ CREATE INDEX tilstand_attr_egenskaber_pat_virkning_notetekst
     USING gin
     (((virkning).notetekst) gin_trgm_ops);
 
+-- All the fields searched by vilkaarligattr, one per line, so that the
+-- search can narrow down the candidates by a single trigram index before
+-- matching each field. The text of dates and intervals is fixed by the
+-- DATESTYLE and INTERVALSTYLE of the database, whereas that of timestamps
+-- depends on the time zone of the session, so they are left out, and
+-- attributes with nothing else have no search text at all.
+CREATE OR REPLACE FUNCTION _as_search_text_tilstand_attr_egenskaber(
+    tilstand_attr_egenskaber
+) RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+    SELECT concat_ws(E'\n',
+        ($1).brugervendtnoegle,
+        ($1).beskrivelse,
+        ($1).integrationsdata
+    );
+$$;
+
+CREATE INDEX tilstand_attr_egenskaber_pat_search_text
+    ON tilstand_attr_egenskaber
+    USING gin
+    (_as_search_text_tilstand_attr_egenskaber(tilstand_attr_egenskaber) gin_trgm_ops);
+
 
 
 
@@ -46322,6 +49048,11 @@ CREATE INDEX tilstand_tils_status_idx_status
     USING btree
     (status);
   
+CREATE INDEX tilstand_tils_status_idx_virkning_timeperiod
+    ON tilstand_tils_status
+    USING gist
+    (tilstand_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX tilstand_tils_status_idx_virkning_aktoerref
     ON tilstand_tils_status
     USING btree
@@ -46375,6 +49106,11 @@ CREATE INDEX tilstand_tils_publiceret_idx_publiceret
     USING btree
     (publiceret);
   
+CREATE INDEX tilstand_tils_publiceret_idx_virkning_timeperiod
+    ON tilstand_tils_publiceret
+    USING gist
+    (tilstand_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX tilstand_tils_publiceret_idx_virkning_aktoerref
     ON tilstand_tils_publiceret
     USING btree
@@ -46474,6 +49210,11 @@ CREATE INDEX tilstand_relation_idx_rel_maal_urn
     USING btree
     (rel_type, rel_maal_urn);
 
+CREATE INDEX tilstand_relation_idx_virkning_timeperiod
+    ON tilstand_relation
+    USING gist
+    (tilstand_registrering_id, ((virkning).TimePeriod));
+
 CREATE INDEX tilstand_relation_idx_virkning_aktoerref
     ON tilstand_relation
     USING btree
@@ -46675,12 +49416,17 @@ CREATE OR REPLACE FUNCTION _as_create_tilstand_registrering(
     note text DEFAULT ''::text
 ) RETURNS tilstand_registrering AS $$
 DECLARE
-    registreringTime TIMESTAMPTZ := clock_timestamp();
+    registreringTime TIMESTAMPTZ;
     registreringObj RegistreringBase;
     rows_affected int;
     tilstand_registrering_id bigint;
     tilstand_registrering    tilstand_registrering;
 BEGIN
+    -- take a transaction ID before the time of the registrering, so that
+    -- the change feed holds it back until the transaction has ended
+    PERFORM txid_current();
+    registreringTime := clock_timestamp();
+
     --limit the scope of the current unlimited registrering
     UPDATE tilstand_registrering as a
         SET registrering.timeperiod = TSTZRANGE(
@@ -46782,12 +49528,8 @@ DECLARE
     auth_filtered_uuids uuid[];
 
     
-    rel_type_max_index_prev_rev int;
     rel_type_max_index_arr _tilstandRelationMaxIndex[];
     tilstand_rel_type_cardinality_unlimited tilstandRelationKode[]:=ARRAY['tilstandsvaerdi'::TilstandRelationKode,'begrundelse'::TilstandRelationKode,'tilstandskvalitet'::TilstandRelationKode,'tilstandsvurdering'::TilstandRelationKode,'tilstandsaktoer'::TilstandRelationKode,'tilstandsudstyr'::TilstandRelationKode,'samtykke'::TilstandRelationKode,'tilstandsdokument'::TilstandRelationKode]::TilstandRelationKode[];
-    tilstand_uuid_underscores text;
-    tilstand_rel_seq_name text;
-    tilstand_rel_type_cardinality_unlimited_present_in_argument tilstandRelationKode[];
     
 BEGIN
     -- Create a new registrering
@@ -46823,8 +49565,8 @@ BEGIN
     -- 1) Insert relations given as part of this update
     -- 2) for aktivitet: Insert relations of previous registration, with index
     --      values not included in this update. Please notice that for the
-    --      logic to work, it is very important that the index sequences
-    --      start with the max value for index of the same type in the
+    --      logic to work, it is very important that new index values
+    --      continue from the max value for index of the same type in the
     --      previous registration
     -- 2) for everything else: Insert relations of previous registration,
     --      taking overlapping virknings into consideration
@@ -46848,39 +49590,6 @@ BEGIN
              AND a.rel_type = ANY (tilstand_rel_type_cardinality_unlimited)
         GROUP BY rel_type
     ) AS a;
-
- 
-    ---Create temporary sequences
-    
-
-    SELECT array_agg(DISTINCT a.RelType) INTO tilstand_rel_type_cardinality_unlimited_present_in_argument FROM unnest(relationer) a WHERE a.RelType = ANY (tilstand_rel_type_cardinality_unlimited);
-    
-    tilstand_uuid_underscores := replace(tilstand_uuid::text, '-', '_');
-    
-
-    IF coalesce(array_length(tilstand_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        FOREACH tilstand_relation_navn IN ARRAY (tilstand_rel_type_cardinality_unlimited_present_in_argument) LOOP
-            tilstand_rel_seq_name := 'tilstand_' || tilstand_relation_navn::text || tilstand_uuid_underscores;
-
-            rel_type_max_index_prev_rev := null;
-
-            SELECT a.indeks into rel_type_max_index_prev_rev
-              FROM unnest(rel_type_max_index_arr) a(relType,indeks)
-             WHERE a.relType=tilstand_relation_navn;
-
-            IF rel_type_max_index_prev_rev IS NULL THEN
-              rel_type_max_index_prev_rev := 0;
-            END IF;
-
-            EXECUTE 'CREATE TEMPORARY SEQUENCE ' || tilstand_rel_seq_name || '
-            INCREMENT 1
-            MINVALUE 1
-            MAXVALUE 9223372036854775807
-            START ' ||  (rel_type_max_index_prev_rev+1)::text ||'
-            CACHE 1;';
-
-        END LOOP;
-    END IF;
     
 
     INSERT INTO tilstand_relation (tilstand_registrering_id, virkning, rel_maal_uuid, rel_maal_urn, rel_type, objekt_type , rel_index, tilstand_vaerdi_attr )
@@ -46896,8 +49605,9 @@ BEGIN
                     OR b.id IS NULL THEN
                     -- For new relations and relations with index given that
                     -- is not found in prev registrering, we'll assign new
-                    -- index values.
-                    nextval('tilstand_' || a.relType::text || tilstand_uuid_underscores)
+                    -- index values, numbered in the order given.
+                    coalesce(m.indeks, 0) + count(*) FILTER (WHERE a.indeks IS NULL
+                        OR b.id IS NULL) OVER (PARTITION BY a.relType ORDER BY a.ordinality ROWS UNBOUNDED PRECEDING)
                 ELSE
                     a.indeks
                 END
@@ -46914,22 +49624,9 @@ BEGIN
                 NULL
             END 
         FROM
-            unnest(relationer) AS a 
-        LEFT JOIN tilstand_relation b ON a.relType = ANY (tilstand_rel_type_cardinality_unlimited) AND b.tilstand_registrering_id = prev_tilstand_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index ;
-
-    
-    -- Drop temporary sequences
-    IF coalesce(array_length(tilstand_rel_type_cardinality_unlimited_present_in_argument, 1), 0) > 0 THEN
-        
-        FOREACH tilstand_relation_navn IN ARRAY (SELECT array_agg(DISTINCT a.RelType) FROM unnest(relationer) a WHERE a.RelType = ANY (tilstand_rel_type_cardinality_unlimited))
-        
-        LOOP
-          tilstand_rel_seq_name := 'tilstand_' || tilstand_relation_navn::text || tilstand_uuid_underscores;
-          EXECUTE 'DROP SEQUENCE ' || tilstand_rel_seq_name || ';';
-        END LOOP;
-    END IF;
-    
-
+            unnest(relationer) WITH ORDINALITY AS a 
+        LEFT JOIN tilstand_relation b ON a.relType = ANY (tilstand_rel_type_cardinality_unlimited) AND b.tilstand_registrering_id = prev_tilstand_registrering.id AND a.relType = b.rel_type AND a.indeks = b.rel_index
+        LEFT JOIN unnest(rel_type_max_index_arr) m (relType, indeks) ON m.relType = a.relType ;
 
     -- Ad 2)
     -- 0..1 relations
@@ -47251,6 +49948,7 @@ END IF;
       RAISE EXCEPTION 'Aborted updating tilstand with id [%] as the given data, does not give raise to a new registration. Aborted reg:[%], previous reg:[%]', tilstand_uuid, to_json(read_new_tilstand_reg), to_json(read_prev_tilstand_reg) USING ERRCODE = 'MO400';
     END IF;
 
+    PERFORM _as_refresh_aktuel_tilstand(tilstand_uuid);
 
     return new_tilstand_registrering.id;
 END; $$ LANGUAGE plpgsql VOLATILE;
@@ -47293,11 +49991,7 @@ $$ DECLARE tilstand_registrering_id bigint;
     auth_filtered_uuids uuid[];
 
     
-    tilstand_relation_kode tilstandRelationKode;
-    tilstand_uuid_underscores text;
-    tilstand_rel_seq_name text;
     tilstand_rel_type_cardinality_unlimited tilstandRelationKode[]:=ARRAY['tilstandsvaerdi'::TilstandRelationKode,'begrundelse'::TilstandRelationKode,'tilstandskvalitet'::TilstandRelationKode,'tilstandsvurdering'::TilstandRelationKode,'tilstandsaktoer'::TilstandRelationKode,'tilstandsudstyr'::TilstandRelationKode,'samtykke'::TilstandRelationKode,'tilstandsdokument'::TilstandRelationKode]::TilstandRelationKode[];
-    tilstand_rel_type_cardinality_unlimited_present_in_argument tilstandRelationKode[];
     
 
     does_exist boolean;
@@ -47444,25 +50138,6 @@ END IF;
 
 IF coalesce(array_length(tilstand_registrering.relationer,1),0)>0 THEN
 
---Create temporary sequences
-tilstand_uuid_underscores:=replace(tilstand_uuid::text, '-', '_');
-
-SELECT array_agg(DISTINCT a.RelType) into tilstand_rel_type_cardinality_unlimited_present_in_argument FROM unnest(tilstand_registrering.relationer) a WHERE a.RelType = any (tilstand_rel_type_cardinality_unlimited) ;
-IF coalesce(array_length(tilstand_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-
-FOREACH tilstand_relation_kode IN ARRAY (tilstand_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  tilstand_rel_seq_name := 'tilstand_' || tilstand_relation_kode::text || tilstand_uuid_underscores;
-
-  EXECUTE 'CREATE TEMPORARY SEQUENCE ' || tilstand_rel_seq_name || '
-  INCREMENT 1
-  MINVALUE 1
-  MAXVALUE 9223372036854775807
-  START 1
-  CACHE 1;';
-
-END LOOP;
-END IF;
 
 
     INSERT INTO tilstand_relation (
@@ -47483,7 +50158,7 @@ END IF;
       a.relType,
       a.objektType,
       CASE WHEN a.relType = any (tilstand_rel_type_cardinality_unlimited) THEN --rel_index
-      nextval('tilstand_' || a.relType::text || tilstand_uuid_underscores)
+      row_number() OVER (PARTITION BY a.relType ORDER BY a.ordinality)
       ELSE 
       NULL
       END,
@@ -47500,21 +50175,11 @@ END IF;
         NULL
       END
     
-    FROM unnest(tilstand_registrering.relationer) a
+    FROM unnest(tilstand_registrering.relationer) WITH ORDINALITY a
   ;
 
 
 
---Drop temporary sequences
-IF coalesce(array_length(tilstand_rel_type_cardinality_unlimited_present_in_argument,1),0)>0 THEN
-FOREACH tilstand_relation_kode IN ARRAY (tilstand_rel_type_cardinality_unlimited_present_in_argument)
-  LOOP
-  tilstand_rel_seq_name := 'tilstand_' || tilstand_relation_kode::text || tilstand_uuid_underscores;
-  EXECUTE 'DROP SEQUENCE ' || tilstand_rel_seq_name || ';';
-END LOOP;
-END IF;
-
-
 END IF;
 
 
@@ -47526,7 +50191,7 @@ IF NOT (coalesce(array_length(auth_filtered_uuids,1),0)=1 AND auth_filtered_uuid
 END IF;
 /*********************/
 
-
+PERFORM _as_refresh_aktuel_tilstand(tilstand_uuid);
 
 
 RETURN tilstand_uuid;
@@ -47788,7 +50453,9 @@ CREATE OR REPLACE FUNCTION as_search_tilstand(
     anyurnArr text[] = '{}'::text[],
     auth_criteria_arr TilstandRegistreringType[]=null
 
-    
+    ,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 
 ) RETURNS uuid[] AS $$
 DECLARE
@@ -48081,16 +50748,22 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 
             SELECT DISTINCT
             b.tilstand_id
-            
             FROM  tilstand_attr_egenskaber a
             JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id
-            
             WHERE
             (
-                        a.brugervendtnoegle ILIKE anyAttrValue OR
-                        a.beskrivelse ILIKE anyAttrValue OR
-                        a.integrationsdata ILIKE anyAttrValue
-                
+                (
+                    -- a field matching the value is part of the search
+                    -- text, which lets the trigram index rule out the rest
+                    _as_search_text_tilstand_attr_egenskaber(a) ILIKE '%' || anyAttrValue || '%'
+                    AND
+                    (
+                        FALSE
+                        OR a.brugervendtnoegle ILIKE anyAttrValue
+                        OR a.beskrivelse ILIKE anyAttrValue
+                        OR a.integrationsdata ILIKE anyAttrValue
+                    )
+                )
             )
             AND
             (
@@ -48099,7 +50772,6 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
                 virkningSoeg && (a.virkning).TimePeriod
             )
             AND
-            
             		(
 				(registreringObj.registrering) IS NULL 
 				OR
@@ -48168,6 +50840,7 @@ IF coalesce(array_length(anyAttrValueArr ,1),0)>0 THEN
 		AND
 		((NOT tilstand_candidates_is_initialized) OR b.tilstand_id = ANY (tilstand_candidates) )
 
+            
 
         );
 
@@ -48947,8 +51620,8 @@ END IF;
 /*** Filter out the objects that does not meets the stipulated access criteria  ***/
 auth_filtered_uuids:=_as_filter_unauth_tilstand(tilstand_candidates,auth_criteria_arr); 
 /*********************/
-IF firstResult > 0 or maxResults < 2147483647 THEN
-   auth_filtered_uuids = _as_sorted_tilstand(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults);
+IF firstResult > 0 or maxResults < 2147483647 or afterUuid IS NOT NULL THEN
+   auth_filtered_uuids = _as_sorted_tilstand(auth_filtered_uuids, virkningSoeg, registreringObj, firstResult, maxResults, afterSortKey, afterUuid);
 END IF;
 return auth_filtered_uuids;
 
@@ -49144,7 +51817,9 @@ CREATE OR REPLACE FUNCTION _as_sorted_tilstand(
     virkningSoeg TSTZRANGE,
     registreringObj    TilstandRegistreringType,
     firstResult int,
-    maxResults int
+    maxResults int,
+    afterSortKey text[] = null,
+    afterUuid uuid = null
 ) RETURNS uuid[] AS $$
 DECLARE
     tilstand_sorted_uuid uuid[];
@@ -49156,6 +51831,41 @@ BEGIN
         registreringSoeg = (registreringObj.registrering).timePeriod;
     END IF;
 
+    -- When searching the current registrations within the virkning period
+    -- of their snapshots in tilstand_aktuel, read the page from the
+    -- index of the sort keys stored there, starting right after the last
+    -- object of the previous page, rather than sorting every candidate
+    IF (registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL)
+       AND virkningSoeg IS NOT NULL AND NOT isempty(virkningSoeg)
+       AND NOT EXISTS (
+          SELECT 1
+            FROM unnest(tilstand_uuids) u(id)
+       LEFT JOIN tilstand_aktuel c ON c.tilstand_id = u.id
+           WHERE c.virkning IS NULL OR NOT c.virkning @> virkningSoeg
+       )
+    THEN
+        IF afterUuid IS NULL THEN
+            RETURN array(
+                  SELECT c.tilstand_id
+                    FROM tilstand_aktuel c
+                   WHERE c.tilstand_id = ANY (tilstand_uuids)
+                     AND c.sorteringsnoegle IS NOT NULL
+                ORDER BY c.sorteringsnoegle, c.tilstand_id
+                   LIMIT maxResults OFFSET firstResult
+            );
+        END IF;
+
+        RETURN array(
+              SELECT c.tilstand_id
+                FROM tilstand_aktuel c
+               WHERE c.tilstand_id = ANY (tilstand_uuids)
+                 AND (c.sorteringsnoegle, c.tilstand_id)
+                     > (afterSortKey, afterUuid)
+            ORDER BY c.sorteringsnoegle, c.tilstand_id
+               LIMIT maxResults OFFSET firstResult
+        );
+    END IF;
+
     tilstand_sorted_uuid:=array(
           SELECT b.tilstand_id
             FROM tilstand_registrering b
@@ -49164,6 +51874,12 @@ BEGIN
              AND (b.registrering).timeperiod && registreringSoeg
              AND (a.virkning).timePeriod && virkningSoeg
         GROUP BY b.tilstand_id
+          -- resume after the last object of the previous page, if any;
+          -- the sort key aggregates the registrations of each object, so
+          -- all candidates are still grouped, but pages don't shift
+          HAVING afterUuid IS NULL
+              OR (array_agg(DISTINCT a.brugervendtnoegle), b.tilstand_id)
+                 > (afterSortKey, afterUuid)
         ORDER BY array_agg(DISTINCT a.brugervendtnoegle), b.tilstand_id
            LIMIT maxResults OFFSET firstResult
     );
@@ -49173,6 +51889,34 @@ END;
 $$ LANGUAGE plpgsql STABLE;
 
 
+-- Return the key _as_sorted_tilstand sorts the given object by, for
+-- use as a keyset when fetching the following page.
+CREATE OR REPLACE FUNCTION _as_sort_key_tilstand(
+    tilstand_uuid uuid,
+    virkningSoeg TSTZRANGE,
+    registreringObj    TilstandRegistreringType
+) RETURNS text[] AS $$
+DECLARE
+    registreringSoeg TSTZRANGE;
+BEGIN
+    IF registreringObj IS NULL OR (registreringObj.registrering).timePeriod IS NULL THEN
+        registreringSoeg = TSTZRANGE(current_timestamp, current_timestamp, '[]');
+    ELSE
+        registreringSoeg = (registreringObj.registrering).timePeriod;
+    END IF;
+
+    RETURN (
+          SELECT array_agg(DISTINCT a.brugervendtnoegle)
+            FROM tilstand_registrering b
+            JOIN tilstand_attr_egenskaber a ON a.tilstand_registrering_id=b.id
+           WHERE b.tilstand_id = tilstand_uuid
+             AND (b.registrering).timeperiod && registreringSoeg
+             AND (a.virkning).timePeriod && virkningSoeg
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
 -- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
 -- Contact: info@magenta.dk.
 --
@@ -49185,240 +51929,261 @@ NOTICE: This file is auto-generated!
 */
 
 
-CREATE OR REPLACE FUNCTION _as_filter_unauth_tilstand(
-	tilstand_uuids uuid[],
+--Returns whether the object with the given uuid currently meets at
+--least one of the registrations given as criteria. Each registration
+--is met when, for every attribute, state and relation given in it, a
+--current row of the object matches, so the criteria are evaluated as a
+--single predicate, which may be pushed into queries listing objects.
+CREATE OR REPLACE FUNCTION _as_is_authorized_tilstand(
+	tilstand_uuid uuid,
 	registreringObjArr TilstandRegistreringType[]
 	)
-  RETURNS uuid[] AS 
+  RETURNS boolean AS
 $$
-DECLARE
-	tilstand_passed_auth_filter uuid[]:=ARRAY[]::uuid[];
-	tilstand_candidates uuid[];
-	--to_be_applyed_filter_uuids uuid[]; 
-	attrEgenskaberTypeObj TilstandEgenskaberAttrType;
-	
-  	tilsStatusTypeObj TilstandStatusTilsType;
-  	tilsPubliceretTypeObj TilstandPubliceretTilsType;
-	relationTypeObj TilstandRelationType;
-	registreringObj TilstandRegistreringType;
-	actual_virkning TIMESTAMPTZ:=current_timestamp;
-BEGIN
-
---RAISE DEBUG 'step 0:registreringObj:%',registreringObj;
-
-IF registreringObjArr IS NULL THEN
-	RETURN tilstand_uuids; --special case: All is allowed, no criteria present
-END IF;
-
-IF coalesce(array_length(registreringObjArr,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: Nothing is allowed. Empty list of criteria where at least one has to be met.				
-END IF; 
-
-IF tilstand_uuids IS NULL OR coalesce(array_length(tilstand_uuids,1),0)=0 THEN
-	RETURN ARRAY[]::uuid[]; --special case: No candidates given to filter.
-END IF;
-
-
-
-FOREACH registreringObj IN ARRAY registreringObjArr
-LOOP
-
-tilstand_candidates:= tilstand_uuids;
-
-
-
---RAISE DEBUG 'tilstand_candidates_is_initialized step 1:%',tilstand_candidates_is_initialized;
---RAISE DEBUG 'tilstand_candidates step 1:%',tilstand_candidates;
---/****************************//
-
---filter on attributes 
---/**********************************************************//
---Filtration on attribute: Egenskaber
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).attrEgenskaber IS NULL THEN
-	--RAISE DEBUG 'as_search_tilstand: skipping filtration on attrEgenskaber';
-ELSE
-	IF coalesce(array_length(tilstand_candidates,1),0)>0 THEN
-		FOREACH attrEgenskaberTypeObj IN ARRAY registreringObj.attrEgenskaber
-		LOOP
-			tilstand_candidates:=array(
-			SELECT DISTINCT
-			b.tilstand_id 
-			FROM  tilstand_attr_egenskaber a 
-			JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					attrEgenskaberTypeObj.brugervendtnoegle IS NULL
-					OR 
-					a.brugervendtnoegle = attrEgenskaberTypeObj.brugervendtnoegle 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.beskrivelse IS NULL
-					OR 
-					a.beskrivelse = attrEgenskaberTypeObj.beskrivelse 
-				)
-				AND
-				(
-					attrEgenskaberTypeObj.integrationsdata IS NULL
-					OR 
-					a.integrationsdata = attrEgenskaberTypeObj.integrationsdata 
-				)
-				AND b.tilstand_id = ANY (tilstand_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-			);
-			
-		END LOOP;
-	END IF;
-END IF;
---RAISE DEBUG 'tilstand_candidates_is_initialized step 3:%',tilstand_candidates_is_initialized;
---RAISE DEBUG 'tilstand_candidates step 3:%',tilstand_candidates;
-
---RAISE DEBUG 'registrering,%',registreringObj;
-
-
---/**********************************************************//
---Filtration on state: Status
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsStatus IS NULL THEN
-	--RAISE DEBUG 'as_search_tilstand: skipping filtration on tilsStatus';
-ELSE
-	IF coalesce(array_length(tilstand_candidates,1),0)>0 THEN 
-
-		FOREACH tilsStatusTypeObj IN ARRAY registreringObj.tilsStatus
-		LOOP
-			tilstand_candidates:=array(
-			SELECT DISTINCT
-			b.tilstand_id 
-			FROM  tilstand_tils_status a
-			JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
-				(
-					tilsStatusTypeObj.status IS NULL
+SELECT
+registreringObjArr IS NULL --special case: All is allowed, no criteria present
+OR EXISTS (
+	SELECT 1
+	FROM unnest(registreringObjArr) r
+	WHERE
+	TRUE
+	--/**********************************************************//
+	--Filtration on attribute: Egenskaber
+	--/**********************************************************//
+	AND (
+		r.attrEgenskaber IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.attrEgenskaber) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM tilstand_attr_egenskaber a
+				JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.brugervendtnoegle IS NULL
 					OR
-					tilsStatusTypeObj.status = a.status
+					a.brugervendtnoegle = f.brugervendtnoegle
 				)
-				AND b.tilstand_id = ANY (tilstand_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
---/**********************************************************//
---Filtration on state: Publiceret
---/**********************************************************//
-IF registreringObj IS NULL OR (registreringObj).tilsPubliceret IS NULL THEN
-	--RAISE DEBUG 'as_search_tilstand: skipping filtration on tilsPubliceret';
-ELSE
-	IF coalesce(array_length(tilstand_candidates,1),0)>0 THEN 
-
-		FOREACH tilsPubliceretTypeObj IN ARRAY registreringObj.tilsPubliceret
-		LOOP
-			tilstand_candidates:=array(
-			SELECT DISTINCT
-			b.tilstand_id 
-			FROM  tilstand_tils_publiceret a
-			JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ 
-			WHERE
+				AND
 				(
-					tilsPubliceretTypeObj.publiceret IS NULL
-					OR
-					tilsPubliceretTypeObj.publiceret = a.publiceret
-				)
-				AND b.tilstand_id = ANY (tilstand_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning
-	);
-			
-		END LOOP;
-	END IF;
-END IF;
-
-/*
---relationer TilstandRelationType[]
-*/
-
-
---RAISE DEBUG 'tilstand_candidates_is_initialized step 4:%',tilstand_candidates_is_initialized;
---RAISE DEBUG 'tilstand_candidates step 4:%',tilstand_candidates;
-
---/**********************************************************//
---Filtration on relations
---/**********************************************************//
-
-
-IF registreringObj IS NULL OR (registreringObj).relationer IS NULL OR coalesce(array_length((registreringObj).relationer,1),0)=0 THEN
-	--RAISE DEBUG 'as_search_tilstand: skipping filtration on relationer';
-ELSE
-	IF coalesce(array_length(tilstand_candidates,1),0)>0 THEN
-		FOREACH relationTypeObj IN ARRAY registreringObj.relationer
-		LOOP
-			tilstand_candidates:=array(
-			SELECT DISTINCT
-			b.tilstand_id 
-			FROM  tilstand_relation a
-			JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
-			WHERE
-				(	
-					relationTypeObj.relType IS NULL
+					f.beskrivelse IS NULL
 					OR
-					relationTypeObj.relType = a.rel_type
+					a.beskrivelse = f.beskrivelse
 				)
 				AND
 				(
-					relationTypeObj.uuid IS NULL
+					f.integrationsdata IS NULL
 					OR
-					relationTypeObj.uuid = a.rel_maal_uuid	
+					a.integrationsdata = f.integrationsdata
 				)
 				AND
-				(
-					relationTypeObj.objektType IS NULL
+				b.tilstand_id = tilstand_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Status
+	--/**********************************************************//
+	AND (
+		r.tilsStatus IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsStatus) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM tilstand_tils_status a
+				JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.status IS NULL
 					OR
-					relationTypeObj.objektType = a.objekt_type
+					f.status = a.status
 				)
-				AND
-				(
-					relationTypeObj.urn IS NULL
+				AND b.tilstand_id = tilstand_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on state: Publiceret
+	--/**********************************************************//
+	AND (
+		r.tilsPubliceret IS NULL
+		OR NOT EXISTS (
+			SELECT 1
+			FROM unnest(r.tilsPubliceret) f
+			WHERE NOT EXISTS (
+				SELECT 1
+				FROM tilstand_tils_publiceret a
+				JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+				WHERE
+				(
+					f.publiceret IS NULL
 					OR
-					relationTypeObj.urn = a.rel_maal_urn
+					f.publiceret = a.publiceret
 				)
-				AND b.tilstand_id = ANY (tilstand_candidates)
-				AND (a.virkning).TimePeriod @> actual_virkning 
-	);
-		END LOOP;
-	END IF;
-END IF;
---/**********************//
-
---RAISE DEBUG 'tilstand_candidates_is_initialized step 5:%',tilstand_candidates_is_initialized;
---RAISE DEBUG 'tilstand_candidates step 5:%',tilstand_candidates;
-
-tilstand_passed_auth_filter:=array(
-SELECT
-a.id 
-FROM
-unnest (tilstand_passed_auth_filter) a(id)
-UNION
-SELECT
-b.id
-FROM
-unnest (tilstand_candidates) b(id)
+				AND b.tilstand_id = tilstand_uuid
+				AND (a.virkning).TimePeriod @> current_timestamp
+			)
+		)
+	)
+	--/**********************************************************//
+	--Filtration on relations
+	--/**********************************************************//
+	AND NOT EXISTS (
+		SELECT 1
+		FROM unnest(r.relationer) f
+		WHERE NOT EXISTS (
+			SELECT 1
+			FROM tilstand_relation a
+			JOIN tilstand_registrering b on a.tilstand_registrering_id=b.id and upper((b.registrering).timeperiod)='infinity'::TIMESTAMPTZ
+			WHERE
+			(
+				f.relType IS NULL
+				OR
+				f.relType = a.rel_type
+			)
+			AND
+			(
+				f.uuid IS NULL
+				OR
+				f.uuid = a.rel_maal_uuid
+			)
+			AND
+			(
+				f.objektType IS NULL
+				OR
+				f.objektType = a.objekt_type
+			)
+			AND
+			(
+				f.urn IS NULL
+				OR
+				f.urn = a.rel_maal_urn
+			)
+			AND b.tilstand_id = tilstand_uuid
+			AND (a.virkning).TimePeriod @> current_timestamp
+		)
+	)
 );
+$$ LANGUAGE sql STABLE;
 
---optimization 
-IF coalesce(array_length(tilstand_passed_auth_filter,1),0)=coalesce(array_length(tilstand_uuids,1),0) AND tilstand_passed_auth_filter @>tilstand_uuids THEN
-	RETURN tilstand_passed_auth_filter;
-END IF;
+
+CREATE OR REPLACE FUNCTION _as_filter_unauth_tilstand(
+	tilstand_uuids uuid[],
+	registreringObjArr TilstandRegistreringType[]
+	)
+  RETURNS uuid[] AS
+$$
+SELECT CASE
+WHEN registreringObjArr IS NULL THEN
+	tilstand_uuids --special case: All is allowed, no criteria present
+ELSE
+	array(
+	SELECT DISTINCT
+	a.id
+	FROM unnest(tilstand_uuids) a(id)
+	WHERE _as_is_authorized_tilstand(a.id, registreringObjArr)
+	)
+END;
+$$ LANGUAGE sql STABLE;
 
 
-END LOOP; --LOOP registreringObj
 
 
-RETURN tilstand_passed_auth_filter;
+-- Copyright (C) 2015 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+/*
+NOTICE: This file is auto-generated!
+*/
 
-END;
-$$ LANGUAGE plpgsql STABLE; 
 
+-- Store the current registration of the given object, as listed at the
+-- current time, in tilstand_aktuel.
+--
+-- The virkning period stored with it is the one between the nearest
+-- virkning boundaries of the registration before and after the current
+-- time. No period of the registration starts or ends within it, so
+-- listing the object for any period within it gives the same result, as
+-- does sorting it for paged searches.
+CREATE OR REPLACE FUNCTION _as_refresh_aktuel_tilstand(
+    tilstand_uuid uuid
+) RETURNS void AS $$
+DECLARE
+    registrering_id bigint;
+    virkning_fra TIMESTAMPTZ;
+    virkning_til TIMESTAMPTZ;
+    aktuel_virkning TSTZRANGE;
+    aktuel_objekt json;
+    aktuel_sorteringsnoegle text[];
+BEGIN
+    SELECT b.id INTO registrering_id
+      FROM tilstand_registrering b
+     WHERE b.tilstand_id = tilstand_uuid
+       AND upper((b.registrering).timeperiod) = 'infinity'::TIMESTAMPTZ;
+
+    WITH perioder AS (
+        SELECT (a.virkning).TimePeriod periode
+          FROM tilstand_attr_egenskaber a
+         WHERE a.tilstand_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM tilstand_tils_status a
+         WHERE a.tilstand_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM tilstand_tils_publiceret a
+         WHERE a.tilstand_registrering_id = registrering_id
+         UNION ALL
+        SELECT (a.virkning).TimePeriod
+          FROM tilstand_relation a
+         WHERE a.tilstand_registrering_id = registrering_id
+    ), graenser AS (
+        SELECT lower(periode) graense FROM perioder
+         UNION
+        SELECT upper(periode) FROM perioder
+    )
+    SELECT max(graense) FILTER (WHERE graense <= now()),
+           min(graense) FILTER (WHERE graense > now())
+      INTO virkning_fra, virkning_til
+      FROM graenser;
+
+    aktuel_virkning := TSTZRANGE(virkning_fra, virkning_til, '()');
+
+    aktuel_objekt := (as_list_tilstand(
+        ARRAY[tilstand_uuid], null, aktuel_virkning
+    ))[1] :: json;
+
+    aktuel_sorteringsnoegle := (
+        SELECT array_agg(DISTINCT a.brugervendtnoegle)
+          FROM tilstand_attr_egenskaber a
+         WHERE a.tilstand_registrering_id = registrering_id
+           AND (a.virkning).TimePeriod && aktuel_virkning
+    );
 
+    IF aktuel_objekt IS NULL THEN
+        DELETE FROM tilstand_aktuel
+         WHERE tilstand_id = tilstand_uuid;
+    ELSE
+        INSERT INTO tilstand_aktuel (
+            tilstand_id, virkning, tidszone, objekt, sorteringsnoegle
+        ) VALUES (
+            tilstand_uuid, aktuel_virkning, current_setting('TimeZone'),
+            aktuel_objekt, aktuel_sorteringsnoegle
+        )
+        ON CONFLICT (tilstand_id) DO UPDATE
+           SET virkning = excluded.virkning,
+               tidszone = excluded.tidszone,
+               objekt = excluded.objekt,
+               sorteringsnoegle = excluded.sorteringsnoegle;
+    END IF;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
 
@@ -680,6 +680,16 @@ actual_result10:=_as_filter_unauth_facet(array[new_uuidB,new_uuidC]::uuid[],arra
 
 RETURN NEXT ok( coalesce(array_length(expected_result10,1),0)=coalesce(array_length(actual_result10,1),0) AND actual_result10 @>expected_result10,'Test #10');
 
+RETURN NEXT ok(
+	NOT _as_is_authorized_facet(new_uuidB,array[filter_reg10A,filter_reg10B,filter_reg10C]::FacetRegistreringType[])
+	AND _as_is_authorized_facet(new_uuidC,array[filter_reg10A,filter_reg10B,filter_reg10C]::FacetRegistreringType[])
+	,'Test #11');
+
+RETURN NEXT ok(
+	_as_is_authorized_facet(new_uuidB,null)
+	AND NOT _as_is_authorized_facet(new_uuidB,ARRAY[]::FacetRegistreringType[])
+	,'Test #12');
+
 
 END;
 $$;
@@ -0,0 +1,165 @@
+-- Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+-- Contact: info@magenta.dk.
+--
+-- This Source Code Form is subject to the terms of the Mozilla Public
+-- License, v. 2.0. If a copy of the MPL was not distributed with this
+-- file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+--SELECT * FROM runtests('test'::name);
+CREATE OR REPLACE FUNCTION test.test_as_refresh_aktuel_facet()
+RETURNS SETOF TEXT LANGUAGE plpgsql AS
+$$
+DECLARE
+	new_uuid uuid;
+	registrering FacetRegistreringType;
+	virkEgenskaber Virkning;
+	virkEgenskaberB Virkning;
+	virkRedaktoer Virkning;
+	virkPubliceret Virkning;
+	facetEgenskabA FacetEgenskaberAttrType;
+	facetEgenskabB FacetEgenskaberAttrType;
+	facetPubliceret FacetPubliceretTilsType;
+	facetRelRedaktoer FacetRelationType;
+	redaktoer_til TIMESTAMPTZ := date_trunc('day', now()) + interval '1 year';
+	aktuel facet_aktuel;
+BEGIN
+
+virkEgenskaber := ROW (
+	'[2015-05-12, infinity)' :: TSTZRANGE,
+	'ed4dc687-59e3-4b79-8f14-0f60a0145901'::uuid,
+	'Bruger',
+	'NoteEx1'
+) :: Virkning;
+
+virkEgenskaberB := ROW (
+	TSTZRANGE(redaktoer_til + interval '1 year', 'infinity', '[)'),
+	'ed4dc687-59e3-4b79-8f14-0f60a0145901'::uuid,
+	'Bruger',
+	'NoteEx2'
+) :: Virkning;
+
+virkRedaktoer := ROW (
+	TSTZRANGE('2015-05-10', redaktoer_til, '[)'),
+	'6892a667-63d9-4ecd-ada1-173f4d7d0c3e'::uuid,
+	'Bruger',
+	'NoteEx3'
+) :: Virkning;
+
+virkPubliceret := ROW (
+	'[2014-05-13, 2015-05-01)' :: TSTZRANGE,
+	'e6a1beb5-0c7e-4299-984a-64aa3963aa4a'::uuid,
+	'Bruger',
+	'NoteEx4'
+) :: Virkning;
+
+facetEgenskabA := ROW (
+	'brugervendt_noegle_A',
+	'facetbeskrivelse_A',
+	'facetplan_A',
+	'facetopbygning_A',
+	'facetophavsret_A',
+	'facetsupplement_A',
+	NULL,
+	'facetintegrationsdata_A',
+	virkEgenskaber
+) :: FacetEgenskaberAttrType;
+
+facetEgenskabB := ROW (
+	'brugervendt_noegle_B',
+	'facetbeskrivelse_B',
+	'facetplan_B',
+	'facetopbygning_B',
+	'facetophavsret_B',
+	'facetsupplement_B',
+	NULL,
+	'facetintegrationsdata_B',
+	virkEgenskaberB
+) :: FacetEgenskaberAttrType;
+
+facetPubliceret := ROW (
+	virkPubliceret,
+	'Publiceret'
+) :: FacetPubliceretTilsType;
+
+facetRelRedaktoer := ROW (
+	'redaktoerer'::FacetRelationKode,
+	virkRedaktoer,
+	'55c3dc9c-60f2-4543-8971-7d1db40c4864'::uuid,
+	null,
+	null
+) :: FacetRelationType;
+
+registrering := ROW (
+	ROW (
+		NULL,
+		'Opstaaet'::Livscykluskode,
+		'107244b5-f00c-4679-a97a-b436176f05d5'::uuid,
+		'Test Note'
+	) :: RegistreringBase,
+	ARRAY[facetPubliceret]::FacetPubliceretTilsType[],
+	ARRAY[facetEgenskabA]::FacetEgenskaberAttrType[],
+	ARRAY[facetRelRedaktoer]::FacetRelationType[]
+) :: FacetRegistreringType;
+
+new_uuid := as_create_or_import_facet(registrering);
+
+SELECT * INTO aktuel FROM facet_aktuel WHERE facet_id = new_uuid;
+
+RETURN NEXT is(
+	aktuel.virkning,
+	TSTZRANGE('2015-05-12', redaktoer_til, '()'),
+	'created facet is current between the nearest boundaries'
+);
+
+RETURN NEXT is(
+	aktuel.objekt::text,
+	((as_list_facet(
+		array[new_uuid]::uuid[], null, TSTZRANGE(now(), now(), '[]')
+	))[1] :: json)::text,
+	'created facet is listed as now'
+);
+
+RETURN NEXT is(
+	aktuel.sorteringsnoegle,
+	_as_sort_key_facet(new_uuid, aktuel.virkning, null),
+	'created facet is sorted as when searched'
+);
+
+PERFORM as_update_facet(
+	new_uuid, uuid_generate_v4(), 'Test update'::text,
+	'Rettet'::Livscykluskode,
+	array[facetEgenskabB]::FacetEgenskaberAttrType[],
+	null,
+	null
+);
+
+SELECT * INTO aktuel FROM facet_aktuel WHERE facet_id = new_uuid;
+
+RETURN NEXT is(
+	aktuel.virkning,
+	TSTZRANGE('2015-05-12', redaktoer_til, '()'),
+	'updated facet is current between the nearest boundaries'
+);
+
+RETURN NEXT is(
+	aktuel.objekt::text,
+	((as_list_facet(
+		array[new_uuid]::uuid[], null, TSTZRANGE(now(), now(), '[]')
+	))[1] :: json)::text,
+	'updated facet is listed as now'
+);
+
+RETURN NEXT is(
+	aktuel.objekt -> 'registreringer' -> 0 ->> 'livscykluskode',
+	'Rettet',
+	'updated facet has the new registration'
+);
+
+RETURN NEXT is(
+	aktuel.sorteringsnoegle,
+	_as_sort_key_facet(new_uuid, aktuel.virkning, null),
+	'updated facet is sorted as when searched'
+);
+
+END;
+$$;
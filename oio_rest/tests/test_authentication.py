@@ -6,13 +6,16 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+import datetime
 import unittest
 
 import flask
 import freezegun
 from mock import MagicMock, patch
+from onelogin.saml2.utils import OneLogin_Saml2_Utils
 
 from oio_rest import authentication
+from oio_rest import settings
 from oio_rest.custom_exceptions import (AuthorizationFailedException,
                                         UnauthorizedException)
 
@@ -53,6 +56,116 @@ class TestAuthentication(unittest.TestCase):
                 AuthorizationFailedException):
             authentication.check_saml_authentication()
 
+    @patch('oio_rest.authentication.assertion_cache',
+           new_callable=lambda: authentication.AssertionCache(10))
+    @patch('oio_rest.authentication.Saml2_Assertion')
+    @patch('oio_rest.authentication.b64decode', new=MagicMock())
+    @patch('oio_rest.authentication.zlib', new=MagicMock())
+    def test_check_saml_authentication_caches_valid_assertion(self,
+                                                              mock_saml2,
+                                                              mock_cache):
+        # Arrange
+        headers = {'Authorization': 'saml-gzipped token'}
+
+        assertion = mock_saml2.return_value
+        assertion.get_attributes.return_value = {
+            settings.SAML_USER_ID_ATTIBUTE: ['user'],
+        }
+
+        with freezegun.freeze_time('2018-04-20 18:00:00'):
+            now = OneLogin_Saml2_Utils.now()
+
+            assertion.get_validity_period.return_value = (now, now + 3600)
+
+            # Act
+            for i in range(2):
+                with self.app.test_request_context(headers=headers):
+                    authentication.check_saml_authentication()
+
+                    # Assert
+                    self.assertEqual('user', flask.request.saml_user_id)
+
+        mock_saml2.assert_called_once()
+        self.assertEqual(1, mock_cache.stats()['hits'])
+        self.assertEqual(1, mock_cache.stats()['misses'])
+
+    @patch('oio_rest.authentication.assertion_cache',
+           new_callable=lambda: authentication.AssertionCache(10))
+    @patch('oio_rest.authentication.Saml2_Assertion')
+    @patch('oio_rest.authentication.b64decode', new=MagicMock())
+    @patch('oio_rest.authentication.zlib', new=MagicMock())
+    def test_check_saml_authentication_revalidates_expired_assertion(
+            self, mock_saml2, mock_cache):
+        # Arrange
+        headers = {'Authorization': 'saml-gzipped token'}
+
+        assertion = mock_saml2.return_value
+        assertion.get_attributes.return_value = {
+            settings.SAML_USER_ID_ATTIBUTE: ['user'],
+        }
+
+        with freezegun.freeze_time('2018-04-20 18:00:00') as frozen_time:
+            now = OneLogin_Saml2_Utils.now()
+
+            assertion.get_validity_period.return_value = (now, now + 60)
+
+            with self.app.test_request_context(headers=headers):
+                authentication.check_saml_authentication()
+
+            frozen_time.tick(datetime.timedelta(hours=1))
+
+            assertion.check_validity.side_effect = Exception('expired')
+
+            # Act & Assert
+            with self.app.test_request_context(headers=headers), \
+                    self.assertRaises(AuthorizationFailedException):
+                authentication.check_saml_authentication()
+
+        self.assertEqual(2, mock_saml2.call_count)
+        self.assertEqual(1, mock_cache.stats()['expired'])
+        self.assertEqual(0, mock_cache.stats()['size'])
+
+
+class TestAssertionCache(unittest.TestCase):
+    def test_put_evicts_least_recently_used(self):
+        # Arrange
+        cache = authentication.AssertionCache(2)
+        now = OneLogin_Saml2_Utils.now()
+
+        cache.put('a', 'user a', {}, None, now + 3600)
+        cache.put('b', 'user b', {}, None, now + 3600)
+
+        # Act
+        cache.get('a')
+        cache.put('c', 'user c', {}, None, now + 3600)
+
+        # Assert
+        self.assertEqual(('user a', {}), cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(('user c', {}), cache.get('c'))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_put_skips_assertions_without_expiry(self):
+        # Arrange
+        cache = authentication.AssertionCache(2)
+
+        # Act
+        cache.put('a', 'user a', {}, None, None)
+
+        # Assert
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, cache.stats()['size'])
+
+    def test_put_disabled_with_zero_size(self):
+        # Arrange
+        cache = authentication.AssertionCache(0)
+
+        # Act
+        cache.put('a', 'user a', {}, None, OneLogin_Saml2_Utils.now() + 60)
+
+        # Assert
+        self.assertIsNone(cache.get('a'))
+
 
 @patch('oio_rest.settings.USE_SAML_AUTHENTICATION', True)
 class TestAssertionVerification(util.TestCase):
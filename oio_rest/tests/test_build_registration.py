@@ -11,6 +11,7 @@ import unittest
 from mock import MagicMock, patch
 
 import oio_rest.utils.build_registration as br
+from oio_rest.utils import test_support
 
 
 class TestBuildRegistration(unittest.TestCase):
@@ -259,20 +260,15 @@ class TestBuildRegistration(unittest.TestCase):
         self.assertEqual(classname, actual_class_name)
         self.assertEqual(expected_list_args, actual_list_args)
 
-    @patch('oio_rest.utils.build_registration.get_relation_names',
-           new=MagicMock())
-    @patch('oio_rest.utils.build_registration.get_state_names',
-           new=MagicMock())
-    @patch('oio_rest.utils.build_registration.get_attribute_fields')
-    @patch('oio_rest.utils.build_registration.get_attribute_names')
-    def test_build_registration_attributes(self,
-                                           mock_get_attribute_names,
-                                           mock_get_attribute_fields):
-        # type: (MagicMock, MagicMock) -> None
+    @test_support.patch_db_struct({
+        'class': {
+            'attributter': {
+                'attributename': ['arg1'],
+            },
+        },
+    })
+    def test_build_registration_attributes(self):
         # Arrange
-        mock_get_attribute_names.return_value = ['attributename']
-        mock_get_attribute_fields.return_value = ['arg1']
-
         classname = 'class'
         list_args = {
             'arg1': ['val1'],
@@ -280,7 +276,7 @@ class TestBuildRegistration(unittest.TestCase):
         }
         expected_result = {
             'attributes': {
-                'attributename': [
+                'classattributename': [
                     {
                         'virkning': None,
                         'arg1': 'val1'
@@ -297,19 +293,15 @@ class TestBuildRegistration(unittest.TestCase):
         # Assert
         self.assertEqual(expected_result, actual_result)
 
-    @patch('oio_rest.utils.build_registration.get_relation_names',
-           new=MagicMock())
-    @patch('oio_rest.utils.build_registration.get_state_names')
-    @patch('oio_rest.utils.build_registration.get_attribute_fields',
-           new=MagicMock())
-    @patch('oio_rest.utils.build_registration.get_attribute_names',
-           new=MagicMock())
-    def test_build_registration_states(self,
-                                       mock_get_state_names):
-        # type: (MagicMock, MagicMock) -> None
+    @test_support.patch_db_struct({
+        'class': {
+            'tilstande': {
+                'statename': ['val1', 'val2'],
+            },
+        },
+    })
+    def test_build_registration_states(self):
         # Arrange
-        mock_get_state_names.return_value = ['statename']
-
         classname = 'class'
         list_args = {
             'statename': ['val1', 'val2'],
@@ -339,18 +331,14 @@ class TestBuildRegistration(unittest.TestCase):
         # Assert
         self.assertEqual(expected_result, actual_result)
 
-    @patch('oio_rest.utils.build_registration.get_relation_names')
-    @patch('oio_rest.utils.build_registration.get_state_names',
-           new=MagicMock())
-    @patch('oio_rest.utils.build_registration.get_attribute_fields',
-           new=MagicMock())
-    @patch('oio_rest.utils.build_registration.get_attribute_names',
-           new=MagicMock())
-    def test_build_registration_relations(self, mock_get_relation_names):
-        # type: (MagicMock) -> None
+    @test_support.patch_db_struct({
+        'class': {
+            'relationer_nul_til_en': [],
+            'relationer_nul_til_mange': ['relationname'],
+        },
+    })
+    def test_build_registration_relations(self):
         # Arrange
-        mock_get_relation_names.return_value = ['relationname']
-
         classname = 'class'
         list_args = {
             'arg1': ['val1'],
@@ -0,0 +1,203 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+import datetime
+import unittest
+
+from mock import patch
+from werkzeug.datastructures import MultiDict
+
+from oio_rest import app as flaskapp
+from oio_rest import changes
+from oio_rest.custom_exceptions import BadRequestException
+from oio_rest.custom_exceptions import NotAllowedException
+
+UUID = '74054d5b-54fc-4c9e-86ef-790fa6935afb'
+
+CHANGE = (
+    1843, 5210, 'organisationenhed', UUID, 'Rettet',
+    datetime.datetime(2019, 1, 17, 15, 2, 39,
+                      tzinfo=datetime.timezone.utc),
+)
+
+
+class TestChanges(unittest.TestCase):
+    def parse_filters(self, *args):
+        return changes.parse_filters(MultiDict(args), flaskapp.HIERARCHIES)
+
+    def test_parse_filters(self):
+        self.assertEqual((None, None, None), self.parse_filters())
+
+        objekttyper, uuids, livscykluskoder = self.parse_filters(
+            ('service', 'Organisation'),
+            ('uuid', UUID),
+            ('livscykluskode', 'Rettet'),
+            ('livscykluskode', 'Slettet'),
+        )
+
+        self.assertIn('organisationenhed', objekttyper)
+        self.assertNotIn('klasse', objekttyper)
+        self.assertEqual([UUID], uuids)
+        self.assertEqual(['Rettet', 'Slettet'], livscykluskoder)
+
+    def test_parse_filters_intersects_service_and_objekttype(self):
+        self.assertEqual(
+            (['bruger'], None, None),
+            self.parse_filters(
+                ('service', 'organisation'),
+                ('objekttype', 'bruger'),
+                ('objekttype', 'klasse'),
+            ),
+        )
+
+        # nothing matches, which mustn't be taken for no filter at all
+        self.assertEqual(
+            ([], None, None),
+            self.parse_filters(
+                ('service', 'organisation'),
+                ('objekttype', 'klasse'),
+            ),
+        )
+
+    def test_parse_filters_rejects_invalid_values(self):
+        for args in [
+            [('service', 'nonexistent')],
+            [('objekttype', 'nonexistent')],
+            [('uuid', 'not-a-uuid')],
+            [('livscykluskode', 'rettet')],
+        ]:
+            with self.subTest(args), self.assertRaises(BadRequestException):
+                self.parse_filters(*args)
+
+    def test_event_id(self):
+        self.assertEqual((1843, 5210), changes.parse_event_id('1843-5210'))
+        self.assertEqual('1843-5210', changes.format_event_id((1843, 5210)))
+
+        with self.assertRaises(BadRequestException):
+            changes.parse_event_id('5210')
+
+    def test_format_event(self):
+        self.assertEqual(
+            'id: 1843-5210\n'
+            'event: Rettet\n'
+            'data: {"livscykluskode": "Rettet", '
+            '"objektID": "74054d5b-54fc-4c9e-86ef-790fa6935afb", '
+            '"objekttype": "organisationenhed", '
+            '"tidspunkt": "2019-01-17T15:02:39+00:00"}\n\n',
+            changes.format_event(CHANGE),
+        )
+
+    @patch('oio_rest.changes.settings.DO_ENABLE_RESTRICTIONS', True)
+    @patch('oio_rest.changes.get_authenticated_user', new=lambda: 'user')
+    @patch('oio_rest.changes.db.get_restrictions_as_sql')
+    def test_get_read_restrictions(self, mock_restrictions):
+        def get_restrictions_as_sql(user, class_name, operation):
+            if class_name == 'Klasse':
+                raise NotAllowedException('Not allowed!')
+
+            return ['restricted'] if class_name == 'Bruger' else None
+
+        mock_restrictions.side_effect = get_restrictions_as_sql
+
+        objekttyper, restrictions = changes.get_read_restrictions(
+            ['bruger', 'klasse', 'organisation'], flaskapp.HIERARCHIES,
+        )
+
+        self.assertEqual(['bruger', 'organisation'], objekttyper)
+        self.assertEqual({'bruger': ['restricted']}, restrictions)
+
+        # without a filter, the types the user may never read are left out
+        objekttyper, restrictions = changes.get_read_restrictions(
+            None, flaskapp.HIERARCHIES,
+        )
+
+        self.assertIn('bruger', objekttyper)
+        self.assertNotIn('klasse', objekttyper)
+        self.assertEqual({'bruger': ['restricted']}, restrictions)
+
+        mock_restrictions.side_effect = None
+        mock_restrictions.return_value = None
+
+        self.assertEqual(
+            (None, {}),
+            changes.get_read_restrictions(None, flaskapp.HIERARCHIES),
+        )
+
+    def test_get_read_restrictions_disabled(self):
+        self.assertEqual(
+            (['bruger'], None),
+            changes.get_read_restrictions(['bruger'], flaskapp.HIERARCHIES),
+        )
+
+    @patch('oio_rest.changes.settings.LIST_BATCH_SIZE', 1)
+    @patch('oio_rest.changes.settings.CHANGES_STREAM_DURATION', 0)
+    @patch('oio_rest.changes.get_listener')
+    @patch('oio_rest.changes.db.get_changes')
+    def test_generate_events(self, mock_get_changes, mock_get_listener):
+        mock_get_changes.side_effect = [[CHANGE], []]
+
+        events = list(changes.generate_events((1842, 0), ['bruger']))
+
+        self.assertEqual(
+            ['retry: 0\nid: 1842-0\n\n', changes.format_event(CHANGE)],
+            events,
+        )
+
+        # the stream ended right after the first read
+        mock_get_changes.assert_called_once_with((1842, 0), ['bruger'],
+                                                 None, None, 1, None)
+
+    @patch('oio_rest.changes.settings.CHANGES_STREAM_DURATION', 60)
+    @patch('oio_rest.changes.get_listener')
+    @patch('oio_rest.changes.db.get_changes')
+    def test_generate_events_waits_for_notifications(self, mock_get_changes,
+                                                     mock_get_listener):
+        mock_get_changes.side_effect = [[], [CHANGE], [CHANGE]]
+        mock_get_listener.return_value.generation = 7
+        mock_get_listener.return_value.wait.side_effect = [7, 8, 9]
+
+        events = changes.generate_events((1842, 0))
+
+        next(events)
+
+        # nothing was notified before the heartbeat
+        self.assertEqual(': keep-alive\n\n', next(events))
+        self.assertEqual(changes.format_event(CHANGE), next(events))
+        self.assertEqual(changes.format_event(CHANGE), next(events))
+
+        # reading resumes after the last change
+        self.assertEqual((1843, 5210), mock_get_changes.call_args[0][0])
+
+
+@patch('oio_rest.app.changes.generate_events', return_value=iter(['x']))
+class TestChangesRoute(unittest.TestCase):
+    def setUp(self):
+        flaskapp.app.testing = True
+        self.app = flaskapp.app.test_client()
+
+    @patch('oio_rest.app.db.get_change_position', return_value=(1842, 0))
+    def test_starts_from_now(self, mock_get_position, mock_generate):
+        result = self.app.get('/changes?objekttype=bruger')
+
+        self.assertEqual(200, result.status_code)
+        self.assertEqual('text/event-stream', result.mimetype)
+        mock_generate.assert_called_once_with((1842, 0), ['bruger'],
+                                              None, None, None)
+
+    def test_resumes_from_last_event_id(self, mock_generate):
+        result = self.app.get('/changes',
+                              headers={'Last-Event-ID': '1843-5210'})
+
+        self.assertEqual(200, result.status_code)
+        mock_generate.assert_called_once_with((1843, 5210), None,
+                                              None, None, None)
+
+    def test_rejects_invalid_last_event_id(self, mock_generate):
+        result = self.app.get('/changes', headers={'Last-Event-ID': 'x'})
+
+        self.assertEqual(400, result.status_code)
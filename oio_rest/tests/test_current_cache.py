@@ -0,0 +1,165 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+import time
+import unittest
+
+from mock import MagicMock, patch
+
+from oio_rest import current_cache
+
+
+class TestCurrentCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = current_cache.CurrentCache(100)
+        self.cache.clear(following=True)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('a'))
+
+        self.cache.put('a', b'aaa', None, self.cache.epoch)
+
+        self.assertEqual(b'aaa', self.cache.get('a'))
+
+        stats = self.cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(3, stats['size'])
+
+    def test_expires(self):
+        self.cache.put('a', b'aaa', time.time() - 1, self.cache.epoch)
+        self.cache.put('b', b'bbb', time.time() + 60, self.cache.epoch)
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(b'bbb', self.cache.get('b'))
+
+        stats = self.cache.stats()
+        self.assertEqual(1, stats['expired'])
+        self.assertEqual(3, stats['size'])
+
+    def test_evicts_least_recently_used_bytes(self):
+        cache = current_cache.CurrentCache(10)
+        cache.clear(following=True)
+
+        cache.put('a', b'aaaa', None, cache.epoch)
+        cache.put('b', b'bbbb', None, cache.epoch)
+        cache.get('a')
+        cache.put('c', b'cccc', None, cache.epoch)
+
+        self.assertEqual(b'aaaa', cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_invalidate(self):
+        epoch = self.cache.epoch
+
+        self.cache.put('a', b'aaa', None, epoch)
+        self.cache.put('b', b'bbb', None, epoch)
+
+        self.cache.invalidate({'a', 'c'})
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(b'bbb', self.cache.get('b'))
+
+        # read before the invalidation, so possibly stale
+        self.cache.put('c', b'ccc', None, epoch)
+
+        self.assertIsNone(self.cache.get('c'))
+        self.assertEqual(1, self.cache.stats()['invalidations'])
+
+    def test_not_following(self):
+        self.cache.put('a', b'aaa', None, self.cache.epoch)
+
+        self.cache.clear()
+        self.cache.put('a', b'aaa', None, self.cache.epoch)
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(0, self.cache.stats()['entries'])
+
+    @patch('oio_rest.current_cache.db.get_changed_objects')
+    def test_sync(self, mock_get_changed_objects):
+        epoch = self.cache.epoch
+
+        for key in ('a', 'b', 'c'):
+            self.cache.put(('klasse', key), key.encode(), None, epoch)
+
+        mock_get_changed_objects.return_value = [
+            (10, 1, 'klasse', 'a', True),
+            (12, 2, 'klasse', 'b', False),
+        ]
+
+        position, pending = self.cache.sync((9, 0), frozenset())
+
+        mock_get_changed_objects.assert_called_with((9, 0))
+        self.assertEqual((10, 1), position)
+        self.assertEqual({(12, 2)}, pending)
+        self.assertIsNone(self.cache.get(('klasse', 'a')))
+        self.assertIsNone(self.cache.get(('klasse', 'b')))
+
+        # the change of b was seen, but an older one was since committed
+        epoch = self.cache.epoch
+        self.cache.put(('klasse', 'b'), b'b', None, epoch)
+
+        mock_get_changed_objects.return_value = [
+            (11, 3, 'klasse', 'c', True),
+            (12, 2, 'klasse', 'b', True),
+        ]
+
+        position, pending = self.cache.sync(position, pending)
+
+        self.assertEqual((12, 2), position)
+        self.assertEqual(frozenset(), pending)
+        self.assertEqual(b'b', self.cache.get(('klasse', 'b')))
+        self.assertIsNone(self.cache.get(('klasse', 'c')))
+
+    @patch('oio_rest.current_cache.db')
+    def test_list_objects(self, mock_db):
+        cache = current_cache.CurrentCache(1000)
+        cache.clear(following=True)
+        cache.start = MagicMock()
+
+        mock_db.get_restrictions_as_sql.return_value = None
+        mock_db.get_current_objects.return_value = [
+            ('b', {'id': 'b'}, None),
+            ('a', {'id': 'a'}, None),
+        ]
+
+        with patch('oio_rest.current_cache.cache', new=cache), \
+                patch('oio_rest.current_cache.get_authenticated_user'):
+            for i in range(2):
+                self.assertEqual(
+                    [[{'id': 'a'}, {'id': 'b'}]],
+                    current_cache.list_objects('Klasse', ['B', 'a'],
+                                               None, None, None, None),
+                )
+
+            mock_db.get_current_objects.assert_called_once_with(
+                'Klasse', ['a', 'b'],
+            )
+
+            # without a valid snapshot of an object, all are listed by the
+            # database
+            mock_db.get_current_objects.return_value = []
+
+            self.assertIs(
+                mock_db.list_objects.return_value,
+                current_cache.list_objects('Klasse', ['a', 'c'],
+                                           None, None, None, None),
+            )
+
+            # nor are objects taken from the cache for users with
+            # restrictions
+            mock_db.get_restrictions_as_sql.return_value = ['restriction']
+
+            self.assertIs(
+                mock_db.iter_objects.return_value,
+                current_cache.iter_objects('Klasse', ['a'],
+                                           None, None, None, None),
+            )
+
+        self.assertEqual(3, cache.stats()['hits'])
@@ -7,16 +7,18 @@
 
 
 import collections
+import copy
 import datetime
 import unittest
 
 import flask_testing
-from mock import MagicMock, call, patch
+import psycopg2
+from mock import ANY, MagicMock, call, patch
 
 from oio_rest import db
 from oio_rest import app
 from oio_rest.custom_exceptions import (
-    BadRequestException, DBException, NotFoundException
+    BadRequestException, DBException, NotAllowedException, NotFoundException
 )
 
 
@@ -530,27 +532,95 @@ class TestDB(flask_testing.TestCase):
         # Assert
         self.assertEqual(expected_result, str(actual_result))
 
-    @patch('oio_rest.db.transform_virkning')
-    @patch('oio_rest.db.filter_empty')
-    @patch('oio_rest.db.simplify_cleared_wrappers')
-    def test_filter_json_output(self, mock_transform, mock_filter,
-                                mock_simplify):
-        # type: (MagicMock, MagicMock, MagicMock) -> None
+    def test_filter_json_output(self):
         # Arrange
-        mock_transform.side_effect = lambda x: x
-        mock_filter.side_effect = lambda x: x
-        mock_simplify.side_effect = lambda x: x
+        def virkning(timeperiod):
+            return {
+                "timeperiod": timeperiod,
+                "aktoerref": None,
+                "aktoertypekode": None,
+                "notetekst": "",
+            }
+
+        output = [[
+            {
+                "id": "93ba1a1c-3b2a-4e1a-b5e9-b9bd9e5c6b6a",
+                "registreringer": [{
+                    "livscykluskode": "Opstaaet",
+                    "note": None,
+                    "attributter": {
+                        "dokumentegenskaber": [{
+                            "brugervendtnoegle": "bvn",
+                            "titel": "",
+                            "major": {"value": 1, "cleared": False},
+                            "minor": {"cleared": True},
+                            "virkning": virkning(
+                                '["2017-01-01 00:00:00+01",infinity)',
+                            ),
+                        }],
+                    },
+                    "tilstande": {"dokumentfremdrift": []},
+                    "relationer": {
+                        "ejer": [{
+                            "uuid": "ef2713ee-1a38-4c23-8fcb-3c4331262194",
+                            "virkning": virkning(
+                                '("2017-01-01 00:00:00+01",infinity]',
+                            ),
+                        }],
+                        "ansvarlig": None,
+                    },
+                    "varianter": [{
+                        "varianttekst": "PDF",
+                        "dele": [
+                            {
+                                "deltekst": "a",
+                                "relationer": [
+                                    {
+                                        "reltype": "underredigeringaf",
+                                        "urn": "urn:a",
+                                        "virkning": virkning(
+                                            '[-infinity,infinity)',
+                                        ),
+                                    },
+                                    {
+                                        "reltype": "underredigeringaf",
+                                        "urn": "urn:b",
+                                        "virkning": virkning(
+                                            '[-infinity,infinity)',
+                                        ),
+                                    },
+                                ],
+                            },
+                            {
+                                "deltekst": "b",
+                                "relationer": [],
+                            },
+                        ],
+                    }],
+                }],
+            },
+        ]]
 
-        expected_output = {'key': 'value'}
+        expected_output = db.transform_relations(db.transform_virkning(
+            db.filter_empty(db.simplify_cleared_wrappers(
+                copy.deepcopy(output),
+            )),
+        ))
 
         # Act
-        actual_output = db.filter_json_output(expected_output)
-        # Assert
+        actual_output = db.filter_json_output(output)
 
-        mock_transform.assert_called()
-        mock_filter.assert_called()
-        mock_simplify.assert_called()
+        # Assert
         self.assertEqual(expected_output, actual_output)
+        self.assertEqual(
+            ["urn:a", "urn:b"],
+            [
+                rel["urn"]
+                for rel in actual_output[0][0]["registreringer"][0][
+                    "varianter"][0]["dele"][0]["relationer"][
+                        "underredigeringaf"]
+            ],
+        )
 
     def test_simplify_cleared_wrappers_dict_with_cleared(self):
         # Arrange
@@ -974,30 +1044,6 @@ class TestDB(flask_testing.TestCase):
         # Assert
         self.assertEqual(expected_result, actual_value)
 
-    @patch('oio_rest.db.list_objects')
-    def test_get_life_cycle_code(self, mock_list_objs):
-        # type: (MagicMock) -> None
-        # Arrange
-        class_name = ''
-        uuid = 'e9eea92f-d404-48c4-85e1-222b56013e3e'
-        results = [[{
-            "id": "8c949998-f01b-4e7c-953b-8ae4fec475a2",
-            "registreringer": [{
-                "attributter": {},
-                "relationer": {},
-                "tilstande": {},
-                "livscykluskode": "Importeret"
-            }]
-        }]]
-
-        mock_list_objs.return_value = results
-
-        # Act
-        actual_result = db.get_life_cycle_code(class_name, uuid)
-
-        # Assert
-        self.assertEqual('Importeret', actual_result)
-
 
 @patch("oio_rest.db.sql_convert_registration", new=MagicMock())
 class TestDBObjectFunctions(unittest.TestCase):
@@ -1016,6 +1062,232 @@ class TestDBObjectFunctions(unittest.TestCase):
         # Assert
         self.assertEqual(uuid, actual_result)
 
+    @patch("oio_rest.db.sql_get_registration", new=MagicMock())
+    @patch("oio_rest.db._update_object")
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.jinja_env")
+    def test_import_object_writes_in_one_transaction(self,
+                                                     mock_jinja_env,
+                                                     mock_get_conn,
+                                                     mock_update):
+        # type: (MagicMock, MagicMock, MagicMock) -> None
+        conn = mock_get_conn.return_value.__enter__.return_value
+        cursor = conn.cursor.return_value.__enter__.return_value
+
+        for current, expected in [
+            (None, db.Livscyklus.IMPORTERET.value),
+            (db.Livscyklus.OPSTAAET.value, db.Livscyklus.RETTET.value),
+            (db.Livscyklus.SLETTET.value, db.Livscyklus.IMPORTERET.value),
+            (db.Livscyklus.PASSIVERET.value, db.Livscyklus.IMPORTERET.value),
+        ]:
+            with self.subTest(current):
+                cursor.reset_mock()
+                mock_get_conn.reset_mock()
+                mock_update.reset_mock()
+
+                cursor.fetchone.side_effect = [(current,) if current else None,
+                                               ("uuid",)]
+
+                # Act
+                actual_result = db.import_object("classname", "note", {},
+                                                 "uuid")
+
+                # Assert
+                self.assertEqual(expected, actual_result)
+                mock_get_conn.assert_called_once_with()
+
+                if current in (db.Livscyklus.SLETTET.value,
+                               db.Livscyklus.PASSIVERET.value):
+                    mock_update.assert_called_once_with(
+                        cursor, "classname", "note", {}, "uuid", expected,
+                        ANY,
+                    )
+                    self.assertEqual(1, cursor.execute.call_count)
+                else:
+                    mock_update.assert_not_called()
+                    self.assertEqual(2, cursor.execute.call_count)
+
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.jinja_env")
+    def test_delete_object_skips_deleted_object(self,
+                                                mock_jinja_env,
+                                                mock_get_conn):
+        # type: (MagicMock, MagicMock) -> None
+        # Arrange
+        cursor = (
+            mock_get_conn.return_value
+            .__enter__.return_value
+            .cursor.return_value
+            .__enter__.return_value
+        )
+        cursor.fetchone.return_value = (db.Livscyklus.SLETTET.value,)
+
+        # Act
+        actual_result = db.delete_object("classname", {}, "note", "uuid")
+
+        # Assert
+        self.assertIsNone(actual_result)
+        self.assertEqual(1, cursor.execute.call_count)
+
+    @patch("oio_rest.db.sql_get_registration", new=MagicMock())
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.jinja_env")
+    def test_create_or_import_objects_skips_failing_objects(self,
+                                                            mock_jinja_env,
+                                                            mock_get_conn):
+        # type: (MagicMock, MagicMock) -> None
+        # Arrange
+        conn = mock_get_conn.return_value
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchone.side_effect = [("uuid1",), ("uuid3",)]
+
+        error = BadRequestException("bad")
+        objects = [("note", {}, None)] * 3
+
+        # Act
+        with patch("oio_rest.db.sql_convert_registration",
+                   side_effect=[{}, error, {}]):
+            results, batches, committed = db.create_or_import_objects(
+                "classname", objects, atomic=False, batch_size=2,
+            )
+
+        # Assert
+        self.assertEqual(["uuid1", error, "uuid3"], results)
+        self.assertEqual([2, 1], [size for size, seconds in batches])
+        self.assertTrue(committed)
+        cursor.execute.assert_any_call("ROLLBACK TO SAVEPOINT bulk_object")
+        conn.rollback.assert_not_called()
+
+    @patch("oio_rest.db._import_object")
+    @patch("oio_rest.db.sql_get_registration", new=MagicMock())
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.jinja_env")
+    def test_create_or_import_objects_imports_as_put(self,
+                                                     mock_jinja_env,
+                                                     mock_get_conn,
+                                                     mock_import):
+        # type: (MagicMock, MagicMock, MagicMock) -> None
+        # Arrange
+        conn = mock_get_conn.return_value
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchone.side_effect = [("uuid1",)]
+
+        objects = [("note", {}, None), ("note", {}, "uuid2")]
+
+        # Act
+        with patch("oio_rest.db.sql_convert_registration"):
+            results, batches, committed = db.create_or_import_objects(
+                "classname", objects,
+            )
+
+        # Assert
+        self.assertEqual(["uuid1", "uuid2"], results)
+        self.assertTrue(committed)
+        mock_import.assert_called_once_with(
+            cursor, "classname", "note", {}, "uuid2", ANY,
+        )
+
+    @patch("oio_rest.db.sql_get_registration", new=MagicMock())
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.jinja_env")
+    def test_create_or_import_objects_atomic_rolls_back(self,
+                                                        mock_jinja_env,
+                                                        mock_get_conn):
+        # type: (MagicMock, MagicMock) -> None
+        # Arrange
+        conn = mock_get_conn.return_value
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchone.side_effect = [("uuid1",), ("uuid3",)]
+
+        error = BadRequestException("bad")
+        objects = [("note", {}, None)] * 3
+
+        # Act
+        with patch("oio_rest.db.sql_convert_registration",
+                   side_effect=[{}, error, {}]):
+            results, batches, committed = db.create_or_import_objects(
+                "classname", objects, atomic=True,
+            )
+
+        # Assert
+        self.assertEqual(["uuid1", error], results)
+        self.assertEqual([], batches)
+        self.assertFalse(committed)
+        conn.rollback.assert_called_once_with()
+        conn.commit.assert_not_called()
+
+    @patch("oio_rest.db.get_pool")
+    @patch("oio_rest.db.jinja_env")
+    @patch("oio_rest.db.settings.LIST_BATCH_SIZE", new=2)
+    def test_iter_objects_fetches_in_batches(self,
+                                             mock_jinja_env,
+                                             mock_get_pool):
+        # type: (MagicMock, MagicMock) -> None
+        # Arrange
+        pool = mock_get_pool.return_value
+        conn = pool.getconn.return_value
+        cursor = conn.cursor.return_value
+        cursor.fetchmany.side_effect = [
+            [({"id": "1"},), ({"id": "2"},)],
+            [({"id": "3", "note": ""},)],
+            [],
+        ]
+
+        # Act
+        objects = db.iter_objects("classname", None, None, None, None, None)
+
+        # Assert
+        cursor.fetchmany.assert_called_once_with(2)
+        self.assertEqual([{"id": "1"}, {"id": "2"}, {"id": "3"}],
+                         list(objects))
+        self.assertEqual(3, cursor.fetchmany.call_count)
+        cursor.close.assert_called_once_with()
+        conn.commit.assert_called_once_with()
+        pool.putconn.assert_called_once_with(conn)
+
+    @patch("oio_rest.db.get_pool")
+    @patch("oio_rest.db.jinja_env")
+    def test_iter_objects_gives_connection_back_when_closed(self,
+                                                            mock_jinja_env,
+                                                            mock_get_pool):
+        # type: (MagicMock, MagicMock) -> None
+        # Arrange
+        pool = mock_get_pool.return_value
+        conn = pool.getconn.return_value
+        cursor = conn.cursor.return_value
+        cursor.fetchmany.return_value = [({"id": "1"},)]
+
+        # Act
+        objects = db.iter_objects("classname", None, None, None, None, None)
+
+        pool.putconn.assert_not_called()
+
+        objects.close()
+
+        # Assert
+        cursor.close.assert_called_once_with()
+        pool.putconn.assert_called_once_with(conn)
+
+    @patch("oio_rest.db.get_pool")
+    @patch("oio_rest.db.jinja_env")
+    def test_iter_objects_gives_connection_back_on_error(self,
+                                                         mock_jinja_env,
+                                                         mock_get_pool):
+        # type: (MagicMock, MagicMock) -> None
+        # Arrange
+        pool = mock_get_pool.return_value
+        conn = pool.getconn.return_value
+        cursor = conn.cursor.return_value
+        cursor.fetchmany.side_effect = psycopg2.Error
+
+        # Act
+        with self.assertRaises(psycopg2.Error):
+            db.iter_objects("classname", None, None, None, None, None)
+
+        # Assert
+        conn.rollback.assert_called_once_with()
+        pool.putconn.assert_called_once_with(conn)
+
     @patch("oio_rest.db.get_connection")
     @patch("oio_rest.db.jinja_env")
     def test_list_objects_raises_on_no_results(self,
@@ -1039,6 +1311,157 @@ class TestDBObjectFunctions(unittest.TestCase):
                             "registrering_fra",
                             "registrering_til")
 
+    @patch("oio_rest.db.get_restrictions_as_sql")
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.get_statement")
+    def test_list_objects_reads_current_snapshot(self, mock_get_statement,
+                                                 mock_get_conn,
+                                                 mock_restrictions):
+        # type: (MagicMock, MagicMock, MagicMock) -> None
+        for registreret_fra, restrictions, current in [
+            (None, None, True),
+            ("registreret_fra", None, False),
+            (None, ["restriction"], False),
+        ]:
+            with self.subTest(registreret_fra=registreret_fra,
+                              restrictions=restrictions):
+                mock_restrictions.return_value = restrictions
+
+                db.list_objects("classname", ["uuid"],
+                                "virkning_fra", "virkning_til",
+                                registreret_fra, None)
+
+                mock_get_statement.assert_called_with(
+                    'list_objects.sql',
+                    class_name="classname",
+                    restrictions=restrictions is not None,
+                    current=current,
+                )
+
+    @patch("oio_rest.db.settings.SEARCH_ENGINE", new='query')
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.get_statement")
+    def test_search_objects_compiles_query(self, mock_get_statement,
+                                           mock_get_conn):
+        # type: (MagicMock, MagicMock) -> None
+        cursor = (
+            mock_get_conn.return_value
+            .__enter__.return_value
+            .cursor.return_value
+            .__enter__.return_value
+        )
+        cursor.fetchone.return_value = ([], None)
+
+        for class_name, template in [
+            ('Klasse', 'search_objects_query.sql'),
+            ('Dokument', 'search_objects.sql'),
+        ]:
+            with self.subTest(class_name):
+                mock_get_statement.reset_mock()
+
+                db.search_objects(class_name, None, {
+                    'attributes': {},
+                    'states': {},
+                    'relations': {},
+                })
+
+                self.assertEqual(template,
+                                 mock_get_statement.call_args[0][0])
+
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.get_pool")
+    @patch("oio_rest.db.get_statement")
+    def test_get_past_registrations(self, mock_get_statement, mock_get_pool,
+                                    mock_get_conn):
+        # type: (MagicMock, MagicMock, MagicMock) -> None
+        pool = mock_get_pool.return_value
+        conn = pool.getconn.return_value
+        cursor = conn.cursor.return_value.__enter__.return_value
+
+        for row, expected in [
+            ((False, 'UTC', ['1 [a,b)']), None),
+            ((True, 'UTC', ['1 [a,b)']), ['UTC', '1 [a,b)']),
+        ]:
+            with self.subTest(row=row):
+                cursor.fetchone.return_value = row
+
+                self.assertEqual(
+                    expected,
+                    db.get_past_registrations("classname", ["uuid"],
+                                              "registreret_fra",
+                                              "registreret_til"),
+                )
+
+        mock_get_statement.assert_called_with(
+            'get_past_registrations.sql',
+            class_name="classname",
+        )
+
+        # the lease of the request isn't used
+        mock_get_conn.assert_not_called()
+        self.assertEqual(2, pool.putconn.call_count)
+
+    @patch("oio_rest.db.settings.DO_ENABLE_RESTRICTIONS", new=True)
+    @patch("oio_rest.db.sql_convert_restrictions")
+    @patch("oio_rest.db.get_restrictions")
+    def test_get_restrictions_as_sql_converts_once(self, mock_restrictions,
+                                                   mock_convert):
+        # type: (MagicMock, MagicMock) -> None
+        db._get_restrictions_array.cache_clear()
+        self.addCleanup(db._get_restrictions_array.cache_clear)
+
+        mock_convert.return_value = ["registrering"]
+
+        for user in ("a", "b"):
+            mock_restrictions.return_value = [
+                ({"brugervendtnoegle": "ORGFUNK"}, {}, {}),
+            ]
+
+            self.assertEqual(
+                ("classnameRegistreringType", ["registrering"]),
+                db.get_restrictions_as_sql(user, "classname", "op"),
+            )
+
+        mock_convert.assert_called_once_with(
+            "classname", [[{"brugervendtnoegle": "ORGFUNK"}, {}, {}]],
+        )
+
+        mock_restrictions.return_value = []
+
+        with self.assertRaises(NotAllowedException):
+            db.get_restrictions_as_sql("c", "classname", "op")
+
+    @patch("oio_rest.db.get_connection")
+    @patch("oio_rest.db.get_pool")
+    @patch("oio_rest.db.get_statement")
+    def test_get_current_objects(self, mock_get_statement, mock_get_pool,
+                                 mock_get_conn):
+        # type: (MagicMock, MagicMock, MagicMock) -> None
+        pool = mock_get_pool.return_value
+        conn = pool.getconn.return_value
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [
+            ("uuid", {"id": "uuid", "registreringer": [
+                {"livscykluskode": "Opstaaet", "relationer": None},
+            ]}, None),
+        ]
+
+        self.assertEqual(
+            [("uuid", {"id": "uuid", "registreringer": [
+                {"livscykluskode": "Opstaaet"},
+            ]}, None)],
+            db.get_current_objects("classname", ["uuid"]),
+        )
+
+        mock_get_statement.assert_called_with(
+            'get_current_objects.sql',
+            class_name="classname",
+        )
+
+        # the lease of the request isn't used, and ours is given back
+        mock_get_conn.assert_not_called()
+        pool.putconn.assert_called_once_with(conn)
+
 
 class TestDBGeneralSQL(unittest.TestCase):
     @patch('oio_rest.db.sql_attribute_array')
@@ -1160,15 +1583,12 @@ class TestDBGeneralSQL(unittest.TestCase):
                       sql_state_array_args)
 
     @patch('oio_rest.db.convert_variants')
-    @patch('oio_rest.db.adapt')
     @patch('oio_rest.db.convert_relations', new=lambda x, y: x)
     @patch('oio_rest.db.get_attribute_names', new=MagicMock())
     @patch('oio_rest.db.get_state_names', new=MagicMock())
     def test_sql_convert_registration_variants(self,
-                                               mock_adapt,
                                                mock_convert_variants):
         # type: (MagicMock) -> None
-        mock_adapt.side_effect = lambda x: x
         mock_convert_variants.side_effect = lambda x: x
 
         # Arrange
@@ -1183,11 +1603,42 @@ class TestDBGeneralSQL(unittest.TestCase):
         class_name = 'classname'
 
         # Act
-        db.sql_convert_registration(registration, class_name)
+        actual_result = db.sql_convert_registration(registration, class_name)
 
         # Assert
-        mock_adapt.assert_called_with(variants)
         mock_convert_variants.assert_called_with(variants)
+        self.assertEqual(variants, actual_result['variants'])
+
+    def test_get_search_criteria(self):
+        # type: () -> None
+        # Arrange
+        from oio_rest.utils.build_registration import build_registration
+
+        registration = db.sql_convert_registration(build_registration(
+            'Klasse', {
+                'brugervendtnoegle': ['ORGFUNK', 'ORGFUNK2'],
+                'titel': ['XYZ'],
+                'publiceret': ['Publiceret'],
+                'ansvarlig': ['ddc99abd-c1b0-48c2-aef7-74fea841adae'],
+            },
+        ), 'Klasse')
+
+        # Act
+        actual_result = db._get_search_criteria(
+            'Klasse', registration, ['Hierarkisk'], [],
+        )
+
+        # Assert
+        self.assertEqual(
+            {
+                'attributes': (('egenskaber', (0, 0, 0)),),
+                'states': (('publiceret', 1),),
+                'relations': 1,
+                'any_attr': 1,
+                'any_uuid': 0,
+            },
+            actual_result,
+        )
 
 
 Diagnostics = collections.namedtuple('Diagnostics', ['message_primary'])
@@ -1370,7 +1821,7 @@ class TestPGErrors(unittest.TestCase):
             db.delete_object('', '', '', '')
 
     @patch("oio_rest.db.psycopg2.Error", new=TestException)
-    @patch('oio_rest.db.object_exists', new=lambda *x: False)
+    @patch('oio_rest.db._get_life_cycle_code', new=lambda *x: None)
     def test_delete_object_raises_on_notfound_pgerror(self, mock_get_conn):
         # type: (MagicMock) -> None
 
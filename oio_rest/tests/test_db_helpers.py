@@ -9,6 +9,7 @@
 from unittest import TestCase
 
 from mock import MagicMock, call, patch
+from psycopg2.extensions import adapt as psyco_adapt
 from werkzeug.datastructures import ImmutableMultiDict
 
 from oio_rest import settings
@@ -21,9 +22,7 @@ class TestDBHelpers(TestCase):
     maxDiff = None
 
     def setUp(self):
-        db_helpers._attribute_fields = {}
-        db_helpers._attribute_names = {}
-        db_helpers._relation_names = {}
+        db_helpers._registry = None
 
     @test_support.patch_db_struct({
         'testclass1': {
@@ -67,22 +66,20 @@ class TestDBHelpers(TestCase):
         # Act
         actual_result = db_helpers.get_attribute_fields(
             'testclass1testattribut')
-        actual_fields = db_helpers._attribute_fields
+        actual_fields = db_helpers.get_registry().attribute_fields
 
         # Assert
         self.assertDictEqual(expected_fields, actual_fields)
         self.assertEqual(expected_result, actual_result)
 
-    def test_get_attribute_fields_uses_cache(self):
-        # Arrange
-        expected_result = ['value1', 'value2']
-        db_helpers._attribute_fields = {'test': expected_result}
-
+    def test_get_registry_is_reused(self):
         # Act
-        actual_result = db_helpers.get_attribute_fields('test')
+        first = db_helpers.get_registry()
+        second = db_helpers.get_registry()
 
         # Assert
-        self.assertEqual(expected_result, actual_result)
+        self.assertIs(first, second)
+        self.assertIs(settings.REAL_DB_STRUCTURE, first.structure)
 
     def test_get_field_type_default(self):
         # Arrange
@@ -282,16 +279,26 @@ class TestDBHelpers(TestCase):
         # Assert
         self.assertEqual(expected_result, actual_result)
 
-    def test_get_attribute_names_uses_cache(self):
+    def test_get_registry_rebuilt_for_new_structure(self):
         # Arrange
-        expected_result = ['value1', 'value2']
-        db_helpers._attribute_names = {'testclass1': expected_result}
+        expected_result = ['testclass1testattribut']
+        old_registry = db_helpers.get_registry()
 
         # Act
-        actual_result = db_helpers.get_attribute_names('testclass1')
+        with patch('oio_rest.settings.REAL_DB_STRUCTURE', new={
+            'testclass1': {
+                'attributter': {
+                    'testattribut': ['value1'],
+                },
+            },
+        }):
+            actual_result = db_helpers.get_attribute_names('testclass1')
 
         # Assert
         self.assertEqual(expected_result, actual_result)
+        self.assertIsNot(old_registry, db_helpers.get_registry())
+        self.assertIs(settings.REAL_DB_STRUCTURE,
+                      db_helpers.get_registry().structure)
 
     def test_get_state_names(self):
         with test_support.patch_db_struct({
@@ -594,17 +601,34 @@ class TestDBHelpers(TestCase):
         # Assert
         self.assertEqual(expected_result, actual_result)
 
-    def test_get_relation_names_uses_cache(self):
+    def test_get_registry_rebuilt_for_extensions(self):
         # Arrange
-
-        expected_result = ['value1', 'value2', 'value3', 'value4']
-        db_helpers._relation_names = {'testclass1': expected_result}
+        db_helpers.get_registry()
 
         # Act
-        actual_result = db_helpers.get_relation_names('testclass1')
+        with test_support.extend_db_struct({
+            'organisationfunktion': {
+                'attributter': {
+                    'fremdrift': ['status'],
+                },
+            },
+        }):
+            actual_result = db_helpers.get_attribute_names(
+                'organisationfunktion',
+            )
 
         # Assert
-        self.assertEqual(expected_result, actual_result)
+        self.assertEqual(
+            [
+                'organisationfunktionegenskaber',
+                'organisationfunktionfremdrift',
+            ],
+            actual_result,
+        )
+        self.assertEqual(
+            ['organisationfunktionegenskaber'],
+            db_helpers.get_attribute_names('organisationfunktion'),
+        )
 
     def test_get_state_names_order(self):
         # Arrange
@@ -1058,6 +1082,75 @@ class TestAktoerAttrAdapter(TestCase):
         self.assertEqual(expected_result, actual_result)
 
 
+@patch('oio_rest.db.db_helpers.NamedTupleAdapter.prepare_and_adapt',
+       new=lambda self, x: psyco_adapt(x))
+class TestRowAdapters(TestCase):
+    def test_cast(self):
+        self.assertEqual(
+            b"'Opstaaet' :: Livscykluskode",
+            psyco_adapt(
+                db_helpers.Cast('Opstaaet', 'Livscykluskode'),
+            ).getquoted(),
+        )
+
+    def test_row_without_type(self):
+        self.assertEqual(
+            b"ROW('it''s',NULL,42)",
+            psyco_adapt(db_helpers.Row(None, ("it's", None, 42))).getquoted(),
+        )
+
+    def test_nested_row(self):
+        row = db_helpers.Row('KlasseRegistreringType', (
+            db_helpers.Row('RegistreringBase', (
+                None,
+                db_helpers.Cast('Rettet', 'Livscykluskode'),
+                None,
+                'note',
+            )),
+            None,
+        ))
+
+        self.assertEqual(
+            b"ROW(ROW(NULL,'Rettet' :: Livscykluskode,NULL,'note') :: "
+            b"RegistreringBase,NULL) :: KlasseRegistreringType",
+            psyco_adapt(row).getquoted(),
+        )
+
+    def test_array_of_rows(self):
+        array = db_helpers.Array('KlassePubliceretTilsType', [
+            db_helpers.Row(None, (None, 'Publiceret')),
+            db_helpers.Row(None, (None, None)),
+        ])
+
+        self.assertEqual(
+            b"ARRAY[ROW(NULL,'Publiceret'),ROW(NULL,NULL)] :: "
+            b"KlassePubliceretTilsType[]",
+            psyco_adapt(array).getquoted(),
+        )
+
+    def test_empty_array(self):
+        self.assertEqual(
+            b"ARRAY[] :: KlasseRelationType[]",
+            psyco_adapt(
+                db_helpers.Array('KlasseRelationType', []),
+            ).getquoted(),
+        )
+
+    def test_null_array_in_row(self):
+        # arrays not given are passed as NULL, which differs from an
+        # empty array
+        row = db_helpers.Row('KlasseRegistreringType', (
+            None,
+            db_helpers.Array('KlasseRelationType', []),
+        ))
+
+        self.assertEqual(
+            b"ROW(NULL,ARRAY[] :: KlasseRelationType[]) :: "
+            b"KlasseRegistreringType",
+            psyco_adapt(row).getquoted(),
+        )
+
+
 class TestSearchable(TestCase):
     from oio_rest.db.db_helpers import Searchable
 
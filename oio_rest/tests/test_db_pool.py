@@ -0,0 +1,113 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+import unittest
+
+from mock import MagicMock, patch
+
+from oio_rest import app
+from oio_rest import db
+from oio_rest.custom_exceptions import DBException
+from oio_rest.db import db_pool
+
+
+@patch('oio_rest.db.db_pool.ThreadedConnectionPool')
+class TestConnectionPool(unittest.TestCase):
+    def test_getconn_counts_active_leases(self, mock_pool_cls):
+        pool = db_pool.ConnectionPool(0, 2, timeout=0)
+
+        conn = pool.getconn()
+
+        self.assertEqual(mock_pool_cls.return_value.getconn.return_value,
+                         conn)
+        self.assertEqual(1, pool.stats()['active'])
+        self.assertEqual(1, pool.stats()['leases'])
+
+        pool.putconn(conn)
+
+        self.assertEqual(0, pool.stats()['active'])
+        mock_pool_cls.return_value.putconn.assert_called_once_with(
+            conn, close=conn.closed,
+        )
+
+    def test_getconn_times_out_when_exhausted(self, mock_pool_cls):
+        pool = db_pool.ConnectionPool(0, 1, timeout=0)
+        pool.getconn()
+
+        with self.assertRaises(DBException) as cm:
+            pool.getconn()
+
+        self.assertEqual(503, cm.exception.status_code)
+        self.assertEqual(1, pool.stats()['timeouts'])
+        self.assertEqual(0, pool.stats()['waiting'])
+
+    def test_getconn_frees_slot_on_connection_error(self, mock_pool_cls):
+        mock_pool_cls.return_value.getconn.side_effect = [
+            ValueError, MagicMock(),
+        ]
+
+        pool = db_pool.ConnectionPool(0, 1, timeout=0)
+
+        with self.assertRaises(ValueError):
+            pool.getconn()
+
+        # the slot was released, so this doesn't time out
+        pool.getconn()
+
+        self.assertEqual(1, pool.stats()['active'])
+
+    def test_getconn_raises_error_waiting(self, mock_pool_cls):
+        pool = db_pool.ConnectionPool(0, 1, timeout=0)
+        pool._slots = MagicMock()
+        pool._slots.acquire.side_effect = KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            pool.getconn()
+
+        self.assertEqual(0, pool.stats()['waiting'])
+        self.assertEqual(0, pool.stats()['timeouts'])
+
+    def test_stats_counts_idle_connections(self, mock_pool_cls):
+        mock_pool_cls.return_value.getconn.side_effect = (
+            lambda: MagicMock(closed=False)
+        )
+
+        pool = db_pool.ConnectionPool(1, 3, timeout=0)
+
+        self.assertEqual(1, pool.stats()['idle'])
+
+        conns = [pool.getconn(), pool.getconn()]
+
+        self.assertEqual(0, pool.stats()['idle'])
+
+        for conn in conns:
+            pool.putconn(conn)
+
+        # only minconn connections are kept when idle
+        self.assertEqual(1, pool.stats()['idle'])
+
+        pool.putconn(pool.getconn(), close=True)
+
+        self.assertEqual(0, pool.stats()['idle'])
+
+
+@patch('oio_rest.db.get_pool')
+class TestRequestLease(unittest.TestCase):
+    def test_one_lease_per_request(self, mock_get_pool):
+        with app.app.test_request_context():
+            first = db.get_connection()
+            second = db.get_connection()
+
+            self.assertIs(first, second)
+            mock_get_pool.return_value.getconn.assert_called_once_with()
+
+    def test_lease_released_on_teardown(self, mock_get_pool):
+        with app.app.test_request_context():
+            conn = db.get_connection()
+
+        mock_get_pool.return_value.putconn.assert_called_once_with(conn)
@@ -0,0 +1,250 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+import os
+import tempfile
+import unittest
+
+from mock import patch
+
+from oio_rest import history_cache
+
+
+class TestHistoryCache(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = tmpdir.name
+
+    def test_get_put(self):
+        cache = history_cache.HistoryCache(100)
+
+        self.assertIsNone(cache.get('a'))
+
+        cache.put('a', b'aaa')
+
+        self.assertEqual(b'aaa', cache.get('a'))
+
+        stats = cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(3, stats['size'])
+
+    def test_evicts_least_recently_used_bytes(self):
+        cache = history_cache.HistoryCache(10)
+
+        cache.put('a', b'aaaa')
+        cache.put('b', b'bbbb')
+        cache.get('a')
+        cache.put('c', b'cccc')
+
+        self.assertEqual(b'aaaa', cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(b'cccc', cache.get('c'))
+
+        stats = cache.stats()
+        self.assertEqual(8, stats['size'])
+        self.assertEqual(1, stats['evictions'])
+
+    def test_skips_responses_above_size(self):
+        cache = history_cache.HistoryCache(2)
+
+        cache.put('a', b'aaa')
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, cache.stats()['size'])
+
+    def test_disabled(self):
+        cache = history_cache.HistoryCache(0, self.directory, 100)
+
+        cache.put('a', b'aaa')
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_directory(self):
+        cache = history_cache.HistoryCache(100, self.directory, 100)
+        cache.put('a', b'aaa')
+
+        other = history_cache.HistoryCache(100, self.directory, 100)
+
+        self.assertEqual(b'aaa', other.get('a'))
+        self.assertEqual(b'aaa', other.get('a'))
+
+        stats = other.stats()
+        self.assertEqual(1, stats['disk_hits'])
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(3, stats['directory_size'])
+
+    def test_directory_evicts_least_recently_used(self):
+        cache = history_cache.HistoryCache(100, self.directory, 10)
+
+        cache.put('a', b'aaaa')
+        cache.put('b', b'bbbb')
+        cache.put('c', b'cccc')
+
+        self.assertEqual(['b', 'c'], sorted(os.listdir(self.directory)))
+        self.assertEqual(8, cache.stats()['directory_size'])
+
+    def test_directory_written_elsewhere(self):
+        cache = history_cache.HistoryCache(100, self.directory, 100)
+        other = history_cache.HistoryCache(100, self.directory, 100)
+
+        cache.put('a', b'aaa')
+
+        self.assertEqual(b'aaa', other.get('a'))
+
+        stats = other.stats()
+        self.assertEqual(1, stats['disk_hits'])
+        self.assertEqual(0, stats['misses'])
+        self.assertEqual(3, stats['directory_size'])
+
+    def test_directory_limit_is_shared(self):
+        cache = history_cache.HistoryCache(100, self.directory, 10)
+        other = history_cache.HistoryCache(100, self.directory, 10)
+
+        cache.put('a', b'aaaa')
+        other.put('b', b'bbbb')
+        cache.put('c', b'cccc')
+
+        # the files of the other process are only counted once this one
+        # finds its own to exceed the limit
+        self.assertEqual(['a', 'b', 'c'], sorted(os.listdir(self.directory)))
+
+        cache.put('d', b'dddd')
+
+        self.assertEqual(['c', 'd'], sorted(os.listdir(self.directory)))
+        self.assertEqual(8, cache.stats()['directory_size'])
+
+    def test_directory_evicts_below_limit(self):
+        cache = history_cache.HistoryCache(100, self.directory, 100)
+
+        for key in 'abcdefghijk':
+            cache.put(key, b'x' * 10)
+
+        # room is made for more than the file that didn't fit
+        self.assertEqual(list('cdefghijk'),
+                         sorted(os.listdir(self.directory)))
+        self.assertEqual(90, cache.stats()['directory_size'])
+
+    @patch('oio_rest.history_cache.tempfile.mkstemp', side_effect=OSError)
+    def test_directory_write_error(self, mock_mkstemp):
+        cache = history_cache.HistoryCache(100, self.directory, 100)
+
+        with self.assertLogs('oio_rest.history_cache'):
+            cache.put('a', b'aaa')
+
+        self.assertEqual(b'aaa', cache.get('a'))
+        self.assertEqual(0, cache.stats()['directory_size'])
+
+    def test_directory_evicted_elsewhere(self):
+        cache = history_cache.HistoryCache(100, self.directory, 100)
+        cache.put('a', b'aaa')
+
+        other = history_cache.HistoryCache(100, self.directory, 100)
+        os.unlink(os.path.join(self.directory, 'a'))
+
+        self.assertIsNone(other.get('a'))
+        self.assertEqual(0, other.stats()['directory_size'])
+
+    def test_is_historical(self):
+        for args, expected in [
+            ({}, False),
+            ({'registreringstid': '2018-01-01'}, False),
+            ({'virkningstid': '2018-01-01'}, False),
+            ({'registreretfra': '2018-01-01',
+              'virkningstid': '2018-01-01'}, False),
+            ({'registreringstid': '2018-01-01',
+              'virkningstid': '2018-01-01'}, True),
+            ({'registrerettil': '2018-01-01',
+              'virkningfra': '-infinity'}, True),
+        ]:
+            with self.subTest(**args):
+                self.assertEqual(expected,
+                                 history_cache.is_historical(args))
+
+    @patch('oio_rest.history_cache.cache',
+           new=history_cache.HistoryCache(1000))
+    @patch('oio_rest.history_cache.db')
+    def test_list_objects(self, mock_db):
+        mock_db.list_objects.return_value = ([{'id': 'uuid'}],)
+
+        for registrations, calls in [
+            (None, 2),
+            (['UTC', '1 ["2018-01-01 00:00:00+00","2019-01-01 00:00:00+00")'],
+             1),
+        ]:
+            with self.subTest(registrations=registrations):
+                mock_db.reset_mock()
+                mock_db.get_past_registrations.return_value = registrations
+
+                for i in range(2):
+                    self.assertEqual(
+                        [{'id': 'uuid'}],
+                        history_cache.list_objects(
+                            'Klasse', ['uuid'], '2018-06-01', None,
+                            '2018-06-01', None,
+                        )[0],
+                    )
+
+                self.assertEqual(calls, mock_db.list_objects.call_count)
+
+    @patch('oio_rest.history_cache.cache',
+           new=history_cache.HistoryCache(1000))
+    @patch('oio_rest.history_cache.db')
+    def test_iter_objects(self, mock_db):
+        mock_db.iter_objects.side_effect = lambda *args: iter([{'id': 'uuid'}])
+        mock_db.get_past_registrations.return_value = [
+            'UTC', '1 ["2018-01-01 00:00:00+00","2019-01-01 00:00:00+00")',
+        ]
+
+        for i in range(2):
+            self.assertEqual(
+                [{'id': 'uuid'}],
+                list(history_cache.iter_objects(
+                    'Klasse', ['uuid'], '2018-06-01', None, '2018-06-01', None,
+                )),
+            )
+
+        # read on the connection of the iterator, and shared with reads
+        # of the same listing
+        self.assertEqual(
+            [{'id': 'uuid'}],
+            history_cache.list_objects(
+                'Klasse', ['uuid'], '2018-06-01', None, '2018-06-01', None,
+            )[0],
+        )
+
+        mock_db.iter_objects.assert_called_once_with(
+            'Klasse', ['uuid'], '2018-06-01', None, '2018-06-01', None,
+        )
+        mock_db.list_objects.assert_not_called()
+
+    @patch('oio_rest.history_cache.settings.DO_ENABLE_RESTRICTIONS',
+           new=True)
+    @patch('oio_rest.history_cache.get_authenticated_user', new=lambda: None)
+    @patch('oio_rest.history_cache.get_restrictions')
+    def test_key_includes_restrictions(self, mock_restrictions):
+        def get_key():
+            return history_cache.get_key('Klasse', ['uuid'], 'a', 'b', 'c',
+                                         'd', ['UTC'])
+
+        mock_restrictions.return_value = None
+        unrestricted = get_key()
+
+        mock_restrictions.return_value = [{'states': {}}]
+        restricted = get_key()
+
+        self.assertNotEqual(unrestricted, restricted)
+        self.assertEqual(restricted, get_key())
+
+        mock_restrictions.return_value = [{'states': {'b': 1, 'a': 2}}]
+        reordered = get_key()
+
+        mock_restrictions.return_value = [{'states': {'a': 2, 'b': 1}}]
+        self.assertEqual(reordered, get_key())
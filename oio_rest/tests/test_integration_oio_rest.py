@@ -6,6 +6,12 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 #
 
+import datetime
+import json
+from unittest import mock
+
+from oio_rest import current_cache, db, history_cache
+
 from tests import util
 
 
@@ -46,3 +52,286 @@ class Tests(util.TestCase):
         actual = self.get(path, uuid=uuid)
 
         self.assertRegistrationsEqual(expected, actual)
+
+    def test_search_pages_with_continuation_token(self):
+        path = '/klassifikation/klasse'
+        klasse = util.get_fixture('klasse_opret.json')
+        uuids = {}
+
+        for bvn in ('PAGE-B', 'PAGE-D', 'PAGE-A', 'PAGE-C', 'PAGE-E'):
+            klasse['attributter']['klasseegenskaber'][0][
+                'brugervendtnoegle'] = bvn
+            uuids[bvn] = self.post(path, klasse)
+
+        params = {'bvn': 'PAGE-%', 'maximalantalresultater': 2}
+
+        r = self.perform_request(path, query_string=params)
+        self.assertOK(r)
+        self.assertEqual([uuids['PAGE-A'], uuids['PAGE-B']],
+                         r.json['results'][0])
+
+        # an object on a page already seen doesn't shift the next one
+        self.assertOK(self.perform_request(
+            '{}/{}'.format(path, uuids['PAGE-A']), method='DELETE',
+        ))
+
+        pages = []
+
+        while 'fortsaettelse' in r.json:
+            r = self.perform_request(path, query_string=dict(
+                params, fortsaettelse=r.json['fortsaettelse'],
+            ))
+            self.assertOK(r)
+
+            pages.append(r.json['results'][0])
+
+        self.assertEqual(
+            [
+                [uuids['PAGE-C'], uuids['PAGE-D']],
+                [uuids['PAGE-E']],
+            ],
+            pages,
+        )
+
+    def test_search_pages_by_current_sort_key(self):
+        path = '/klassifikation/klasse'
+        klasse = util.get_fixture('klasse_opret.json')
+        uuids = {}
+
+        for bvn in ('PAGE-A', 'PAGE-B', 'PAGE-C'):
+            klasse['attributter']['klasseegenskaber'][0][
+                'brugervendtnoegle'] = bvn
+            uuids[bvn] = self.post(path, klasse)
+
+        conn = db.get_pool().getconn()
+
+        try:
+            with conn, conn.cursor() as cursor:
+                cursor.execute(
+                    'SELECT klasse_id, sorteringsnoegle FROM klasse_aktuel',
+                )
+                self.assertEqual(
+                    {uuid: [bvn] for bvn, uuid in uuids.items()},
+                    dict(cursor.fetchall()),
+                )
+
+                # the sort key stored with the current registration is
+                # the one searches for the current time are sorted by
+                cursor.execute(
+                    "UPDATE klasse_aktuel SET sorteringsnoegle = '{PAGE-0}' "
+                    "WHERE klasse_id = %s", (uuids['PAGE-C'],),
+                )
+        finally:
+            db.get_pool().putconn(conn)
+
+        r = self.perform_request(path, query_string={
+            'bvn': 'PAGE-%', 'maximalantalresultater': 2,
+        })
+        self.assertOK(r)
+        self.assertEqual([uuids['PAGE-C'], uuids['PAGE-A']],
+                         r.json['results'][0])
+
+        r = self.perform_request(path, query_string={
+            'bvn': 'PAGE-%', 'maximalantalresultater': 2,
+            'fortsaettelse': r.json['fortsaettelse'],
+        })
+        self.assertOK(r)
+        self.assertEqual([uuids['PAGE-B']], r.json['results'][0])
+
+    def test_past_registrations_are_cached(self):
+        uuid = "931ee7bf-10d6-4cc3-8938-83aa6389aaba"
+        path = '/organisation/bruger'
+
+        cache = history_cache.HistoryCache(2 ** 20)
+
+        self.load_fixture(path, 'test_bruger.json', uuid)
+
+        created = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+        with mock.patch('oio_rest.history_cache.cache', cache):
+            self.get(path, uuid=uuid, registreringstid=created,
+                     virkningstid='2004-01-01')
+
+            # the current registration may still change
+            self.assertEqual(0, cache.stats()['entries'])
+
+            self.patch("{}/{}".format(path, uuid), json={
+                'egenskaber': {},
+                'tilstande': {},
+                'relationer': {},
+            })
+
+            # the patch ended the registration, which is now in the past
+            expected = self.get(path, uuid=uuid, registreringstid=created,
+                                virkningstid='2004-01-01')
+
+            for i in range(2):
+                self.assertEqual(
+                    expected,
+                    self.get(path, uuid=uuid, registreringstid=created,
+                             virkningstid='2004-01-01'),
+                )
+
+                r = self.perform_request(
+                    '{}/{}'.format(path, uuid),
+                    query_string={'registreringstid': created,
+                                  'virkningstid': '2004-01-01'},
+                )
+                self.assertOK(r)
+
+        # reading and listing the object share the entry
+        stats = cache.stats()
+        self.assertEqual(1, stats['entries'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(4, stats['hits'])
+
+    def test_current_objects_are_cached(self):
+        uuid = "931ee7bf-10d6-4cc3-8938-83aa6389aaba"
+        path = '/organisation/bruger'
+
+        self.load_fixture(path, 'test_bruger.json', uuid)
+
+        expected = self.get(path, uuid=uuid)
+
+        cache = current_cache.CurrentCache(2 ** 20)
+        cache.clear(following=True)
+
+        with mock.patch('oio_rest.current_cache.cache', cache), \
+                mock.patch.object(cache, 'start'):
+            for i in range(2):
+                self.assertEqual(expected, self.get(path, uuid=uuid))
+
+        stats = cache.stats()
+        self.assertEqual(1, stats['entries'])
+        self.assertEqual(1, stats['hits'])
+
+    @mock.patch('oio_rest.settings.CHANGES_STREAM_DURATION', 0)
+    @mock.patch('oio_rest.settings.DO_ENABLE_RESTRICTIONS', True)
+    # the stream ends before waiting for notifications
+    @mock.patch('oio_rest.changes.get_listener')
+    @mock.patch('oio_rest.db.get_restrictions')
+    def test_changes_feed_applies_restrictions(self, mock_restrictions,
+                                               mock_get_listener):
+        path = '/organisation/bruger'
+        visible = "931ee7bf-10d6-4cc3-8938-83aa6389aaba"
+        hidden = "a2e52bd6-7f1e-4d8c-9c1d-0f5b5a3f9a61"
+
+        mock_restrictions.return_value = None
+
+        self.load_fixture(path, 'test_bruger.json', visible)
+        self.load_fixture(path, 'test_bruger.json', hidden)
+        self.patch('{}/{}'.format(path, hidden), json={
+            'attributter': {
+                'brugeregenskaber': [{
+                    'brugervendtnoegle': 'fedtmule',
+                    'virkning': {'from': '-infinity', 'to': 'infinity'},
+                }],
+            },
+        })
+
+        def get_changed_uuids():
+            r = self.perform_request('/changes',
+                                     headers={'Last-Event-ID': '0-0'})
+            self.assertOK(r)
+
+            return {
+                json.loads(line[len('data: '):])['objektID']
+                for line in r.get_data(as_text=True).splitlines()
+                if line.startswith('data: ')
+            }
+
+        self.assertEqual({visible, hidden}, get_changed_uuids())
+
+        mock_restrictions.side_effect = lambda user, class_name, op: (
+            [({}, {'brugervendtnoegle': 'andersand'}, {})]
+            if class_name == 'Bruger' else None
+        )
+
+        self.assertEqual({visible}, get_changed_uuids())
+
+        # a user who may read no users gets no changes to them
+        mock_restrictions.side_effect = lambda user, class_name, op: (
+            [] if class_name == 'Bruger' else None
+        )
+
+        self.assertEqual(set(), get_changed_uuids())
+
+    def test_prune_outbox_keeps_unpublished_changes(self):
+        path = '/organisation/bruger'
+
+        for uuid in ("931ee7bf-10d6-4cc3-8938-83aa6389aaba",
+                     "a2e52bd6-7f1e-4d8c-9c1d-0f5b5a3f9a61"):
+            self.load_fixture(path, 'test_bruger.json', uuid)
+
+        conn = db.get_pool().getconn()
+
+        def prune(keep):
+            with conn, conn.cursor() as cursor:
+                cursor.execute('SELECT prune_mox_outbox(%s)', (keep,))
+                (pruned,) = cursor.fetchone()
+
+                cursor.execute('SELECT txid, id FROM mox_outbox '
+                               'ORDER BY txid, id')
+
+                return pruned, cursor.fetchall()
+
+        try:
+            with conn, conn.cursor() as cursor:
+                cursor.execute("INSERT INTO mox_outbox_checkpoint (relay) "
+                               "VALUES ('relay')")
+
+            # nothing has been published
+            pruned, rows = prune('0')
+            self.assertEqual(0, pruned)
+            self.assertGreater(len(rows), 1)
+
+            with conn, conn.cursor() as cursor:
+                cursor.execute("UPDATE mox_outbox_checkpoint "
+                               "SET txid = %s, id = %s", rows[0])
+
+            # the first change has been published, but is too recent
+            self.assertEqual((0, rows), prune('1 day'))
+
+            self.assertEqual((1, rows[1:]), prune('0'))
+        finally:
+            db.get_pool().putconn(conn)
+
+    def test_changes_wait_for_writing_transactions(self):
+        uuid = "931ee7bf-10d6-4cc3-8938-83aa6389aaba"
+        path = '/organisation/bruger'
+
+        def get_changes():
+            r = self.perform_request(path + '/changes',
+                                     query_string={'since': '2000-01-01'})
+            self.assertOK(r)
+
+            return [change['uuid'] for change in r.json['results']]
+
+        conn = db.get_pool().getconn()
+
+        try:
+            with conn.cursor() as cursor:
+                # a transaction reading for a long time holds nothing back
+                cursor.execute('SELECT 1')
+
+                self.load_fixture(path, 'test_bruger.json', uuid)
+
+                self.assertEqual([uuid], get_changes())
+
+                conn.rollback()
+
+                # but one that has written might still add registrations
+                # started before those made since
+                cursor.execute('SELECT txid_current()')
+
+                self.patch('{}/{}'.format(path, uuid), json={
+                    'note': 'changed',
+                })
+
+                self.assertEqual([uuid], get_changes())
+
+            conn.rollback()
+
+            self.assertEqual([uuid, uuid], get_changes())
+        finally:
+            db.get_pool().putconn(conn)
@@ -0,0 +1,195 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+from unittest import mock
+
+from oio_rest import db
+from oio_rest.utils import build_registration
+from tests import util
+
+
+# Searches run by both search engines, as the path, the parameters and
+# whether the order of the results matters.
+SEARCHES = [
+    ('/klassifikation/klasse', {'bvn': 'ORGFUNK'}, False),
+    ('/klassifikation/klasse', {'bvn': 'org%'}, False),
+    ('/klassifikation/klasse', {'bvn': 'nothing'}, False),
+    ('/klassifikation/klasse', {'titel': 'XYZ', 'bvn': '%'}, False),
+    ('/klassifikation/klasse', {'bvn': ['ORGFUNK', 'ORGFUNK2']}, False),
+    ('/klassifikation/klasse', {'omfang': 'magenta', 'retskilde': 'Ja'},
+     False),
+    ('/klassifikation/klasse', {'publiceret': 'Publiceret'}, False),
+    ('/klassifikation/klasse', {'publiceret': 'IkkePubliceret'}, False),
+    ('/klassifikation/klasse',
+     {'ansvarlig': 'ddc99abd-c1b0-48c2-aef7-74fea841adae'}, False),
+    ('/klassifikation/klasse',
+     {'redaktoerer': ['ef2713ee-1a38-4c23-8fcb-3c4331262194',
+                      'ddc99abd-c1b0-48c2-aef7-74fea841adae']}, False),
+    ('/klassifikation/klasse',
+     {'ansvarlig:Bruger': 'ddc99abd-c1b0-48c2-aef7-74fea841adae'}, False),
+    ('/klassifikation/klasse',
+     {'ansvarlig:Organisation': 'ddc99abd-c1b0-48c2-aef7-74fea841adae'},
+     False),
+    ('/klassifikation/klasse', {'vilkaarligattr': 'Hierarkisk'}, False),
+    ('/klassifikation/klasse', {'vilkaarligattr': 'Vores kunde'}, False),
+    ('/klassifikation/klasse', {'vilkaarligattr': ['XYZ', 'Magenta']},
+     False),
+    ('/klassifikation/klasse',
+     {'vilkaarligrel': 'ef2713ee-1a38-4c23-8fcb-3c4331262194'}, False),
+    ('/klassifikation/klasse',
+     {'vilkaarligrel': ['ef2713ee-1a38-4c23-8fcb-3c4331262194',
+                        '00000000-0000-0000-0000-000000000000']}, False),
+    ('/klassifikation/klasse',
+     {'bvn': '%', 'livscykluskode': 'Opstaaet'}, False),
+    ('/klassifikation/klasse',
+     {'bvn': '%', 'livscykluskode': 'Rettet'}, False),
+    ('/klassifikation/klasse',
+     {'bvn': '%', 'virkningstid': '2013-01-01'}, False),
+    ('/klassifikation/klasse',
+     {'bvn': '%', 'virkningfra': '2015-01-01', 'virkningtil': '2016-01-01'},
+     False),
+    ('/klassifikation/klasse',
+     {'bvn': '%', 'registreringstid': '2000-01-01'}, False),
+    ('/klassifikation/klasse',
+     {'bvn': '%', 'maximalantalresultater': 1}, True),
+    ('/klassifikation/klasse',
+     {'bvn': '%', 'foersteresultat': 1, 'maximalantalresultater': 10},
+     True),
+    ('/aktivitet/aktivitet', {'bvn': 'JOGGING', 'status': 'Aktiv'}, False),
+    ('/aktivitet/aktivitet',
+     {'ansvarlig': 'abcdeabd-c1b0-48c2-aef7-74fea841adae'}, False),
+    ('/aktivitet/aktivitet',
+     {'vilkaarligrel': '0e3ed41a-08f2-4967-8689-dce625f93029'}, False),
+    ('/sag/sag', {'bvn': 'SAG%', 'fremdrift': 'Opstaaet'}, False),
+    ('/sag/sag',
+     {'andrebehandlere': 'ef2713ee-1a38-4c23-8fcb-3c4331262194'}, False),
+    ('/tilstand/tilstand', {'bvn': 'RASK', 'status': 'Aktiv'}, False),
+    ('/organisation/organisationenhed',
+     {'overordnet': '456362c4-0ee4-4e5e-a72c-751239745e62',
+      'gyldighed': 'Aktiv'}, False),
+    ('/organisation/organisationenhed', {'bvn': 'root', 'uuid': None},
+     False),
+    ('/indsats/indsats', {'bvn': 'BESOEG'}, False),
+]
+
+# Searches of journal posts, which are only available to callers of
+# db.search_objects, as their parameters and whether they find the case.
+JOURNAL_POST_SEARCHES = [
+    ({'journalpostkode': ['vedlagtdokument']}, True),
+    ({'journalpostkode': ['journalnotat']}, True),
+    ({'journalnotat.titel': ['kommentarer%']}, True),
+    ({'journalnotat.titel': ['nothing']}, False),
+    ({'journaldokument.offentlighedundtaget.alternativtitel': ['Fortroligt!'],
+      'journaldokument.dokumenttitel': ['Rapport%']}, True),
+]
+
+
+class Tests(util.TestCase):
+    def search(self, path, **params):
+        r = self.perform_request(path, query_string=params)
+
+        self.assertOK(r)
+
+        return r.json['results'][0]
+
+    def test_engines_agree(self):
+        self.load_fixture('/klassifikation/klasse', 'klasse_opret.json')
+        klasse = self.load_fixture('/klassifikation/klasse',
+                                   'klasse_opret.json')
+        self.load_fixture('/aktivitet/aktivitet', 'aktivitet_opret.json')
+        self.load_fixture('/sag/sag', 'sag_opret.json')
+        self.load_fixture('/tilstand/tilstand', 'tilstand_opret.json')
+        enhed = self.load_fixture('/organisation/organisationenhed',
+                                  'organisationenhed_opret.json')
+        self.load_fixture('/indsats/indsats', 'indsats_opret.json')
+
+        self.patch('/klassifikation/klasse/{}'.format(klasse), {
+            'attributter': {
+                'klasseegenskaber': [
+                    {
+                        'brugervendtnoegle': 'ORGFUNK2',
+                        'virkning': {
+                            'from': '2015-01-01',
+                            'to': 'infinity',
+                        },
+                    },
+                ],
+            },
+        })
+
+        for path, params, ordered in SEARCHES:
+            if 'uuid' in params:
+                params = dict(params, uuid=enhed)
+
+            with self.subTest(path=path, **params):
+                with mock.patch('oio_rest.settings.SEARCH_ENGINE',
+                                'function'):
+                    expected = self.search(path, **params)
+
+                with mock.patch('oio_rest.settings.SEARCH_ENGINE', 'query'):
+                    actual = self.search(path, **params)
+
+                if ordered:
+                    self.assertEqual(expected, actual)
+                else:
+                    self.assertEqual(sorted(expected), sorted(actual))
+
+    def test_engines_agree_on_pages(self):
+        for i in range(5):
+            self.load_fixture('/klassifikation/klasse', 'klasse_opret.json')
+
+        params = {'bvn': '%', 'maximalantalresultater': 2}
+
+        for engine in ('function', 'query'):
+            with mock.patch('oio_rest.settings.SEARCH_ENGINE', engine):
+                r = self.perform_request('/klassifikation/klasse',
+                                         query_string=params)
+                self.assertOK(r)
+
+                with self.subTest(engine=engine):
+                    pages = [r.json['results'][0]]
+
+                    while 'fortsaettelse' in r.json:
+                        r = self.perform_request(
+                            '/klassifikation/klasse',
+                            query_string=dict(
+                                params, fortsaettelse=r.json['fortsaettelse'],
+                            ),
+                        )
+                        self.assertOK(r)
+
+                        pages.append(r.json['results'][0])
+
+                    if engine == 'function':
+                        expected = pages
+                    else:
+                        self.assertEqual(expected, pages)
+
+        self.assertEqual(5, sum(map(len, expected)))
+
+    def test_engines_agree_on_journal_posts(self):
+        sag = self.load_fixture('/sag/sag', 'sag_opret.json')
+
+        for params, found in JOURNAL_POST_SEARCHES:
+            with self.subTest(**params):
+                results = {}
+
+                for engine in ('function', 'query'):
+                    registration = build_registration.build_registration(
+                        'Sag', params,
+                    )
+
+                    with mock.patch('oio_rest.settings.SEARCH_ENGINE',
+                                    engine), \
+                            self.app.test_request_context():
+                        uuids, _ = db.search_objects('Sag', None,
+                                                     registration)
+                        results[engine] = uuids[0]
+
+                self.assertEqual(results['function'], results['query'])
+                self.assertEqual([sag] if found else [], results['query'])
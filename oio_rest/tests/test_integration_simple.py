@@ -30,74 +30,91 @@ class Tests(util.TestCase):
                     "/",
                     "/aktivitet/aktivitet",
                     "/aktivitet/aktivitet/" + UUID_PATTERN,
+                    "/aktivitet/aktivitet/changes",
                     "/aktivitet/aktivitet/fields",
                     "/aktivitet/aktivitet/schema",
                     "/aktivitet/classes",
+                    "/changes",
                     "/dokument/classes",
                     "/dokument/dokument",
                     "/dokument/dokument/" + UUID_PATTERN,
                     "/dokument/dokument/" + CONTENT_PATH_PATTERN,
+                    "/dokument/dokument/changes",
                     "/dokument/dokument/fields",
                     "/dokument/dokument/schema",
                     "/get-token",
                     "/indsats/classes",
                     "/indsats/indsats",
                     "/indsats/indsats/" + UUID_PATTERN,
+                    "/indsats/indsats/changes",
                     "/indsats/indsats/fields",
                     "/indsats/indsats/schema",
                     "/klassifikation/classes",
                     "/klassifikation/facet",
                     "/klassifikation/facet/" + UUID_PATTERN,
+                    "/klassifikation/facet/changes",
                     "/klassifikation/facet/fields",
                     "/klassifikation/facet/schema",
                     "/klassifikation/klasse",
                     "/klassifikation/klasse/" + UUID_PATTERN,
+                    "/klassifikation/klasse/changes",
                     "/klassifikation/klasse/fields",
                     "/klassifikation/klasse/schema",
                     "/klassifikation/klassifikation",
                     "/klassifikation/klassifikation/" + UUID_PATTERN,
+                    "/klassifikation/klassifikation/changes",
                     "/klassifikation/klassifikation/fields",
                     "/klassifikation/klassifikation/schema",
                     "/log/classes",
                     "/log/loghaendelse",
                     "/log/loghaendelse/" + UUID_PATTERN,
+                    "/log/loghaendelse/changes",
                     "/log/loghaendelse/fields",
                     "/log/loghaendelse/schema",
                     "/organisation/bruger",
                     "/organisation/bruger/" + UUID_PATTERN,
+                    "/organisation/bruger/changes",
                     "/organisation/bruger/fields",
                     "/organisation/bruger/schema",
                     "/organisation/classes",
                     "/organisation/interessefaellesskab",
                     "/organisation/interessefaellesskab/" + UUID_PATTERN,
+                    "/organisation/interessefaellesskab/changes",
                     "/organisation/interessefaellesskab/fields",
                     "/organisation/interessefaellesskab/schema",
                     "/organisation/itsystem",
                     "/organisation/itsystem/" + UUID_PATTERN,
+                    "/organisation/itsystem/changes",
                     "/organisation/itsystem/fields",
                     "/organisation/itsystem/schema",
                     "/organisation/organisation",
                     "/organisation/organisation/" + UUID_PATTERN,
+                    "/organisation/organisation/changes",
                     "/organisation/organisation/fields",
                     "/organisation/organisation/schema",
                     "/organisation/organisationenhed",
                     "/organisation/organisationenhed/" + UUID_PATTERN,
+                    "/organisation/organisationenhed/changes",
                     "/organisation/organisationenhed/fields",
                     "/organisation/organisationenhed/schema",
                     "/organisation/organisationfunktion",
                     "/organisation/organisationfunktion/" + UUID_PATTERN,
+                    "/organisation/organisationfunktion/changes",
                     "/organisation/organisationfunktion/fields",
                     "/organisation/organisationfunktion/schema",
                     "/sag/classes",
                     "/sag/sag",
                     "/sag/sag/" + UUID_PATTERN,
+                    "/sag/sag/changes",
                     "/sag/sag/fields",
                     "/sag/sag/schema",
                     "/site-map",
                     "/static/<path:filename>",
+                    "/stats",
                     "/tilstand/classes",
                     "/tilstand/tilstand",
                     "/tilstand/tilstand/" + UUID_PATTERN,
+                    "/tilstand/tilstand/changes",
                     "/tilstand/tilstand/fields",
                     "/tilstand/tilstand/schema",
                 ]
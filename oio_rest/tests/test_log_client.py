@@ -0,0 +1,209 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+import os
+import tempfile
+import unittest
+
+import pika
+from mock import patch
+
+from oio_rest import log_client
+
+
+@patch('oio_rest.log_client.LogPublisher._start')
+@patch('oio_rest.log_client.pika.BlockingConnection')
+class TestLogPublisher(unittest.TestCase):
+    def get_publisher(self, **kwargs):
+        kwargs.setdefault('retry_delay', 0)
+
+        return log_client.LogPublisher('localhost', 'mox.log',
+                                       'mox.log_queue', **kwargs)
+
+    def test_publishes_batches_on_one_connection(self, mock_conn_cls,
+                                                 mock_start):
+        channel = mock_conn_cls.return_value.channel.return_value
+        channel.is_closed = False
+
+        publisher = self.get_publisher(batch_size=2)
+
+        for i in range(3):
+            publisher.publish('{}', {'beskedID': str(i)})
+
+        self.assertTrue(publisher._step())
+        self.assertEqual(2, channel.basic_publish.call_count)
+        self.assertEqual(1, publisher.stats()['size'])
+
+        self.assertTrue(publisher._step())
+        self.assertEqual(3, channel.basic_publish.call_count)
+
+        mock_conn_cls.assert_called_once()
+        channel.tx_select.assert_called_once_with()
+        self.assertEqual(2, channel.tx_commit.call_count)
+
+        self.assertEqual(
+            ['0', '1', '2'],
+            [
+                call[1]['properties'].headers['beskedID']
+                for call in channel.basic_publish.call_args_list
+            ],
+        )
+
+        stats = publisher.stats()
+        self.assertEqual(3, stats['queued'])
+        self.assertEqual(3, stats['published'])
+        self.assertEqual(0, stats['size'])
+
+    def test_requeues_uncommitted_batch_and_reconnects(self, mock_conn_cls,
+                                                       mock_start):
+        channel = mock_conn_cls.return_value.channel.return_value
+        channel.is_closed = False
+        channel.tx_commit.side_effect = [
+            pika.exceptions.ChannelClosed(),
+            None,
+        ]
+
+        publisher = self.get_publisher()
+
+        for i in range(3):
+            publisher.publish('{}', {'beskedID': str(i)})
+
+        self.assertTrue(publisher._step())
+
+        stats = publisher.stats()
+        self.assertEqual(0, stats['published'])
+        self.assertEqual(3, stats['size'])
+        self.assertEqual(1, stats['failures'])
+
+        self.assertTrue(publisher._step())
+
+        stats = publisher.stats()
+        self.assertEqual(3, stats['published'])
+        self.assertEqual(0, stats['size'])
+        self.assertEqual(2, stats['connects'])
+
+        self.assertEqual(
+            ['0', '1', '2', '0', '1', '2'],
+            [
+                call[1]['properties'].headers['beskedID']
+                for call in channel.basic_publish.call_args_list
+            ],
+        )
+
+    def test_drop_oldest(self, mock_conn_cls, mock_start):
+        publisher = self.get_publisher(maxsize=2, overflow='drop-oldest')
+
+        for i in range(3):
+            publisher.publish('{}', {'beskedID': str(i)})
+
+        self.assertEqual(
+            ['1', '2'],
+            [headers['beskedID'] for body, headers in publisher._events],
+        )
+        self.assertEqual(1, publisher.stats()['dropped'])
+
+    @patch('oio_rest.log_client.threading.Condition.wait_for')
+    def test_block_times_out(self, mock_wait_for, mock_conn_cls,
+                             mock_start):
+        publisher = self.get_publisher(maxsize=2, block_timeout=0.5)
+
+        for i in range(3):
+            publisher.publish('{}', {'beskedID': str(i)})
+
+        mock_wait_for.assert_called_once()
+        self.assertEqual(0.5, mock_wait_for.call_args[0][1])
+
+        self.assertEqual(
+            ['1', '2'],
+            [headers['beskedID'] for body, headers in publisher._events],
+        )
+        self.assertEqual(1, publisher.stats()['dropped'])
+
+    def test_block_until_room(self, mock_conn_cls, mock_start):
+        publisher = self.get_publisher(maxsize=2, block_timeout=0.5)
+
+        for i in range(2):
+            publisher.publish('{}', {'beskedID': str(i)})
+
+        def make_room(predicate, timeout):
+            publisher._events.popleft()
+            return predicate()
+
+        with patch.object(publisher._cond, 'wait_for',
+                          side_effect=make_room) as mock_wait_for:
+            publisher.publish('{}', {'beskedID': '2'})
+
+        mock_wait_for.assert_called_once()
+
+        self.assertEqual(
+            ['1', '2'],
+            [headers['beskedID'] for body, headers in publisher._events],
+        )
+
+        stats = publisher.stats()
+        self.assertEqual(0, stats['dropped'])
+        self.assertEqual(0, stats['spilled'])
+        self.assertEqual(3, stats['queued'])
+
+    def test_spill_to_disk(self, mock_conn_cls, mock_start):
+        channel = mock_conn_cls.return_value.channel.return_value
+
+        with tempfile.TemporaryDirectory() as spill_dir:
+            publisher = self.get_publisher(maxsize=1, overflow='spill',
+                                           spill_dir=spill_dir)
+
+            for i in range(3):
+                publisher.publish('{}', {'beskedID': str(i)})
+
+            self.assertEqual(1, publisher.stats()['size'])
+            self.assertEqual(2, publisher.stats()['spilled'])
+
+            # the first step publishes the queued event, the next one
+            # reads the spilled event back, spilling the other again
+            self.assertTrue(publisher._step())
+            self.assertTrue(publisher._step())
+            self.assertTrue(publisher._step())
+
+            self.assertEqual(
+                ['0', '1', '2'],
+                [
+                    call[1]['properties'].headers['beskedID']
+                    for call in channel.basic_publish.call_args_list
+                ],
+            )
+            self.assertEqual([], os.listdir(spill_dir))
+
+    def test_invalid_overflow(self, mock_conn_cls, mock_start):
+        with self.assertRaises(ValueError):
+            self.get_publisher(overflow='ignore')
+
+        with self.assertRaises(ValueError):
+            self.get_publisher(overflow='spill')
+
+
+@patch('oio_rest.log_client.settings.LOG_AMQP_SERVER', 'localhost')
+@patch('oio_rest.log_client.get_publisher')
+class TestLogServiceCall(unittest.TestCase):
+    def test_queues_event(self, mock_get_publisher):
+        log_client.log_service_call('Organisation', 'Bruger', 'now', 'Opret',
+                                    201, 'Created', '', 'user', 'role',
+                                    'object')
+
+        mock_get_publisher.return_value.publish.assert_called_once()
+
+        body, headers = mock_get_publisher.return_value.publish.call_args[0]
+
+        self.assertEqual('object', headers['beskedID'])
+        self.assertIn('"returkode": 201', body)
+
+    def test_ignored_service(self, mock_get_publisher):
+        log_client.log_service_call('Log', 'LogHaendelse', 'now', 'Opret',
+                                    201, 'Created', '', 'user', 'role',
+                                    'object')
+
+        mock_get_publisher.assert_not_called()
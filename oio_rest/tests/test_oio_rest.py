@@ -21,7 +21,7 @@ from oio_rest.db import db_helpers
 from oio_rest.custom_exceptions import (BadRequestException, NotFoundException,
                                         GoneException)
 from oio_rest.oio_rest import OIOStandardHierarchy, OIORestObject
-from oio_rest import oio_rest, organisation
+from oio_rest import oio_rest, organisation, settings
 from oio_rest.utils import test_support
 
 
@@ -93,6 +93,30 @@ class TestOIORestObjectCreateApi(TestCase):
                              self.testclass.create_object,
                              self.flask.add_url_rule.call_args_list)
 
+    def test_create_api_adds_create_objects_rule(self):
+        self.testclass.create_api(hierarchy="Hierarchy", flask=self.flask,
+                                  base_url="URL")
+        self.flask.add_url_rule.assert_called()
+        self.assert_api_rule("TestClassRestObject_create_objects", "POST",
+                             self.testclass.create_objects,
+                             self.flask.add_url_rule.call_args_list)
+
+    def test_create_api_adds_list_objects_rule(self):
+        self.testclass.create_api(hierarchy="Hierarchy", flask=self.flask,
+                                  base_url="URL")
+        self.flask.add_url_rule.assert_called()
+        self.assert_api_rule("TestClassRestObject_list_objects", "POST",
+                             self.testclass.list_objects,
+                             self.flask.add_url_rule.call_args_list)
+
+    def test_create_api_adds_get_changes_rule(self):
+        self.testclass.create_api(hierarchy="Hierarchy", flask=self.flask,
+                                  base_url="URL")
+        self.flask.add_url_rule.assert_called()
+        self.assert_api_rule("TestClassRestObject_get_changes", "GET",
+                             self.testclass.get_changes,
+                             self.flask.add_url_rule.call_args_list)
+
     def test_create_api_adds_delete_object_rule(self):
         self.testclass.create_api(hierarchy="Hierarchy", flask=self.flask,
                                   base_url="URL")
@@ -123,11 +147,7 @@ class TestOIORestObject(TestCase):
     def setUp(self):
         self.testclass = TestClassRestObject()
         self.app = flask.Flask(__name__)
-        db_helpers._search_params = {}
-        db_helpers._attribute_fields = {}
-        db_helpers._attribute_names = {}
-        db_helpers._relation_names = {}
-        db_helpers._state_names = {}
+        db_helpers._registry = None
 
     def test_get_args_lowercases_arg_keys(self):
         # Arrange
@@ -287,6 +307,143 @@ class TestOIORestObject(TestCase):
         self.assertDictEqual(expected_data, actual_data)
         self.assertEqual(201, actual_code)
 
+    ORGANISATION = {
+        "attributter": {
+            "organisationegenskaber": [
+                {
+                    "brugervendtnoegle": "bvn",
+                    "organisationsnavn": "name",
+                    "virkning": {
+                        "from": "2017-01-01 12:00:00",
+                        "to": "infinity"
+                    }
+                }
+            ]
+        },
+        "tilstande": {
+            "organisationgyldighed": [
+                {
+                    "gyldighed": "Aktiv",
+                    "virkning": {
+                        "from": "2017-01-01 12:00:00",
+                        "to": "infinity"
+                    }
+                }
+            ]
+        },
+    }
+
+    @patch('oio_rest.db.create_or_import_objects')
+    def test_create_objects_returns_uuids(self, mock):
+        # Arrange
+        uuid1 = "c98d1e8b-0655-40a0-8e86-bb0cc07b0d59"
+        uuid2 = "8b55fa3d-ed1c-4a43-93ba-b0ca8e2b1c46"
+
+        mock.return_value = [uuid1, uuid2], [(2, 0.5)], True
+
+        data = [
+            self.ORGANISATION,
+            dict(self.ORGANISATION, uuid=uuid2, note="NOTE"),
+        ]
+
+        expected_data = {
+            "results": [{"uuid": uuid1}, {"uuid": uuid2}],
+            "batches": [{"size": 2, "seconds": 0.5}],
+            "committed": True,
+        }
+
+        # Act
+        with self.app.test_request_context(data=json.dumps(data),
+                                           content_type='application/json',
+                                           method='POST'):
+            result = organisation.Organisation.create_objects()
+            actual_data = json.loads(result[0].get_data(as_text=True))
+            actual_code = result[1]
+
+        # Assert
+        self.assertDictEqual(expected_data, actual_data)
+        self.assertEqual(200, actual_code)
+
+        objects = mock.call_args[0][1]
+        self.assertEqual([None, uuid2], [o[2] for o in objects])
+        self.assertEqual(["", "NOTE"], [o[0] for o in objects])
+
+    @patch('oio_rest.db.create_or_import_objects')
+    def test_create_objects_atomic_rejects_invalid_object(self, mock):
+        # Arrange
+        data = [self.ORGANISATION, {"attributter": {}}]
+
+        # Act
+        with self.app.test_request_context(data=json.dumps(data),
+                                           content_type='application/json',
+                                           method='POST'):
+            result = organisation.Organisation.create_objects()
+            actual_data = json.loads(result[0].get_data(as_text=True))
+            actual_code = result[1]
+
+        # Assert
+        mock.assert_not_called()
+        self.assertEqual(400, actual_code)
+        self.assertFalse(actual_data['committed'])
+        self.assertIsNone(actual_data['results'][0])
+        self.assertEqual(400, actual_data['results'][1]['error']['status'])
+
+    @patch('oio_rest.db.create_or_import_objects')
+    def test_create_objects_best_effort_skips_invalid_object(self, mock):
+        # Arrange
+        uuid = "c98d1e8b-0655-40a0-8e86-bb0cc07b0d59"
+
+        mock.return_value = (
+            [uuid, NotFoundException("gone")], [(2, 0.5)], True,
+        )
+
+        data = '\n'.join([
+            json.dumps(self.ORGANISATION),
+            json.dumps({"attributter": {}}),
+            '',
+            json.dumps(self.ORGANISATION),
+        ])
+
+        # Act
+        with self.app.test_request_context(
+            '/?atomic=false&batchsize=2',
+            data=data,
+            content_type='application/x-ndjson',
+            method='POST',
+        ):
+            result = organisation.Organisation.create_objects()
+            actual_data = json.loads(result[0].get_data(as_text=True))
+            actual_code = result[1]
+
+        # Assert
+        self.assertEqual(200, actual_code)
+        self.assertEqual(
+            [
+                {"uuid": uuid},
+                400,
+                {"error": {"message": "gone", "status": 404}},
+            ],
+            [
+                actual_data['results'][0],
+                actual_data['results'][1]['error']['status'],
+                actual_data['results'][2],
+            ],
+        )
+
+        args = mock.call_args[0]
+        self.assertEqual(2, len(args[1]))
+        self.assertEqual((False, 2), args[2:])
+
+    def test_create_objects_rejects_non_list(self):
+        # Act
+        with self.app.test_request_context(
+            data=json.dumps(self.ORGANISATION),
+            content_type='application/json',
+            method='POST',
+        ):
+            with self.assertRaises(BadRequestException):
+                organisation.Organisation.create_objects()
+
     def test_create_object_with_no_input_returns_uuid_none_and_code_400(
             self):
         # Arrange
@@ -343,14 +500,14 @@ class TestOIORestObject(TestCase):
             self.testclass.get_fields()
 
     @freezegun.freeze_time('2017-01-01', tz_offset=1)
-    @patch('oio_rest.db.list_objects')
+    @patch('oio_rest.db.iter_objects')
     @test_support.patch_db_struct(db_struct)
     def test_get_objects_list_uses_default_params(self,
                                                   mock_list):
         # Arrange
         data = ["1", "2", "3"]
 
-        mock_list.return_value = data
+        mock_list.return_value = iter(data)
 
         virkning_fra = datetime.datetime.now()
         virkning_to = datetime.datetime.now() + datetime.timedelta(
@@ -359,7 +516,7 @@ class TestOIORestObject(TestCase):
         expected_args = ('TestClassRestObject', None, virkning_fra,
                          virkning_to, None, None)
 
-        expected_result = {"results": data}
+        expected_result = {"results": [data]}
 
         # Act
         with self.app.test_request_context(method='GET'):
@@ -373,13 +530,15 @@ class TestOIORestObject(TestCase):
         self.assertEqual(expected_args, actual_args)
         self.assertDictEqual(expected_result, actual_result)
 
-    @patch('oio_rest.db.list_objects')
+    @patch('oio_rest.db.get_past_registrations',
+           new=MagicMock(return_value=None))
+    @patch('oio_rest.db.iter_objects')
     @test_support.patch_db_struct(db_struct)
     def test_get_objects_list_uses_supplied_params(self, mock):
         # Arrange
         data = ["1", "2", "3"]
 
-        mock.return_value = data
+        mock.return_value = iter(data)
 
         uuids = ["942f2aae-6151-4894-ac47-842ab93b161b",
                  "18ac08a3-8158-4b68-81aa-adacb1ea0fb3"]
@@ -393,7 +552,7 @@ class TestOIORestObject(TestCase):
             registreret_fra,
             registreret_til)
 
-        expected_result = {"results": data}
+        expected_result = {"results": [data]}
 
         request_params = {
             "uuid": uuids,
@@ -416,12 +575,12 @@ class TestOIORestObject(TestCase):
         self.assertEqual(expected_args, actual_args)
         self.assertDictEqual(expected_result, actual_result)
 
-    @patch('oio_rest.db.list_objects')
+    @patch('oio_rest.db.iter_objects')
     @test_support.patch_db_struct(db_struct)
     def test_get_objects_returns_empty_list_on_no_results(self, mock):
         # Arrange
 
-        mock.return_value = None
+        mock.return_value = iter([])
 
         # Act
         with self.app.test_request_context(method='GET'):
@@ -433,6 +592,175 @@ class TestOIORestObject(TestCase):
 
         self.assertDictEqual(expected_result, actual_result)
 
+    @patch("oio_rest.db.settings.COALESCE_READS", new=True)
+    @patch("oio_rest.db.get_authenticated_user", new=lambda: "user")
+    @patch("oio_rest.db._reads")
+    @test_support.patch_db_struct(db_struct)
+    def test_reads_are_coalesced(self, mock_reads):
+        # type: (MagicMock) -> None
+        def get_key(**params):
+            with self.app.test_request_context(method='GET',
+                                               query_string=params):
+                self.testclass.get_objects()
+
+            key, func = mock_reads.call.call_args[0]
+
+            return key
+
+        mock_reads.call.return_value = [["1", "2"], None]
+
+        # reads of objects as they take effect now are identical,
+        # regardless of when each was made
+        self.assertEqual(get_key(), get_key())
+        self.assertEqual(get_key(attribut='%'), get_key(attribut='%'))
+
+        self.assertEqual(
+            get_key(virkningstid='2017-01-01'),
+            get_key(virkningstid='2017-01-01'),
+        )
+        self.assertNotEqual(get_key(), get_key(virkningstid='2017-01-01'))
+        self.assertNotEqual(get_key(), get_key(attribut='%'))
+
+    @patch('oio_rest.db.iter_objects')
+    @patch('oio_rest.settings.LIST_BATCH_SIZE', new=2)
+    def test_list_objects_reads_uuids_from_body_in_batches(self, mock):
+        # Arrange
+        uuids = ["942f2aae-6151-4894-ac47-842ab93b161b",
+                 "18ac08a3-8158-4b68-81aa-adacb1ea0fb3",
+                 "e9eea92f-d404-48c4-85e1-222b56013e3e"]
+
+        mock.side_effect = lambda class_name, batch, *args: iter(batch)
+
+        data = {
+            "uuid": uuids,
+            "registreretFra": "registreret_fra",
+            "virkningTil": "virkning_til",
+        }
+
+        # Act
+        with self.app.test_request_context(data=json.dumps(data),
+                                           content_type='application/json',
+                                           method='POST'):
+            result = self.testclass.list_objects()
+            actual_result = json.loads(result.get_data(as_text=True))
+
+        # Assert
+        self.assertEqual({"results": [uuids]}, actual_result)
+        self.assertEqual(
+            [uuids[:2], uuids[2:]],
+            [call_args[0][1] for call_args in mock.call_args_list],
+        )
+        self.assertEqual(
+            ("registreret_fra", None),
+            mock.call_args[0][4:],
+        )
+        self.assertEqual("virkning_til", mock.call_args[0][3])
+
+    @patch('oio_rest.db.iter_objects')
+    @test_support.patch_db_struct(db_struct)
+    def test_get_objects_list_closes_unread_results(self, mock):
+        # Arrange
+        objects = MagicMock()
+        mock.return_value = objects
+
+        # Act
+        with self.app.test_request_context(method='GET'):
+            response = self.testclass.get_objects()
+
+        objects.close.assert_not_called()
+
+        response.close()
+
+        # Assert
+        objects.close.assert_called_once_with()
+
+    @patch('oio_rest.db.iter_objects')
+    @patch('oio_rest.settings.LIST_BATCH_SIZE', new=2)
+    def test_list_objects_closes_batch_being_read(self, mock):
+        # Arrange
+        uuids = ["942f2aae-6151-4894-ac47-842ab93b161b",
+                 "18ac08a3-8158-4b68-81aa-adacb1ea0fb3",
+                 "e9eea92f-d404-48c4-85e1-222b56013e3e"]
+
+        closed = []
+
+        def iter_objects(class_name, batch, *args):
+            # started, like db.iter_objects, so that closing it unread
+            # runs the cleanup
+            def generate():
+                try:
+                    yield
+                    yield from batch
+                finally:
+                    closed.append(batch)
+
+            objects = generate()
+            next(objects)
+
+            return objects
+
+        mock.side_effect = iter_objects
+
+        data = {"uuid": uuids}
+
+        # Act
+        with self.app.test_request_context(data=json.dumps(data),
+                                           content_type='application/json',
+                                           method='POST'):
+            response = self.testclass.list_objects()
+
+            # unread
+            response.close()
+
+            self.assertEqual([uuids[:2]], closed)
+
+            # read part of the way into the second batch
+            response = self.testclass.list_objects()
+            body = iter(response.response)
+
+            for i in range(4):
+                next(body)
+
+            response.close()
+
+        # Assert
+        self.assertEqual([uuids[:2], uuids[:2], uuids[2:]], closed)
+
+    @patch('oio_rest.db.iter_objects')
+    def test_list_objects_rejects_invalid_input(self, mock):
+        for data in [
+            ["942f2aae-6151-4894-ac47-842ab93b161b"],
+            {},
+            {"uuid": "942f2aae-6151-4894-ac47-842ab93b161b"},
+            {"uuid": ["urn:x"]},
+            {"uuid": [], "brugervendtnoegle": "x"},
+        ]:
+            with self.subTest(data), \
+                    self.app.test_request_context(
+                        data=json.dumps(data),
+                        content_type='application/json',
+                        method='POST'), \
+                    self.assertRaises(BadRequestException):
+                self.testclass.list_objects()
+
+        mock.assert_not_called()
+
+    @patch('oio_rest.db.iter_objects')
+    @test_support.patch_db_struct(db_struct)
+    def test_get_objects_list_streams_same_body_as_jsonify(self, mock):
+        # Arrange
+        data = [{"id": "1", "b": [1, 2]}, {"id": "2", "a": None}]
+
+        mock.return_value = iter(data)
+
+        # Act
+        with self.app.test_request_context(method='GET'):
+            response = self.testclass.get_objects()
+            expected_body = flask.jsonify({"results": [data]}).get_data()
+
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(expected_body, response.get_data())
+
     @freezegun.freeze_time('2017-01-01', tz_offset=1)
     @test_support.patch_db_struct(db_struct)
     @patch('oio_rest.oio_rest.build_registration')
@@ -442,7 +770,7 @@ class TestOIORestObject(TestCase):
         # Arrange
         data = ["1", "2", "3"]
 
-        mock_search.return_value = data
+        mock_search.return_value = data, None
 
         mock_br.return_value = "REGISTRATION"
 
@@ -483,7 +811,7 @@ class TestOIORestObject(TestCase):
         # Arrange
         data = ["1", "2", "3"]
 
-        mock_search.return_value = data
+        mock_search.return_value = data, None
 
         registration = "REGISTRATION"
         mock_br.return_value = registration
@@ -538,6 +866,203 @@ class TestOIORestObject(TestCase):
         self.assertEqual(expected_args, actual_args)
         self.assertDictEqual(expected_result, actual_result)
 
+    @test_support.patch_db_struct(db_struct)
+    @patch('oio_rest.oio_rest.build_registration')
+    @patch('oio_rest.db.search_objects')
+    def test_get_objects_search_returns_continuation_for_full_page(
+            self, mock_search, mock_br):
+        # Arrange
+        uuids = ["17b9a711-5fb4-43aa-8f8d-fe929d23ea68",
+                 "94d42aaa-884d-42ba-8ced-964ee34b65c4"]
+
+        mock_search.return_value = (uuids,), ["bvn"]
+
+        request_params = {
+            "brugerref": "99809e77-ede6-48f2-b170-2366bdcd20e5",
+            "maximalantalresultater": 2,
+        }
+
+        # Act
+        with self.app.test_request_context(method='GET',
+                                           query_string=request_params):
+            actual_result = json.loads(
+                self.testclass.get_objects().get_data(as_text=True),
+            )
+
+        # Assert
+        self.assertEqual([uuids], actual_result['results'])
+        self.assertEqual(
+            (["bvn"], uuids[-1]),
+            oio_rest.decode_continuation(actual_result['fortsaettelse']),
+        )
+
+    @test_support.patch_db_struct(db_struct)
+    @patch('oio_rest.oio_rest.build_registration')
+    @patch('oio_rest.db.search_objects')
+    def test_get_objects_search_omits_continuation_for_last_page(
+            self, mock_search, mock_br):
+        # Arrange
+        uuids = ["17b9a711-5fb4-43aa-8f8d-fe929d23ea68"]
+
+        mock_search.return_value = (uuids,), ["bvn"]
+
+        request_params = {
+            "brugerref": "99809e77-ede6-48f2-b170-2366bdcd20e5",
+            "maximalantalresultater": 2,
+        }
+
+        # Act
+        with self.app.test_request_context(method='GET',
+                                           query_string=request_params):
+            actual_result = json.loads(
+                self.testclass.get_objects().get_data(as_text=True),
+            )
+
+        # Assert
+        self.assertEqual({"results": [uuids]}, actual_result)
+
+    @test_support.patch_db_struct(db_struct)
+    @patch('oio_rest.oio_rest.build_registration')
+    @patch('oio_rest.db.search_objects')
+    def test_get_objects_search_resumes_from_continuation(self, mock_search,
+                                                          mock_br):
+        # Arrange
+        uuid = "17b9a711-5fb4-43aa-8f8d-fe929d23ea68"
+
+        mock_search.return_value = ([],), None
+
+        request_params = {
+            "brugerref": "99809e77-ede6-48f2-b170-2366bdcd20e5",
+            "maximalantalresultater": 2,
+            "fortsaettelse": oio_rest.encode_continuation(["bvn"], uuid),
+        }
+
+        # Act
+        with self.app.test_request_context(method='GET',
+                                           query_string=request_params):
+            self.testclass.get_objects()
+
+        # Assert
+        self.assertEqual((["bvn"], uuid),
+                         mock_search.call_args[1]['after'])
+
+    @test_support.patch_db_struct(db_struct)
+    @patch('oio_rest.db.search_objects')
+    def test_get_objects_search_raises_on_invalid_continuation(
+            self, mock_search):
+        for token in ("not a token",
+                      oio_rest.encode_continuation(["bvn"], "urn:bvn"),
+                      oio_rest.encode_continuation("bvn", None)):
+            request_params = {
+                "brugerref": "99809e77-ede6-48f2-b170-2366bdcd20e5",
+                "fortsaettelse": token,
+            }
+
+            with self.subTest(token), \
+                    self.app.test_request_context(
+                        method='GET', query_string=request_params), \
+                    self.assertRaises(BadRequestException):
+                self.testclass.get_objects()
+
+        mock_search.assert_not_called()
+
+    @test_support.patch_db_struct(db_struct)
+    @patch('oio_rest.db.search_objects')
+    def test_get_objects_search_continuation_conflicts_with_first_result(
+            self, mock_search):
+        request_params = {
+            "brugerref": "99809e77-ede6-48f2-b170-2366bdcd20e5",
+            "foersteresultat": 10,
+            "fortsaettelse": oio_rest.encode_continuation(
+                ["bvn"], "17b9a711-5fb4-43aa-8f8d-fe929d23ea68",
+            ),
+        }
+
+        with self.app.test_request_context(method='GET',
+                                           query_string=request_params), \
+                self.assertRaises(BadRequestException):
+            self.testclass.get_objects()
+
+        mock_search.assert_not_called()
+
+    @patch('oio_rest.db.get_registrations_since')
+    def test_get_changes_returns_position_of_last_registration(self, mock):
+        # Arrange
+        uuids = ["17b9a711-5fb4-43aa-8f8d-fe929d23ea68",
+                 "94d42aaa-884d-42ba-8ced-964ee34b65c4"]
+        started = datetime.datetime(2019, 1, 17, 15, 2, 39,
+                                    tzinfo=datetime.timezone.utc)
+
+        mock.return_value = [
+            (41, uuids[0], 'Opstaaet', started, True),
+            (42, uuids[1], 'Rettet', started, False),
+        ]
+
+        request_params = {
+            "since": "2019-01-01",
+            "maximalantalresultater": 2,
+        }
+
+        # Act
+        with self.app.test_request_context(method='GET',
+                                           query_string=request_params):
+            actual_result = json.loads(
+                self.testclass.get_changes().get_data(as_text=True),
+            )
+
+        # Assert
+        mock.assert_called_once_with('TestClassRestObject', '2019-01-01', 0,
+                                     2)
+
+        # objects the user may not read are left out, but skipped
+        self.assertEqual(
+            [{
+                "uuid": uuids[0],
+                "livscykluskode": "Opstaaet",
+                "registreringstid": "2019-01-17T15:02:39+00:00",
+            }],
+            actual_result['results'],
+        )
+        self.assertEqual(
+            ("2019-01-17T15:02:39+00:00", 42),
+            oio_rest.decode_change_position(actual_result['fortsaettelse']),
+        )
+
+    @patch('oio_rest.db.get_registrations_since', return_value=[])
+    def test_get_changes_resumes_from_token(self, mock):
+        token = oio_rest.encode_change_position("2019-01-17T15:02:39+00:00",
+                                                42)
+
+        with self.app.test_request_context(method='GET',
+                                           query_string={"since": token}):
+            actual_result = json.loads(
+                self.testclass.get_changes().get_data(as_text=True),
+            )
+
+        mock.assert_called_once_with('TestClassRestObject',
+                                     "2019-01-17T15:02:39+00:00", 42,
+                                     settings.LIST_BATCH_SIZE)
+
+        # without changes, the position stays the same
+        self.assertEqual({"results": [], "fortsaettelse": token},
+                         actual_result)
+
+    @patch('oio_rest.db.get_registrations_since')
+    def test_get_changes_rejects_invalid_arguments(self, mock):
+        for request_params in [
+            {},
+            {"since": "2019-01-01", "uuid": "x"},
+            {"since": "2019-01-01", "maximalantalresultater": "x"},
+            {"since": oio_rest.encode_change_position(None, "x")},
+        ]:
+            with self.subTest(request_params), \
+                    self.app.test_request_context(
+                        method='GET', query_string=request_params), \
+                    self.assertRaises(BadRequestException):
+                self.testclass.get_changes()
+
+        mock.assert_not_called()
+
     @test_support.patch_db_struct(db_struct)
     @patch('oio_rest.utils.build_registration')
     @patch('oio_rest.db.search_objects')
@@ -548,7 +1073,7 @@ class TestOIORestObject(TestCase):
         # Arrange
         data = ["1", "2", "3"]
 
-        mock_search.return_value = data
+        mock_search.return_value = data, None
 
         mock_br.return_value = {}
 
@@ -621,6 +1146,8 @@ class TestOIORestObject(TestCase):
         self.assertEqual(expected_args, actual_args)
         self.assertEqual(expected_result, actual_result)
 
+    @patch('oio_rest.db.get_past_registrations',
+           new=MagicMock(return_value=None))
     @patch('oio_rest.db.list_objects')
     def test_get_object_uses_supplied_params(self, mock):
         # Arrange
@@ -738,15 +1265,14 @@ class TestOIORestObject(TestCase):
         self.assertDictEqual(expected_data, actual_data)
         self.assertEqual(400, actual_code)
 
-    @patch("oio_rest.db.object_exists")
-    @patch("oio_rest.db.create_or_import_object")
-    def test_put_object_create_if_not_exists(self, mock_create, mock_exists):
-        # type: (MagicMock, MagicMock) -> None
+    @patch("oio_rest.db.import_object")
+    def test_put_object_create_if_not_exists(self, mock_import):
+        # type: (MagicMock) -> None
         # Arrange
         uuid = "d321b784-2bbc-40b7-aa1b-c74d931cd535"
         expected_data = {"uuid": uuid}
 
-        mock_exists.return_value = False
+        mock_import.return_value = db.Livscyklus.IMPORTERET.value
 
         virkning = {
             "from": "2017-01-01",
@@ -779,59 +1305,66 @@ class TestOIORestObject(TestCase):
             result = organisation.Organisation.put_object(uuid)
             actual_data = json.loads(result[0].get_data(as_text=True))
             actual_code = result[1]
+            actual_operation = flask.request.api_operation
 
         # Assert
-        mock_create.assert_called()
+        mock_import.assert_called_once()
         self.assertDictEqual(expected_data, actual_data)
         self.assertEqual(200, actual_code)
+        self.assertEqual("Import", actual_operation)
 
-    @patch("oio_rest.db.get_life_cycle_code")
-    @patch("oio_rest.db.object_exists")
-    @patch("oio_rest.db.update_object")
-    def test_patch_object_update_if_deleted_or_passive(self, mock_update,
-                                                       mock_exists,
-                                                       mock_life_cycle):
-        # type: (MagicMock, MagicMock, MagicMock) -> None
-        from oio_rest.db import Livscyklus
-
+    @patch("oio_rest.db.import_object")
+    def test_put_object_edit_if_exists(self, mock_import):
+        # type: (MagicMock) -> None
         # Arrange
-        uuid = "fa3c6c47-9594-48e3-918e-cb1208e0144c"
-        expected_data = {"uuid": uuid}
+        uuid = "d321b784-2bbc-40b7-aa1b-c74d931cd535"
 
-        mock_exists.return_value = True
+        mock_import.return_value = db.Livscyklus.RETTET.value
 
-        mock_life_cycle.return_value = Livscyklus.PASSIVERET.value
+        virkning = {
+            "from": "2017-01-01",
+            "from_included": True,
+            "to": "2019-12-31",
+            "to_included": False,
+        }
 
-        data = {'note': "NOTE"}
+        data = {
+            "attributter": {
+                "organisationegenskaber": [
+                    {
+                        "brugervendtnoegle": "magenta",
+                        "organisationsnavn": "Magenta ApS",
+                        "virkning": virkning,
+                    }
+                ]
+            },
+            "tilstande": {
+                "organisationgyldighed": [
+                    {"gyldighed": "Aktiv", "virkning": virkning}
+                ]
+            },
+        }
 
         # Act
         with self.app.test_request_context(data=json.dumps(data),
                                            content_type='application/json',
                                            method='PUT'):
-            result = self.testclass.patch_object(uuid)
-            actual_data = json.loads(result[0].get_data(as_text=True))
-            actual_code = result[1]
+            result = organisation.Organisation.put_object(uuid)
+            actual_operation = flask.request.api_operation
 
         # Assert
-        mock_update.assert_called()
-        self.assertDictEqual(expected_data, actual_data)
-        self.assertEqual(200, actual_code)
+        self.assertEqual(200, result[1])
+        self.assertEqual("Ret", actual_operation)
 
-    @patch("oio_rest.db.get_life_cycle_code")
     @patch("oio_rest.db.object_exists")
     @patch("oio_rest.db.update_object")
-    def test_patch_object_update_if_not_deleted_or_passive(self, mock_update,
-                                                           mock_exists,
-                                                           mock_life_cycle):
-        # type: (MagicMock, MagicMock, MagicMock) -> None
-        from oio_rest.db import Livscyklus
-
+    def test_patch_object_updates_object(self, mock_update, mock_exists):
+        # type: (MagicMock, MagicMock) -> None
         # Arrange
-        uuid = "4b4be464-ace2-49d7-9589-04d279b0fe79"
+        uuid = "fa3c6c47-9594-48e3-918e-cb1208e0144c"
         expected_data = {"uuid": uuid}
 
         mock_exists.return_value = True
-        mock_life_cycle.return_value = Livscyklus.OPSTAAET.value
 
         data = {'note': "NOTE"}
 
@@ -848,21 +1381,16 @@ class TestOIORestObject(TestCase):
         self.assertDictEqual(expected_data, actual_data)
         self.assertEqual(200, actual_code)
 
-    @patch("oio_rest.db.get_life_cycle_code")
     @patch("oio_rest.db.object_exists")
     @patch("oio_rest.db.passivate_object")
     def test_patch_object_passivate_if_livscyklus_passiv(self, mock_passivate,
-                                                         mock_exists,
-                                                         mock_life_cycle):
-        # type: (MagicMock, MagicMock, MagicMock) -> None
-        from oio_rest.db import Livscyklus
-
+                                                         mock_exists):
+        # type: (MagicMock, MagicMock) -> None
         # Arrange
         uuid = "b1dfa53f-89a7-4277-8c3d-86703bf87a87"
         expected_data = {"uuid": uuid}
 
         mock_exists.return_value = True
-        mock_life_cycle.return_value = Livscyklus.OPSTAAET.value
 
         data = {'livscyklus': 'passiv'}
 
@@ -72,3 +72,84 @@ class TestRestrictions(TestCase):
         # Act
         with self.assertRaises(ImportError):
             restrictions.get_restrictions(user, object_type, operation)
+
+    @patch('oio_rest.auth.restrictions.DO_ENABLE_RESTRICTIONS', new=True)
+    @patch('oio_rest.auth.restrictions.AUTH_RESTRICTION_FUNCTION',
+           new='mock_fun')
+    @patch('oio_rest.auth.restrictions.restriction_cache',
+           new=restrictions.RestrictionCache(10, 60))
+    @patch('oio_rest.auth.restrictions.import_module')
+    def test_get_restrictions_cached(self, mock_import_module):
+        # type: (MagicMock) -> None
+        # Arrange
+        mock_import_module.return_value = auth_module = MagicMock()
+        auth_module.mock_fun.side_effect = [None, [], None]
+
+        # Act & Assert
+        for i in range(2):
+            self.assertIsNone(
+                restrictions.get_restrictions('user', 'obj', 'op'),
+            )
+            self.assertEqual(
+                [], restrictions.get_restrictions('other', 'obj', 'op'),
+            )
+
+        restrictions.invalidate_restrictions('user')
+
+        self.assertIsNone(restrictions.get_restrictions('user', 'obj', 'op'))
+        self.assertEqual(3, auth_module.mock_fun.call_count)
+
+        stats = restrictions.restriction_cache.stats()
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(1, stats['invalidations'])
+
+
+class TestRestrictionCache(TestCase):
+    def test_expires(self):
+        cache = restrictions.RestrictionCache(10, 60)
+
+        with patch('time.monotonic', return_value=100):
+            cache.put(('user', 'obj', 'op'), [])
+
+        with patch('time.monotonic', return_value=159):
+            self.assertEqual((True, []), cache.get(('user', 'obj', 'op')))
+
+        with patch('time.monotonic', return_value=160):
+            self.assertEqual((False, None), cache.get(('user', 'obj', 'op')))
+
+        self.assertEqual(1, cache.stats()['expired'])
+
+    def test_evicts_least_recently_used(self):
+        cache = restrictions.RestrictionCache(2, 60)
+
+        cache.put(('a', 'obj', 'op'), None)
+        cache.put(('b', 'obj', 'op'), None)
+        cache.get(('a', 'obj', 'op'))
+        cache.put(('c', 'obj', 'op'), None)
+
+        self.assertEqual((True, None), cache.get(('a', 'obj', 'op')))
+        self.assertEqual((False, None), cache.get(('b', 'obj', 'op')))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_disabled(self):
+        cache = restrictions.RestrictionCache(10, 0)
+
+        cache.put(('user', 'obj', 'op'), None)
+
+        self.assertEqual((False, None), cache.get(('user', 'obj', 'op')))
+
+    def test_invalidate(self):
+        cache = restrictions.RestrictionCache(10, 60)
+
+        for user in ('a', 'b'):
+            for object_type in ('Klasse', 'Facet'):
+                cache.put((user, object_type, 'op'), None)
+
+        cache.invalidate(object_type='Klasse')
+
+        self.assertEqual((False, None), cache.get(('a', 'Klasse', 'op')))
+        self.assertEqual((True, None), cache.get(('a', 'Facet', 'op')))
+
+        cache.invalidate()
+
+        self.assertEqual(0, cache.stats()['size'])
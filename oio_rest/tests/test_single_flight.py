@@ -0,0 +1,88 @@
+# Copyright (C) 2015-2019 Magenta ApS, https://magenta.dk.
+# Contact: info@magenta.dk.
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+import threading
+import unittest
+
+from oio_rest.db.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+
+    def call_in_thread(self, key, func):
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(self.flights.call(key, func)),
+        )
+        thread.start()
+
+        return thread, results
+
+    def wait_for_calls(self, calls):
+        while self.flights.stats()['calls'] < calls:
+            threading.Event().wait(0.001)
+
+    def test_call(self):
+        self.assertEqual(42, self.flights.call('key', lambda: 42))
+        self.assertEqual(43, self.flights.call('key', lambda: 43))
+
+        self.assertEqual({
+            'calls': 2,
+            'runs': 2,
+            'coalesced': 0,
+            'running': 0,
+        }, self.flights.stats())
+
+    def test_error(self):
+        def fail():
+            raise ValueError('fail')
+
+        with self.assertRaises(ValueError):
+            self.flights.call('key', fail)
+
+        self.assertEqual(0, self.flights.stats()['running'])
+
+    def test_coalesces_calls_made_while_running(self):
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        def func():
+            runs.append(len(runs))
+            started.set()
+            release.wait()
+            return len(runs)
+
+        first, first_results = self.call_in_thread('key', func)
+        started.wait()
+
+        # made while the first is running, so they wait for it and run
+        # once together
+        others = [self.call_in_thread('key', func) for i in range(3)]
+        self.wait_for_calls(4)
+
+        other, other_results = self.call_in_thread('other', lambda: 'other')
+        other.join()
+
+        release.set()
+
+        for thread, results in [(first, first_results)] + others:
+            thread.join()
+
+        self.assertEqual([1], first_results)
+        self.assertEqual([[2]] * 3, [results for _, results in others])
+        self.assertEqual(['other'], other_results)
+
+        self.assertEqual({
+            'calls': 5,
+            'runs': 3,
+            'coalesced': 2,
+            'running': 0,
+        }, self.flights.stats())
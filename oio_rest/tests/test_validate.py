@@ -26,6 +26,7 @@ from oio_rest import sag
 from oio_rest import tilstand
 from oio_rest import validate
 from oio_rest import settings
+from oio_rest.utils import test_support
 
 from . import util
 
@@ -787,6 +788,40 @@ class TestGenerateJSONSchema(TestBase):
             validate.validate(req, 'klasse')
 
 
+class TestGetValidator(TestBase):
+    def test_validator_is_reused(self):
+        self.assertIs(
+            validate.get_validator('facet'),
+            validate.get_validator('facet'),
+        )
+
+    def test_validator_discarded_with_schema(self):
+        validator = validate.get_validator('facet')
+
+        with test_support.extend_db_struct({
+            'facet': {
+                'attributter': {
+                    'fremdrift': ['status'],
+                },
+            },
+        }):
+            self.assertIsNot(validator, validate.get_validator('facet'))
+
+    def test_same_error_as_jsonschema(self):
+        req = util.get_fixture('facet_opret.json')
+        req['attributter']['facetegenskaber'][0]['supplement'] = 42
+
+        with self.assertRaises(jsonschema.exceptions.ValidationError) as cm:
+            jsonschema.validate(req, validate.get_schema('facet'))
+
+        expected = str(cm.exception)
+
+        with self.assertRaises(jsonschema.exceptions.ValidationError) as cm:
+            validate.validate(req, 'facet')
+
+        self.assertEqual(expected, str(cm.exception))
+
+
 class TestFacetSystematically(TestBase):
     def setUp(self):
         super().setUp()
@@ -6,63 +6,171 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
-""" Simple class to relay messages from PostgreSQL notifications
+""" Simple class to relay changes from the PostgreSQL outbox
 into an AMQP-queue """
 import select
 import json
+import time
 import pika
 import psycopg2
 from os import getenv
 
+# Changes are read in commit order, and only once no older transaction
+# that might still add to the outbox is running.
+READ_OUTBOX = """
+SELECT txid, id, objekttype, objekt_id, livscykluskode
+  FROM mox_outbox
+ WHERE (txid, id) > (%(txid)s, %(id)s)
+   AND txid < txid_snapshot_xmin(txid_current_snapshot())
+ ORDER BY txid, id
+ LIMIT %(limit)s
+"""
 
-def AMQPNotifier(database, user, password, host):
+# Locking the checkpoint ensures that relays sharing a name take turns.
+READ_CHECKPOINT = """
+INSERT INTO mox_outbox_checkpoint (relay) VALUES (%(relay)s)
+    ON CONFLICT DO NOTHING;
+SELECT txid, id FROM mox_outbox_checkpoint
+ WHERE relay = %(relay)s
+   FOR UPDATE
+"""
+
+WRITE_CHECKPOINT = """
+UPDATE mox_outbox_checkpoint
+   SET txid = %(txid)s, id = %(id)s, opdateret = now()
+ WHERE relay = %(relay)s
+"""
+
+# Delete the published rows older than the retention period.
+PRUNE_OUTBOX = """
+SELECT prune_mox_outbox(%(keep)s :: interval)
+"""
+
+# Rewind to just before the given row.
+REWIND_CHECKPOINT = """
+INSERT INTO mox_outbox_checkpoint (relay, txid, id)
+SELECT %(relay)s, txid, id - 1 FROM mox_outbox WHERE id = %(id)s
+    ON CONFLICT (relay) DO UPDATE
+   SET txid = excluded.txid, id = excluded.id, opdateret = now()
+"""
+
+
+def relay_batch(pg_conn, amqp, relay, batch_size):
+    """ Publish the next batch of changes and move the checkpoint past it.
+    The change is only considered published once the AMQP server has
+    confirmed it; should the relay stop before the checkpoint is
+    committed, the batch is published again on restart.
+    :param pg_conn: The PostgreSQL connection
+    :param amqp: The AMQP channel, with delivery confirmation enabled
+    :param relay: The name of the checkpoint of this relay
+    :param batch_size: The maximum number of changes to publish
+    :return: The number of changes published
+    """
+    with pg_conn, pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(READ_CHECKPOINT, {'relay': relay})
+        txid, outbox_id = pg_cursor.fetchone()
+
+        pg_cursor.execute(READ_OUTBOX, {'txid': txid, 'id': outbox_id,
+                                        'limit': batch_size})
+        rows = pg_cursor.fetchall()
+
+        for txid, outbox_id, objekttype, objektID, livscykluskode in rows:
+            amqp_payload = {'beskedtype': 'Notification',
+                            'objektID': objektID,
+                            'objekttype': objekttype,
+                            'livscykluskode': livscykluskode}
+
+            if not amqp.basic_publish(exchange='',
+                                      routing_key='mox.notifications',
+                                      body=json.dumps(amqp_payload)):
+                raise RuntimeError(
+                    'change {} was not confirmed'.format(outbox_id),
+                )
+
+        if rows:
+            pg_cursor.execute(WRITE_CHECKPOINT, {'relay': relay, 'txid': txid,
+                                                 'id': outbox_id})
+
+    return len(rows)
+
+
+def prune_outbox(pg_conn, retention):
+    """ Delete the changes published by every relay, and older than the
+    retention period, from the outbox.
+    :param pg_conn: The PostgreSQL connection
+    :param retention: How long to keep changes, as a PostgreSQL interval
+    :return: The number of changes deleted
+    """
+    with pg_conn, pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(PRUNE_OUTBOX, {'keep': retention})
+        (pruned,) = pg_cursor.fetchone()
+
+    return pruned
+
+
+def AMQPNotifier(database, user, password, host, relay='notify_to_amqp',
+                 batch_size=100, poll_interval=5, replay_from=None,
+                 retention='7 days', prune_interval=3600):
     """ Main notification thread.
+    Notifications merely wake the relay up; the changes themselves are
+    read from the outbox, starting from where the relay left off.
     :param database: The PostgreSQL database
     :param user:  The PostgreSQL user
     :param password: The PostgreSQL password
     :param host:  The PostgreSQL hostname
+    :param relay: The name of the checkpoint of this relay
+    :param batch_size: The maximum number of changes to publish at a time
+    :param poll_interval: Seconds to wait for a notification before
+        checking the outbox anyway
+    :param replay_from: If given, the id of the first outbox row to publish
+    :param retention: How long to keep published changes in the outbox, as
+        a PostgreSQL interval, or None to keep them forever
+    :param prune_interval: Seconds between deleting old changes
     """
     pg_conn = psycopg2.connect(database=database, user=user,
                                password=password, host=host)
-    pg_cursor = pg_conn.cursor()
     pika_params = pika.ConnectionParameters('localhost')
     pika_connection = pika.BlockingConnection(pika_params)
     amqp = pika_connection.channel()
     amqp.queue_declare(queue='mox.notifications')
+    amqp.confirm_delivery()
+
+    with pg_conn, pg_conn.cursor() as pg_cursor:
+        if replay_from is not None:
+            pg_cursor.execute(REWIND_CHECKPOINT,
+                              {'relay': relay, 'id': replay_from})
+
+        pg_cursor.execute("LISTEN mox_notifications;")
+
+    next_prune = time.monotonic()
 
-    pg_cursor.execute("LISTEN mox_notifications;")
-    pg_conn.poll()
-    pg_conn.commit()
     while True:
-        if select.select([pg_conn], [], [], 60) == ([], [], []):
+        while relay_batch(pg_conn, amqp, relay, batch_size) == batch_size:
             pass
-        else:
-            pg_conn.poll()
-            pg_conn.commit()
-            while pg_conn.notifies:
-                notify = pg_conn.notifies.pop(0)
-                payload_dict = json.loads(notify.payload)
-
-                table = payload_dict['table']
-                objekttype = table[0:table.find('registrering')-1]
-                objektID = payload_dict['data'][objekttype + '_id']
-                registrering = payload_dict['data']['registrering']
-                livscykluskode = registrering['livscykluskode']
-
-                amqp_payload = {'beskedtype': 'Notification',
-                                'objektID': objektID,
-                                'objekttype': objekttype,
-                                'livscykluskode': livscykluskode}
-
-                amqp.basic_publish(exchange='',
-                                   routing_key='mox.notifications',
-                                   body=json.dumps(amqp_payload))
+
+        if retention is not None and time.monotonic() >= next_prune:
+            prune_outbox(pg_conn, retention)
+            next_prune = time.monotonic() + prune_interval
+
+        # Changes of transactions still running when we read the outbox
+        # are picked up by the next poll, notified or not.
+        select.select([pg_conn], [], [], poll_interval)
+        pg_conn.poll()
+        del pg_conn.notifies[:]
+
 
 if __name__ == '__main__':
+    replay_from = getenv("REPLAY_FROM")
 
     amqp_notifier = AMQPNotifier(
         database=getenv("DB_NAME", "mox"),
         user=getenv("DB_USER", "mox"),
         password=getenv("DB_PASS", "mox"),
-        host=getenv("DB_HOST", "localhost")
+        host=getenv("DB_HOST", "localhost"),
+        relay=getenv("RELAY_NAME", "notify_to_amqp"),
+        batch_size=int(getenv("BATCH_SIZE", 100)),
+        poll_interval=float(getenv("POLL_INTERVAL", 5)),
+        replay_from=int(replay_from) if replay_from else None,
+        retention=getenv("OUTBOX_RETENTION", "7 days") or None,
+        prune_interval=float(getenv("PRUNE_INTERVAL", 3600)),
     )